@@ -7,8 +7,8 @@ from ctypes import *
 from pathlib import Path
 
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
+from device_registry import add_sdk_path, device_name, REFILL_OB1, DISTRIBUTION_MUX
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
 
 from Elveflow64 import *
 
@@ -19,7 +19,7 @@ OB1_Instr_ID=c_int32(-1) # handle for the SDK communication, increments with eac
 MUX_DRI_Instr_Id=c_int32(-1)
 Answer=(c_char*40)() #for MUX DRI
 
-error = OB1_Initialization('113433_OB1'.encode('ascii'),0,0,0,0,byref(OB1_Instr_ID)) 
+error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'),0,0,0,0,byref(OB1_Instr_ID)) 
 error = OB1_Add_Sens(OB1_Instr_ID.value, channel_MFS, 5, 1, 1, 7, 0) 
 print(f"added Sensor to channel {channel_MFS.value} with error {error}")
 error = OB1_Add_Sens(OB1_Instr_ID.value, channel_MFS_MUXout, 5, 1, 1, 7, 0) 
@@ -35,7 +35,7 @@ path_buf = create_string_buffer(Calib_path.encode('ascii'))  # char path[] (arra
 error = OB1_Calib_Load (OB1_Instr_ID.value, path_buf)
 error = OB1_Set_Press(OB1_Instr_ID.value, channel_MFS, c_double(0)) #reset the pressure to 0 as a safety measure
 
-error = MUX_DRI_Initialization("12MUX".encode('ascii'),byref(MUX_DRI_Instr_Id))#choose the COM port, it can be ASRLXXX::INSTR (where XXX=port number)
+error = MUX_DRI_Initialization(device_name(DISTRIBUTION_MUX).encode('ascii'),byref(MUX_DRI_Instr_Id))#name or COM port (ASRLXXX::INSTR, XXX=port number) is set in bench_config.json
 error = MUX_DRI_Send_Command(MUX_DRI_Instr_Id.value, 0, Answer, 40) #0 is for homing the valve which is necessary before using it writes 'Home' to the Answer buffer
 print("Homing and initial command sent to MUX with error code", error)
 error = MUX_DRI_Send_Command(MUX_DRI_Instr_Id.value, 1, Answer, 40) #0 is for homing the valve which is necessary before using it
@@ -1,10 +1,10 @@
 import sys, os
 from ctypes import byref, c_double, c_int32
 from dataclasses import dataclass
-from enum import IntEnum
 import time
 
 from Elveflow32 import *
+from error_codes import ErrorCode, ERROR_MESSAGES
 
 #sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
 #sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
@@ -29,44 +29,7 @@ IPA_CALIBRATION = 1 # can create a class for these? meh
 MFS_SENSOR_TYPE = 5
 MFS_RESOLUTION = 7 # [0..7] => [9..16] bits
 
-# error codes from the end of the SDK User Guide - probably won't need all of them
-# more error codes can be found: https://www.ni.com/docs/en-US/bundle/labview-api-ref/page/errors/general-labview-error-codes.html
-class ErrorCode(IntEnum):
-    NO_DIGITAL_SENSOR                      = 8000
-    NO_PRESSURE_SENSOR_OB1_MK3             = 8001
-    NO_DIGITAL_PRESSURE_SENSOR_MK3_PLUS    = 8002
-    NO_DIGITAL_FLOW_SENSOR_MK3             = 8003
-    NO_IPA_CONFIG_FOR_SENSOR               = 8004
-    SENSOR_NOT_COMPATIBLE                  = 8005
-    NO_INSTRUMENT_WITH_SELECTED_ID         = 8006
-    MULTIPLE_CONNECTIONS                   = 8007
-    ONLY_AVAILABLE_FOR_MUX_WIRE_V3         = 8008
-    VALVE_TYPE_RESERVED_FOR_V3_USE_4_5_6   = 8009
-    NO_COMMUNICATION_WITH_OB1              = 8030
-    NO_COMMUNICATION_WITH_BFS              = 8031
-    NO_COMMUNICATION_WITH_MSRD             = 8032
-    OB1_REMOTE_LOOP_NOT_EXECUTED           = 8033
-    BFS_REMOTE_LOOP_NOT_EXECUTED           = 8034
-    MSRD_REMOTE_LOOP_NOT_EXECUTED          = 8035
-
-ERROR_MESSAGES: dict[ErrorCode, str] = {
-    ErrorCode.NO_DIGITAL_SENSOR:                    "No Digital Sensor found",
-    ErrorCode.NO_PRESSURE_SENSOR_OB1_MK3:           "No pressure sensor compatible with OB1",
-    ErrorCode.NO_DIGITAL_PRESSURE_SENSOR_MK3_PLUS:  "No Digital pressure sensor compatible with OB1",
-    ErrorCode.NO_DIGITAL_FLOW_SENSOR_MK3:           "No Digital Flow sensor compatible with OB1",
-    ErrorCode.NO_IPA_CONFIG_FOR_SENSOR:             "No IPA config for this sensor",
-    ErrorCode.SENSOR_NOT_COMPATIBLE:                "Sensor not compatible with AF1",
-    ErrorCode.NO_INSTRUMENT_WITH_SELECTED_ID:       "No Instrument with selected ID",
-    ErrorCode.MULTIPLE_CONNECTIONS:                 "ESI software might be connected to the device, close ESI before runnin this script",
-    ErrorCode.ONLY_AVAILABLE_FOR_MUX_WIRE_V3:       "Only available for MUX Wire V3 devices",
-    ErrorCode.VALVE_TYPE_RESERVED_FOR_V3_USE_4_5_6: "Types 1, 2, 3 are reserved for V3 valves; use 4, 5, or 6 for custom/older valves",
-    ErrorCode.NO_COMMUNICATION_WITH_OB1:            "No communication with OB1",
-    ErrorCode.NO_COMMUNICATION_WITH_BFS:            "No communication with BFS",
-    ErrorCode.NO_COMMUNICATION_WITH_MSRD:           "No communication with MSRD",
-    ErrorCode.OB1_REMOTE_LOOP_NOT_EXECUTED:         "OB1 remote loop has not been executed",
-    ErrorCode.BFS_REMOTE_LOOP_NOT_EXECUTED:         "BFS remote loop has not been executed",
-    ErrorCode.MSRD_REMOTE_LOOP_NOT_EXECUTED:        "MSRD remote loop has not been executed",
-}
+# error codes (ErrorCode, ERROR_MESSAGES) live in error_codes.py, shared with retry.py
 
 
 def loadElveflowModule(dll_dir: str, py_dir: str):
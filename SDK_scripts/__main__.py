@@ -0,0 +1,6 @@
+# python SDK_scripts <command> (see cli.py)
+import sys
+
+from cli import main
+
+sys.exit(main())
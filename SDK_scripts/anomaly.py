@@ -0,0 +1,276 @@
+import math
+import threading
+from collections import deque
+
+from flow_model import SATURATION_MBAR
+
+
+# Event types
+CLOG = "clog"                # pressure holds, flow far below what the path resistance allows
+BUBBLE = "bubble"            # air through the MFS: flow reading jumps around the prediction
+LEAK = "leak"                # flow far above what the path resistance allows (open fitting, burst tube)
+EMPTY = "empty_reservoir"    # flow collapses after air reached the sensor / the reservoir is at its low level
+KINDS = (CLOG, BUBBLE, LEAK, EMPTY)
+
+# Flow response time constant of a path (seconds) used until a fingerprint gives a better one
+DEFAULT_TAU_S = 2.0
+
+
+class AnomalyEvent:
+    """One detected anomaly on a channel (and the MUX port it was routed to)."""
+
+    def __init__(self, kind, channel, port, t, pressure, flow, predicted, message):
+        self.kind = kind
+        self.channel = channel
+        self.port = port
+        self.t = t
+        self.pressure = pressure
+        self.flow = flow
+        self.predicted = predicted
+        self.message = message
+
+    def to_dict(self):
+        return {'kind': self.kind, 'channel': self.channel, 'port': self.port, 't': self.t,
+                'pressure': self.pressure, 'flow': self.flow, 'predicted': self.predicted,
+                'message': self.message}
+
+    def __repr__(self):
+        return f"AnomalyEvent({self.kind}, channel {self.channel}, port {self.port}: {self.message})"
+
+
+class _ChannelState:
+    def __init__(self, window):
+        self.predicted = None        # lagged model prediction in µL/min
+        self.last_t = None
+        self.last_residual = None
+        self.jumps = deque(maxlen=window)
+        self.counts = {kind: 0 for kind in KINDS}
+        self.clear_counts = {kind: 0 for kind in KINDS}
+        self.active = set()
+        self.settle_pending = True   # the settle window starts at the first sample after a reset
+        self.settle_until = None
+        self.last_bubble_t = None
+
+
+class AnomalyDetector:
+    """
+    Streaming clog / bubble / leak / empty-reservoir detector on the logged sample stream.
+
+    Each sample's flow is compared with the flow the path should carry at the measured
+    pressure: the path's FlowModel (per channel and MUX port) passed through a first-order
+    lag of tau_s, so pressure ramps do not look like clogs. A condition has to hold for
+    n_confirm consecutive samples before its event is raised, and is raised once until it
+    has been gone for n_confirm samples. Without a model only the model-free check runs (no
+    flow at a high pressure, reported as a clog or, with a reservoir at its low level, as empty).
+
+    Events go to on_event(event) (called on the sample thread: keep it short), to an
+    optional EventLog, and to self.events; active(channel) tells a protocol what is
+    currently wrong on a channel.
+
+        detector = AnomalyDetector(flow_models, totalizer=totalizer, on_event=handle)
+        detector.set_port(1, 3)
+        detector.add_sample(1, time.time(), pressure, flow)   # from the logger
+
+    Args:
+        flow_models: Optional FlowModelBank; the model of (channel, port) is the prediction
+        n_confirm: Consecutive samples a condition must hold (default: 3)
+        clog_ratio: Flow below this fraction of the prediction is a clog (default: 0.5)
+        leak_ratio: Flow above this multiple of the prediction is a leak (default: 1.5)
+        min_predicted: Ratios are only judged when the prediction is above this, µL/min (default: 20)
+        no_flow_pressure: Without a model, |flow| < no_flow at this pressure or more is a clog, mbar (default: 200)
+        no_flow: Flow counted as none, µL/min (default: 5)
+        bubble_jump: Residual jump counted towards a bubble, fraction of the prediction (default: 0.5)
+        bubble_count: Jumps within the last `window` samples that make a bubble (default: 2)
+        window: Samples the bubble check looks back over (default: 5)
+        empty_after_bubble_s: A flow collapse this soon after a bubble is an empty reservoir (default: 30)
+        settle_s: Samples after set_port() / reset() are ignored for this long (default: 5)
+        tau_s: Flow response time constant of the paths, or dict port -> seconds (default: DEFAULT_TAU_S)
+        totalizer: Optional FlowTotalizer; a collapse while a reservoir feeding the path is at its low level is EMPTY
+        on_event: Optional callable(AnomalyEvent)
+        event_log: Optional EventLog the events are written to
+        verbose: Print events
+    """
+
+    def __init__(self, flow_models=None, n_confirm=3, clog_ratio=0.5, leak_ratio=1.5, min_predicted=20.0,
+                 no_flow_pressure=200.0, no_flow=5.0, bubble_jump=0.5, bubble_count=2, window=5,
+                 empty_after_bubble_s=30.0, settle_s=5.0, tau_s=DEFAULT_TAU_S, totalizer=None, on_event=None,
+                 event_log=None, verbose=True):
+        self.flow_models = flow_models
+        self.n_confirm = n_confirm
+        self.clog_ratio = clog_ratio
+        self.leak_ratio = leak_ratio
+        self.min_predicted = min_predicted
+        self.no_flow_pressure = no_flow_pressure
+        self.no_flow = no_flow
+        self.bubble_jump = bubble_jump
+        self.bubble_count = bubble_count
+        self.window = window
+        self.empty_after_bubble_s = empty_after_bubble_s
+        self.settle_s = settle_s
+        self.tau_s = tau_s
+        self.totalizer = totalizer
+        self.on_event = on_event
+        self.event_log = event_log
+        self.verbose = verbose
+        self.events = []
+        self._ports = {}       # channel -> MUX port (None = no MUX)
+        self._models = {}      # channel -> callable override (set_model)
+        self._state = {}       # channel -> _ChannelState
+        self._lock = threading.Lock()
+
+    def set_port(self, channel_num, port):
+        """The MUX now routes the channel to port: switch to that path's model and let the flow settle."""
+        with self._lock:
+            self._ports[channel_num] = port
+            self._reset(channel_num)
+
+    def set_model(self, channel_num, model):
+        """Use callable pressure -> flow for a channel instead of the FlowModelBank (None = back to the bank)."""
+        with self._lock:
+            if model is None:
+                self._models.pop(channel_num, None)
+            else:
+                self._models[channel_num] = model
+
+    def reset(self, channel_num=None):
+        """Forget the state of a channel (or all), e.g. after a refill or a deliberate pressure step."""
+        with self._lock:
+            for ch in ([channel_num] if channel_num is not None else list(self._state)):
+                self._reset(ch)
+
+    def _reset(self, channel_num):
+        self._state[channel_num] = _ChannelState(self.window)
+
+    def active(self, channel_num):
+        """Kinds currently raised on a channel (a set, empty when all is well)."""
+        with self._lock:
+            state = self._state.get(channel_num)
+            return set(state.active) if state is not None else set()
+
+    def _model(self, channel_num, port):
+        if channel_num in self._models:
+            return self._models[channel_num]
+        if self.flow_models is not None:
+            model = self.flow_models.get(channel_num, port)
+            if model is not None:
+                return model.flow_for_pressure
+        return None
+
+    def _tau(self, port):
+        if isinstance(self.tau_s, dict):
+            return self.tau_s.get(port, DEFAULT_TAU_S)
+        return self.tau_s
+
+    def _reservoir_low(self, channel_num, port):
+        if self.totalizer is None:
+            return False
+        return any(r.drains(channel_num, port) and r.usable_ul <= 0 for r in self.totalizer.reservoirs.values())
+
+    def add_sample(self, channel_num, t, pressure, flow):
+        """
+        Check one sample.
+
+        Args:
+            channel_num: OB1 channel
+            t: Sample time in seconds (the log's Time_s clock)
+            pressure: Regulator reading in mbar
+            flow: MFS reading in µL/min (None / NaN samples are skipped)
+
+        Returns:
+            list: AnomalyEvent raised by this sample (usually empty)
+        """
+        if pressure is None or flow is None or math.isnan(pressure) or math.isnan(flow):
+            return []
+        with self._lock:
+            if channel_num not in self._state:
+                self._reset(channel_num)
+            state = self._state[channel_num]
+            port = self._ports.get(channel_num)
+
+            if state.settle_pending:
+                state.settle_pending = False
+                state.settle_until = t + self.settle_s
+            settling = t < state.settle_until
+
+            model = self._model(channel_num, port)
+            predicted = None
+            if model is not None:
+                target = model(pressure)
+                if state.predicted is None or state.last_t is None:
+                    state.predicted = target
+                else:
+                    dt = max(t - state.last_t, 0.0)
+                    state.predicted += (1.0 - math.exp(-dt / self._tau(port))) * (target - state.predicted)
+                predicted = state.predicted
+            state.last_t = t
+            if settling:
+                state.last_residual = None
+                return []
+
+            scale = max(predicted if predicted is not None else abs(flow), self.min_predicted)
+            residual = flow - (predicted if predicted is not None else 0.0)
+            state.jumps.append(state.last_residual is not None
+                               and abs(residual - state.last_residual) > self.bubble_jump * scale)
+            state.last_residual = residual
+
+            judged = predicted is not None and predicted >= self.min_predicted
+            collapsed = abs(flow) < self.no_flow and (judged or pressure >= self.no_flow_pressure)
+            # without a prediction every pressure change moves the residual, so bubbles need a model
+            bubble = judged and sum(state.jumps) >= self.bubble_count
+            if bubble:
+                state.last_bubble_t = t
+            recent_bubble = (state.last_bubble_t is not None and t - state.last_bubble_t <= self.empty_after_bubble_s)
+            empty = collapsed and (recent_bubble or self._reservoir_low(channel_num, port))
+            clog = not empty and not bubble and (
+                collapsed or (judged and flow < self.clog_ratio * predicted))
+            leak = not bubble and judged and flow > self.leak_ratio * predicted
+            conditions = {CLOG: clog, BUBBLE: bubble, LEAK: leak, EMPTY: empty}
+
+            raised = []
+            for kind, holds in conditions.items():
+                if holds:
+                    state.counts[kind] += 1
+                    state.clear_counts[kind] = 0
+                    needed = 1 if kind == BUBBLE else self.n_confirm   # the jump count already spans samples
+                    if state.counts[kind] >= needed and kind not in state.active:
+                        state.active.add(kind)
+                        raised.append(AnomalyEvent(kind, channel_num, port, t, pressure, flow, predicted,
+                                                   self._describe(kind, pressure, flow, predicted)))
+                else:
+                    state.counts[kind] = 0
+                    if kind in state.active:
+                        state.clear_counts[kind] += 1
+                        if state.clear_counts[kind] >= self.n_confirm:
+                            state.active.discard(kind)
+            # an empty reservoir explains the collapse; it is not also a clog
+            if EMPTY in state.active:
+                state.active.discard(CLOG)
+            self.events.extend(raised)
+
+        for event in raised:
+            if self.verbose:
+                print(f"⚠ {event.kind.upper()} on channel {channel_num}"
+                      f"{f' port {port}' if port is not None else ''}: {event.message}")
+            if self.event_log is not None:
+                fields = event.to_dict()
+                fields['sample_t'] = fields.pop('t')   # the event log stamps its own 't'
+                self.event_log.log("anomaly", **fields)
+            if self.on_event is not None:
+                self.on_event(event)
+        return raised
+
+    def _describe(self, kind, pressure, flow, predicted):
+        expected = f", expected {predicted:.1f} µL/min" if predicted is not None else ""
+        text = f"{flow:.1f} µL/min at {pressure:.1f} mbar{expected}"
+        if pressure >= SATURATION_MBAR:
+            text += " (regulator saturated)"
+        return text
+
+    def print_summary(self):
+        print(f"\n=== ANOMALIES ===")
+        if not self.events:
+            print("✓ None detected")
+        for event in self.events:
+            port = f" port {event.port}" if event.port is not None else ""
+            print(f"⚠ t={event.t:.1f} {event.kind:<16} channel {event.channel}{port}: {event.message}")
+        print("=" * 40)
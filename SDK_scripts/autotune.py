@@ -0,0 +1,505 @@
+import sys
+import os
+import time
+import json
+import math
+from datetime import datetime
+
+from ctypes import *
+
+from device_registry import add_sdk_path, device_name, device_info, calibration_file, REFILL_OB1
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+
+# MFS calibration codes (same as H20_CALIBRATION / IPA_CALIBRATION in OB1_test.py)
+FLUID_NAMES = {0: 'H2O', 1: 'IPA'}
+
+DEFAULT_GAINS_PATH = "pid_gains.json"
+
+# Host-unit gain (mbar per µL/min) -> PID_Set_Params_Remote gain, measured on this bench.
+# None = not calibrated: autotune saves host-unit gains only and never pushes to the remote PID
+REMOTE_GAIN_SCALE = None
+
+
+def _read(instr_id, channel):
+    sen = c_double()
+    reg = c_double()
+    error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+    return error, reg.value, sen.value
+
+
+def _smooth(values, n=5):
+    """Centered moving average used before picking crossing times on a noisy flow step."""
+    if n <= 1 or len(values) < n:
+        return list(values)
+    half = n // 2
+    out = []
+    for i in range(len(values)):
+        window = values[max(0, i - half):i + half + 1]
+        out.append(sum(window) / len(window))
+    return out
+
+
+def _crossing_time(time_log, values, level):
+    """First time the (rising or falling) response crosses level, linearly interpolated."""
+    rising = values[-1] >= values[0]
+    for i in range(1, len(values)):
+        v0, v1 = values[i - 1], values[i]
+        if (rising and v0 < level <= v1) or (not rising and v0 > level >= v1):
+            if v1 == v0:
+                return time_log[i]
+            frac = (level - v0) / (v1 - v0)
+            return time_log[i - 1] + frac * (time_log[i] - time_log[i - 1])
+    return None
+
+
+def fit_fopdt_step(time_log, flow_log, pressure_step, baseline_s=None):
+    """
+    Fit a first-order-plus-dead-time model to an open-loop pressure step.
+
+    Uses Smith's two-point method on the smoothed response:
+    tau = 1.5 * (t63 - t28), theta = t63 - tau, K = delta_flow / delta_pressure.
+
+    Args:
+        time_log: Sample times in seconds, step applied at t = 0
+        flow_log: Flow readings in µL/min
+        pressure_step: Size of the applied pressure step in mbar
+        baseline_s: Samples before this time are averaged as the initial value (default: first sample only)
+
+    Returns:
+        dict: {'K': µL/min per mbar, 'tau': s, 'theta': s} or None if the fit failed
+    """
+    if len(flow_log) < 10 or pressure_step == 0:
+        return None
+
+    smooth = _smooth(flow_log)
+    if baseline_s is not None:
+        base = [f for t, f in zip(time_log, smooth) if t <= baseline_s] or smooth[:1]
+    else:
+        base = smooth[:1]
+    y0 = sum(base) / len(base)
+
+    # final value from the last 20% of the record
+    tail = smooth[int(len(smooth) * 0.8):]
+    y_final = sum(tail) / len(tail)
+    dy = y_final - y0
+    if abs(dy) < 1e-6:
+        return None
+
+    t28 = _crossing_time(time_log, smooth, y0 + 0.283 * dy)
+    t63 = _crossing_time(time_log, smooth, y0 + 0.632 * dy)
+    if t28 is None or t63 is None or t63 <= t28:
+        return None
+
+    tau = 1.5 * (t63 - t28)
+    theta = max(t63 - tau, 0.0)
+    return {'K': dy / pressure_step, 'tau': tau, 'theta': theta}
+
+
+def fopdt_from_relay(relay_amplitude, oscillation_amplitude, period_s, static_gain):
+    """
+    Convert a relay test (ultimate gain/period) into FOPDT parameters, given the static gain.
+
+    Args:
+        relay_amplitude: Half the pressure swing of the relay in mbar
+        oscillation_amplitude: Half the peak-to-peak flow oscillation in µL/min
+        period_s: Oscillation period in seconds
+        static_gain: Process gain K in µL/min per mbar
+
+    Returns:
+        dict: {'K', 'tau', 'theta', 'Ku', 'Pu'} or None if the numbers are inconsistent
+    """
+    if oscillation_amplitude <= 0 or period_s <= 0 or static_gain <= 0:
+        return None
+    ku = 4.0 * relay_amplitude / (math.pi * oscillation_amplitude)
+    kku = static_gain * ku
+    if kku <= 1.0:
+        return None
+    w = 2.0 * math.pi / period_s
+    tau = math.sqrt(kku ** 2 - 1.0) / w
+    theta = (math.pi - math.atan(w * tau)) / w
+    return {'K': static_gain, 'tau': tau, 'theta': theta, 'Ku': ku, 'Pu': period_s}
+
+
+def compute_pi_gains(model, method="SIMC", tau_c=None):
+    """
+    PI gains for a FOPDT model.
+
+    SIMC (Skogestad): Kc = tau / (K (tau_c + theta)), Ti = min(tau, 4 (tau_c + theta))
+    IMC  (Rivera):    Kc = (2 tau + theta) / (2 K tau_c), Ti = tau + theta / 2
+
+    Args:
+        model: dict with 'K', 'tau', 'theta'
+        method: "SIMC" or "IMC" (default: "SIMC")
+        tau_c: Closed-loop time constant in seconds (default: theta, or tau/2 if theta is ~0)
+
+    Returns:
+        dict: {'k_p', 'k_i', 'Ti', 'tau_c', 'method'} in host units (mbar per µL/min, per s)
+    """
+    K, tau, theta = model['K'], model['tau'], model['theta']
+    if tau_c is None:
+        tau_c = theta if theta > 0.05 * tau else tau / 2.0
+    tau_c = max(tau_c, 1e-3)
+
+    method = method.upper()
+    if method == "SIMC":
+        k_p = tau / (K * (tau_c + theta))
+        ti = min(tau, 4.0 * (tau_c + theta))
+    elif method == "IMC":
+        k_p = (2.0 * tau + theta) / (2.0 * K * tau_c)
+        ti = tau + theta / 2.0
+    else:
+        raise ValueError(f"Unknown tuning method: {method}")
+
+    return {'k_p': k_p, 'k_i': k_p / ti, 'Ti': ti, 'tau_c': tau_c, 'method': method}
+
+
+def step_test(instr_id, channel, p_start=100.0, p_step=100.0, settle_s=20.0, record_s=30.0,
+              sample_dt=0.05, verbose=True):
+    """
+    Open-loop pressure step test through OB1_Set_Press / OB1_Get_Data.
+
+    Args:
+        instr_id: OB1 instrument ID
+        channel: Channel to test
+        p_start: Operating pressure before the step in mbar (default: 100)
+        p_step: Step size in mbar (default: 100)
+        settle_s: Time at p_start before the step in seconds (default: 20)
+        record_s: Recording time after the step in seconds (default: 30)
+        sample_dt: Sampling interval in seconds (default: 0.05)
+        verbose: Print progress information
+
+    Returns:
+        dict: Step logs (time relative to the step) and the fitted model, or None on error
+    """
+    if verbose:
+        print(f"\n=== STEP TEST ===")
+        print(f"Channel: {channel.value}")
+        print(f"Step: {p_start} -> {p_start + p_step} mbar")
+        print("-" * 30)
+
+    try:
+        OB1_Set_Press(instr_id, channel, c_double(p_start))
+        time.sleep(settle_s)
+
+        time_log, flow_log, pressure_log = [], [], []
+        # one second of pre-step baseline
+        start = time.time() + 1.0
+        stepped = False
+        while (time.time() - start) < record_s:
+            now = time.time()
+            if not stepped and now >= start:
+                error = OB1_Set_Press(instr_id, channel, c_double(p_start + p_step))
+                if error != 0:
+                    if verbose:
+                        print(f"Error applying step: {error}")
+                    return None
+                stepped = True
+            error, pressure, flow = _read(instr_id, channel)
+            if error == 0:
+                time_log.append(now - start)
+                flow_log.append(flow)
+                pressure_log.append(pressure)
+            time.sleep(sample_dt)
+    except KeyboardInterrupt:
+        if verbose:
+            print("\nStep test interrupted by user")
+        return None
+    finally:
+        OB1_Set_Press(instr_id, channel, c_double(0))
+
+    # fit only on post-step samples, baseline from the pre-step second
+    pre = [f for t, f in zip(time_log, flow_log) if t < 0]
+    post_t = [t for t in time_log if t >= 0]
+    post_f = [f for t, f in zip(time_log, flow_log) if t >= 0]
+    if pre:
+        post_t = [0.0] + post_t
+        post_f = [sum(pre) / len(pre)] + post_f
+    model = fit_fopdt_step(post_t, post_f, p_step)
+
+    if verbose:
+        if model:
+            print(f"FOPDT fit: K={model['K']:.3f} µL/min/mbar, tau={model['tau']:.2f} s, theta={model['theta']:.2f} s")
+        else:
+            print("⚠ Could not fit a FOPDT model to the step response")
+        print("=" * 30)
+
+    return {'time_log': time_log, 'flow_log': flow_log, 'pressure_log': pressure_log,
+            'p_start': p_start, 'p_step': p_step, 'model': model}
+
+
+def relay_test(instr_id, channel, p_bias=200.0, relay_amplitude=50.0, flow_setpoint=None,
+               n_cycles=6, timeout_s=120.0, sample_dt=0.05, verbose=True):
+    """
+    Relay (Astrom-Hagglund) test: pressure toggles p_bias ± relay_amplitude whenever the flow
+    crosses the setpoint; the resulting limit cycle gives the ultimate gain and period.
+
+    Args:
+        instr_id: OB1 instrument ID
+        channel: Channel to test
+        p_bias: Center pressure in mbar (default: 200)
+        relay_amplitude: Relay half-swing in mbar (default: 50)
+        flow_setpoint: Switching level in µL/min (default: flow measured at p_bias)
+        n_cycles: Oscillation cycles to average (default: 6)
+        timeout_s: Abort after this many seconds (default: 120)
+        sample_dt: Sampling interval in seconds (default: 0.05)
+        verbose: Print progress information
+
+    Returns:
+        dict: Relay results and fitted model, or None on error
+    """
+    if verbose:
+        print(f"\n=== RELAY TEST ===")
+        print(f"Channel: {channel.value}")
+        print(f"Relay: {p_bias} ± {relay_amplitude} mbar")
+        print("-" * 30)
+
+    time_log, flow_log = [], []
+    switch_times = []
+    try:
+        OB1_Set_Press(instr_id, channel, c_double(p_bias))
+        time.sleep(10.0)
+        if flow_setpoint is None:
+            samples = []
+            for _ in range(20):
+                error, _, flow = _read(instr_id, channel)
+                if error == 0:
+                    samples.append(flow)
+                time.sleep(sample_dt)
+            if not samples:
+                return None
+            flow_setpoint = sum(samples) / len(samples)
+
+        static_gain_points = (p_bias, flow_setpoint)
+        high = True
+        OB1_Set_Press(instr_id, channel, c_double(p_bias + relay_amplitude))
+        start = time.time()
+        while (time.time() - start) < timeout_s and len(switch_times) < 2 * n_cycles + 2:
+            error, _, flow = _read(instr_id, channel)
+            now = time.time() - start
+            if error == 0:
+                time_log.append(now)
+                flow_log.append(flow)
+                if high and flow > flow_setpoint:
+                    high = False
+                    OB1_Set_Press(instr_id, channel, c_double(p_bias - relay_amplitude))
+                    switch_times.append(now)
+                elif not high and flow < flow_setpoint:
+                    high = True
+                    OB1_Set_Press(instr_id, channel, c_double(p_bias + relay_amplitude))
+                    switch_times.append(now)
+            time.sleep(sample_dt)
+    except KeyboardInterrupt:
+        if verbose:
+            print("\nRelay test interrupted by user")
+        return None
+    finally:
+        OB1_Set_Press(instr_id, channel, c_double(0))
+
+    if len(switch_times) < 6:
+        if verbose:
+            print(f"⚠ Not enough relay switches ({len(switch_times)}) to estimate the limit cycle")
+        return None
+
+    # skip the first transient cycle
+    periods = [switch_times[i + 2] - switch_times[i] for i in range(2, len(switch_times) - 2)]
+    period = sum(periods) / len(periods)
+    steady = [f for t, f in zip(time_log, flow_log) if t >= switch_times[2]]
+    amplitude = (max(steady) - min(steady)) / 2.0
+
+    # static gain from the operating point (flow per mbar through the origin)
+    static_gain = static_gain_points[1] / static_gain_points[0] if static_gain_points[0] else 0.0
+    model = fopdt_from_relay(relay_amplitude, amplitude, period, static_gain)
+
+    if verbose:
+        print(f"Limit cycle: period {period:.2f} s, amplitude {amplitude:.1f} µL/min")
+        if model:
+            print(f"FOPDT fit: K={model['K']:.3f}, tau={model['tau']:.2f} s, theta={model['theta']:.2f} s, Ku={model['Ku']:.3f}")
+        else:
+            print("⚠ Relay data inconsistent with a FOPDT model")
+        print("=" * 30)
+
+    return {'time_log': time_log, 'flow_log': flow_log, 'switch_times': switch_times,
+            'period': period, 'amplitude': amplitude, 'flow_setpoint': flow_setpoint, 'model': model}
+
+
+def save_pid_gains(channel_num, fluid, gains, model=None, remote_gains=None, remote_gain_scale=None,
+                   path=DEFAULT_GAINS_PATH):
+    """
+    Store gains per channel and per fluid in a JSON file (other entries are kept).
+
+    Args:
+        channel_num: OB1 channel number (int)
+        fluid: 'H2O' / 'IPA' or an MFS calibration code (0/1)
+        gains: dict from compute_pi_gains
+        model: FOPDT model the gains were computed from (optional)
+        remote_gains: (k_p, k_i) for PID_Set_Params_Remote, only with a calibrated scale (optional)
+        remote_gain_scale: The calibrated scale remote_gains were computed with (optional)
+        path: JSON file path (default: pid_gains.json)
+    """
+    fluid = FLUID_NAMES.get(fluid, fluid)
+    data = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+    data.setdefault(f"channel_{channel_num}", {})[fluid] = {
+        'k_p': gains['k_p'],
+        'k_i': gains['k_i'],
+        'method': gains.get('method'),
+        'tau_c': gains.get('tau_c'),
+        'remote_k_p': remote_gains[0] if remote_gains else None,
+        'remote_k_i': remote_gains[1] if remote_gains else None,
+        'remote_gain_scale': remote_gain_scale if remote_gains else None,
+        'model': model,
+        'date': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return path
+
+
+def load_pid_gains(channel_num, fluid, path=DEFAULT_GAINS_PATH):
+    """
+    Returns:
+        dict: Saved gains entry for the channel and fluid, or None
+    """
+    fluid = FLUID_NAMES.get(fluid, fluid)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data.get(f"channel_{channel_num}", {}).get(fluid)
+
+
+def autotune_channel(instr_id, channel, fluid=1, mode="step", method="SIMC", tau_c=None,
+                     push=False, remote_gain_scale=None, gains_path=DEFAULT_GAINS_PATH,
+                     verbose=True, **test_kwargs):
+    """
+    Run a step or relay test, fit a FOPDT model, compute PI gains and save them for this channel
+    and fluid; optionally push them to the remote PID.
+
+    The remote PID gains are not in documented physical units: the host-unit gains (mbar per
+    µL/min, typically 0.1-0.5) are 100x or more above the remote gains known to work (0.001).
+    Remote gains are therefore only computed, saved and pushed with a remote_gain_scale measured
+    on the bench; without one only the host-unit gains are saved.
+
+    Args:
+        instr_id: OB1 instrument ID
+        channel: Channel to tune
+        fluid: MFS calibration (0 = H2O, 1 = IPA) or name (default: 1, as in OB1_Add_Sens calls)
+        mode: "step" or "relay" (default: "step")
+        method: "SIMC" or "IMC" (default: "SIMC")
+        tau_c: Closed-loop time constant (default: chosen from the model)
+        push: Send the gains with PID_Set_Params_Remote (default: False, needs remote_gain_scale)
+        remote_gain_scale: Calibrated host -> remote gain factor (default: None = no remote gains)
+        gains_path: JSON file for saved gains (default: pid_gains.json)
+        verbose: Print progress information
+        **test_kwargs: Passed to step_test / relay_test
+
+    Returns:
+        dict: {'model', 'gains', 'remote_gains', 'error'} or None if the test/fit failed
+    """
+    if push and remote_gain_scale is None:
+        raise ValueError("pushing to the remote PID needs a calibrated remote_gain_scale")
+    if verbose:
+        print(f"\n=== PID AUTOTUNE ===")
+        print(f"Channel: {channel.value}, fluid: {FLUID_NAMES.get(fluid, fluid)}, mode: {mode}, method: {method}")
+        print("-" * 30)
+
+    if mode == "step":
+        test = step_test(instr_id, channel, verbose=verbose, **test_kwargs)
+    elif mode == "relay":
+        test = relay_test(instr_id, channel, verbose=verbose, **test_kwargs)
+    else:
+        raise ValueError(f"Unknown autotune mode: {mode}")
+
+    if not test or not test['model']:
+        if verbose:
+            print("✗ Autotune failed: no model")
+        return None
+
+    model = test['model']
+    gains = compute_pi_gains(model, method=method, tau_c=tau_c)
+    remote_gains = None
+    if remote_gain_scale is not None:
+        remote_gains = (gains['k_p'] * remote_gain_scale, gains['k_i'] * remote_gain_scale)
+
+    error = 0
+    if push:
+        error = PID_Set_Params_Remote(instr_id, channel, 1, *remote_gains)
+        if error != 0 and verbose:
+            print(f"Error pushing PID parameters: {error}")
+
+    save_pid_gains(channel.value, fluid, gains, model=model,
+                   remote_gains=remote_gains, remote_gain_scale=remote_gain_scale, path=gains_path)
+
+    if verbose:
+        print(f"Gains ({gains['method']}): Kp={gains['k_p']:.4f}, Ki={gains['k_i']:.4f} (Ti={gains['Ti']:.2f} s)")
+        if push:
+            print(f"Pushed to remote PID: Kp={remote_gains[0]:.6f}, Ki={remote_gains[1]:.6f}")
+        elif remote_gains is None:
+            print("No remote_gain_scale: remote PID gains not computed")
+        print(f"Saved to: {gains_path}")
+        print("=" * 30)
+
+    return {'model': model, 'gains': gains,
+            'remote_gains': remote_gains, 'error': error}
+
+
+def main():
+    """
+    Autotune the remote PID on one channel:
+    1. Initialize OB1 and add the MFS sensor
+    2. Load calibration
+    3. Step test -> FOPDT fit -> SIMC gains
+    4. Save the gains per channel/fluid (and push them, once REMOTE_GAIN_SCALE is calibrated)
+    5. Cleanup
+    """
+    channel = c_int32(1)
+    instr_id = c_int32(-1)
+    sensor_args = device_info(REFILL_OB1).get('sensors', {}).get(str(channel.value))
+    if not sensor_args:
+        print(f"Error: no MFS configured on channel {channel.value} of the {REFILL_OB1}")
+        return
+    fluid = sensor_args[2]  # MFS calibration the gains are saved under (0 = H2O, 1 = IPA)
+
+    print("=== INITIALIZING OB1 ===")
+    error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'), 0, 0, 0, 0, byref(instr_id))
+    if error != 0:
+        print(f"Error initializing OB1: {error}")
+        return
+    print("✓ OB1 initialized successfully")
+
+    try:
+        error = OB1_Add_Sens(instr_id.value, channel.value, *sensor_args)
+        if error != 0:
+            print(f"Error adding sensor: {error}")
+            return
+
+        calibration_path = calibration_file(REFILL_OB1)
+        if not calibration_path:
+            print(f"Error: no calibration found for the {REFILL_OB1}")
+            return
+        error = OB1_Calib_Load(instr_id.value, create_string_buffer(calibration_path.encode('ascii')))
+        if error != 0:
+            print(f"Error loading calibration: {error}")
+            return
+
+        # remote PID needs to exist before PID_Set_Params_Remote
+        PID_Add_Remote(instr_id.value, channel, instr_id.value, channel, 0.001, 0.001, 0)
+
+        result = autotune_channel(instr_id.value, channel, fluid=fluid, mode="step", method="SIMC",
+                                  push=REMOTE_GAIN_SCALE is not None, remote_gain_scale=REMOTE_GAIN_SCALE,
+                                  p_start=100.0, p_step=100.0)
+        if result:
+            print(f"✓ Autotune finished: {result['gains']}")
+
+    finally:
+        OB1_Set_Press(instr_id.value, channel, c_double(0))
+        OB1_Destructor(instr_id.value)
+
+
+if __name__ == "__main__":
+    main()
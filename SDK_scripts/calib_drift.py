@@ -0,0 +1,246 @@
+import os
+import re
+import sys
+import glob
+from datetime import datetime
+
+import numpy as np
+
+
+# OB1_Calib table: CALIB_LEN points per regulator channel
+CALIB_LEN = 1000
+N_CHANNELS = 4
+
+# Recalibrate when the table is predicted to have moved more than this (RMS change, % of the
+# table's span) since the last OB1_Calib, or when the last one is older than MAX_CALIB_AGE_DAYS
+DRIFT_TOL_PCT = 0.5
+MAX_CALIB_AGE_DAYS = 90
+
+# calibration_20250929.calib / .CALIB, as written by create_timestamped_path
+_DATED_NAME = re.compile(r"_(\d{8})$")
+
+
+def load_calib(path, n_channels=N_CHANNELS):
+    """
+    Parse an OB1_Calib_Save file into a (n_channels, points) array.
+
+    Text files (numbers separated by whitespace, commas, tabs or semicolons) and binary files
+    of big-endian doubles (LabVIEW's format, with or without the int32 length header) are
+    read. The table is split into n_channels equal blocks in file order.
+
+    Args:
+        path: Calibration file
+        n_channels: Regulator channels on the OB1 (default: 4)
+
+    Returns:
+        numpy.ndarray: Calibration table, one row per channel
+
+    Raises:
+        ValueError: The file is neither format or does not split into n_channels blocks
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    try:
+        tokens = [t for t in re.split(r"[\s,;]+", raw.decode('ascii')) if t]
+        values = np.array(tokens, dtype=float)
+    except (UnicodeDecodeError, ValueError):
+        if len(raw) >= 4 and (len(raw) - 4) % 8 == 0 and int.from_bytes(raw[:4], 'big') == (len(raw) - 4) // 8:
+            raw = raw[4:]
+        if not raw or len(raw) % 8:
+            raise ValueError(f"{path}: not a text or float64 calibration table")
+        values = np.frombuffer(raw, dtype='>f8').astype(float)
+
+    if values.size == 0 or values.size % n_channels:
+        raise ValueError(f"{path}: {values.size} values do not split into {n_channels} channels")
+    return values.reshape(n_channels, -1)
+
+
+def compare(reference, table):
+    """
+    Per-channel difference between two calibration tables (vectorized over channels).
+
+    Args:
+        reference: (channels, points) array, e.g. the older calibration
+        table: Array of the same shape
+
+    Returns:
+        dict: numpy arrays, one value per channel:
+              'offset' (mean difference), 'rms', 'max_abs', 'gain' (least-squares slope of
+              table against reference, 1 = no gain change), 'rms_pct' (rms as % of the
+              reference span; the drift figure the tolerances use)
+    """
+    reference = np.asarray(reference, dtype=float)
+    table = np.asarray(table, dtype=float)
+    if reference.shape != table.shape:
+        raise ValueError(f"calibration tables differ in shape: {reference.shape} vs {table.shape}")
+
+    diff = table - reference
+    span = np.ptp(reference, axis=1)
+    span = np.where(span > 0, span, 1.0)
+    ref_centered = reference - reference.mean(axis=1, keepdims=True)
+    table_centered = table - table.mean(axis=1, keepdims=True)
+    ref_var = (ref_centered ** 2).sum(axis=1)
+    covariance = (ref_centered * table_centered).sum(axis=1)
+    gain = np.where(ref_var > 0, covariance / np.where(ref_var > 0, ref_var, 1.0), 1.0)
+    rms = np.sqrt((diff ** 2).mean(axis=1))
+    return {
+        'offset': diff.mean(axis=1),
+        'rms': rms,
+        'max_abs': np.abs(diff).max(axis=1),
+        'gain': gain,
+        'rms_pct': rms / span * 100,
+    }
+
+
+def archive(base_path):
+    """
+    Date-stamped calibrations next to base_path, oldest first.
+
+    For base_path "C:/Users/oykuz/calibration.calib" this finds calibration_YYYYMMDD.calib
+    (any extension case).
+
+    Returns:
+        list: (datetime, path) tuples
+    """
+    folder, filename = os.path.split(base_path)
+    stem, ext = os.path.splitext(filename)
+    found = []
+    for path in glob.glob(os.path.join(folder or ".", f"{glob.escape(stem)}_*")):
+        name, path_ext = os.path.splitext(os.path.basename(path))
+        match = _DATED_NAME.search(name)
+        if not match or path_ext.lower() != ext.lower() or name[:match.start()] != stem:
+            continue
+        try:
+            found.append((datetime.strptime(match.group(1), "%Y%m%d"), path))
+        except ValueError:
+            continue
+    return sorted(found)
+
+
+def drift_history(base_path, n_channels=N_CHANNELS, verbose=True):
+    """
+    Drift of every archived calibration against the previous one and against the first.
+
+    Returns:
+        list: One dict per readable calibration: 'date', 'path', 'table', 'from_previous' and
+              'from_first' (compare() results, None for the first), 'rate_pct_per_day'
+              (worst channel's rms_pct change per day since the previous one)
+    """
+    history = []
+    for date, path in archive(base_path):
+        try:
+            table = load_calib(path, n_channels)
+        except (OSError, ValueError) as e:
+            if verbose:
+                print(f"⚠ Skipping {path}: {e}")
+            continue
+        entry = {'date': date, 'path': path, 'table': table,
+                 'from_previous': None, 'from_first': None, 'rate_pct_per_day': None}
+        if history:
+            previous = history[-1]
+            if previous['table'].shape == table.shape:
+                entry['from_previous'] = compare(previous['table'], table)
+                days = max((date - previous['date']).days, 1)
+                entry['rate_pct_per_day'] = float(entry['from_previous']['rms_pct'].max()) / days
+            if history[0]['table'].shape == table.shape:
+                entry['from_first'] = compare(history[0]['table'], table)
+        history.append(entry)
+
+    if verbose:
+        print(f"\n=== CALIBRATION DRIFT HISTORY ===")
+        print(f"Archive: {base_path} ({len(history)} calibrations)")
+        print(f"{'Date':<11} {'vs previous (RMS % of span per channel)':<44} {'%/day':>7}")
+        print("-" * 65)
+        for entry in history:
+            step = entry['from_previous']
+            per_channel = " ".join(f"{x:6.3f}" for x in step['rms_pct']) if step is not None else "-"
+            rate = f"{entry['rate_pct_per_day']:.4f}" if entry['rate_pct_per_day'] is not None else "-"
+            print(f"{entry['date']:%Y-%m-%d}  {per_channel:<44} {rate:>7}")
+        print("=" * 65)
+    return history
+
+
+def recalibration_needed(base_path, tol_pct=DRIFT_TOL_PCT, max_age_days=MAX_CALIB_AGE_DAYS, now=None,
+                         n_channels=N_CHANNELS, verbose=True):
+    """
+    Decide whether OB1_Calib has to run or the latest archived calibration can be loaded.
+
+    The drift rate between the last two calibrations is extrapolated to today; if the
+    predicted change since the latest calibration is within tol_pct (and the latest is not
+    older than max_age_days) the latest one is good enough.
+
+    Args:
+        base_path: Calibration path the archive is stamped from (see archive())
+        tol_pct: Allowed predicted drift, RMS % of table span (default: DRIFT_TOL_PCT)
+        max_age_days: Recalibrate after this many days regardless (default: MAX_CALIB_AGE_DAYS)
+        now: Date to judge against (default: datetime.now())
+        verbose: Print the decision
+
+    Returns:
+        tuple: (needed: bool, latest_path: str or None, reason: str)
+    """
+    now = now or datetime.now()
+    history = drift_history(base_path, n_channels, verbose=False)
+    latest_path = history[-1]['path'] if history else None
+    if not history:
+        needed, reason = True, "no readable calibration in the archive"
+    else:
+        latest = history[-1]
+        age_days = (now - latest['date']).days
+        if age_days > max_age_days:
+            needed, reason = True, f"latest calibration is {age_days} days old (limit {max_age_days})"
+        elif latest['rate_pct_per_day'] is None:
+            needed, reason = False, f"only one calibration, {age_days} days old; drift rate unknown"
+        else:
+            predicted = latest['rate_pct_per_day'] * age_days
+            last_step = float(latest['from_previous']['rms_pct'].max())
+            if last_step > tol_pct:
+                needed, reason = True, f"last two calibrations differ by {last_step:.3f}% (tolerance {tol_pct}%)"
+            elif predicted > tol_pct:
+                needed, reason = True, f"predicted drift {predicted:.3f}% after {age_days} days (tolerance {tol_pct}%)"
+            else:
+                needed, reason = False, f"predicted drift {predicted:.3f}% after {age_days} days (tolerance {tol_pct}%)"
+
+    if verbose:
+        mark = "⚠ Recalibration needed" if needed else "✓ Calibration still valid"
+        print(f"{mark}: {reason}")
+        if latest_path:
+            print(f"Latest calibration: {latest_path}")
+    return needed, latest_path, reason
+
+
+def print_comparison(path_a, path_b, n_channels=N_CHANNELS, tol_pct=DRIFT_TOL_PCT):
+    """Compare two calibration files channel by channel. Returns the compare() result."""
+    result = compare(load_calib(path_a, n_channels), load_calib(path_b, n_channels))
+    print(f"\n=== CALIBRATION COMPARISON ===")
+    print(f"A: {path_a}")
+    print(f"B: {path_b}")
+    print(f"{'Channel':<8} {'offset':>9} {'RMS':>9} {'max |Δ|':>9} {'gain':>8} {'RMS %':>7}")
+    print("-" * 55)
+    for ch in range(len(result['rms'])):
+        mark = "✓" if result['rms_pct'][ch] <= tol_pct else "✗"
+        print(f"{ch + 1:<8} {result['offset'][ch]:>9.4f} {result['rms'][ch]:>9.4f} {result['max_abs'][ch]:>9.4f} "
+              f"{result['gain'][ch]:>8.5f} {result['rms_pct'][ch]:>7.3f} {mark}")
+    print("=" * 55)
+    return result
+
+
+def main():
+    """
+    python calib_drift.py <a.calib> <b.calib>   compare two calibrations
+    python calib_drift.py <base.calib>          drift history of the dated archive + verdict
+    """
+    if len(sys.argv) == 3:
+        print_comparison(sys.argv[1], sys.argv[2])
+    elif len(sys.argv) == 2:
+        drift_history(sys.argv[1])
+        recalibration_needed(sys.argv[1])
+    else:
+        print(main.__doc__)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
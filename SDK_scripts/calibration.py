@@ -12,15 +12,15 @@ import matplotlib.pyplot as plt
 from datetime import datetime
 
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
+from device_registry import add_sdk_path, device_name, REFILL_OB1
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
 
 from Elveflow64 import *
 
 # ----- OB1 INITIALIZATION -----
 channel_MFS = c_int32(2)
 Instr_ID=c_int32(-1) # handle for the SDK communication, increments with each new instrument initialized
-error = OB1_Initialization('113433'.encode('ascii'),0,0,0,0,byref(Instr_ID)) 
+error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'),0,0,0,0,byref(Instr_ID)) 
 error = OB1_Add_Sens(Instr_ID.value, channel_MFS.value, 5, 1, 1, 7, 0) 
 print("added Sensor with error", error)
 
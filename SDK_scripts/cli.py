@@ -0,0 +1,507 @@
+import os
+import sys
+import time
+import argparse
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOT = os.path.dirname(_HERE)
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+
+# Only the standard library is imported above this line. Each command imports what it needs,
+# so "monitor" never loads the SDK and "log" never loads matplotlib.
+
+EXPERIMENTS = {
+    'parallel': os.path.join(_ROOT, 'refillSampleExperiments', 'parallelRefillSampleDebug.py'),
+    'flow-valve': os.path.join(_ROOT, 'refillSampleExperiments', 'refillSample_Flow_Valve.py'),
+    'pressure-valve': os.path.join(_ROOT, 'refillSampleExperiments', 'refillSample_Pressure_Valve.py'),
+    'pressure-manifold': os.path.join(_ROOT, 'refillSampleExperiments', 'refillSample_Pressure_Manifold.py'),
+    'demo': os.path.join(_ROOT, 'demo_EliLiliy.py'),
+}
+
+# Modules that should never be loaded just by importing a script
+HEAVY_MODULES = ('matplotlib', 'numpy', 'pandas', 'scipy')
+
+# Imported one by one by "bench" (script names resolve through EXPERIMENTS' folders)
+BENCH_MODULES = [
+    'cli', 'error_codes', 'retry', 'sdk_worker', 'event_log', 'telemetry', 'device_registry', 'plotting',
+    'read_mask', 'sensor_profiles', 'scheduler', 'shutdown', 'flow_model', 'filters', 'totalizer', 'anomaly', 'port_fingerprint', 'stability', 'watchdog', 'sample_cache',
+    'zero_offset', 'calib_drift', 'shared_log', 'autotune',
+    'flow_controller', 'reconnect', 'instrument_daemon', 'parallelRefillSampleDebug', 'refillSample_Flow_Valve',
+    'refillSample_Pressure_Valve', 'refillSample_Pressure_Manifold', 'demo_EliLiliy',
+]
+
+# Numeric helpers that need a heavy module at import time by design; "bench" allows it for them only
+BENCH_EXPECTED_HEAVY = {
+    'calib_drift': ('numpy',),
+    'shared_log': ('numpy',),
+}
+
+
+def _install_fake_sdk(args):
+    if getattr(args, 'fake', False):
+        import fake_elveflow
+        fake_elveflow.install()
+        print("Using the simulated SDK (fake_elveflow)")
+
+
+# ----- monitor -----
+
+def cmd_monitor(args):
+    """Print live samples published by a running experiment."""
+    from telemetry import TelemetrySubscriber, TELEMETRY_ADDRESS
+
+    print("=== TELEMETRY MONITOR ===")
+    print(f"Subscribing to udp://{TELEMETRY_ADDRESS[0]}:{TELEMETRY_ADDRESS[1]} (Ctrl+C to stop)")
+    print("-" * 30)
+    with TelemetrySubscriber(channel_num=args.channel) as sub:
+        try:
+            for sample in sub:
+                flow = f"{sample['flow']:.1f} µL/min" if sample['flow'] is not None else "-"
+                print(f"#{sample['seq']} ch{sample['channel']} - P: {sample['pressure']:.1f} mbar, F: {flow}"
+                      + (f" ({sub.lost} lost)" if sub.lost else ""))
+        except KeyboardInterrupt:
+            print(f"\nReceived {sub.received} samples, {sub.lost} lost")
+    return 0
+
+
+# ----- log -----
+
+def cmd_log(args):
+    """Headless logging of one OB1 channel to CSV (no matplotlib, no setpoint changes)."""
+    _install_fake_sdk(args)
+    from ctypes import c_double, c_int32, byref
+    from datetime import datetime
+    from device_registry import open_role, close_all
+    from Elveflow64 import OB1_Get_Data
+
+    filename = args.output or f"continuous_logging_{args.channel}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    error, instr_id = open_role(args.role)
+    if error != 0:
+        return 1
+
+    print(f"\n=== LOGGING CHANNEL {args.channel} ===")
+    print(f"Every {args.sample_dt}s for {args.duration}s -> {filename} (Ctrl+C to stop)")
+    print("-" * 30)
+    samples = 0
+    errors = 0
+    start = time.time()
+    next_sample = time.monotonic()
+    try:
+        with open(filename, 'w') as f:
+            f.write("Time_s,Pressure_mbar,Flow_ul_min\n")
+            while args.duration <= 0 or time.time() - start < args.duration:
+                reg = c_double()
+                sen = c_double()
+                error = OB1_Get_Data(instr_id, c_int32(args.channel), byref(reg), byref(sen))
+                if error == 0:
+                    f.write(f"{time.time() - start:.2f},{reg.value:.2f},{sen.value:.2f}\n")
+                    samples += 1
+                    if samples % 10 == 0:
+                        f.flush()
+                        print(f"Logged {samples} samples - P: {reg.value:.1f} mbar, F: {sen.value:.1f} µL/min")
+                else:
+                    errors += 1
+                    print(f"Error reading channel {args.channel}: {error}")
+                next_sample += args.sample_dt
+                time.sleep(max(0.0, next_sample - time.monotonic()))
+    except KeyboardInterrupt:
+        print("\nLogging stopped by user")
+    finally:
+        close_all(verbose=False)
+    print(f"✓ {samples} samples ({errors} read errors) saved to: {filename}")
+    return 0
+
+
+# ----- profiles -----
+
+def cmd_profiles(args):
+    """Achieved MFS sample rate and noise of every resolution profile on one channel."""
+    if args.fake:
+        import fake_elveflow
+        fake_elveflow.install(fake_elveflow.FakeElveflow(sensor_read_s=args.fake_read_ms / 1000))
+        print(f"Using the simulated SDK (fake_elveflow, {args.fake_read_ms} ms per 16-bit sensor read)")
+    from ctypes import c_double, c_int32
+    from device_registry import open_role, close_all, device_info
+    from sensor_profiles import SensorProfiles
+    from Elveflow64 import OB1_Set_Press
+
+    sensors = device_info(args.role).get('sensors', {})
+    if str(args.channel) not in sensors:
+        print(f"✗ No sensor configured on channel {args.channel} of the {args.role}")
+        return 1
+    error, instr_id = open_role(args.role)
+    if error != 0:
+        return 1
+    channel = c_int32(args.channel)
+    try:
+        if args.pressure:
+            # a steady, non-zero flow makes the noise column meaningful
+            OB1_Set_Press(instr_id, channel, c_double(args.pressure))
+            time.sleep(args.settle)
+        profiles = SensorProfiles(instr_id, {args.channel: sensors[str(args.channel)]}, verbose=False)
+        profiles.print_summary(profiles.characterize(args.channel, n=args.samples))
+    finally:
+        if args.pressure:
+            OB1_Set_Press(instr_id, channel, c_double(0.0))
+        close_all(verbose=False)
+    return 0
+
+
+# ----- settling -----
+
+def cmd_settling(args):
+    """Settling time of the SDK remote PID vs the host PID on the same flow step."""
+    _install_fake_sdk(args)
+    import json
+    from ctypes import c_int32
+    from device_registry import open_role, close_all, device_info
+    from flow_controller import benchmark_settling
+
+    if str(args.channel) not in device_info(args.role).get('sensors', {}):
+        print(f"✗ No sensor configured on channel {args.channel} of the {args.role}")
+        return 1
+    error, instr_id = open_role(args.role)
+    if error != 0:
+        return 1
+    try:
+        results = benchmark_settling(instr_id.value, c_int32(args.channel), args.target, tolerance=args.tolerance,
+                                     duration_s=args.duration, rest_time_s=args.rest)
+    finally:
+        close_all(verbose=False)
+    if not results:
+        return 1
+    for name, s in results['host']['scheduler_stats'].items():
+        print(f"Host loop task {name}: {s['runs']} runs, {s['overruns']} overruns, "
+              f"max lateness {s['max_lateness_s'] * 1000:.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    return 0
+
+
+# ----- calib -----
+
+def cmd_calib(args):
+    """Compare two calibration files, or show the drift history of a dated archive."""
+    import calib_drift
+
+    if len(args.files) > 2:
+        print("✗ Give two calibration files to compare, or one archive base path")
+        return 2
+    if len(args.files) == 2:
+        calib_drift.print_comparison(args.files[0], args.files[1], tol_pct=args.tol)
+        return 0
+    calib_drift.drift_history(args.files[0])
+    needed, _, _ = calib_drift.recalibration_needed(args.files[0], tol_pct=args.tol, max_age_days=args.max_age)
+    return 1 if needed else 0
+
+
+# ----- totals -----
+
+def cmd_totals(args):
+    """Show the flow totals / reservoir levels, define a reservoir or record a refill."""
+    from totalizer import FlowTotalizer
+
+    totalizer = FlowTotalizer(path=args.file)
+    totalizer.load()
+    changed = False
+    if args.add:
+        if args.capacity is None:
+            print("✗ --add needs --capacity")
+            return 2
+        totalizer.add_reservoir(args.add, args.channel, args.capacity, port=args.port, volume_ul=args.volume,
+                                low_ul=args.low)
+        print(f"✓ Reservoir '{args.add}' on channel {args.channel}"
+              f"{f' port {args.port}' if args.port is not None else ''}: {args.capacity:.0f} µL")
+        changed = True
+    elif args.refill:
+        if args.refill not in totalizer.reservoirs:
+            print(f"✗ Unknown reservoir '{args.refill}' (known: {', '.join(totalizer.reservoirs) or 'none'})")
+            return 1
+        totalizer.refill(args.refill, volume_ul=args.volume)
+        print(f"✓ Refill of '{args.refill}' recorded: {totalizer.reservoirs[args.refill].volume_ul:.0f} µL")
+        changed = True
+    if args.reset:
+        totalizer.reset_totals()
+        print("✓ Volume totals reset")
+        changed = True
+    if changed:
+        totalizer.save()
+    totalizer.print_summary()
+    return 0
+
+
+# ----- fingerprint -----
+
+def cmd_fingerprint(args):
+    """Fingerprint MUX ports (path resistance, dead time) with a pressure sweep each."""
+    if args.fake:
+        import fake_elveflow
+        # two paths that differ the way real tubing does: port 3 short and wide, port 4 long and narrow
+        fake_elveflow.install(fake_elveflow.FakeElveflow(paths={3: (0.8, 0.6), 4: (0.4, 1.5)}))
+        print("Using the simulated SDK (fake_elveflow, ports 3 and 4 on different paths)")
+    from ctypes import c_char
+    from device_registry import open_role, close_all, device_info
+    from port_fingerprint import PortFingerprints
+    from flow_model import FlowModelBank
+    from zero_offset import ZeroOffsets, VENTED
+    from Elveflow64 import MUX_DRI_Send_Command
+
+    if str(args.channel) not in device_info(args.role).get('sensors', {}):
+        print(f"✗ No sensor configured on channel {args.channel} of the {args.role}")
+        return 1
+    error, instr_id = open_role(args.role)
+    if error != 0:
+        return 1
+    error, mux_id = open_role(args.mux_role)
+    if error != 0:
+        close_all(verbose=False)
+        return 1
+    fingerprints = PortFingerprints(path=args.file)
+    fingerprints.load()
+    flow_models = FlowModelBank()
+    flow_models.load()
+    try:
+        answer = (c_char * 40)()
+        error = MUX_DRI_Send_Command(mux_id.value, 0, answer, 40)   # home before the first move
+        if error != 0:
+            print(f"✗ MUX homing failed ({error})")
+            return 1
+        time.sleep(5.0)
+        # the fits share the model bank with the protocols' zero-corrected ramp fits
+        zero_offsets = ZeroOffsets()
+        zero_offsets.load()
+        if zero_offsets.measure(instr_id, [args.channel], state=VENTED, sensor_channels=[args.channel]):
+            zero_offsets.save()
+        measured = fingerprints.measure(instr_id, args.channel, args.ports, mux_id=mux_id,
+                                        pressures=tuple(args.pressures), step_s=args.step, flow_models=flow_models,
+                                        zero_offsets=zero_offsets)
+    finally:
+        close_all(verbose=False)
+    if measured:
+        fingerprints.save()
+        flow_models.save()
+    fingerprints.print_summary()
+    return 0 if len(measured) == len(args.ports) else 1
+
+
+# ----- run -----
+
+def cmd_run(args):
+    """Run an experiment script's main() as if started directly."""
+    import runpy
+
+    _install_fake_sdk(args)
+    path = EXPERIMENTS[args.experiment]
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+    return 0
+
+
+# ----- bench -----
+
+def _import_profile(module, fake):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns:
+        dict: 'ok', 'wall_ms', 'cumulative_ms' (the module's own import), 'heavy' (heavy
+              modules it pulled in), 'error'
+    """
+    import subprocess
+
+    paths = [_HERE] + sorted({os.path.dirname(p) for p in EXPERIMENTS.values()})
+    code = (f"import sys; sys.path[:0] = {paths!r}\n"
+            + ("import fake_elveflow; fake_elveflow.install()\n" if fake else "")
+            + f"import {module}")
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    cumulative_ms = None
+    heavy = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        name = parts[2].rstrip()
+        top = name.strip().split(".")[0]
+        if top in HEAVY_MODULES:
+            heavy.add(top)
+        if name.strip() == module and not name.startswith("  "):
+            try:
+                cumulative_ms = int(parts[1]) / 1000
+            except ValueError:
+                pass
+    error = None
+    if proc.returncode != 0:
+        error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"
+    return {'ok': proc.returncode == 0, 'wall_ms': wall_ms, 'cumulative_ms': cumulative_ms,
+            'heavy': sorted(heavy), 'error': error}
+
+
+def cmd_bench(args):
+    """
+    Import-time profile of every module, each in a fresh interpreter.
+
+    Fails (exit code 1) if a module takes longer than --budget-ms to import or pulls in
+    matplotlib / numpy / pandas / scipy at import time (BENCH_EXPECTED_HEAVY excepted), so it
+    can gate changes.
+    """
+    modules = args.modules or BENCH_MODULES
+    print(f"\n=== IMPORT-TIME BENCHMARK ({'simulated SDK' if args.fake else 'real SDK'}) ===")
+    print(f"{'Module':<34} {'import ms':>10} {'process ms':>11}  Heavy imports")
+    print("-" * 75)
+
+    baseline = _import_profile("sys", fake=False)['wall_ms']
+    failures = []
+    for module in modules:
+        result = _import_profile(module, args.fake)
+        if not result['ok']:
+            print(f"{module:<34} {'-':>10} {result['wall_ms']:>11.0f}  ✗ {result['error']}")
+            failures.append(module)
+            continue
+        import_ms = result['cumulative_ms']
+        heavy = [m for m in result['heavy'] if m not in args.allow and m not in BENCH_EXPECTED_HEAVY.get(module, ())]
+        over = args.budget_ms is not None and import_ms is not None and import_ms > args.budget_ms
+        mark = "✗" if over or heavy else "✓"
+        # None: already imported by the simulated SDK before the module itself
+        shown = f"{import_ms:.1f}" if import_ms is not None else "preloaded"
+        print(f"{module:<34} {shown:>10} {result['wall_ms']:>11.0f}  {mark} {', '.join(result['heavy']) or '-'}")
+        if over or heavy:
+            failures.append(module)
+    print("-" * 75)
+    print(f"Bare interpreter start: {baseline:.0f} ms")
+    if failures:
+        print(f"✗ {len(failures)} module(s) over budget or importing heavy dependencies: {', '.join(failures)}")
+    else:
+        print("✓ All modules within budget")
+    print("=" * 75)
+    return 1 if failures else 0
+
+
+# ----- plot -----
+
+def cmd_plot(args):
+    """Plot logging CSVs; several files are rendered headless in parallel worker processes."""
+    from plotting import load_log_csv, plot_channel_data, render_batch
+
+    if args.show:
+        if len(args.csv) > 1 or args.output_dir:
+            print("✗ --show plots a single CSV")
+            return 2
+        results = load_log_csv(args.csv[0])
+        filename = os.path.splitext(args.csv[0])[0] + ".png"
+        plot_channel_data(results, save_plot=True, show_plot=True, filename=filename, dpi=args.dpi)
+        return 0
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    rendered = render_batch(args.csv, out_dir=args.output_dir, jobs=args.jobs, dpi=args.dpi)
+    return 0 if all(ok for _, _, ok in rendered) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python SDK_scripts",
+                                     description="Elveflow bench tools (OB1 / MUX DRI / MFS)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("monitor", help="print live samples from a running experiment")
+    p.add_argument("--channel", type=int, default=None, help="only this OB1 channel")
+    p.set_defaults(func=cmd_monitor)
+
+    p = sub.add_parser("log", help="log a channel to CSV without plotting")
+    p.add_argument("--channel", type=int, default=1)
+    p.add_argument("--duration", type=float, default=60.0, help="seconds, 0 = until Ctrl+C (default: 60)")
+    p.add_argument("--sample-dt", type=float, default=1.0, help="seconds between samples (default: 1.0)")
+    p.add_argument("--role", default="refill OB1", help="device role from bench_config.json")
+    p.add_argument("--output", default=None, help="CSV file (default: continuous_logging_<ch>_<time>.csv)")
+    p.add_argument("--fake", action="store_true", help="use the simulated SDK")
+    p.set_defaults(func=cmd_log)
+
+    p = sub.add_parser("profiles", help="measure MFS sample rate / noise per resolution profile")
+    p.add_argument("--channel", type=int, default=1)
+    p.add_argument("--role", default="refill OB1", help="device role from bench_config.json")
+    p.add_argument("--samples", type=int, default=50, help="back-to-back reads per profile (default: 50)")
+    p.add_argument("--pressure", type=float, default=0.0, help="hold this pressure while measuring (default: 0 = vented)")
+    p.add_argument("--settle", type=float, default=5.0, help="seconds to wait after setting --pressure (default: 5)")
+    p.add_argument("--fake", action="store_true", help="use the simulated SDK")
+    p.add_argument("--fake-read-ms", type=float, default=20.0, help="simulated 16-bit sensor read time (default: 20)")
+    p.set_defaults(func=cmd_profiles)
+
+    p = sub.add_parser("settling", help="settling time of the remote PID vs the host PID on one flow step")
+    p.add_argument("--channel", type=int, default=1)
+    p.add_argument("--role", default="refill OB1", help="device role from bench_config.json")
+    p.add_argument("--target", type=float, default=200.0, help="flow step in µL/min (default: 200)")
+    p.add_argument("--tolerance", type=float, default=10.0, help="settling band in µL/min (default: 10)")
+    p.add_argument("--duration", type=float, default=120.0, help="seconds per controller (default: 120)")
+    p.add_argument("--rest", type=float, default=20.0, help="vented pause between the runs in s (default: 20)")
+    p.add_argument("--output", default=None, help="save results and logs to this JSON file")
+    p.add_argument("--fake", action="store_true", help="use the simulated SDK")
+    p.set_defaults(func=cmd_settling)
+
+    p = sub.add_parser("calib", help="compare calibrations / check drift of the dated archive")
+    p.add_argument("files", nargs="+", help="two .calib files to compare, or the base path of the archive "
+                                            "(e.g. calibration.calib for calibration_YYYYMMDD.calib)")
+    p.add_argument("--tol", type=float, default=0.5, help="allowed drift, RMS %% of table span (default: 0.5)")
+    p.add_argument("--max-age", type=int, default=90, help="days before recalibrating regardless (default: 90)")
+    p.set_defaults(func=cmd_calib)
+
+    p = sub.add_parser("totals", help="flow totals per channel / MUX port and reservoir levels")
+    p.add_argument("--file", default="flow_totals.json", help="totals file (default: flow_totals.json)")
+    p.add_argument("--refill", metavar="NAME", default=None, help="record a refill of this reservoir")
+    p.add_argument("--add", metavar="NAME", default=None, help="start tracking a reservoir (needs --capacity)")
+    p.add_argument("--channel", type=int, default=1, help="OB1 channel draining the --add reservoir (default: 1)")
+    p.add_argument("--port", type=int, default=None, help="MUX port draining the --add reservoir (default: any)")
+    p.add_argument("--capacity", type=float, default=None, help="--add reservoir volume when full, µL")
+    p.add_argument("--low", type=float, default=0.0, help="--add reservoir volume that must stay in it, µL")
+    p.add_argument("--volume", type=float, default=None,
+                   help="µL added by --refill / now in the --add reservoir (default: full)")
+    p.add_argument("--reset", action="store_true", help="zero the volume totals (reservoirs are kept)")
+    p.set_defaults(func=cmd_totals)
+
+    p = sub.add_parser("fingerprint", help="measure path resistance / dead time of MUX ports")
+    p.add_argument("--channel", type=int, default=1, help="OB1 channel feeding the MUX (default: 1)")
+    p.add_argument("--ports", type=int, nargs="+", default=[3, 4], help="MUX ports (default: 3 4)")
+    p.add_argument("--pressures", type=float, nargs="+", default=[100.0, 200.0, 300.0, 400.0],
+                   help="sweep steps in mbar (default: 100 200 300 400)")
+    p.add_argument("--step", type=float, default=8.0, help="seconds per step (default: 8)")
+    p.add_argument("--role", default="refill OB1", help="OB1 role from bench_config.json")
+    p.add_argument("--mux-role", default="distribution MUX", help="MUX DRI role from bench_config.json")
+    p.add_argument("--file", default="port_fingerprints.json", help="fingerprint file (default: port_fingerprints.json)")
+    p.add_argument("--fake", action="store_true", help="use the simulated SDK")
+    p.set_defaults(func=cmd_fingerprint)
+
+    p = sub.add_parser("run", help="run an experiment script")
+    p.add_argument("experiment", choices=sorted(EXPERIMENTS))
+    p.add_argument("--fake", action="store_true", help="use the simulated SDK")
+    p.set_defaults(func=cmd_run)
+
+    p = sub.add_parser("bench", help="import-time profile of every module")
+    p.add_argument("modules", nargs="*", help="modules to profile (default: all)")
+    p.add_argument("--budget-ms", type=float, default=None, help="fail if an import takes longer")
+    p.add_argument("--allow", nargs="*", default=[], help="heavy modules allowed at import time (e.g. numpy)")
+    p.add_argument("--fake", action="store_true", help="use the simulated SDK (no DLL needed)")
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("plot", help="plot logging CSVs (several in parallel)")
+    p.add_argument("csv", nargs="+")
+    p.add_argument("--output-dir", default=None, help="folder for the PNGs (default: next to each CSV)")
+    p.add_argument("--jobs", type=int, default=None, help="plots rendered at a time (default: CPU count)")
+    p.add_argument("--dpi", type=int, default=150, help="PNG resolution (default: 150)")
+    p.add_argument("--show", action="store_true", help="also open a window (single CSV only)")
+    p.set_defaults(func=cmd_plot)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+import os
+import sys
+import copy
+import json
+import time
+import importlib.util
+from datetime import datetime
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Per-bench configuration (not committed; copy bench_config.example.json and edit it)
+CONFIG_ENV = "ELVEFLOW_BENCH_CONFIG"
+CONFIG_PATH = os.path.join(_HERE, "bench_config.json")
+# Result of the last discover(), shared by every script on this machine
+CACHE_PATH = os.path.join(_HERE, "device_cache.json")
+
+# Roles used by the scripts
+REFILL_OB1 = "refill OB1"
+DISTRIBUTION_MUX = "distribution MUX"
+
+OB1_TYPE = "OB1"
+MUX_DRI_TYPE = "MUX_DRI"
+
+# Used when there is no bench_config.json: the instruments of the bench these scripts were
+# written on. Paths on this machine (SDK, calibration) are never defaulted; they come from
+# bench_config.json (see bench_config.example.json)
+DEFAULT_CONFIG = {
+    "sdk": {
+        "dll_path": "",
+        "python_path": "",
+    },
+    # serial number -> device; "name" is what Initialization is called with (NI MAX alias or
+    # COM resource), "aliases" are older names tried by discover(). A bench config's "devices"
+    # and "roles" replace these two sections instead of being merged into them
+    "devices": {
+        "113433": {
+            "type": OB1_TYPE,
+            "name": "OB1",
+            "aliases": ["113433", "113433_OB1", "OB1_113433"],
+            "regulators": [0, 0, 0, 0],
+            # channel -> OB1_Add_Sens(sensor type, digital, calibration, resolution, custom voltage)
+            "sensors": {"1": [5, 1, 1, 7, 0]},
+            # base path new calibrations are archived under as <stem>_YYYYMMDD<ext>; the newest is loaded
+            "calibration": None,
+        },
+        "12MUX": {
+            "type": MUX_DRI_TYPE,
+            "name": "12MUX",
+            "aliases": [],
+        },
+    },
+    # logical role -> serial number
+    "roles": {
+        REFILL_OB1: "113433",
+        DISTRIBUTION_MUX: "12MUX",
+    },
+}
+
+_config = None
+_discovered = None
+_handles = {}   # role -> c_int32 opened by open_role()
+_serial_warned = set()   # roles whose serial mismatch was already reported
+
+
+def load_config(path=None, reload=False):
+    """
+    Bench configuration: bench_config.json (or $ELVEFLOW_BENCH_CONFIG) over DEFAULT_CONFIG.
+
+    'sdk' paths are merged key by key; 'devices' and 'roles' are replaced as a whole when the
+    bench config has them, so discover() only probes the instruments of this bench.
+
+    Returns:
+        dict: 'sdk', 'devices' (by serial) and 'roles' (role -> serial)
+    """
+    global _config
+    if _config is not None and not reload and path is None:
+        return _config
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    path = path or os.environ.get(CONFIG_ENV) or CONFIG_PATH
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            bench = json.load(f)
+        config['sdk'].update(bench.get('sdk', {}))
+        for section in ('devices', 'roles'):
+            if section in bench:
+                config[section] = bench[section]
+    _config = config
+    return config
+
+
+def add_sdk_path():
+    """
+    Put the Elveflow SDK on sys.path (call before "from Elveflow64 import *").
+
+    $ELVEFLOW_SDK_DLL / $ELVEFLOW_SDK_PYTHON override the configured paths.
+
+    Raises:
+        RuntimeError: No SDK path is configured and Elveflow64 cannot be imported otherwise
+    """
+    sdk = load_config()['sdk']
+    paths = [os.environ.get("ELVEFLOW_SDK_DLL", sdk.get('dll_path')),
+             os.environ.get("ELVEFLOW_SDK_PYTHON", sdk.get('python_path'))]
+    for path in paths:
+        if path and path not in sys.path:
+            sys.path.append(path)
+    # already loaded (e.g. fake_elveflow) or installed where Python finds it
+    if any(paths) or "Elveflow64" in sys.modules or importlib.util.find_spec("Elveflow64") is not None:
+        return
+    raise RuntimeError(f"Elveflow SDK location not configured: set sdk.dll_path and sdk.python_path in "
+                       f"{os.environ.get(CONFIG_ENV) or CONFIG_PATH} (see bench_config.example.json) or "
+                       f"$ELVEFLOW_SDK_DLL / $ELVEFLOW_SDK_PYTHON")
+
+
+def _device_for_role(role):
+    config = load_config()
+    if role not in config['roles']:
+        raise KeyError(f"Unknown device role '{role}' (configured: {', '.join(config['roles'])})")
+    serial = config['roles'][role]
+    if serial not in config['devices']:
+        raise KeyError(f"Role '{role}' points to serial {serial}, which is not in the device list")
+    return serial, config['devices'][serial]
+
+
+def device_name(role):
+    """
+    Name to pass to OB1_Initialization / MUX_DRI_Initialization for a role.
+
+    Uses the name that answered during the last discover() if there is one, the configured
+    name otherwise.
+    """
+    serial, device = _device_for_role(role)
+    found = discovered().get(serial)
+    if found and found.get('serial_ok') is False and role not in _serial_warned:
+        _serial_warned.add(role)
+        print(f"⚠ {role}: {found['name']} reported serial {found.get('reported_serial')}, configured as {serial}; "
+              f"check bench_config.json or run discover(refresh=True)")
+    if found and found.get('connected'):
+        return found['name']
+    return device['name']
+
+
+def device_info(role):
+    """
+    Returns:
+        dict: Configured device for a role plus 'serial', 'role' and what discover() found
+    """
+    serial, device = _device_for_role(role)
+    info = dict(device, serial=serial, role=role)
+    info.update(discovered().get(serial, {}))
+    return info
+
+
+def calibration_file(role):
+    """
+    Calibration file to load for an OB1 role.
+
+    The configured "calibration" is the base path new calibrations are archived under
+    (calib_drift.archive()); the newest dated file next to it wins, the base file itself
+    is used if there is none.
+
+    Returns:
+        str or None: None if the role has no calibration configured or nothing is on disk
+    """
+    base = device_info(role).get('calibration')
+    if not base:
+        return None
+    from calib_drift import archive  # numpy, only needed here
+    dated = archive(base)
+    if dated:
+        return dated[-1][1]
+    return base if os.path.exists(base) else None
+
+
+def discovered():
+    """Devices found by the last discover(), from memory or device_cache.json ({} if never run)."""
+    global _discovered
+    if _discovered is None:
+        _discovered = {}
+        if os.path.exists(CACHE_PATH):
+            try:
+                with open(CACHE_PATH, 'r') as f:
+                    _discovered = json.load(f).get('devices', {})
+            except (OSError, ValueError):
+                _discovered = {}
+    return _discovered
+
+
+def _probe_ob1(names):
+    from ctypes import c_int32, byref
+    from Elveflow64 import OB1_Initialization, OB1_Destructor
+    for name in names:
+        instr_id = c_int32(-1)
+        if OB1_Initialization(name.encode('ascii'), 0, 0, 0, 0, byref(instr_id)) == 0:
+            OB1_Destructor(instr_id.value)
+            return name, None
+    return None, None
+
+
+def _probe_mux(names):
+    from ctypes import c_int32, c_char, byref
+    from Elveflow64 import MUX_DRI_Initialization, MUX_DRI_Send_Command, MUX_DRI_Destructor
+    for name in names:
+        instr_id = c_int32(-1)
+        if MUX_DRI_Initialization(name.encode('ascii'), byref(instr_id)) == 0:
+            answer = (c_char * 40)()
+            # 1 = read serial number
+            error = MUX_DRI_Send_Command(instr_id.value, 1, answer, 40)
+            MUX_DRI_Destructor(instr_id.value)
+            return name, answer.value.decode('ascii', 'replace').strip() if error == 0 else None
+    return None, None
+
+
+def _normalize_serial(serial):
+    return str(serial).strip().upper()
+
+
+def _serial_check(device_type, serial, name, reported_serial):
+    """
+    Whether the device that answered is the one configured under serial.
+
+    The MUX DRI reports its serial (command 1). The OB1 SDK has no call for it, so an OB1 only
+    counts as verified when the name that answered contains the serial (NI MAX aliases
+    usually do).
+
+    Returns:
+        bool or None: None if it could not be checked
+    """
+    if name is None:
+        return None
+    if device_type == OB1_TYPE:
+        return True if _normalize_serial(serial) in _normalize_serial(name) else None
+    if not reported_serial:
+        return None
+    return _normalize_serial(reported_serial) == _normalize_serial(serial)
+
+
+def discover(refresh=False, verbose=True):
+    """
+    Find which configured instruments are connected and remember how to reach them.
+
+    Every configured device is opened once under its name, then its aliases, and closed again;
+    the working name (and the MUX DRI's reported serial) is written to device_cache.json so
+    later runs do not need to probe. The MUX DRI's reported serial is compared to its key in
+    the config ('serial_ok'; see _serial_check()). Run it with no other program holding the
+    instruments.
+
+    Args:
+        refresh: Probe again even if a cache exists
+        verbose: Print the device table
+
+    Returns:
+        dict: serial -> {'type', 'name', 'connected', 'reported_serial', 'serial_ok', 'roles', 'checked'}
+    """
+    global _discovered
+    if not refresh and discovered():
+        if verbose:
+            print_devices()
+        return _discovered
+
+    add_sdk_path()
+    config = load_config()
+    roles_by_serial = {}
+    for role, serial in config['roles'].items():
+        roles_by_serial.setdefault(serial, []).append(role)
+
+    found = {}
+    for serial, device in config['devices'].items():
+        names = [device['name']] + [a for a in device.get('aliases', []) if a != device['name']]
+        probe = _probe_ob1 if device['type'] == OB1_TYPE else _probe_mux
+        try:
+            name, reported_serial = probe(names)
+        except Exception as e:
+            if verbose:
+                print(f"Probing {serial} raised {e!r}")
+            name, reported_serial = None, None
+        found[serial] = {
+            'type': device['type'],
+            'name': name or device['name'],
+            'connected': name is not None,
+            'reported_serial': reported_serial,
+            'serial_ok': _serial_check(device['type'], serial, name, reported_serial),
+            'roles': roles_by_serial.get(serial, []),
+            'checked': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    _discovered = found
+    try:
+        with open(CACHE_PATH, 'w') as f:
+            json.dump({'discovered_at': time.time(), 'devices': found}, f, indent=2)
+    except OSError as e:
+        if verbose:
+            print(f"Could not write {CACHE_PATH}: {e}")
+    if verbose:
+        print_devices()
+    return found
+
+
+def print_devices():
+    config = load_config()
+    found = discovered()
+    mismatched = []
+    print("\n=== BENCH DEVICES ===")
+    print(f"{'Serial':<10} {'Type':<8} {'Name':<14} {'Status':<10} Roles")
+    print("-" * 60)
+    for serial, device in config['devices'].items():
+        entry = found.get(serial, {})
+        status = "-" if not entry else ("✓ found" if entry.get('connected') else "✗ missing")
+        if entry.get('serial_ok') is False:
+            status = "⚠ serial"
+            mismatched.append((serial, entry.get('reported_serial')))
+        roles = [r for r, s in config['roles'].items() if s == serial]
+        print(f"{serial:<10} {device['type']:<8} {entry.get('name', device['name']):<14} {status:<10} {', '.join(roles)}")
+    print("=" * 60)
+    for serial, reported in mismatched:
+        print(f"⚠ {serial} answered with serial {reported}: another instrument is on that name")
+
+
+def open_role(role, add_sensors=True, verbose=True):
+    """
+    Initialize the instrument for a role once per process and return its ID.
+
+    OB1s get the configured sensors and calibration; a second call returns the same c_int32.
+
+    Returns:
+        tuple: (error_code: int, instr_id: c_int32)
+    """
+    if role in _handles:
+        return 0, _handles[role]
+
+    add_sdk_path()
+    from ctypes import c_int32, byref, create_string_buffer
+    from Elveflow64 import OB1_Initialization, OB1_Add_Sens, OB1_Calib_Load, MUX_DRI_Initialization
+
+    info = device_info(role)
+    name = device_name(role)
+    instr_id = c_int32(-1)
+    if info['type'] == OB1_TYPE:
+        regs = info.get('regulators', [0, 0, 0, 0])
+        error = OB1_Initialization(name.encode('ascii'), *regs, byref(instr_id))
+    else:
+        error = MUX_DRI_Initialization(name.encode('ascii'), byref(instr_id))
+    if error != 0:
+        if verbose:
+            print(f"✗ Could not open {role} ({name}, serial {info['serial']}): error {error}")
+        return error, instr_id
+
+    if info['type'] == OB1_TYPE and add_sensors:
+        for channel, sensor_args in sorted(info.get('sensors', {}).items()):
+            error = OB1_Add_Sens(instr_id.value, int(channel), *sensor_args)
+            if error != 0 and verbose:
+                print(f"⚠ Adding sensor on channel {channel} of {role} failed: error {error}")
+        calib_path = calibration_file(role)
+        if calib_path:
+            error = OB1_Calib_Load(instr_id.value, create_string_buffer(calib_path.encode('ascii')))
+            if error != 0 and verbose:
+                print(f"⚠ Loading calibration {calib_path} failed: error {error}")
+        elif info.get('calibration') and verbose:
+            print(f"⚠ No calibration found for {role} at {info['calibration']}: running uncalibrated")
+
+    _handles[role] = instr_id
+    if verbose:
+        print(f"✓ {role}: {name} (serial {info['serial']}) opened with ID {instr_id.value}")
+    return 0, instr_id
+
+
+def close_all(verbose=True):
+    """Destroy every handle opened by open_role()."""
+    from Elveflow64 import OB1_Destructor, MUX_DRI_Destructor
+    for role, instr_id in list(_handles.items()):
+        destructor = OB1_Destructor if device_info(role)['type'] == OB1_TYPE else MUX_DRI_Destructor
+        error = destructor(instr_id.value)
+        if verbose:
+            print(f"{'✓' if error == 0 else '✗'} {role} closed" + (f" (error {error})" if error else ""))
+        del _handles[role]
+
+
+def main():
+    """List the bench's instruments: python device_registry.py [--refresh]"""
+    discover(refresh="--refresh" in sys.argv)
+
+
+if __name__ == "__main__":
+    main()
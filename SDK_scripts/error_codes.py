@@ -0,0 +1,85 @@
+from enum import IntEnum
+
+
+# error codes from the end of the SDK User Guide - probably won't need all of them
+# more error codes can be found: https://www.ni.com/docs/en-US/bundle/labview-api-ref/page/errors/general-labview-error-codes.html
+class ErrorCode(IntEnum):
+    NO_DIGITAL_SENSOR                      = 8000
+    NO_PRESSURE_SENSOR_OB1_MK3             = 8001
+    NO_DIGITAL_PRESSURE_SENSOR_MK3_PLUS    = 8002
+    NO_DIGITAL_FLOW_SENSOR_MK3             = 8003
+    NO_IPA_CONFIG_FOR_SENSOR               = 8004
+    SENSOR_NOT_COMPATIBLE                  = 8005
+    NO_INSTRUMENT_WITH_SELECTED_ID         = 8006
+    MULTIPLE_CONNECTIONS                   = 8007
+    ONLY_AVAILABLE_FOR_MUX_WIRE_V3         = 8008
+    VALVE_TYPE_RESERVED_FOR_V3_USE_4_5_6   = 8009
+    NO_COMMUNICATION_WITH_OB1              = 8030
+    NO_COMMUNICATION_WITH_BFS              = 8031
+    NO_COMMUNICATION_WITH_MSRD             = 8032
+    OB1_REMOTE_LOOP_NOT_EXECUTED           = 8033
+    BFS_REMOTE_LOOP_NOT_EXECUTED           = 8034
+    MSRD_REMOTE_LOOP_NOT_EXECUTED          = 8035
+
+ERROR_MESSAGES: dict[ErrorCode, str] = {
+    ErrorCode.NO_DIGITAL_SENSOR:                    "No Digital Sensor found",
+    ErrorCode.NO_PRESSURE_SENSOR_OB1_MK3:           "No pressure sensor compatible with OB1",
+    ErrorCode.NO_DIGITAL_PRESSURE_SENSOR_MK3_PLUS:  "No Digital pressure sensor compatible with OB1",
+    ErrorCode.NO_DIGITAL_FLOW_SENSOR_MK3:           "No Digital Flow sensor compatible with OB1",
+    ErrorCode.NO_IPA_CONFIG_FOR_SENSOR:             "No IPA config for this sensor",
+    ErrorCode.SENSOR_NOT_COMPATIBLE:                "Sensor not compatible with AF1",
+    ErrorCode.NO_INSTRUMENT_WITH_SELECTED_ID:       "No Instrument with selected ID",
+    ErrorCode.MULTIPLE_CONNECTIONS:                 "ESI software might be connected to the device, close ESI before runnin this script",
+    ErrorCode.ONLY_AVAILABLE_FOR_MUX_WIRE_V3:       "Only available for MUX Wire V3 devices",
+    ErrorCode.VALVE_TYPE_RESERVED_FOR_V3_USE_4_5_6: "Types 1, 2, 3 are reserved for V3 valves; use 4, 5, or 6 for custom/older valves",
+    ErrorCode.NO_COMMUNICATION_WITH_OB1:            "No communication with OB1",
+    ErrorCode.NO_COMMUNICATION_WITH_BFS:            "No communication with BFS",
+    ErrorCode.NO_COMMUNICATION_WITH_MSRD:           "No communication with MSRD",
+    ErrorCode.OB1_REMOTE_LOOP_NOT_EXECUTED:         "OB1 remote loop has not been executed",
+    ErrorCode.BFS_REMOTE_LOOP_NOT_EXECUTED:         "BFS remote loop has not been executed",
+    ErrorCode.MSRD_REMOTE_LOOP_NOT_EXECUTED:        "MSRD remote loop has not been executed",
+}
+
+# Codes returned by this project's own wrappers instead of an SDK result; never retried
+QUEUE_TIMEOUT_ERROR = -9000      # queued command did not run in time (sdk_worker.sdk_call)
+WATCHDOG_TRIPPED_ERROR = -9001   # control write refused after a watchdog trip
+CIRCUIT_OPEN = -8000             # device circuit breaker open, call not attempted (retry.SDKErrorPolicy)
+
+LOCAL_ERROR_MESSAGES = {
+    QUEUE_TIMEOUT_ERROR:    "SDK command queue timeout",
+    WATCHDOG_TRIPPED_ERROR: "Refused: safety watchdog tripped",
+    CIRCUIT_OPEN:           "Circuit breaker open",
+}
+
+# Errors that can clear by themselves (USB hiccup, remote loop busy) and are worth retrying.
+# The other ErrorCode values are configuration problems that no retry will fix.
+# Other codes outside ErrorCode are LabVIEW/VISA I/O errors (timeouts, resource busy) and are
+# treated as transient too; the local codes above are not.
+TRANSIENT_ERRORS = frozenset({
+    ErrorCode.NO_COMMUNICATION_WITH_OB1,
+    ErrorCode.NO_COMMUNICATION_WITH_BFS,
+    ErrorCode.NO_COMMUNICATION_WITH_MSRD,
+    ErrorCode.OB1_REMOTE_LOOP_NOT_EXECUTED,
+    ErrorCode.BFS_REMOTE_LOOP_NOT_EXECUTED,
+    ErrorCode.MSRD_REMOTE_LOOP_NOT_EXECUTED,
+})
+
+
+def is_transient(code):
+    """True if an SDK error code is worth retrying."""
+    if code in LOCAL_ERROR_MESSAGES:
+        return False
+    try:
+        return ErrorCode(code) in TRANSIENT_ERRORS
+    except ValueError:
+        return True
+
+
+def error_message(code):
+    """Readable message for an SDK error code."""
+    if code in LOCAL_ERROR_MESSAGES:
+        return LOCAL_ERROR_MESSAGES[code]
+    try:
+        return ERROR_MESSAGES[ErrorCode(code)]
+    except ValueError:
+        return f"Unrecognized error code {code}"
@@ -0,0 +1,254 @@
+import json
+import time
+import bisect
+import threading
+from datetime import datetime
+
+
+# Event types
+VALVE_COMMANDED = "valve_cmd"
+VALVE_CONFIRMED = "valve_ok"
+SETPOINT = "setpoint"
+PHASE_BEGIN = "phase_begin"
+PHASE_END = "phase_end"
+PID = "pid"
+ERROR = "error"
+NOTE = "note"
+RECONNECT = "reconnect"
+
+# Setpoint changes smaller than this (mbar or µL/min) against the logged setpoint or ramp are
+# left out when a loop logs with setpoint(..., deadband=SETPOINT_DEADBAND)
+SETPOINT_DEADBAND = 5.0
+
+
+class EventLog:
+    """
+    Timestamped, structured record of what the experiment did, written next to the sample log.
+
+    Every event is one JSON line {"t": ..., "type": ..., ...}. t is seconds since start_time,
+    the same clock as the continuous logging time_log / CSV Time_s column, so events join
+    directly onto samples. Lines are flushed as they are written, so a crash keeps everything
+    up to the last event.
+
+    The in-memory copy is kept sorted by t (events_between / state_at use bisect), and
+    annotate() forward-fills phase, valve and setpoint onto a sample time axis, so phase
+    segmentation of a run needs no heuristics. A ramp is one setpoint event with ramp_to /
+    ramp_s, interpolated on the way back, so control loops do not log every step.
+
+    Args:
+        filename: JSON-lines output file; None keeps events in memory only
+                  (default: events_<timestamp>.jsonl)
+        start_time: time.time() that corresponds to t = 0 (default: now)
+    """
+
+    def __init__(self, filename="", start_time=None):
+        if filename == "":
+            filename = f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        self.filename = filename
+        self.start_time = time.time() if start_time is None else start_time
+        self.events = []
+        self._times = []
+        self._open_phases = []
+        self._setpoints = {}   # (channel, kind) -> (t, value, ramp_to, ramp_s) of the last logged setpoint
+        self._lock = threading.Lock()
+        self._file = open(filename, 'a', encoding='utf-8') if filename else None
+
+    def log(self, event_type, **fields):
+        """Record one event now. Extra keyword arguments are stored as event fields."""
+        event = {'t': round(time.time() - self.start_time, 3), 'type': event_type}
+        event.update(fields)
+        with self._lock:
+            self.events.append(event)
+            self._times.append(event['t'])
+            if self._file:
+                self._file.write(json.dumps(event, separators=(',', ':')) + "\n")
+                self._file.flush()
+        return event
+
+    # ----- typed helpers -----
+
+    def valve_commanded(self, valve, rotation=0):
+        return self.log(VALVE_COMMANDED, valve=valve, rotation=rotation)
+
+    def valve_confirmed(self, valve):
+        return self.log(VALVE_CONFIRMED, valve=valve)
+
+    def setpoint(self, channel_num, value, kind="pressure", ramp_to=None, ramp_s=None, deadband=None):
+        """
+        kind is "pressure" (mbar) or "flow" (µL/min).
+
+        A linear ramp is logged once, at its start: value is where it starts, ramp_to where it
+        ends ramp_s seconds later. With a deadband, a value within deadband of what the last
+        logged setpoint or ramp gives for now is not logged (returns None), so a loop can pass
+        every setpoint it sends and only deviations are kept.
+        """
+        key = (channel_num, kind)
+        if deadband is not None and ramp_to is None and key in self._setpoints:
+            if abs(value - _ramp_value(*self._setpoints[key], time.time() - self.start_time)) <= deadband:
+                return None
+        fields = {'ch': channel_num, 'kind': kind, 'value': round(value, 2)}
+        if ramp_to is not None:
+            fields.update(ramp_to=round(ramp_to, 2), ramp_s=None if ramp_s is None else round(ramp_s, 3))
+        event = self.log(SETPOINT, **fields)
+        self._setpoints[key] = (event['t'], value, ramp_to, ramp_s)
+        return event
+
+    def pid(self, channel_num, running, k_p=None, k_i=None):
+        fields = {'ch': channel_num, 'on': bool(running)}
+        if k_p is not None:
+            fields.update(k_p=k_p, k_i=k_i)
+        return self.log(PID, **fields)
+
+    def error(self, source, code, message=""):
+        return self.log(ERROR, source=source, code=code, msg=message)
+
+    def phase_begin(self, name, **attrs):
+        self._open_phases.append(name)
+        return self.log(PHASE_BEGIN, phase=name, **attrs)
+
+    def phase_end(self, name=None, **attrs):
+        if name is None:
+            name = self._open_phases[-1] if self._open_phases else ""
+        if name in self._open_phases:
+            self._open_phases.remove(name)
+        return self.log(PHASE_END, phase=name, **attrs)
+
+    def phase(self, name, **attrs):
+        """
+        Context manager for a phase:
+            with events.phase("prime", valve=3):
+                ...
+        """
+        log = self
+
+        class _Phase:
+            def __enter__(self):
+                log.phase_begin(name, **attrs)
+                return self
+
+            def __exit__(self, exc_type, exc, tb):
+                if exc_type is not None:
+                    log.phase_end(name, aborted=True)
+                else:
+                    log.phase_end(name)
+                return False
+
+        return _Phase()
+
+    def close(self):
+        """Close open phases and the output file."""
+        for name in list(reversed(self._open_phases)):
+            self.phase_end(name, aborted=True)
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # ----- time-indexed queries -----
+
+    def events_between(self, t0, t1, event_type=None):
+        """Events with t0 <= t < t1, optionally only one type."""
+        with self._lock:
+            lo = bisect.bisect_left(self._times, t0)
+            hi = bisect.bisect_left(self._times, t1)
+            selected = self.events[lo:hi]
+        return [e for e in selected if event_type is None or e['type'] == event_type]
+
+    def phases(self):
+        """
+        Returns:
+            list: (phase name, start t, end t or None, begin event) for every phase, in order
+        """
+        segments = []
+        open_segments = {}
+        for event in self.events:
+            if event['type'] == PHASE_BEGIN:
+                open_segments[event['phase']] = len(segments)
+                segments.append([event['phase'], event['t'], None, event])
+            elif event['type'] == PHASE_END and event['phase'] in open_segments:
+                segments[open_segments.pop(event['phase'])][2] = event['t']
+        return [tuple(s) for s in segments]
+
+    def state_at(self, t):
+        """
+        Experiment state at time t from the events before it.
+
+        Returns:
+            dict: 'phase' (innermost open phase or None), 'valve', 'setpoint' {channel: (kind, value)}, 'pid' {channel: on}
+        """
+        with self._lock:
+            hi = bisect.bisect_right(self._times, t)
+            past = self.events[:hi]
+        return self._replay(past, t)
+
+    def annotate(self, time_log):
+        """
+        Forward-fill the event state onto sample times (e.g. the logging 'time_log').
+
+        Returns:
+            dict: 'phase', 'valve', 'setpoint' lists aligned with time_log (setpoint is the
+                  most recent setpoint of any channel, interpolated along ramps)
+        """
+        phase_col, valve_col, setpoint_col = [], [], []
+        open_phases = []
+        valve = None
+        setpoint = None   # (t, value, ramp_to, ramp_s)
+        i = 0
+        events = self.events
+        for t in time_log:
+            while i < len(events) and events[i]['t'] <= t:
+                e = events[i]
+                if e['type'] == PHASE_BEGIN:
+                    open_phases.append(e['phase'])
+                elif e['type'] == PHASE_END and e['phase'] in open_phases:
+                    open_phases.remove(e['phase'])
+                elif e['type'] in (VALVE_CONFIRMED, VALVE_COMMANDED):
+                    valve = e['valve']
+                elif e['type'] == SETPOINT:
+                    setpoint = (e['t'], e['value'], e.get('ramp_to'), e.get('ramp_s'))
+                i += 1
+            phase_col.append("/".join(open_phases) if open_phases else None)
+            valve_col.append(valve)
+            setpoint_col.append(_ramp_value(*setpoint, t) if setpoint else None)
+        return {'phase': phase_col, 'valve': valve_col, 'setpoint': setpoint_col}
+
+    @staticmethod
+    def _replay(events, t):
+        state = {'phase': None, 'valve': None, 'setpoint': {}, 'pid': {}}
+        open_phases = []
+        for e in events:
+            if e['type'] == PHASE_BEGIN:
+                open_phases.append(e['phase'])
+            elif e['type'] == PHASE_END and e['phase'] in open_phases:
+                open_phases.remove(e['phase'])
+            elif e['type'] in (VALVE_CONFIRMED, VALVE_COMMANDED):
+                state['valve'] = e['valve']
+            elif e['type'] == SETPOINT:
+                value = _ramp_value(e['t'], e['value'], e.get('ramp_to'), e.get('ramp_s'), t)
+                state['setpoint'][e['ch']] = (e['kind'], value)
+            elif e['type'] == PID:
+                state['pid'][e['ch']] = e['on']
+        state['phase'] = open_phases[-1] if open_phases else None
+        return state
+
+    @classmethod
+    def load(cls, filename):
+        """Read an events_*.jsonl file back for analysis (in memory only, nothing is written)."""
+        log = cls(filename=None, start_time=0.0)
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    event = json.loads(line)
+                    log.events.append(event)
+        log.events.sort(key=lambda e: e['t'])
+        log._times = [e['t'] for e in log.events]
+        return log
+
+
+def _ramp_value(t0, value, ramp_to, ramp_s, t):
+    """Setpoint at t of one logged at t0 that ramps linearly to ramp_to over ramp_s (if given)."""
+    if ramp_to is None or not ramp_s:
+        return value if ramp_to is None else ramp_to
+    progress = min(max((t - t0) / ramp_s, 0.0), 1.0)
+    return value + (ramp_to - value) * progress
@@ -0,0 +1,502 @@
+import sys
+import time
+import types
+import random
+import threading
+from collections import deque
+
+from ctypes import *
+
+from error_codes import ErrorCode
+
+
+# Returned for calls whose arguments the real DLL would reject (unknown channel, missing file)
+INVALID_ARGUMENT = -1
+# The DLL returns plain ints
+NO_COMMUNICATION = int(ErrorCode.NO_COMMUNICATION_WITH_OB1)
+NO_INSTRUMENT = int(ErrorCode.NO_INSTRUMENT_WITH_SELECTED_ID)
+NO_FLOW_SENSOR = int(ErrorCode.NO_DIGITAL_FLOW_SENSOR_MK3)
+# VI_ERROR_CONN_LOST: what the MUX DRI serial link reports once its USB adapter is gone
+VISA_CONNECTION_LOST = -1073807194
+# Points per channel in a saved calibration table
+CALIB_LEN = 1000
+# MFS reading span in µL/min (-1000..1000) split into 2 ** bits steps
+MFS_SPAN = 2000.0
+# Pressure history kept for path dead times
+HISTORY_S = 10.0
+
+
+def _value(x):
+    """Plain Python value of an int / float / ctypes value / create_string_buffer."""
+    return x.value if hasattr(x, 'value') else x
+
+
+def _write(ref, value):
+    """Store value in a byref() / pointer / ctypes object output argument."""
+    if ref is None:
+        return
+    target = getattr(ref, '_obj', None)
+    if target is None:
+        target = getattr(ref, 'contents', ref)
+    target.value = value
+
+
+class SimulatedOB1:
+    """
+    One OB1 with MFS flow sensors behind simple first-order physics.
+
+    The regulator pressure follows its setpoint with time constant tau_s; the flow on a channel
+    with a sensor is conductance * pressure plus noise, quantized to the sensor resolution. A remote PID (PID_Add_Remote +
+    PID_Set_Running_Remote) adjusts the pressure setpoint towards the OB1_Set_Sens target.
+    The state advances lazily on every call, so no background thread is needed.
+    pressure_offset / flow_offset are added to every reading, like an unzeroed regulator / MFS.
+    path is the (conductance, dead_time_s) of the MUX port the flow currently goes through:
+    the flow then follows the pressure dead_time_s late.
+    """
+
+    def __init__(self, name, n_channels=4, tau_s=0.2, conductance=0.8, noise=0.5):
+        self.name = name
+        self.n_channels = n_channels
+        self.tau_s = tau_s
+        self.conductance = conductance
+        self.noise = noise
+        self.pressure_offset = 0.0
+        self.flow_offset = 0.0
+        self.path = None
+        self.reset()
+
+    def reset(self):
+        """Power-on state: what a re-initialized OB1 looks like after a USB drop."""
+        self.setpoint = [0.0] * (self.n_channels + 1)
+        self.pressure = [0.0] * (self.n_channels + 1)
+        self.sensors = {}
+        self.flow_target = {}
+        self.pid = {}
+        self.calibration = None
+        self._last_step = time.monotonic()
+        self._history = deque()     # (monotonic time, pressures) for path dead times
+
+    def step(self):
+        now = time.monotonic()
+        dt = now - self._last_step
+        self._last_step = now
+        if dt <= 0:
+            return
+        for ch, p in self.pid.items():
+            if p['running'] and ch in self.flow_target:
+                error = self.flow_target[ch] - self.flow(p['sensor_channel'], noise=False)
+                self.setpoint[ch] = max(-900.0, min(2000.0, self.setpoint[ch] + p['k_i'] * 1000.0 * error * dt))
+        alpha = min(1.0, dt / self.tau_s)
+        for ch in range(1, self.n_channels + 1):
+            self.pressure[ch] += (self.setpoint[ch] - self.pressure[ch]) * alpha
+        self._history.append((now, list(self.pressure)))
+        while len(self._history) > 1 and self._history[1][0] < now - HISTORY_S:
+            self._history.popleft()
+
+    def _delayed_pressure(self, channel_num, dead_time_s):
+        if dead_time_s <= 0 or not self._history:
+            return self.pressure[channel_num]
+        when = time.monotonic() - dead_time_s
+        for t, pressures in reversed(self._history):
+            if t <= when:
+                return pressures[channel_num]
+        return self._history[0][1][channel_num]
+
+    def flow(self, channel_num, noise=True):
+        if channel_num not in self.sensors:
+            return 0.0
+        conductance, dead_time_s = self.path if self.path is not None else (self.conductance, 0.0)
+        flow = conductance * self._delayed_pressure(channel_num, dead_time_s) + self.flow_offset
+        if noise and self.noise:
+            flow += random.gauss(0.0, self.noise)
+        step = MFS_SPAN / 2 ** (9 + self.sensors[channel_num]['resolution'])
+        return round(flow / step) * step
+
+
+class SimulatedMUXDRI:
+    """MUX distribution valve: has to be homed after power-up, then moves between valves."""
+
+    def __init__(self, name, n_valves=12):
+        self.name = name
+        self.n_valves = n_valves
+        self.reset()
+
+    def reset(self):
+        self.homed = False
+        self.valve = 0
+
+
+class FakeElveflow:
+    """
+    In-process stand-in for the Elveflow64 DLL wrapper.
+
+    Exposes the OB1_* / PID_* / MUX_DRI_* functions used by these scripts with the same
+    argument conventions (byref outputs, error code return). Every Initialization hands out a
+    new instrument ID; IDs of a device that has dropped off the bus stay invalid forever, just
+    like the real DLL after a USB disconnect.
+
+    simulate_disconnect() unplugs a device for a while: calls with its current ID fail with
+    NO_COMMUNICATION_WITH_OB1 (MUX DRI: VISA connection lost) and Initialization fails until
+    the device is back, after which it comes up in its power-on state (no sensors, no
+    calibration, zero pressure, MUX not homed).
+
+    Args:
+        ob1_names: OB1 names accepted by OB1_Initialization (default: None = any)
+        mux_names: MUX DRI names accepted by MUX_DRI_Initialization (default: None = any)
+        call_latency_s: Time each call takes, like a USB round trip (default: 0.0)
+        reg_read_s: Extra time OB1_Get_Data takes when the regulator output is requested (default: 0.0)
+        sensor_read_s: Extra time OB1_Get_Data takes when the sensor output is requested at 16 bit;
+                       halved for every bit less (default: 0.0)
+        paths: MUX valve -> (conductance, dead_time_s) of the OB1 flow routed through it; other
+               valves use the OB1 conductance with no delay (default: None)
+    """
+
+    def __init__(self, ob1_names=None, mux_names=None, call_latency_s=0.0, reg_read_s=0.0, sensor_read_s=0.0,
+                 paths=None):
+        self.ob1_names = ob1_names
+        self.mux_names = mux_names
+        self.call_latency_s = call_latency_s
+        self.reg_read_s = reg_read_s
+        self.sensor_read_s = sensor_read_s
+        self.paths = dict(paths or {})   # MUX valve -> (conductance, dead_time_s) of the OB1 flow through it
+        self.ob1s = {}          # name -> SimulatedOB1
+        self.muxes = {}         # name -> SimulatedMUXDRI
+        self._handles = {}      # instrument ID -> device
+        self._unplugged = {}    # device name -> monotonic time it comes back
+        self._next_id = 1
+        self._lock = threading.RLock()
+        self.calls = 0
+
+    # ----- test controls -----
+
+    def simulate_disconnect(self, name="OB1", duration_s=2.0):
+        """
+        Unplug the device called name for duration_s seconds.
+
+        Every handle to it is invalidated immediately; the device resets to its power-on state.
+        """
+        with self._lock:
+            self._unplugged[name] = time.monotonic() + duration_s
+            for instr_id, device in list(self._handles.items()):
+                if device.name == name:
+                    del self._handles[instr_id]
+            for devices in (self.ob1s, self.muxes):
+                if name in devices:
+                    devices[name].reset()
+
+    def is_plugged(self, name):
+        with self._lock:
+            back_at = self._unplugged.get(name)
+            if back_at is None:
+                return True
+            if time.monotonic() >= back_at:
+                del self._unplugged[name]
+                return True
+            return False
+
+    def module(self):
+        """A module object that can be installed as sys.modules['Elveflow64']."""
+        mod = types.ModuleType("Elveflow64")
+        mod.__dict__.update({k: v for k, v in globals().items() if k in _CTYPES_EXPORTS})
+        for name in _SDK_FUNCTIONS:
+            setattr(mod, name, getattr(self, name))
+        mod.fake_sdk = self
+        return mod
+
+    # ----- helpers -----
+
+    def _tick(self):
+        self.calls += 1
+        self._wait(self.call_latency_s)
+
+    def _wait(self, seconds):
+        if seconds:
+            time.sleep(seconds)
+
+    def _device(self, instr_id, kind):
+        device = self._handles.get(_value(instr_id))
+        if not isinstance(device, kind):
+            return None
+        if not self.is_plugged(device.name):
+            return None
+        return device
+
+    def _ob1(self, instr_id):
+        ob1 = self._device(instr_id, SimulatedOB1)
+        if ob1 is not None:
+            ob1.step()
+        return ob1
+
+    def _open(self, name, devices, allowed, factory, id_out):
+        if allowed is not None and name not in allowed:
+            return NO_INSTRUMENT
+        if not self.is_plugged(name):
+            return NO_INSTRUMENT
+        if name not in devices:
+            devices[name] = factory(name)
+        instr_id = self._next_id
+        self._next_id += 1
+        self._handles[instr_id] = devices[name]
+        _write(id_out, instr_id)
+        return 0
+
+    # ----- OB1 -----
+
+    def OB1_Initialization(self, name, reg_ch1, reg_ch2, reg_ch3, reg_ch4, instr_id_out):
+        with self._lock:
+            self._tick()
+            name = _value(name)
+            name = name.decode('ascii') if isinstance(name, bytes) else str(name)
+            return self._open(name, self.ob1s, self.ob1_names, SimulatedOB1, instr_id_out)
+
+    def OB1_Destructor(self, instr_id):
+        with self._lock:
+            self._tick()
+            if self._handles.pop(_value(instr_id), None) is None:
+                return NO_COMMUNICATION
+            return 0
+
+    def OB1_Add_Sens(self, instr_id, channel, sensor_type, digital_analog, calibration, resolution, custom_voltage):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ch = _value(channel)
+            if not 1 <= ch <= ob1.n_channels:
+                return INVALID_ARGUMENT
+            ob1.sensors[ch] = {'type': _value(sensor_type), 'calibration': _value(calibration),
+                               'resolution': _value(resolution)}
+            return 0
+
+    def OB1_Calib(self, instr_id):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ob1.calibration = "<new>"
+            return 0
+
+    def OB1_Calib_Save(self, instr_id, path):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            path = _value(path)
+            path = path.decode('ascii') if isinstance(path, bytes) else str(path)
+            try:
+                # CALIB_LEN points per channel, tab separated, one channel per line; a little
+                # offset drift between calibrations like a real regulator
+                with open(path, 'w') as f:
+                    for ch in range(1, ob1.n_channels + 1):
+                        offset = random.gauss(0.0, 0.5)
+                        f.write("\t".join(f"{-1000.0 + 2000.0 * i / (CALIB_LEN - 1) + offset:.4f}"
+                                          for i in range(CALIB_LEN)) + "\n")
+            except OSError:
+                return INVALID_ARGUMENT
+            ob1.calibration = path
+            return 0
+
+    def OB1_Calib_Load(self, instr_id, path):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            path = _value(path)
+            ob1.calibration = path.decode('ascii') if isinstance(path, bytes) else str(path)
+            return 0
+
+    def OB1_Set_Press(self, instr_id, channel, pressure):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ch = _value(channel)
+            if not 1 <= ch <= ob1.n_channels:
+                return INVALID_ARGUMENT
+            ob1.setpoint[ch] = float(_value(pressure))
+            return 0
+
+    def OB1_Set_Sens(self, instr_id, channel, target):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ch = _value(channel)
+            if ch not in ob1.pid:
+                return INVALID_ARGUMENT
+            ob1.flow_target[ch] = float(_value(target))
+            return 0
+
+    def OB1_Get_Data(self, instr_id, channel, reg_out, sens_out):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ch = _value(channel)
+            if not 1 <= ch <= ob1.n_channels:
+                return INVALID_ARGUMENT
+            # an output passed as None is not read (the OB1 skips that part of the transfer)
+            if reg_out is not None:
+                self._wait(self.reg_read_s)
+                _write(reg_out, ob1.pressure[ch] + ob1.pressure_offset)
+            if sens_out is not None:
+                sensor = ob1.sensors.get(ch)
+                self._wait(self.sensor_read_s * 2.0 ** ((sensor['resolution'] if sensor else 7) - 7))
+                _write(sens_out, ob1.flow(ch))
+            return 0
+
+    # ----- remote PID -----
+
+    def PID_Add_Remote(self, reg_id, reg_channel, sens_id, sens_channel, k_p, k_i, running):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(reg_id)
+            if ob1 is None or self._ob1(sens_id) is None:
+                return NO_COMMUNICATION
+            ch = _value(reg_channel)
+            if _value(sens_channel) not in ob1.sensors:
+                return NO_FLOW_SENSOR
+            ob1.pid[ch] = {'sensor_channel': _value(sens_channel), 'k_p': float(_value(k_p)),
+                           'k_i': float(_value(k_i)), 'running': bool(_value(running))}
+            return 0
+
+    def PID_Set_Running_Remote(self, instr_id, channel, running):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ch = _value(channel)
+            if ch in ob1.pid:
+                ob1.pid[ch]['running'] = bool(_value(running))
+            return 0
+
+    def PID_Set_Params_Remote(self, instr_id, channel, reset, k_p, k_i):
+        with self._lock:
+            self._tick()
+            ob1 = self._ob1(instr_id)
+            if ob1 is None:
+                return NO_COMMUNICATION
+            ch = _value(channel)
+            if ch not in ob1.pid:
+                return INVALID_ARGUMENT
+            ob1.pid[ch].update(k_p=float(_value(k_p)), k_i=float(_value(k_i)))
+            return 0
+
+    # ----- MUX DRI -----
+
+    def MUX_DRI_Initialization(self, name, instr_id_out):
+        with self._lock:
+            self._tick()
+            name = _value(name)
+            name = name.decode('ascii') if isinstance(name, bytes) else str(name)
+            return self._open(name, self.muxes, self.mux_names, SimulatedMUXDRI, instr_id_out)
+
+    def MUX_DRI_Destructor(self, instr_id):
+        with self._lock:
+            self._tick()
+            if self._handles.pop(_value(instr_id), None) is None:
+                return NO_INSTRUMENT
+            return 0
+
+    def MUX_DRI_Send_Command(self, instr_id, action, answer, length):
+        """action 0 = home, 1 = read serial number."""
+        with self._lock:
+            self._tick()
+            mux = self._device(instr_id, SimulatedMUXDRI)
+            if mux is None:
+                return VISA_CONNECTION_LOST
+            if _value(action) == 0:
+                mux.homed = True
+                mux.valve = 1
+                reply = b"homed"
+            else:
+                reply = f"SIM-{mux.name}".encode('ascii')
+            if answer is not None:
+                answer.value = reply[:max(0, _value(length) - 1)]
+            return 0
+
+    def MUX_DRI_Set_Valve(self, instr_id, valve, rotation):
+        with self._lock:
+            self._tick()
+            mux = self._device(instr_id, SimulatedMUXDRI)
+            if mux is None:
+                return VISA_CONNECTION_LOST
+            valve = _value(valve)
+            if not 1 <= valve <= mux.n_valves:
+                return INVALID_ARGUMENT
+            mux.valve = valve
+            for ob1 in self.ob1s.values():
+                ob1.path = self.paths.get(valve)
+            return 0
+
+    def MUX_DRI_Get_Valve(self, instr_id, valve_out):
+        """Valve 0 means the position is unknown (not homed since power-up)."""
+        with self._lock:
+            self._tick()
+            mux = self._device(instr_id, SimulatedMUXDRI)
+            if mux is None:
+                return VISA_CONNECTION_LOST
+            _write(valve_out, mux.valve if mux.homed else 0)
+            return 0
+
+
+_SDK_FUNCTIONS = [name for name in vars(FakeElveflow)
+                  if name.startswith(('OB1_', 'PID_', 'MUX_DRI_'))]
+# the real Elveflow64.py does "from ctypes import *", so scripts get ctypes through it
+_CTYPES_EXPORTS = [name for name in dir(sys.modules['ctypes']) if not name.startswith('_')]
+
+
+def install(fake=None, module_names=("Elveflow64",)):
+    """
+    Make "from Elveflow64 import *" load the simulator instead of the DLL.
+
+    Call before importing any script that talks to the instruments:
+        import fake_elveflow
+        sdk = fake_elveflow.install()
+        import parallelRefillSampleDebug
+
+    Returns:
+        FakeElveflow: The simulator behind the installed module (for simulate_disconnect etc.)
+    """
+    fake = fake or FakeElveflow()
+    mod = fake.module()
+    for name in module_names:
+        sys.modules[name] = mod
+    return fake
+
+
+def main():
+    """Quick self-check: bring up an OB1 and MUX, unplug the OB1 for 2 seconds, reconnect."""
+    sdk = FakeElveflow()
+    instr_id = c_int32(-1)
+    mux_id = c_int32(-1)
+    print("=== FAKE ELVEFLOW SDK ===")
+    print(f"OB1_Initialization: {sdk.OB1_Initialization('OB1'.encode('ascii'), 0, 0, 0, 0, byref(instr_id))} (ID {instr_id.value})")
+    print(f"MUX_DRI_Initialization: {sdk.MUX_DRI_Initialization('12MUX'.encode('ascii'), byref(mux_id))} (ID {mux_id.value})")
+    sdk.OB1_Add_Sens(instr_id.value, 1, 5, 1, 1, 7, 0)
+    sdk.OB1_Set_Press(instr_id, c_int32(1), c_double(300.0))
+    time.sleep(1.0)
+    reg, sen = c_double(), c_double()
+    sdk.OB1_Get_Data(instr_id, c_int32(1), byref(reg), byref(sen))
+    print(f"Channel 1: {reg.value:.1f} mbar, {sen.value:.1f} µL/min")
+
+    sdk.simulate_disconnect("OB1", 2.0)
+    print(f"After unplug, OB1_Get_Data -> {sdk.OB1_Get_Data(instr_id, c_int32(1), byref(reg), byref(sen))}")
+    print(f"Re-initialize while unplugged -> {sdk.OB1_Initialization(b'OB1', 0, 0, 0, 0, byref(instr_id))}")
+    time.sleep(2.1)
+    print(f"Re-initialize after 2 s -> {sdk.OB1_Initialization(b'OB1', 0, 0, 0, 0, byref(instr_id))} (ID {instr_id.value})")
+    sdk.OB1_Get_Data(instr_id, c_int32(1), byref(reg), byref(sen))
+    print(f"Channel 1 after power-on: {reg.value:.1f} mbar, {sen.value:.1f} µL/min (no sensor)")
+    print("=" * 30)
+
+
+if __name__ == "__main__":
+    main()
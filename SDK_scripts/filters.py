@@ -0,0 +1,329 @@
+import math
+from bisect import insort, bisect_left
+from collections import deque
+
+
+# Streaming filters for flow / pressure readings. Every filter takes one sample per update()
+# call and costs the same per sample however long the run is (O(1), or O(window) for the
+# windowed ones), so they can run inside control, logging and stabilization loops.
+# update(value, dt=None, pressure=None) returns the filtered value; the *_batch functions
+# give the same output for whole logs (NumPy) for offline analysis.
+
+
+class EWMA:
+    """
+    Exponentially weighted moving average.
+
+    Args:
+        alpha: Weight of the newest sample, 0 < alpha <= 1 (default: 0.3)
+        tau_s: Time constant in seconds; when given, alpha follows the actual dt of each update
+    """
+
+    def __init__(self, alpha=0.3, tau_s=None):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = alpha
+        self.tau_s = tau_s
+        self.value = None
+
+    def reset(self):
+        self.value = None
+
+    def update(self, value, dt=None, pressure=None):
+        if self.value is None:
+            self.value = value
+            return value
+        alpha = self.alpha
+        if self.tau_s and dt:
+            alpha = 1.0 - math.exp(-dt / self.tau_s)
+        self.value += alpha * (value - self.value)
+        return self.value
+
+
+class MovingMedian:
+    """
+    Median of the last `window` samples; a single spike never gets through.
+
+    Args:
+        window: Samples in the window (default: 5, odd keeps the median a real sample)
+    """
+
+    def __init__(self, window=5):
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._fifo = deque()
+        self._sorted = []
+        self.value = None
+
+    def update(self, value, dt=None, pressure=None):
+        self._fifo.append(value)
+        insort(self._sorted, value)
+        if len(self._fifo) > self.window:
+            del self._sorted[bisect_left(self._sorted, self._fifo.popleft())]
+        n = len(self._sorted)
+        mid = n // 2
+        self.value = self._sorted[mid] if n % 2 else 0.5 * (self._sorted[mid - 1] + self._sorted[mid])
+        return self.value
+
+
+def _solve(a, b):
+    """Solve a small linear system with Gaussian elimination (partial pivoting)."""
+    n = len(b)
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise ValueError("singular system")
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= f * m[col][c]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        x[r] = (m[r][n] - sum(m[r][c] * x[c] for c in range(r + 1, n))) / m[r][r]
+    return x
+
+
+def savgol_coefficients(window, order):
+    """
+    Causal Savitzky-Golay weights: the polynomial fitted to the last `window` samples,
+    evaluated at the newest one. Oldest sample first.
+    """
+    if order >= window:
+        raise ValueError("order must be smaller than window")
+    ts = [i - (window - 1) for i in range(window)]   # newest sample at t = 0
+    # normal equations (A^T A) c = e0: the fitted value at t = 0 is the constant term
+    ata = [[sum(t ** (i + j) for t in ts) for j in range(order + 1)] for i in range(order + 1)]
+    c = _solve(ata, [1.0] + [0.0] * order)
+    return [sum(c[k] * t ** k for k in range(order + 1)) for t in ts]
+
+
+class SavitzkyGolay:
+    """
+    Causal Savitzky-Golay smoother: keeps ramps and steps sharper than an average of the same length.
+
+    Until the window is full the mean of the samples so far is returned.
+
+    Args:
+        window: Samples in the window (default: 9)
+        order: Polynomial order (default: 2)
+    """
+
+    def __init__(self, window=9, order=2):
+        self.window = window
+        self.order = order
+        self.coefficients = savgol_coefficients(window, order)
+        self.reset()
+
+    def reset(self):
+        self._fifo = deque(maxlen=self.window)
+        self.value = None
+
+    def update(self, value, dt=None, pressure=None):
+        self._fifo.append(value)
+        if len(self._fifo) < self.window:
+            self.value = sum(self._fifo) / len(self._fifo)
+        else:
+            self.value = sum(c * v for c, v in zip(self.coefficients, self._fifo))
+        return self.value
+
+
+class Kalman1D:
+    """
+    Scalar Kalman filter on the flow, driven by the regulator pressure.
+
+    Prediction: the estimate moves by the change of model(pressure) passed through a lag of
+    tau_s, so a pressure step shows up before the noisy sensor confirms it. Only the change is
+    used: at a constant pressure the prediction is a random walk and the estimate converges on
+    the measurement, however far the model is off. The measurement is the MFS reading.
+
+    Args:
+        model: Callable pressure_mbar -> flow_ul_min, e.g. FlowModel.flow_for_pressure (default: None)
+        tau_s: Flow response time constant in seconds (default: 0.5)
+        process_noise: Flow variance added per second, (µL/min)^2/s (default: 25.0)
+        measurement_noise: Sensor variance, (µL/min)^2 (default: 25.0)
+    """
+
+    def __init__(self, model=None, tau_s=0.5, process_noise=25.0, measurement_noise=25.0):
+        self.model = model
+        self.tau_s = tau_s
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.variance = None
+        self._model_flow = None   # lagged model(pressure)
+
+    def update(self, value, dt=None, pressure=None):
+        dt = 1.0 if dt is None else dt
+        predicted_change = 0.0
+        if self.model is not None and pressure is not None:
+            target = self.model(pressure)
+            if self._model_flow is None:
+                self._model_flow = target
+            else:
+                step = (1.0 - math.exp(-dt / self.tau_s)) * (target - self._model_flow)
+                self._model_flow += step
+                predicted_change = step
+        if self.value is None:
+            self.value = value
+            self.variance = self.measurement_noise
+            return value
+        self.value += predicted_change
+        self.variance += self.process_noise * dt
+        gain = self.variance / (self.variance + self.measurement_noise)
+        self.value += gain * (value - self.value)
+        self.variance *= (1.0 - gain)
+        return self.value
+
+
+FILTERS = {'ewma': EWMA, 'median': MovingMedian, 'savgol': SavitzkyGolay, 'kalman': Kalman1D}
+
+
+class ChannelFilters:
+    """
+    Filters attached per OB1 channel and quantity ("pressure" / "flow").
+
+        filters = ChannelFilters()
+        filters.attach(1, "flow", Kalman1D(model=flow_models.get(1, 1).flow_for_pressure))
+        pressure, flow = filters.apply(1, pressure, flow, dt=0.1)
+
+    The flow filter gets the raw pressure, so pressure-driven filters see the regulator input.
+    """
+
+    def __init__(self):
+        self._filters = {}   # (channel, quantity) -> filter
+
+    def attach(self, channel_num, quantity, filt):
+        if quantity not in ("pressure", "flow"):
+            raise ValueError(f"Unknown quantity: {quantity}")
+        self._filters[(channel_num, quantity)] = filt
+        return filt
+
+    def detach(self, channel_num, quantity):
+        return self._filters.pop((channel_num, quantity), None)
+
+    def get(self, channel_num, quantity):
+        return self._filters.get((channel_num, quantity))
+
+    def reset(self, channel_num=None):
+        for (ch, _), filt in self._filters.items():
+            if channel_num is None or ch == channel_num:
+                filt.reset()
+
+    def apply(self, channel_num, pressure, flow, dt=None):
+        """
+        Filter one sample (values that were not read stay None).
+
+        Returns:
+            tuple: (pressure, flow)
+        """
+        raw_pressure = pressure
+        filt = self._filters.get((channel_num, "pressure"))
+        if filt is not None and pressure is not None:
+            pressure = filt.update(pressure, dt=dt)
+        filt = self._filters.get((channel_num, "flow"))
+        if filt is not None and flow is not None:
+            flow = filt.update(flow, dt=dt, pressure=raw_pressure)
+        return pressure, flow
+
+
+# ----- batch versions (offline logs) -----
+
+def ewma_batch(values, alpha=0.3):
+    """EWMA over a whole log; same output as feeding EWMA(alpha) sample by sample."""
+    import numpy as np
+
+    x = np.asarray(values, dtype=float)
+    if x.size == 0:
+        return x
+    try:
+        from scipy.signal import lfilter, lfilter_zi
+    except ImportError:
+        out = np.empty_like(x)
+        acc = x[0]
+        for i, v in enumerate(x):
+            acc += alpha * (v - acc)
+            out[i] = acc
+        return out
+    b, a = [alpha], [1.0, alpha - 1.0]
+    out, _ = lfilter(b, a, x, zi=lfilter_zi(b, a) * x[0])
+    return out
+
+
+def median_batch(values, window=5):
+    """Causal moving median over a whole log (the first samples use the shorter window they have)."""
+    import numpy as np
+
+    x = np.asarray(values, dtype=float)
+    if x.size == 0:
+        return x
+    out = np.empty_like(x)
+    head = min(window - 1, x.size)
+    for i in range(head):
+        out[i] = np.median(x[:i + 1])
+    if x.size >= window:
+        out[window - 1:] = np.median(np.lib.stride_tricks.sliding_window_view(x, window), axis=1)
+    return out
+
+
+def savgol_batch(values, window=9, order=2):
+    """Causal Savitzky-Golay over a whole log; same output as SavitzkyGolay(window, order)."""
+    import numpy as np
+
+    x = np.asarray(values, dtype=float)
+    if x.size == 0:
+        return x
+    out = np.cumsum(x) / np.arange(1, x.size + 1)   # running mean while the window fills
+    if x.size >= window:
+        weights = np.asarray(savgol_coefficients(window, order))
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window) @ weights
+    return out
+
+
+def kalman_batch(values, pressures=None, dt=1.0, **kwargs):
+    """Kalman1D over a whole log (recursive, so it runs the streaming filter); kwargs go to Kalman1D."""
+    import numpy as np
+
+    filt = Kalman1D(**kwargs)
+    dts = np.broadcast_to(np.asarray(dt, dtype=float), np.shape(values))
+    if pressures is None:
+        return np.array([filt.update(v, dt=d) for v, d in zip(values, dts)])
+    return np.array([filt.update(v, dt=d, pressure=p) for v, d, p in zip(values, dts, pressures)])
+
+
+def filter_log(results, method="median", quantity="flow", **kwargs):
+    """
+    Filtered copy of a logged quantity from a results dictionary / load_log_csv().
+
+    Args:
+        results: Dictionary with 'time_log', 'pressure_log', 'flow_log'
+        method: "ewma", "median", "savgol" or "kalman"
+        quantity: "flow" or "pressure"
+        kwargs: Filter parameters (alpha, window, order, model, tau_s, ...)
+
+    Returns:
+        numpy.ndarray: Filtered values, same length as the log
+    """
+    import numpy as np
+
+    values = results[f'{quantity}_log']
+    if method == "ewma":
+        return ewma_batch(values, **kwargs)
+    if method == "median":
+        return median_batch(values, **kwargs)
+    if method == "savgol":
+        return savgol_batch(values, **kwargs)
+    if method == "kalman":
+        t = np.asarray(results['time_log'], dtype=float)
+        dt = np.diff(t, prepend=t[0]) if t.size else 1.0
+        pressures = results['pressure_log'] if quantity == "flow" else None
+        return kalman_batch(values, pressures=pressures, dt=dt, **kwargs)
+    raise ValueError(f"Unknown filter: {method} (use one of {', '.join(FILTERS)})")
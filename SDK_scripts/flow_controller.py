@@ -0,0 +1,412 @@
+import sys
+import time
+import threading
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from scheduler import DeadlineScheduler
+from sdk_worker import sdk_call, PRIORITY_CONTROL, PRIORITY_SAFETY
+
+
+# OB1 MK4 channels are (-900, 1000) mbar
+PRESSURE_MIN = -900.0
+PRESSURE_MAX = 1000.0
+
+# Host-side gains are in physical units: k_p [mbar per µL/min], k_i [mbar per µL/min per s],
+# k_d [mbar per µL/min/s]. They are NOT the same scale as the SDK remote PID gains (0.001).
+# Starting points from the 200 mbar ~ 200 µL/min operating point in the logs (~1 µL/min per mbar).
+DEFAULT_GAIN_SCHEDULE = [
+    # (max |target flow| in µL/min, k_p, k_i, k_d)
+    (100.0, 0.15, 0.30, 0.0),
+    (300.0, 0.25, 0.50, 0.0),
+    (float('inf'), 0.35, 0.70, 0.0),
+]
+
+
+class GainSchedule:
+    """
+    Piecewise-constant PID gains selected by the magnitude of the target flow.
+
+    Args:
+        bands: List of (max_abs_flow, k_p, k_i, k_d) tuples; sorted on construction.
+               The last band should use float('inf') to cover every target.
+    """
+
+    def __init__(self, bands=None):
+        bands = DEFAULT_GAIN_SCHEDULE if bands is None else bands
+        if not bands:
+            raise ValueError("gain schedule needs at least one band")
+        self.bands = sorted((float(b[0]), float(b[1]), float(b[2]), float(b[3])) for b in bands)
+
+    def gains_for(self, target_flow):
+        """
+        Returns:
+            tuple: (k_p, k_i, k_d) for the band containing abs(target_flow)
+        """
+        flow = abs(target_flow)
+        for max_flow, k_p, k_i, k_d in self.bands:
+            if flow <= max_flow:
+                return k_p, k_i, k_d
+        _, k_p, k_i, k_d = self.bands[-1]
+        return k_p, k_i, k_d
+
+
+class HostPIDController:
+    """
+    Host-side flow PID controller that outputs an OB1 pressure command.
+
+    u = feedforward(target) + k_p*e + I + D
+
+    - Feedforward: optional callable target_flow -> pressure (e.g. a fitted pressure->flow model),
+      so each step starts near the right pressure instead of integrating up from zero.
+    - Anti-windup: back-calculation; the integrator is bled off while the output is saturated.
+    - Derivative: on the measurement (no kick on setpoint changes) through a first-order filter.
+    - Gain scheduling: gains follow the target flow through a GainSchedule. The integrator stores
+      pressure (not error), so switching bands does not bump the output.
+
+    Args:
+        k_p, k_i, k_d: Fixed gains; ignored when gain_schedule is given
+        gain_schedule: GainSchedule instance (default: None)
+        feedforward: Callable target_flow -> pressure in mbar (default: None)
+        output_limits: (min, max) pressure in mbar (default: OB1 range)
+        derivative_tau: Derivative filter time constant in seconds (default: 0.5)
+        anti_windup_gain: Back-calculation gain per second (default: 1.0)
+    """
+
+    def __init__(self, k_p=0.25, k_i=0.5, k_d=0.0, gain_schedule=None, feedforward=None,
+                 output_limits=(PRESSURE_MIN, PRESSURE_MAX), derivative_tau=0.5, anti_windup_gain=1.0):
+        self.gain_schedule = gain_schedule
+        self.k_p = k_p
+        self.k_i = k_i
+        self.k_d = k_d
+        self.feedforward = feedforward
+        self.output_min, self.output_max = output_limits
+        self.derivative_tau = derivative_tau
+        self.anti_windup_gain = anti_windup_gain
+
+        self.target = 0.0
+        self._feedforward_value = 0.0
+        self._integral = 0.0
+        self._derivative = 0.0
+        self._last_measurement = None
+        self.last_output = 0.0
+        self.saturated = False
+
+    def set_target(self, target_flow):
+        """
+        Change the flow setpoint and update scheduled gains and feedforward.
+
+        Args:
+            target_flow: Target flow in µL/min
+        """
+        self.target = float(target_flow)
+        if self.gain_schedule is not None:
+            self.k_p, self.k_i, self.k_d = self.gain_schedule.gains_for(self.target)
+        if self.feedforward is not None:
+            try:
+                self._feedforward_value = float(self.feedforward(self.target))
+            except Exception:
+                self._feedforward_value = 0.0
+        else:
+            self._feedforward_value = 0.0
+
+    def reset(self, initial_output=None):
+        """
+        Clear controller state.
+
+        Args:
+            initial_output: Pressure currently applied, used for bumpless start (default: None)
+        """
+        self._integral = 0.0
+        if initial_output is not None:
+            self._integral = initial_output - self._feedforward_value
+        self._derivative = 0.0
+        self._last_measurement = None
+        self.saturated = False
+
+    def update(self, measured_flow, dt):
+        """
+        Compute a new pressure command.
+
+        Args:
+            measured_flow: Latest flow reading in µL/min
+            dt: Time since the previous update in seconds
+
+        Returns:
+            float: Pressure command in mbar, clamped to output_limits
+        """
+        if dt <= 0:
+            return self.last_output
+
+        error = self.target - measured_flow
+
+        # filtered derivative on measurement
+        if self._last_measurement is not None and self.k_d:
+            raw = -(measured_flow - self._last_measurement) / dt
+            alpha = dt / (self.derivative_tau + dt)
+            self._derivative += alpha * (raw - self._derivative)
+        self._last_measurement = measured_flow
+
+        self._integral += self.k_i * error * dt
+        unclamped = self._feedforward_value + self.k_p * error + self._integral + self.k_d * self._derivative
+        output = min(max(unclamped, self.output_min), self.output_max)
+
+        # back-calculation anti-windup
+        self.saturated = output != unclamped
+        if self.saturated:
+            self._integral += self.anti_windup_gain * (output - unclamped) * dt
+            # never let the integrator alone push further past the limit
+            self._integral = min(max(self._integral, self.output_min - self._feedforward_value),
+                                 self.output_max - self._feedforward_value)
+
+        self.last_output = output
+        return output
+
+    def get_state(self):
+        return {
+            'target': self.target,
+            'k_p': self.k_p,
+            'k_i': self.k_i,
+            'k_d': self.k_d,
+            'feedforward': self._feedforward_value,
+            'integral': self._integral,
+            'output': self.last_output,
+            'saturated': self.saturated,
+        }
+
+
+class HostFlowLoop:
+    """
+    Closed flow loop on one OB1 channel: a scheduler task reads the flow sensor,
+    runs the HostPIDController and writes the pressure.
+
+    Args:
+        instr_id: OB1 instrument ID
+        channel: Channel to control (c_int32)
+        controller: HostPIDController instance
+        scheduler: DeadlineScheduler to run on; a private one is started if None
+        period_s: Control period in seconds (default: 0.05)
+        verbose: Print progress information
+        sdk_thread: Optional SDKCommandThread owning the OB1; reads and writes go through it
+        zero_offsets: Optional ZeroOffsets; the loop controls on zero-corrected flow
+        flow_filter: Optional streaming filter from filters.py applied to the flow before the PID
+                     (e.g. Kalman1D driven by the flow model); reset by start()
+    """
+
+    def __init__(self, instr_id, channel, controller, scheduler=None, period_s=0.05, verbose=True,
+                 sdk_thread=None, zero_offsets=None, flow_filter=None):
+        self.instr_id = instr_id
+        self.channel = channel
+        self.controller = controller
+        self.sdk_thread = sdk_thread
+        self.zero_offsets = zero_offsets
+        self.flow_filter = flow_filter
+        self.period_s = period_s
+        self.verbose = verbose
+        self._own_scheduler = scheduler is None
+        self.scheduler = scheduler if scheduler is not None else DeadlineScheduler(name=f"host-pid-{channel.value}", verbose=verbose)
+        self.task_name = f"host_pid_ch{channel.value}"
+        self._last_time = None
+        self._lock = threading.Lock()
+        self.read_errors = 0
+        self.write_errors = 0
+        self.last_flow = None
+        self.last_pressure = None
+        self.running = False
+
+    def start(self, target_flow, initial_pressure=None):
+        """
+        Start closed-loop control at the given target flow.
+
+        Args:
+            target_flow: Target flow in µL/min
+            initial_pressure: Pressure to start from; defaults to the feedforward value
+        """
+        with self._lock:
+            self.controller.set_target(target_flow)
+            self.controller.reset(initial_output=initial_pressure)
+            self._last_time = None
+            if self.flow_filter is not None:
+                self.flow_filter.reset()
+            self.running = True
+        self.scheduler.add_task(self.task_name, self.period_s, self._step)
+        if self._own_scheduler:
+            self.scheduler.start()
+        if self.verbose:
+            state = self.controller.get_state()
+            print(f"Host PID started on channel {self.channel.value}: target {target_flow:.1f} µL/min, "
+                  f"feedforward {state['feedforward']:.1f} mbar, "
+                  f"Kp={state['k_p']}, Ki={state['k_i']}, Kd={state['k_d']}, period {self.period_s*1000:.0f} ms")
+
+    def set_target(self, target_flow):
+        with self._lock:
+            self.controller.set_target(target_flow)
+
+    def stop(self, vent=True):
+        """
+        Stop the loop.
+
+        Args:
+            vent: Set the channel pressure to 0 after stopping (default: True)
+        """
+        # a step already in flight finishes before we vent, so it cannot overwrite the 0 mbar
+        with self._lock:
+            self.running = False
+        self.scheduler.remove_task(self.task_name)
+        if self._own_scheduler:
+            self.scheduler.stop()
+        if vent:
+            sdk_call(self.sdk_thread, PRIORITY_SAFETY, OB1_Set_Press, self.instr_id, self.channel, c_double(0))
+
+    def _step(self, now):
+        with self._lock:
+            if not self.running:
+                return
+
+            sen = c_double()
+            reg = c_double()
+            error = sdk_call(self.sdk_thread, PRIORITY_CONTROL, OB1_Get_Data,
+                             self.instr_id, self.channel, byref(reg), byref(sen))
+            if error != 0:
+                self.read_errors += 1
+                return
+
+            pressure, flow = reg.value, sen.value
+            if self.zero_offsets is not None:
+                pressure, flow = self.zero_offsets.correct(self.channel.value, pressure, flow)
+
+            dt = self.period_s if self._last_time is None else now - self._last_time
+            self._last_time = now
+            if self.flow_filter is not None:
+                flow = self.flow_filter.update(flow, dt=dt, pressure=pressure)
+            command = self.controller.update(flow, dt)
+
+            error = sdk_call(self.sdk_thread, PRIORITY_CONTROL, OB1_Set_Press,
+                             self.instr_id, self.channel, c_double(command))
+            if error != 0:
+                self.write_errors += 1
+            self.last_flow = flow
+            self.last_pressure = pressure
+
+
+def _settling_time(time_log, flow_log, target_flow, tolerance):
+    """Time after which the flow stays inside target ± tolerance for the rest of the record (None if never)."""
+    settled_at = None
+    for t, flow in zip(time_log, flow_log):
+        if abs(flow - target_flow) <= tolerance:
+            if settled_at is None:
+                settled_at = t
+        else:
+            settled_at = None
+    return settled_at
+
+
+def _record_step(instr_id, channel, duration_s, sample_dt):
+    time_log, flow_log, pressure_log = [], [], []
+    start = time.time()
+    while (time.time() - start) < duration_s:
+        sen = c_double()
+        reg = c_double()
+        error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+        if error == 0:
+            time_log.append(time.time() - start)
+            flow_log.append(sen.value)
+            pressure_log.append(reg.value)
+        time.sleep(sample_dt)
+    return time_log, flow_log, pressure_log
+
+
+def benchmark_settling(instr_id, channel, target_flow, tolerance=10.0, duration_s=120.0,
+                       k_p_remote=0.001, k_i_remote=0.001, host_controller=None,
+                       host_period_s=0.05, rest_time_s=20.0, sample_dt=0.1, verbose=True):
+    """
+    Compare settling time of the SDK remote PID and the host PID on the same flow step.
+
+    Both runs start from 0 mbar: remote PID first, then the channel is vented for
+    rest_time_s, then the host PID. Settling time is the time after which the flow
+    stays within target ± tolerance until the end of the run.
+
+    Args:
+        instr_id: OB1 instrument ID
+        channel: Channel to control
+        target_flow: Step target in µL/min
+        tolerance: Settling band in µL/min (default: 10)
+        duration_s: Length of each run in seconds (default: 120)
+        k_p_remote, k_i_remote: Remote PID gains (default: 0.001)
+        host_controller: HostPIDController (default: gain-scheduled controller, no feedforward)
+        host_period_s: Host control period in seconds (default: 0.05)
+        rest_time_s: Vented pause between runs in seconds (default: 20)
+        sample_dt: Recording interval in seconds (default: 0.1)
+        verbose: Print progress information
+
+    Returns:
+        dict: Settling times, final errors and raw logs for both controllers
+    """
+    if verbose:
+        print(f"\n=== PID SETTLING BENCHMARK ===")
+        print(f"Channel: {channel.value}")
+        print(f"Target Flow: {target_flow} ± {tolerance} µL/min")
+        print(f"Run length: {duration_s} s per controller")
+        print("-" * 35)
+
+    results = {'target_flow': target_flow, 'tolerance': tolerance}
+
+    # --- remote (SDK) PID ---
+    OB1_Set_Press(instr_id, channel, c_double(0))
+    error = PID_Add_Remote(instr_id, channel, instr_id, channel, k_p_remote, k_i_remote, 1)
+    if error != 0:
+        if verbose:
+            print(f"Error setting up remote PID: {error}")
+        return None
+    PID_Set_Running_Remote(instr_id, channel, c_int32(1))
+    OB1_Set_Sens(instr_id, channel, c_double(target_flow))
+    try:
+        t_log, f_log, p_log = _record_step(instr_id, channel, duration_s, sample_dt)
+    finally:
+        PID_Set_Running_Remote(instr_id, channel, c_int32(0))
+        OB1_Set_Press(instr_id, channel, c_double(0))
+    results['remote'] = {
+        'settling_time': _settling_time(t_log, f_log, target_flow, tolerance),
+        'final_error': (f_log[-1] - target_flow) if f_log else None,
+        'time_log': t_log, 'flow_log': f_log, 'pressure_log': p_log,
+    }
+    if verbose:
+        print(f"Remote PID settling time: {results['remote']['settling_time']}")
+
+    time.sleep(rest_time_s)
+
+    # --- host PID ---
+    if host_controller is None:
+        host_controller = HostPIDController(gain_schedule=GainSchedule())
+    loop = HostFlowLoop(instr_id, channel, host_controller, period_s=host_period_s, verbose=verbose)
+    loop.start(target_flow, initial_pressure=0.0 if host_controller.feedforward is None else None)
+    try:
+        t_log, f_log, p_log = _record_step(instr_id, channel, duration_s, sample_dt)
+        # stop() removes the task, and its stats with it
+        scheduler_stats = loop.scheduler.get_stats()
+    finally:
+        loop.stop(vent=True)
+    results['host'] = {
+        'settling_time': _settling_time(t_log, f_log, target_flow, tolerance),
+        'final_error': (f_log[-1] - target_flow) if f_log else None,
+        'time_log': t_log, 'flow_log': f_log, 'pressure_log': p_log,
+        'scheduler_stats': scheduler_stats,
+        'read_errors': loop.read_errors,
+        'write_errors': loop.write_errors,
+    }
+
+    if verbose:
+        remote_ts = results['remote']['settling_time']
+        host_ts = results['host']['settling_time']
+        print(f"\n=== SETTLING BENCHMARK RESULTS ===")
+        print(f"Remote PID: {'did not settle' if remote_ts is None else f'{remote_ts:.1f} s'}")
+        print(f"Host PID:   {'did not settle' if host_ts is None else f'{host_ts:.1f} s'}")
+        print(f"Host loop read/write errors: {loop.read_errors}/{loop.write_errors}")
+        print("=" * 35)
+
+    return results
@@ -0,0 +1,282 @@
+import os
+import csv
+import json
+import math
+import threading
+from datetime import datetime
+
+
+DEFAULT_MODEL_PATH = "flow_models.json"
+
+# readings at the regulator limit are saturated and say nothing about the path resistance
+SATURATION_MBAR = 999.0
+# Highest pressure a feedforward lookup may return; models are fitted on ramps that rarely reach
+# it, and the protocols' watchdogs trip at 950 mbar
+MAX_FEEDFORWARD_MBAR = 900.0
+
+
+def _solve3(a, b):
+    """Solve a 3x3 linear system with Gaussian elimination (partial pivoting). Returns None if singular."""
+    m = [row[:] + [b[i]] for i, row in enumerate(a)]
+    for col in range(3):
+        pivot = max(range(col, 3), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            return None
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, 3):
+            f = m[r][col] / m[col][col]
+            for c in range(col, 4):
+                m[r][c] -= f * m[col][c]
+    x = [0.0, 0.0, 0.0]
+    for r in (2, 1, 0):
+        x[r] = (m[r][3] - sum(m[r][c] * x[c] for c in range(r + 1, 3))) / m[r][r]
+    return x
+
+
+class FlowModel:
+    """
+    Pressure/flow model for one hydraulic path (OB1 channel + MUX valve position):
+
+        P = p0 + R * Q + R2 * Q * |Q|
+
+    p0 is the offset (capillary/height head, regulator zero error), R the linear hydraulic
+    resistance in mbar per µL/min and R2 a small quadratic loss term (kept >= 0 so the
+    curve stays monotonic and can be inverted).
+
+    The fit is least squares on (pressure, flow) pairs; update() refines it online with
+    recursive least squares and a forgetting factor so the model follows slow drift.
+
+    Args:
+        p0, R, R2: Initial parameters (default: 0, 1, 0)
+        forgetting: RLS forgetting factor in (0, 1] (default: 0.999)
+        min_flow: Samples below this |flow| in µL/min are ignored (default: 5.0)
+    """
+
+    def __init__(self, p0=0.0, R=1.0, R2=0.0, forgetting=0.999, min_flow=5.0):
+        self.p0 = p0
+        self.R = R
+        self.R2 = R2
+        self.forgetting = forgetting
+        self.min_flow = min_flow
+        self.n_samples = 0
+        self.rms_error = None
+        self.updated = None
+        # RLS covariance, starts loose
+        self._P = [[1e4 if i == j else 0.0 for j in range(3)] for i in range(3)]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _features(flow):
+        return [1.0, flow, flow * abs(flow)]
+
+    def _usable(self, pressure, flow):
+        return abs(flow) >= self.min_flow and abs(pressure) < SATURATION_MBAR
+
+    def fit(self, pressure_log, flow_log):
+        """
+        Batch least-squares fit.
+
+        Args:
+            pressure_log: Measured pressures in mbar
+            flow_log: Measured flows in µL/min
+
+        Returns:
+            bool: True if the model was updated
+        """
+        ata = [[0.0] * 3 for _ in range(3)]
+        atb = [0.0] * 3
+        n = 0
+        for p, q in zip(pressure_log, flow_log):
+            if not self._usable(p, q):
+                continue
+            x = self._features(q)
+            for i in range(3):
+                atb[i] += x[i] * p
+                for j in range(3):
+                    ata[i][j] += x[i] * x[j]
+            n += 1
+        if n < 5:
+            return False
+
+        theta = _solve3(ata, atb)
+        if theta is None or theta[1] <= 0 or theta[2] < 0:
+            # not enough flow range to see curvature, or a non-monotonic fit: linear fit instead
+            s1 = atb[0]; sq = ata[0][1]; sqq = ata[1][1]; sqp = atb[1]
+            det = n * sqq - sq * sq
+            if abs(det) < 1e-12:
+                return False
+            theta = [(sqq * s1 - sq * sqp) / det, (n * sqp - sq * s1) / det, 0.0]
+            if theta[1] <= 0:
+                return False
+
+        with self._lock:
+            self.p0, self.R, self.R2 = theta
+            self.n_samples = n
+            self._P = [[1e2 if i == j else 0.0 for j in range(3)] for i in range(3)]
+            sq_err = [(p - self.pressure_for_flow(q)) ** 2
+                      for p, q in zip(pressure_log, flow_log) if self._usable(p, q)]
+            self.rms_error = math.sqrt(sum(sq_err) / len(sq_err))
+            self.updated = datetime.now().isoformat(timespec='seconds')
+        return True
+
+    def update(self, pressure, flow):
+        """
+        Online recursive-least-squares update with one (pressure, flow) sample.
+
+        Returns:
+            bool: True if the sample was used
+        """
+        if not self._usable(pressure, flow):
+            return False
+        x = self._features(flow)
+        with self._lock:
+            theta = [self.p0, self.R, self.R2]
+            P = self._P
+            px = [sum(P[i][j] * x[j] for j in range(3)) for i in range(3)]
+            denom = self.forgetting + sum(x[i] * px[i] for i in range(3))
+            k = [v / denom for v in px]
+            err = pressure - sum(theta[i] * x[i] for i in range(3))
+            theta = [theta[i] + k[i] * err for i in range(3)]
+            if theta[1] <= 0:
+                # a single noisy sample must not flip the curve; keep the previous estimate and covariance
+                return False
+            self._P = [[(P[i][j] - k[i] * px[j]) / self.forgetting for j in range(3)] for i in range(3)]
+            self.p0, self.R, self.R2 = theta[0], theta[1], max(theta[2], 0.0)
+            self.n_samples += 1
+        return True
+
+    def pressure_for_flow(self, flow):
+        """Pressure in mbar needed for the given flow in µL/min."""
+        return self.p0 + self.R * flow + self.R2 * flow * abs(flow)
+
+    def flow_for_pressure(self, pressure):
+        """Flow in µL/min predicted at the given pressure in mbar (inverse of pressure_for_flow)."""
+        dp = pressure - self.p0
+        if self.R2 <= 1e-12:
+            return dp / self.R if self.R else 0.0
+        # R2*q|q| + R*q - dp = 0, solved on the side given by sign(dp)
+        sign = 1.0 if dp >= 0 else -1.0
+        a = self.R2
+        disc = self.R * self.R + 4.0 * a * abs(dp)
+        return sign * (-self.R + math.sqrt(disc)) / (2.0 * a)
+
+    def to_dict(self):
+        return {'p0': self.p0, 'R': self.R, 'R2': self.R2, 'n_samples': self.n_samples,
+                'rms_error': self.rms_error, 'updated': self.updated}
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(p0=data['p0'], R=data['R'], R2=data.get('R2', 0.0))
+        model.n_samples = data.get('n_samples', 0)
+        model.rms_error = data.get('rms_error')
+        model.updated = data.get('updated')
+        return model
+
+
+class FlowModelBank:
+    """
+    FlowModel per hydraulic path, keyed by (OB1 channel, MUX valve position).
+    Use valve=None for a channel that is not routed through the MUX.
+
+    Args:
+        path: JSON file used by save()/load() (default: flow_models.json)
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_PATH):
+        self.path = path
+        self.models = {}
+
+    @staticmethod
+    def _key(channel, valve):
+        return f"ch{int(channel)}" + ("" if valve is None else f"_v{int(valve)}")
+
+    def get(self, channel, valve=None, create=False):
+        key = self._key(channel, valve)
+        if key not in self.models and create:
+            self.models[key] = FlowModel()
+        return self.models.get(key)
+
+    def fit(self, channel, valve, pressure_log, flow_log, verbose=True):
+        """
+        Fit (or refit) the model for one path.
+
+        Returns:
+            FlowModel: The fitted model, or None if there was not enough usable data
+        """
+        model = FlowModel()
+        if not model.fit(pressure_log, flow_log):
+            if verbose:
+                print(f"⚠ Could not fit channel {channel} / valve {valve} (too few flowing samples or no monotonic fit)")
+            return None
+        self.models[self._key(channel, valve)] = model
+        if verbose:
+            print(f"Flow model channel {channel} / valve {valve}: "
+                  f"P = {model.p0:.1f} + {model.R:.3f}*Q + {model.R2:.2e}*Q|Q| mbar "
+                  f"({model.n_samples} samples, RMS {model.rms_error:.1f} mbar)")
+        return model
+
+    def fit_from_ramp(self, channel, valve, ramp_results, verbose=True):
+        """Fit from the dict returned by ramp_pressure (uses 'pressure_log' and 'flow_log')."""
+        if not ramp_results:
+            return None
+        return self.fit(channel, valve, ramp_results['pressure_log'], ramp_results['flow_log'], verbose)
+
+    def fit_from_csv(self, channel, valve, filename, verbose=True):
+        """Fit from a continuous_logging_*.csv file (Time_s,Pressure_mbar,Flow_ul_min)."""
+        pressure_log, flow_log = [], []
+        with open(filename, newline='') as f:
+            for row in csv.DictReader(f):
+                pressure_log.append(float(row['Pressure_mbar']))
+                flow_log.append(float(row['Flow_ul_min']))
+        return self.fit(channel, valve, pressure_log, flow_log, verbose)
+
+    def update(self, channel, valve, pressure, flow):
+        """Online update of an existing path model; no-op if the path has not been fitted yet."""
+        model = self.get(channel, valve)
+        return model.update(pressure, flow) if model else False
+
+    def pressure_for_flow(self, channel, valve, flow, default=None, max_pressure=MAX_FEEDFORWARD_MBAR):
+        """
+        Feedforward lookup: pressure needed for a target flow on a path.
+
+        Returns:
+            float: Pressure in mbar, or default if the path has no model or the pressure is
+                   above max_pressure (an extrapolation not worth sending)
+        """
+        model = self.get(channel, valve)
+        if model is None:
+            return default
+        pressure = model.pressure_for_flow(flow)
+        if not math.isfinite(pressure) or pressure > max_pressure:
+            return default
+        return pressure
+
+    def feedforward(self, channel, valve=None, max_pressure=MAX_FEEDFORWARD_MBAR):
+        """
+        Returns:
+            callable: target_flow -> pressure (capped at max_pressure), for
+                      HostPIDController(feedforward=...); None if no model
+        """
+        model = self.get(channel, valve)
+        if model is None:
+            return None
+        return lambda flow: min(model.pressure_for_flow(flow), max_pressure)
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, 'w') as f:
+            json.dump({key: m.to_dict() for key, m in self.models.items()}, f, indent=2)
+        return path
+
+    def load(self, path=None):
+        """
+        Returns:
+            bool: True if a model file was loaded
+        """
+        path = path or self.path
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            data = json.load(f)
+        self.models = {key: FlowModel.from_dict(d) for key, d in data.items()}
+        return True
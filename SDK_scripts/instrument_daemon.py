@@ -0,0 +1,435 @@
+import sys
+import os
+import time
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client
+
+from ctypes import *
+
+from device_registry import add_sdk_path, device_name, device_info, calibration_file, REFILL_OB1, DISTRIBUTION_MUX
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+
+# Local-only endpoint. Connections carry pickled data, so only processes that know the key may
+# connect: $ELVEFLOW_DAEMON_KEY, or a random key created on first use in a file only this user can read
+DAEMON_ADDRESS = ('127.0.0.1', 47320)
+DAEMON_KEY_ENV = "ELVEFLOW_DAEMON_KEY"
+DAEMON_KEY_PATH = os.path.join(os.path.expanduser("~"), ".elveflow_daemon_key")
+
+N_OB1_CHANNELS = 4
+
+
+def daemon_authkey(path=DAEMON_KEY_PATH):
+    """
+    Connection key shared by the daemon and its clients.
+
+    Returns:
+        bytes: $ELVEFLOW_DAEMON_KEY if set, otherwise the key in path (created with a random
+               key and owner-only permissions if it does not exist)
+    """
+    key = os.environ.get(DAEMON_KEY_ENV)
+    if key:
+        return key.encode('ascii')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'r') as f:
+            return f.read().strip().encode('ascii')
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    with open(path, 'r') as f:
+        return f.read().strip().encode('ascii')
+
+
+class InstrumentDaemon:
+    """
+    Long-lived process that owns the OB1 and MUX DRI handles and serves commands to clients.
+
+    Bring-up (initialization, sensors, calibration load, MUX homing) happens once when the
+    daemon starts; experiment scripts then attach with InstrumentClient in milliseconds and
+    never call OB1_Initialization / MUX_DRI_Initialization themselves, which also avoids the
+    MULTIPLE_CONNECTIONS error when two scripts want the same device.
+
+    SDK calls from all clients are serialized by one lock. When a client disconnects, the
+    channels it pressurized are vented unless it detached with keep_state=True.
+
+    Args:
+        ob1_name: OB1 device name (default: the "refill OB1" role in device_registry)
+        mux_name: MUX DRI device name, "" if no MUX is used (default: the "distribution MUX" role)
+        sensors: channel -> OB1_Add_Sens arguments after the channel (default: the OB1 role's
+            "sensors" in device_registry)
+        calibration_path: Calibration file to load, None to skip (default: None)
+        address: (host, port) to listen on (default: DAEMON_ADDRESS)
+        authkey: Connection key (default: daemon_authkey())
+        verbose: Print progress information
+    """
+
+    def __init__(self, ob1_name=None, mux_name=None, sensors=None, calibration_path=None,
+                 address=DAEMON_ADDRESS, authkey=None, verbose=True):
+        self.ob1_name = ob1_name or device_name(REFILL_OB1)
+        self.mux_name = device_name(DISTRIBUTION_MUX) if mux_name is None else mux_name
+        if sensors is None:
+            sensors = device_info(REFILL_OB1).get('sensors', {})
+        self.sensors = {int(ch): tuple(args) for ch, args in sensors.items()}
+        self.sensor_channels = tuple(sorted(self.sensors))
+        self.calibration_path = calibration_path
+        self.address = address
+        self.authkey = authkey or daemon_authkey()
+        self.verbose = verbose
+
+        self.ob1_id = c_int32(-1)
+        self.mux_id = c_int32(-1)
+        self.started_at = None
+        self.commands_served = 0
+        self.clients = 0
+
+        self._sdk_lock = threading.Lock()
+        self._stats_lock = threading.Lock()   # clients / commands_served change on every client thread
+        self._listener = None
+        self._running = False
+
+    # ----- bring-up / tear-down -----
+
+    def bring_up(self):
+        """
+        Initialize instruments, add sensors, load calibration and home the MUX.
+
+        Returns:
+            bool: True if the OB1 (and MUX, if configured) are ready
+        """
+        if self.verbose:
+            print("=== DAEMON BRING-UP ===")
+        start = time.time()
+
+        error = OB1_Initialization(self.ob1_name.encode('ascii'), 0, 0, 0, 0, byref(self.ob1_id))
+        if error != 0:
+            print(f"Error initializing OB1: {error}")
+            return False
+        for channel_num in self.sensor_channels:
+            error = OB1_Add_Sens(self.ob1_id.value, channel_num, *self.sensors[channel_num])
+            if error != 0:
+                print(f"Error adding sensor on channel {channel_num}: {error}")
+        if self.calibration_path:
+            error = OB1_Calib_Load(self.ob1_id.value, create_string_buffer(self.calibration_path.encode('ascii')))
+            if error != 0:
+                print(f"Error loading calibration {self.calibration_path}: {error}")
+                return False
+        for channel_num in range(1, N_OB1_CHANNELS + 1):
+            OB1_Set_Press(self.ob1_id.value, c_int32(channel_num), c_double(0))
+
+        if self.mux_name:
+            error = MUX_DRI_Initialization(self.mux_name.encode('ascii'), byref(self.mux_id))
+            if error != 0:
+                print(f"Error initializing MUX DRI: {error}")
+                return False
+            answer = (c_char * 40)()
+            error = MUX_DRI_Send_Command(self.mux_id.value, 0, answer, 40)  # homing
+            time.sleep(5.0)
+            if error != 0:
+                print(f"Error homing MUX DRI: {error}")
+                return False
+
+        self.started_at = time.time()
+        if self.verbose:
+            print(f"✓ Instruments ready in {self.started_at - start:.1f}s (OB1 id {self.ob1_id.value}, MUX id {self.mux_id.value})")
+        return True
+
+    def tear_down(self):
+        """Vent all channels and release the instrument handles."""
+        with self._sdk_lock:
+            if self.ob1_id.value >= 0:
+                for channel_num in range(1, N_OB1_CHANNELS + 1):
+                    PID_Set_Running_Remote(self.ob1_id.value, c_int32(channel_num), c_int32(0))
+                    OB1_Set_Press(self.ob1_id.value, c_int32(channel_num), c_double(0))
+            if self.mux_id.value >= 0:
+                MUX_DRI_Destructor(self.mux_id.value)
+                self.mux_id = c_int32(-1)
+            if self.ob1_id.value >= 0:
+                OB1_Destructor(self.ob1_id.value)
+                self.ob1_id = c_int32(-1)
+        if self.verbose:
+            print("✓ Instruments vented and released")
+
+    # ----- serving -----
+
+    def serve_forever(self):
+        """Accept clients until stop() or a 'shutdown' command. Each client gets its own thread."""
+        self._listener = Listener(self.address, authkey=self.authkey)
+        self._running = True
+        if self.verbose:
+            print(f"Instrument daemon listening on {self.address[0]}:{self.address[1]}")
+        try:
+            while self._running:
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    break  # listener closed by stop()
+                except Exception as e:
+                    if self.verbose:
+                        print(f"Rejected connection: {e}")
+                    continue
+                if not self._running:
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        finally:
+            self._running = False
+            self._listener.close()
+
+    def stop(self):
+        if self._running:
+            self._running = False
+            try:
+                # closing the listener does not unblock accept() on every platform; connect once to wake it
+                Client(self.address, authkey=self.authkey).close()
+            except Exception:
+                pass
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except Exception:
+                pass
+
+    def _serve_client(self, conn):
+        with self._stats_lock:
+            self.clients += 1
+        touched_channels = set()
+        keep_state = False
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                command, args = request[0], request[1:]
+                if command == 'detach':
+                    keep_state = bool(args[0]) if args else False
+                    conn.send((0, None))
+                    break
+                try:
+                    reply = self._dispatch(command, args, touched_channels)
+                except Exception as e:
+                    reply = (-1, f"{type(e).__name__}: {e}")
+                with self._stats_lock:
+                    self.commands_served += 1
+                conn.send(reply)
+                if command == 'shutdown':
+                    self.stop()
+                    break
+        finally:
+            conn.close()
+            with self._stats_lock:
+                self.clients -= 1
+            if touched_channels and not keep_state:
+                # a crashed or finished client must not leave its channels pressurized
+                with self._sdk_lock:
+                    for channel_num in touched_channels:
+                        PID_Set_Running_Remote(self.ob1_id.value, c_int32(channel_num), c_int32(0))
+                        OB1_Set_Press(self.ob1_id.value, c_int32(channel_num), c_double(0))
+
+    def _dispatch(self, command, args, touched_channels):
+        """Run one command. Returns (error_code, payload)."""
+        ob1 = self.ob1_id.value
+        with self._sdk_lock:
+            if command == 'ping':
+                return 0, time.time()
+            if command == 'status':
+                return 0, {
+                    'ob1_name': self.ob1_name, 'ob1_id': ob1,
+                    'mux_name': self.mux_name, 'mux_id': self.mux_id.value,
+                    'sensor_channels': self.sensor_channels,
+                    'calibration_path': self.calibration_path,
+                    'uptime_s': time.time() - self.started_at if self.started_at else 0.0,
+                    'commands_served': self.commands_served, 'clients': self.clients,
+                }
+            if command == 'set_pressure':
+                channel_num, pressure = args
+                touched_channels.add(channel_num)
+                return OB1_Set_Press(ob1, c_int32(channel_num), c_double(pressure)), None
+            if command == 'get_data':
+                channel_num, read_sensor = args
+                reg = c_double()
+                sen = c_double()
+                error = OB1_Get_Data(ob1, c_int32(channel_num), byref(reg), byref(sen) if read_sensor else None)
+                return error, (reg.value, sen.value if read_sensor else None)
+            if command == 'set_flow':
+                channel_num, flow = args
+                touched_channels.add(channel_num)
+                return OB1_Set_Sens(ob1, c_int32(channel_num), c_double(flow)), None
+            if command == 'pid_add':
+                channel_num, k_p, k_i, running = args
+                touched_channels.add(channel_num)
+                return PID_Add_Remote(ob1, c_int32(channel_num), ob1, c_int32(channel_num), k_p, k_i, running), None
+            if command == 'pid_run':
+                channel_num, running = args
+                touched_channels.add(channel_num)
+                return PID_Set_Running_Remote(ob1, c_int32(channel_num), c_int32(running)), None
+            if command == 'pid_params':
+                channel_num, k_p, k_i = args
+                touched_channels.add(channel_num)
+                return PID_Set_Params_Remote(ob1, c_int32(channel_num), 1, k_p, k_i), None
+            if command == 'set_valve':
+                position, rotation = args
+                return MUX_DRI_Set_Valve(self.mux_id.value, position, rotation), None
+            if command == 'get_valve':
+                valve = c_int32(-1)
+                error = MUX_DRI_Get_Valve(self.mux_id.value, byref(valve))
+                return error, valve.value
+            if command == 'home':
+                answer = (c_char * 40)()
+                error = MUX_DRI_Send_Command(self.mux_id.value, 0, answer, 40)
+                return error, answer.value.decode('ascii', errors='replace').strip()
+            if command == 'add_sensor':
+                channel_num, sensor_args = args
+                return OB1_Add_Sens(ob1, channel_num, *sensor_args), None
+            if command == 'calibrate':
+                (path,) = args
+                error = OB1_Calib(ob1)
+                if error == 0:
+                    error = OB1_Calib_Save(ob1, create_string_buffer(path.encode('ascii')))
+                if error == 0:
+                    self.calibration_path = path
+                return error, None
+            if command == 'load_calibration':
+                (path,) = args
+                error = OB1_Calib_Load(ob1, create_string_buffer(path.encode('ascii')))
+                if error == 0:
+                    self.calibration_path = path
+                return error, None
+            if command == 'vent_all':
+                errors = 0
+                for channel_num in range(1, N_OB1_CHANNELS + 1):
+                    PID_Set_Running_Remote(ob1, c_int32(channel_num), c_int32(0))
+                    errors += OB1_Set_Press(ob1, c_int32(channel_num), c_double(0)) != 0
+                return (0 if errors == 0 else -1), errors
+            if command == 'shutdown':
+                return 0, None
+        return -1, f"unknown command {command!r}"
+
+
+class InstrumentClient:
+    """
+    Client for a running InstrumentDaemon. Every method returns (error_code, payload) with the
+    SDK error code, so calling code can keep its `if error != 0` checks.
+
+    Args:
+        address: Daemon address (default: DAEMON_ADDRESS)
+        authkey: Connection key (default: daemon_authkey())
+        timeout_s: Give up connecting after this many seconds (default: 2.0)
+    """
+
+    def __init__(self, address=DAEMON_ADDRESS, authkey=None, timeout_s=2.0):
+        authkey = authkey or daemon_authkey()
+        deadline = time.time() + timeout_s
+        while True:
+            try:
+                self._conn = Client(address, authkey=authkey)
+                break
+            except ConnectionRefusedError:
+                if time.time() > deadline:
+                    raise ConnectionRefusedError(f"No instrument daemon at {address[0]}:{address[1]}")
+                time.sleep(0.05)
+        self._lock = threading.Lock()
+
+    def _call(self, command, *args):
+        with self._lock:
+            self._conn.send((command,) + args)
+            return self._conn.recv()
+
+    def ping(self):
+        return self._call('ping')
+
+    def status(self):
+        return self._call('status')
+
+    def set_pressure(self, channel_num, pressure_mbar):
+        return self._call('set_pressure', int(channel_num), float(pressure_mbar))
+
+    def get_data(self, channel_num, read_sensor=True):
+        """Returns (error, (pressure_mbar, flow_ul_min)); flow is None when read_sensor is False."""
+        return self._call('get_data', int(channel_num), bool(read_sensor))
+
+    def set_flow(self, channel_num, flow_ul_min):
+        return self._call('set_flow', int(channel_num), float(flow_ul_min))
+
+    def pid_add(self, channel_num, k_p, k_i, running=1):
+        return self._call('pid_add', int(channel_num), float(k_p), float(k_i), int(running))
+
+    def pid_run(self, channel_num, running):
+        return self._call('pid_run', int(channel_num), int(running))
+
+    def pid_params(self, channel_num, k_p, k_i):
+        return self._call('pid_params', int(channel_num), float(k_p), float(k_i))
+
+    def set_valve(self, position, rotation=0):
+        return self._call('set_valve', int(position), int(rotation))
+
+    def get_valve(self):
+        return self._call('get_valve')
+
+    def home(self):
+        return self._call('home')
+
+    def add_sensor(self, channel_num, sensor_args):
+        """Register an MFS: sensor_args are OB1_Add_Sens' (type, digital, calibration, resolution, voltage)."""
+        return self._call('add_sensor', int(channel_num), tuple(int(a) for a in sensor_args))
+
+    def calibrate(self, path):
+        """Run a new OB1 calibration (takes minutes, other clients wait) and save it to path."""
+        return self._call('calibrate', str(path))
+
+    def load_calibration(self, path):
+        return self._call('load_calibration', str(path))
+
+    def vent_all(self):
+        return self._call('vent_all')
+
+    def shutdown_daemon(self):
+        return self._call('shutdown')
+
+    def close(self, keep_state=False):
+        """
+        Detach from the daemon. Channels this client set are vented unless keep_state is True.
+        """
+        try:
+            self._call('detach', bool(keep_state))
+        except (EOFError, OSError):
+            pass
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    """
+    Start the instrument daemon:
+    1. Initialize OB1 + MUX DRI, add sensor, load calibration, home MUX (once)
+    2. Serve client commands until Ctrl+C or a 'shutdown' command
+    3. Vent all channels and release the instruments
+    """
+    daemon = InstrumentDaemon(
+        ob1_name=device_name(REFILL_OB1),
+        mux_name=device_name(DISTRIBUTION_MUX),
+        calibration_path=calibration_file(REFILL_OB1),
+    )
+    if not daemon.bring_up():
+        daemon.tear_down()
+        return
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        print("\nDaemon stopped by user")
+    finally:
+        daemon.stop()
+        daemon.tear_down()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+import os
+import sys
+import csv
+import json
+import tempfile
+import subprocess
+from datetime import datetime
+
+
+# Rendered figures: 12 x 8 in at PLOT_DPI (300 dpi took seconds per long run and gained nothing on screen)
+FIG_SIZE = (12, 8)
+PLOT_DPI = 150
+
+# Keys of a results dictionary that plotting needs (the rest stays in the parent process)
+PLOT_KEYS = ('channel', 'samples', 'duration', 'time_log', 'pressure_log', 'flow_log',
+             'avg_pressure', 'min_pressure', 'max_pressure', 'pressure_stability',
+             'avg_flow', 'min_flow', 'max_flow', 'flow_stability')
+
+# Renders started by plot_in_background that have not been waited for
+_workers = []
+
+
+def load_log_csv(filename):
+    """
+    Read a logging CSV (Time_s, Pressure_mbar, Flow_ul_min) back into a results dictionary.
+
+    Works for files written by save_continuous_logging_data and by "python SDK_scripts log".
+
+    Args:
+        filename: CSV file
+
+    Returns:
+        dict: Same keys as stop_continuous_logging results (channel is taken from the
+              continuous_logging_<channel>_... file name when possible)
+    """
+    time_log, pressure_log, flow_log = [], [], []
+    with open(filename, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            time_log.append(float(row['Time_s']))
+            pressure_log.append(float(row['Pressure_mbar']))
+            flow_log.append(float(row['Flow_ul_min']))
+
+    channel = "?"
+    parts = filename.replace("\\", "/").rsplit("/", 1)[-1].split("_")
+    if len(parts) > 2 and parts[0] == "continuous" and parts[2].isdigit():
+        channel = int(parts[2])
+    return summarize(time_log, pressure_log, flow_log, channel)
+
+
+def summarize(time_log, pressure_log, flow_log, channel):
+    """Statistics over a logged run, in the layout plot_channel_data expects."""
+    n = len(pressure_log)
+    results = {
+        'channel': channel,
+        'samples': n,
+        'duration': time_log[-1] - time_log[0] if n > 1 else 0.0,
+        'time_log': time_log,
+        'pressure_log': pressure_log,
+        'flow_log': flow_log,
+    }
+    for name, log in (('pressure', pressure_log), ('flow', flow_log)):
+        log = [x for x in log if x == x]  # NaN = not read (see read_mask.py)
+        m = len(log)
+        avg = sum(log) / m if m else 0.0
+        std = (sum((x - avg) ** 2 for x in log) / m) ** 0.5 if m else 0.0
+        results[f'avg_{name}'] = avg
+        results[f'min_{name}'] = min(log) if m else 0.0
+        results[f'max_{name}'] = max(log) if m else 0.0
+        results[f'{name}_stability'] = (std / avg) * 100 if avg > 0 else 0
+    return results
+
+
+def decimate(time_log, series, max_points):
+    """
+    Reduce samples to what the plot can show without losing spikes.
+
+    The time axis is cut into max_points // 2 buckets; in each bucket the samples holding the
+    minimum and maximum of every series are kept, so a one-sample pressure spike still shows.
+
+    Args:
+        time_log: Sample times
+        series: List of value lists aligned with time_log
+        max_points: Roughly the plot width in pixels
+
+    Returns:
+        tuple: (time_log, [decimated series...])
+    """
+    n = len(time_log)
+    buckets = max(1, max_points // 2)
+    if n <= 2 * buckets:
+        return time_log, series
+    keep = []
+    for b in range(buckets):
+        lo = b * n // buckets
+        hi = (b + 1) * n // buckets
+        if hi <= lo:
+            continue
+        idx = set()
+        for values in series:
+            chunk = values[lo:hi]
+            idx.add(lo + chunk.index(min(chunk)))
+            idx.add(lo + chunk.index(max(chunk)))
+        keep.extend(sorted(idx))
+    return [time_log[i] for i in keep], [[values[i] for i in keep] for values in series]
+
+
+def _draw(plt, results, dpi):
+    time_seconds, (pressure, flow) = decimate(results['time_log'],
+                                              [results['pressure_log'], results['flow_log']],
+                                              int(FIG_SIZE[0] * dpi))
+
+    plt.style.use('default')
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=FIG_SIZE)
+    fig.suptitle(f'Channel {results["channel"]} - Pressure and Flow Rate Monitoring',
+                 fontsize=16, fontweight='bold')
+
+    # Plot 1: Pressure
+    ax1.plot(time_seconds, pressure, 'b-', linewidth=2, label='Pressure')
+    ax1.axhline(y=results['avg_pressure'], color='r', linestyle='--', alpha=0.7,
+                label=f'Average: {results["avg_pressure"]:.1f} mbar')
+    ax1.fill_between(time_seconds, pressure, alpha=0.3, color='blue')
+    ax1.set_ylabel('Pressure (mbar)', fontsize=12, fontweight='bold')
+    ax1.set_title('Pressure vs Time', fontsize=14, fontweight='bold')
+    ax1.grid(True, alpha=0.3)
+    ax1.legend()
+
+    pressure_text = f'Range: {results["min_pressure"]:.1f} - {results["max_pressure"]:.1f} mbar\n'
+    pressure_text += f'Stability: {results["pressure_stability"]:.2f}% CV'
+    ax1.text(0.02, 0.98, pressure_text, transform=ax1.transAxes,
+             verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+
+    # Plot 2: Flow Rate
+    ax2.plot(time_seconds, flow, 'g-', linewidth=2, label='Flow Rate')
+    ax2.axhline(y=results['avg_flow'], color='r', linestyle='--', alpha=0.7,
+                label=f'Average: {results["avg_flow"]:.1f} µL/min')
+    ax2.fill_between(time_seconds, flow, alpha=0.3, color='green')
+    ax2.set_xlabel('Time (seconds)', fontsize=12, fontweight='bold')
+    ax2.set_ylabel('Flow Rate (µL/min)', fontsize=12, fontweight='bold')
+    ax2.set_title('Flow Rate vs Time', fontsize=14, fontweight='bold')
+    ax2.grid(True, alpha=0.3)
+    ax2.legend()
+
+    flow_text = f'Range: {results["min_flow"]:.1f} - {results["max_flow"]:.1f} µL/min\n'
+    flow_text += f'Stability: {results["flow_stability"]:.2f}% CV'
+    ax2.text(0.02, 0.98, flow_text, transform=ax2.transAxes,
+             verticalalignment='top', bbox=dict(boxstyle='round', facecolor='lightgreen', alpha=0.8))
+
+    stats_text = f'Duration: {results["duration"]:.1f} seconds\n'
+    stats_text += f'Samples: {results["samples"]}\n'
+    stats_text += f'Channel: {results["channel"]}'
+    fig.text(0.98, 0.02, stats_text, transform=fig.transFigure,
+             verticalalignment='bottom', horizontalalignment='right',
+             bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8))
+
+    plt.tight_layout()
+    return fig
+
+
+def _default_filename(results):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"channel_plot_{results['channel']}_{timestamp}.png"
+
+
+def render_plot(results, filename, dpi=PLOT_DPI):
+    """
+    Render results to a PNG on the Agg backend (never opens a window).
+
+    Returns:
+        str: filename
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig = _draw(plt, results, dpi)
+    fig.savefig(filename, dpi=dpi)
+    plt.close(fig)
+    return filename
+
+
+def plot_channel_data(results, save_plot=True, show_plot=True, filename=None, dpi=PLOT_DPI):
+    """
+    Create plots for pressure and flow rate data in this process.
+
+    With show_plot this blocks until the window is closed; experiment scripts should use
+    plot_in_background instead so nothing waits on a plot window.
+
+    Args:
+        results: Results dictionary from stop_continuous_logging / load_log_csv
+        save_plot: Save plot to file (default: True)
+        show_plot: Display plot (default: True)
+        filename: Output filename (optional, will generate timestamped name if not provided)
+        dpi: Output resolution (default: PLOT_DPI)
+
+    Returns:
+        str: Filename of the saved plot
+    """
+    if not results or not results.get('time_log'):
+        print("No data to plot")
+        return ""
+
+    if not show_plot:
+        filename = filename or _default_filename(results)
+        if save_plot:
+            render_plot(results, filename, dpi)
+            print(f"Plot saved to: {filename}")
+        return filename
+
+    import matplotlib.pyplot as plt
+
+    fig = _draw(plt, results, dpi)
+    if save_plot:
+        filename = filename or _default_filename(results)
+        fig.savefig(filename, dpi=dpi)
+        print(f"Plot saved to: {filename}")
+    plt.show()
+    return filename
+
+
+def _start_worker(source, filename, dpi):
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), source, filename, str(dpi)])
+
+
+def plot_in_background(results, filename=None, dpi=PLOT_DPI):
+    """
+    Render the final plot in a separate process and return at once.
+
+    The data is handed over in a temporary JSON file and rendered by "python plotting.py" on
+    the Agg backend, so cleanup, venting and the program exit never wait for matplotlib. The
+    child keeps running (and prints "Plot saved to") after the experiment has exited.
+
+    Args:
+        results: Results dictionary from stop_continuous_logging
+        filename: Output PNG (optional, will generate timestamped name if not provided)
+        dpi: Output resolution (default: PLOT_DPI)
+
+    Returns:
+        str: Filename the plot will be written to ("" if there is no data)
+    """
+    if not results or not results.get('time_log'):
+        print("No data to plot")
+        return ""
+    filename = os.path.abspath(filename or _default_filename(results))
+    fd, payload = tempfile.mkstemp(prefix="plot_", suffix=".json")
+    with os.fdopen(fd, 'w') as f:
+        json.dump({key: results.get(key) for key in PLOT_KEYS}, f)
+    _workers.append(_start_worker(payload, filename, dpi))
+    print(f"Rendering plot in the background: {filename}")
+    return filename
+
+
+def wait_for_plots(timeout=None):
+    """Wait for background renders (e.g. at the end of a batch). Returns the number that failed."""
+    failed = 0
+    while _workers:
+        proc = _workers.pop()
+        try:
+            failed += proc.wait(timeout=timeout) != 0
+        except subprocess.TimeoutExpired:
+            failed += 1
+    return failed
+
+
+def render_batch(sources, out_dir=None, jobs=None, dpi=PLOT_DPI, verbose=True):
+    """
+    Render plots for many logging CSVs in parallel, one worker process per file.
+
+    Args:
+        sources: CSV files
+        out_dir: Folder for the PNGs (default: next to each CSV)
+        jobs: Renders at a time (default: number of CPUs)
+        dpi: Output resolution (default: PLOT_DPI)
+
+    Returns:
+        list: (csv, png, ok) per source
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def render(source):
+        png = os.path.splitext(source)[0] + ".png"
+        if out_dir:
+            png = os.path.join(out_dir, os.path.basename(png))
+        ok = _start_worker(source, png, dpi).wait() == 0
+        return source, png, ok
+
+    jobs = jobs or os.cpu_count() or 1
+    if verbose:
+        print(f"\n=== RENDERING {len(sources)} PLOTS ({jobs} at a time) ===")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(render, sources))
+    if verbose:
+        failed = [source for source, _, ok in results if not ok]
+        print(f"✓ {len(results) - len(failed)} plots rendered" + (f", ✗ {len(failed)} failed" if failed else ""))
+        print("=" * 30)
+    return results
+
+
+def main():
+    """
+    Worker entry: python plotting.py <results.json | log.csv> <output.png> [dpi]
+
+    A .json source is a temporary file from plot_in_background and is deleted once read.
+    """
+    source, filename = sys.argv[1], sys.argv[2]
+    dpi = int(sys.argv[3]) if len(sys.argv) > 3 else PLOT_DPI
+    if source.endswith(".json"):
+        with open(source, 'r') as f:
+            results = json.load(f)
+        os.remove(source)
+    else:
+        results = load_log_csv(source)
+    if not results.get('time_log'):
+        print(f"No data to plot in {source}")
+        return 1
+    render_plot(results, filename, dpi)
+    print(f"Plot saved to: {filename}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
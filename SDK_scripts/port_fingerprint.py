@@ -0,0 +1,273 @@
+import os
+import json
+import time
+from datetime import datetime
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from sdk_worker import sdk_call, PRIORITY_CONTROL
+from flow_model import FlowModel
+
+
+DEFAULT_FINGERPRINTS_PATH = "port_fingerprints.json"
+
+# Pressure sweep per port: each step is held STEP_S seconds; the last third of every step is
+# its steady state, the step response gives the dead time and time constant
+SWEEP_MBAR = (100.0, 200.0, 300.0, 400.0)
+STEP_S = 8.0
+# Wait after the MUX moves before the sweep starts
+SWITCH_SETTLE_S = 3.0
+# Steps whose flow changes less than this (µL/min) are too small to time
+MIN_STEP_FLOW = 10.0
+# Never compute a pressure above this for a port (the watchdog limit in the protocols is 950 mbar)
+MAX_PORT_PRESSURE_MBAR = 900.0
+
+
+class PortFingerprints:
+    """
+    Hydraulic fingerprint of every MUX port a channel feeds: the pressure->flow model of the
+    path (resistance) and how late and how slowly the flow follows a pressure step (dead time,
+    time constant).
+
+    measure() switches the MUX to each port and runs a short pressure sweep; protocols then
+    ask pressure_for_flow() for the pressure that gives their target flow on that port right
+    after a switch, instead of reusing one pressure for every port or waiting for a PID.
+
+        fingerprints = PortFingerprints()
+        fingerprints.load()
+        fingerprints.measure(instr_id, 1, [3, 4], mux_id=mux_id)
+        pressure = fingerprints.pressure_for_flow(1, 3, 200.0, default=300.0)
+
+    Args:
+        path: JSON file used by save()/load() (default: port_fingerprints.json)
+    """
+
+    def __init__(self, path=DEFAULT_FINGERPRINTS_PATH):
+        self.path = path
+        # "ch1_v3" -> {'model', 'resistance', 'dead_time_s', 'tau_s', 'points', 'date'}
+        self.entries = {}
+
+    @staticmethod
+    def _key(channel_num, port):
+        return f"ch{int(channel_num)}_v{int(port)}"
+
+    def get(self, channel_num, port):
+        return self.entries.get(self._key(channel_num, port))
+
+    def model(self, channel_num, port):
+        """FlowModel of a port's path, or None if it has not been fingerprinted."""
+        entry = self.get(channel_num, port)
+        return FlowModel.from_dict(entry['model']) if entry else None
+
+    def pressure_for_flow(self, channel_num, port, flow, default=None):
+        """
+        Pressure in mbar that gives flow (µL/min) on a port, capped at MAX_PORT_PRESSURE_MBAR.
+
+        Returns:
+            float: Pressure, or default if the port has no fingerprint
+        """
+        model = self.model(channel_num, port)
+        if model is None:
+            return default
+        return min(model.pressure_for_flow(flow), MAX_PORT_PRESSURE_MBAR)
+
+    def response_times(self, channel_num):
+        """
+        Returns:
+            dict: port -> dead time + time constant in seconds, for the ports of channel_num
+        """
+        prefix = f"ch{int(channel_num)}_v"
+        return {int(key[len(prefix):]): e['dead_time_s'] + e['tau_s'] for key, e in self.entries.items()
+                if key.startswith(prefix) and e.get('dead_time_s') is not None and e.get('tau_s') is not None}
+
+    def measure(self, instr_id, channel_num, ports, mux_id=None, pressures=SWEEP_MBAR, step_s=STEP_S,
+                sample_dt=0.05, switch_settle_s=SWITCH_SETTLE_S, flow_models=None, totalizer=None, sdk_thread=None,
+                zero_offsets=None, verbose=True):
+        """
+        Fingerprint ports with a pressure sweep each.
+
+        The channel starts and ends every sweep vented. The caller must make sure the ports
+        can take the sweep's flow (outlets open, enough liquid).
+
+        Args:
+            instr_id: OB1 instrument ID
+            channel_num: OB1 channel feeding the MUX
+            ports: MUX valve positions to fingerprint
+            mux_id: MUX DRI instrument ID (c_int32); None = the caller has set the port (one port only)
+            pressures: Sweep steps in mbar (default: SWEEP_MBAR)
+            step_s: Seconds per step (default: STEP_S)
+            sample_dt: Seconds between samples (default: 0.05)
+            switch_settle_s: Wait after a MUX move in seconds (default: SWITCH_SETTLE_S)
+            flow_models: Optional FlowModelBank the fitted path models are also stored in
+            totalizer: Optional FlowTotalizer the swept volume is counted in, per port
+            sdk_thread: Optional SDKCommandThread that owns the OB1
+            zero_offsets: Optional ZeroOffsets subtracted from every reading, so the fit matches
+                          the corrected ramp fits in the same FlowModelBank
+
+        Returns:
+            dict: port -> stored entry (ports that failed are missing)
+        """
+        if mux_id is None and len(ports) != 1:
+            raise ValueError("without mux_id only the port the MUX is already on can be fingerprinted")
+        if verbose:
+            print(f"\n=== FINGERPRINTING MUX PORTS ===")
+            print(f"Channel {channel_num}, ports {list(ports)}: steps {list(pressures)} mbar, {step_s}s each")
+            print("-" * 40)
+
+        channel = c_int32(channel_num)
+        measured = {}
+        for port in ports:
+            if mux_id is not None:
+                error = MUX_DRI_Set_Valve(mux_id.value, port, 0)
+                if error != 0:
+                    if verbose:
+                        print(f"✗ Port {port}: MUX switch failed ({error})")
+                    continue
+                time.sleep(switch_settle_s)
+            if totalizer is not None:
+                totalizer.set_port(channel_num, port)
+                totalizer.new_segment(channel_num)
+            try:
+                steps = self._sweep(instr_id, channel, pressures, step_s, sample_dt, sdk_thread, totalizer,
+                                    zero_offsets)
+            finally:
+                sdk_call(sdk_thread, PRIORITY_CONTROL, OB1_Set_Press, instr_id, channel, c_double(0.0))
+                if totalizer is not None:
+                    totalizer.new_segment(channel_num)
+            entry, steady_p, steady_f = self._evaluate(steps)
+            if entry is None:
+                if verbose:
+                    print(f"✗ Port {port}: no usable flow in the sweep (clogged, dry or no sensor?)")
+                continue
+            entry['date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.entries[self._key(channel_num, port)] = entry
+            measured[port] = entry
+            if flow_models is not None:
+                flow_models.fit(channel_num, port, steady_p, steady_f, verbose=False)
+            if verbose:
+                timing = (f"dead time {entry['dead_time_s']:.2f}s, tau {entry['tau_s']:.2f}s"
+                          if entry['dead_time_s'] is not None else "step response not timed")
+                print(f"✓ Port {port}: {entry['resistance']:.3f} mbar per µL/min "
+                      f"(p0 {entry['model']['p0']:.1f} mbar), {timing}")
+        if verbose:
+            print("=" * 40)
+        return measured
+
+    def _sweep(self, instr_id, channel, pressures, step_s, sample_dt, sdk_thread, totalizer=None, zero_offsets=None):
+        """Run the steps; returns a list of (t, pressure, flow) sample lists, one per step (the first is at 0 mbar)."""
+        steps = []
+        reg = c_double()
+        sen = c_double()
+        for target in (0.0,) + tuple(pressures):
+            samples = []
+            start = time.perf_counter()
+            error = sdk_call(sdk_thread, PRIORITY_CONTROL, OB1_Set_Press, instr_id, channel, c_double(target))
+            if error != 0:
+                break
+            while (time.perf_counter() - start) < step_s:
+                elapsed = time.perf_counter() - start
+                error = sdk_call(sdk_thread, PRIORITY_CONTROL, OB1_Get_Data, instr_id, channel, byref(reg), byref(sen))
+                if error == 0:
+                    pressure, flow = reg.value, sen.value
+                    if zero_offsets is not None:
+                        pressure, flow = zero_offsets.correct(channel.value, pressure, flow)
+                    samples.append((elapsed, pressure, flow))
+                    if totalizer is not None:
+                        totalizer.add_sample(channel.value, time.time(), flow)
+                time.sleep(sample_dt)
+            steps.append(samples)
+        return steps
+
+    @staticmethod
+    def _evaluate(steps):
+        """Returns (entry or None, steady pressures, steady flows)."""
+        steady_p, steady_f, dead_times, taus = [], [], [], []
+        previous_flow = None
+        for samples in steps:
+            if len(samples) < 6:
+                return None, steady_p, steady_f
+            tail = samples[-max(3, len(samples) // 3):]
+            flow_ss = sum(s[2] for s in tail) / len(tail)
+            steady_p.extend(s[1] for s in tail)
+            steady_f.extend(s[2] for s in tail)
+            if previous_flow is not None and abs(flow_ss - previous_flow) >= MIN_STEP_FLOW:
+                timing = _step_timing(samples, previous_flow, flow_ss)
+                if timing is not None:
+                    dead_times.append(timing[0])
+                    taus.append(timing[1])
+            previous_flow = flow_ss
+
+        model = FlowModel()
+        if not model.fit(steady_p, steady_f):
+            return None, steady_p, steady_f
+        entry = {
+            'model': model.to_dict(),
+            'resistance': model.R,
+            'dead_time_s': _median(dead_times),
+            'tau_s': _median(taus),
+            'points': len(steady_f),
+        }
+        return entry, steady_p, steady_f
+
+    def print_summary(self):
+        print(f"\n=== PORT FINGERPRINTS ===")
+        print(f"{'Path':<8} {'R mbar/(µL/min)':>16} {'p0 mbar':>8} {'dead s':>7} {'tau s':>6}  Date")
+        print("-" * 65)
+        for key in sorted(self.entries):
+            e = self.entries[key]
+            dead = f"{e['dead_time_s']:.2f}" if e.get('dead_time_s') is not None else "-"
+            tau = f"{e['tau_s']:.2f}" if e.get('tau_s') is not None else "-"
+            print(f"{key:<8} {e['resistance']:>16.3f} {e['model']['p0']:>8.1f} {dead:>7} {tau:>6}  {e['date']}")
+        print("=" * 65)
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        return path
+
+    def load(self, path=None):
+        """
+        Returns:
+            bool: True if a fingerprint file was loaded
+        """
+        path = path or self.path
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            self.entries = json.load(f)
+        return True
+
+
+def _step_timing(samples, flow_from, flow_to):
+    """
+    Dead time and time constant of one step, fitting a first order plus dead time response
+    through the 10 % and 63 % crossings. Returns None if the flow never gets there.
+    """
+    change = flow_to - flow_from
+    t10 = t63 = None
+    for t, _, flow in samples:
+        progress = (flow - flow_from) / change
+        if t10 is None and progress >= 0.10:
+            t10 = t
+        if progress >= 0.632:
+            t63 = t
+            break
+    if t10 is None or t63 is None:
+        return None
+    # FOPDT: t10 = dead + 0.105 tau, t63 = dead + tau
+    tau = max((t63 - t10) / 0.895, 0.0)
+    return max(t10 - 0.105 * tau, 0.0), tau
+
+
+def _median(values):
+    if not values:
+        return None
+    values = sorted(values)
+    mid = len(values) // 2
+    return values[mid] if len(values) % 2 else 0.5 * (values[mid - 1] + values[mid])
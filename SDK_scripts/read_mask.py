@@ -0,0 +1,159 @@
+import sys
+import time
+from contextlib import contextmanager
+
+from ctypes import *
+
+
+# What OB1_Get_Data should read on a channel; the SDK skips an output passed as None
+READ_REGULATOR = 1   # regulator pressure only
+READ_SENSOR = 2      # flow sensor only (MFS I2C read)
+READ_BOTH = READ_REGULATOR | READ_SENSOR
+
+MASK_NAMES = {READ_REGULATOR: "regulator", READ_SENSOR: "sensor", READ_BOTH: "both"}
+
+
+class ReadMasks:
+    """
+    Which half of OB1_Get_Data each channel needs, per protocol phase.
+
+    A mask is looked up as (channel, phase) -> (channel, any phase) -> (any channel, phase)
+    -> default. Channels that have no flow sensor never get READ_SENSOR, whatever was set, so
+    they never pay for an I2C read that can only return 0.
+
+        masks = ReadMasks(sensor_channels=[1])
+        masks.set(READ_REGULATOR, phase="ramp")
+        with masks.phase("ramp"):
+            ...   # logger reads the regulator only on every channel
+
+    Args:
+        sensor_channels: Channels with an MFS (default: None = assume every channel has one)
+        default: Mask when nothing more specific is set (default: READ_BOTH)
+    """
+
+    def __init__(self, sensor_channels=None, default=READ_BOTH):
+        self.sensor_channels = None if sensor_channels is None else {int(ch) for ch in sensor_channels}
+        self.default = default
+        self.current_phase = None
+        self._masks = {}   # (channel or None, phase or None) -> mask
+
+    @classmethod
+    def from_registry(cls, role, default=READ_BOTH):
+        """Masks for the OB1 in a device_registry role; its configured "sensors" are the MFS channels."""
+        from device_registry import device_info
+        return cls(sensor_channels=device_info(role).get('sensors', {}).keys(), default=default)
+
+    def has_sensor(self, channel_num):
+        return self.sensor_channels is None or channel_num in self.sensor_channels
+
+    def set(self, mask, channel=None, phase=None):
+        """Set the mask for one channel and/or one phase (None = all)."""
+        if mask not in MASK_NAMES:
+            raise ValueError(f"Unknown read mask: {mask}")
+        self._masks[(channel, phase)] = mask
+
+    def set_phase(self, phase):
+        """Switch the protocol phase masks are looked up in (None = no phase). Returns the previous phase."""
+        previous, self.current_phase = self.current_phase, phase
+        return previous
+
+    @contextmanager
+    def phase(self, phase):
+        previous = self.set_phase(phase)
+        try:
+            yield self
+        finally:
+            self.set_phase(previous)
+
+    def get(self, channel_num, phase=None):
+        """
+        Mask to read channel_num with.
+
+        Args:
+            channel_num: OB1 channel number
+            phase: Phase to look up (default: None = the current phase)
+
+        Returns:
+            int: READ_REGULATOR, READ_SENSOR or READ_BOTH
+        """
+        phase = self.current_phase if phase is None else phase
+        for key in ((channel_num, phase), (channel_num, None), (None, phase)):
+            if key in self._masks:
+                mask = self._masks[key]
+                break
+        else:
+            mask = self.default
+        return self.restrict(channel_num, mask)
+
+    def restrict(self, channel_num, mask):
+        """Drop READ_SENSOR on channels without a sensor (READ_SENSOR alone becomes READ_REGULATOR)."""
+        if not self.has_sensor(channel_num):
+            return READ_REGULATOR
+        return mask
+
+
+def data_args(mask, reg, sen):
+    """OB1_Get_Data output arguments for mask: byref() for what is read, None for what is skipped."""
+    return (byref(reg) if mask & READ_REGULATOR else None,
+            byref(sen) if mask & READ_SENSOR else None)
+
+
+def benchmark(samples=200, reg_read_s=0.002, sensor_read_s=0.008, verbose=True):
+    """
+    Time OB1_Get_Data per mask on the simulated SDK.
+
+    The simulator charges reg_read_s for the regulator and sensor_read_s for the MFS read, so
+    the numbers show what each mask saves per call and per logging second; set them to what
+    the bench measures (defaults are typical USB / 16-bit I2C round trips).
+
+    Args:
+        samples: Calls per mask
+        reg_read_s: Simulated regulator read time in seconds
+        sensor_read_s: Simulated sensor read time in seconds
+        verbose: Print the table
+
+    Returns:
+        dict: mask name -> {'ms_per_read', 'reads_per_s', 'saving_pct'} (saving vs READ_BOTH)
+    """
+    import fake_elveflow
+
+    sdk = fake_elveflow.FakeElveflow(reg_read_s=reg_read_s, sensor_read_s=sensor_read_s)
+    instr_id = c_int32(-1)
+    sdk.OB1_Initialization(b"OB1", 0, 0, 0, 0, byref(instr_id))
+    sdk.OB1_Add_Sens(instr_id, c_int32(1), 5, 1, 1, 7, 0)
+    channel = c_int32(1)
+    reg = c_double()
+    sen = c_double()
+
+    timings = {}
+    for mask in (READ_BOTH, READ_REGULATOR, READ_SENSOR):
+        reg_arg, sen_arg = data_args(mask, reg, sen)
+        start = time.perf_counter()
+        for _ in range(samples):
+            sdk.OB1_Get_Data(instr_id, channel, reg_arg, sen_arg)
+        timings[mask] = (time.perf_counter() - start) / samples
+
+    results = {}
+    for mask, seconds in timings.items():
+        results[MASK_NAMES[mask]] = {
+            'ms_per_read': seconds * 1000,
+            'reads_per_s': 1.0 / seconds if seconds > 0 else float('inf'),
+            'saving_pct': (1 - seconds / timings[READ_BOTH]) * 100 if timings[READ_BOTH] > 0 else 0.0,
+        }
+
+    if verbose:
+        print(f"\n=== OB1_Get_Data READ MASK BENCHMARK (simulated SDK) ===")
+        print(f"Regulator read: {reg_read_s * 1000:.1f} ms, sensor read: {sensor_read_s * 1000:.1f} ms, "
+              f"{samples} calls per mask")
+        print(f"{'Mask':<12} {'ms/read':>9} {'reads/s':>9} {'saving':>8}")
+        print("-" * 42)
+        for name, r in results.items():
+            print(f"{name:<12} {r['ms_per_read']:>9.2f} {r['reads_per_s']:>9.0f} {r['saving_pct']:>7.0f}%")
+        print("=" * 42)
+    return results
+
+
+if __name__ == "__main__":
+    # python read_mask.py [regulator ms] [sensor ms]
+    args = [float(a) / 1000 for a in sys.argv[1:3]]
+    benchmark(*([200] + args))
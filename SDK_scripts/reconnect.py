@@ -0,0 +1,360 @@
+import sys
+import time
+import threading
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from sdk_worker import sdk_call, PRIORITY_SAFETY
+from retry import CircuitBreaker
+from event_log import RECONNECT
+
+
+OB1 = "OB1"
+MUX = "MUX"
+
+# MUX DRI homing takes a few seconds; home_MUX_DRI waits the same
+MUX_HOME_WAIT_S = 5.0
+MUX_SETTLE_S = 3.0
+
+
+def _value(x):
+    return x.value if hasattr(x, 'value') else x
+
+
+class InstrumentSession:
+    """
+    Everything that was done to the OB1 / MUX DRI since they were opened, and the logic to redo
+    it after a USB drop.
+
+    When a device falls off the bus its instrument ID is dead for good. reconnect() destroys the
+    old handle, re-initializes the device until it answers (or reconnect_timeout_s runs out),
+    writes the new ID into the same c_int32 the scripts already hold, and replays the session:
+    - OB1: sensors (OB1_Add_Sens), last loaded calibration, pressure setpoints, remote PID
+      (gains, flow target, running state)
+    - MUX DRI: re-verifies the valve position and re-homes + moves back to the last valve if
+      the position is lost
+    The outage is kept in gaps (and in the event log, if given).
+
+    The session learns the state through record(fn, *args), called after each successful SDK
+    call (parallelRefillSampleDebug does this in _sdk_call). Pass the c_int32 instrument IDs
+    themselves to SDK calls, not .value, so calls made after a reconnect use the new ID.
+
+    With start(), a supervisor thread reconnects a device as soon as its circuit breaker in
+    error_policy opens or recover() asks for it; control code calls recover() on a transient
+    error and continues once it returns True.
+
+    Args:
+        ob1_name: Name given to OB1_Initialization
+        ob1_id: c_int32 holding the OB1 ID (updated in place)
+        mux_name: Name given to MUX_DRI_Initialization (default: None = no MUX)
+        mux_id: c_int32 holding the MUX DRI ID (updated in place)
+        sdk_thread: Optional SDKCommandThread owning the OB1; reconnect calls run on it at safety priority
+        error_policy: Optional SDKErrorPolicy whose breakers trigger reconnects ("OB1" / "MUX")
+        event_log: Optional EventLog for reconnect events
+        heartbeat: Optional callable run while waiting (e.g. SafetyWatchdog.heartbeat)
+        should_restore: Optional callable; if it returns False (watchdog tripped, shutting down)
+                        setpoints and PID are not restored and the channels stay vented
+        on_reconnect: Optional list of callables(device, new_id) run after a successful reconnect
+        reconnect_timeout_s: Give up re-initializing after this long (default: 60.0)
+        retry_period_s: Time between Initialization attempts (default: 1.0)
+        verbose: Print reconnect progress
+    """
+
+    def __init__(self, ob1_name, ob1_id, mux_name=None, mux_id=None, sdk_thread=None, error_policy=None,
+                 event_log=None, heartbeat=None, should_restore=None, on_reconnect=None,
+                 reconnect_timeout_s=60.0, retry_period_s=1.0, verbose=True):
+        self.names = {OB1: ob1_name, MUX: mux_name}
+        self.ids = {OB1: ob1_id, MUX: mux_id}
+        self.sdk_thread = sdk_thread
+        self.error_policy = error_policy
+        self.event_log = event_log
+        self.heartbeat = heartbeat
+        self.should_restore = should_restore
+        self.on_reconnect = list(on_reconnect or [])
+        self.reconnect_timeout_s = reconnect_timeout_s
+        self.retry_period_s = retry_period_s
+        self.verbose = verbose
+
+        # replayed state
+        self.sensors = {}          # channel -> OB1_Add_Sens arguments after the channel
+        self.calibration = None    # bytes path of the last OB1_Calib_Load
+        self.pressure = {}         # channel -> last OB1_Set_Press value
+        self.flow_target = {}      # channel -> last OB1_Set_Sens value
+        self.pid = {}              # channel -> {'sensor_channel', 'k_p', 'k_i', 'running'}
+        self.valve = None
+        self.rotation = 0
+
+        self.gaps = []
+        self._generation = {OB1: 0, MUX: 0}
+        self._last_ok = {OB1: True, MUX: True}
+        self._requested = set()
+        self._reconnecting = set()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ----- state recording -----
+
+    def record(self, fn, *args):
+        """Remember the effect of a successful SDK call (unknown functions are ignored)."""
+        name = getattr(fn, '__name__', '')
+        values = [_value(a) for a in args]
+        if name == 'OB1_Add_Sens':
+            self.sensors[values[1]] = tuple(values[2:])
+        elif name == 'OB1_Calib_Load':
+            self.calibration = values[1]
+        elif name == 'OB1_Set_Press':
+            self.pressure[values[1]] = values[2]
+        elif name == 'OB1_Set_Sens':
+            self.flow_target[values[1]] = values[2]
+        elif name == 'PID_Add_Remote':
+            self.pid[values[1]] = {'sensor_channel': values[3], 'k_p': values[4], 'k_i': values[5],
+                                   'running': bool(values[6])}
+        elif name == 'PID_Set_Running_Remote':
+            if values[1] in self.pid:
+                self.pid[values[1]]['running'] = bool(values[2])
+        elif name == 'PID_Set_Params_Remote':
+            if values[1] in self.pid:
+                self.pid[values[1]].update(k_p=values[3], k_i=values[4])
+        elif name == 'MUX_DRI_Set_Valve':
+            self.valve, self.rotation = values[1], values[2]
+
+    # ----- supervisor -----
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="reconnect-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Stop supervising; a reconnect in progress finishes its current step first."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def is_reconnecting(self, device=OB1):
+        return device in self._reconnecting
+
+    def recover(self, device=OB1, timeout_s=None):
+        """
+        Ask for device to be reconnected (joining a reconnect already in progress) and wait.
+
+        Returns:
+            bool: True if the device answers again (reconnected or was fine after all)
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self.reconnect(device)
+        timeout_s = self.reconnect_timeout_s + 30.0 if timeout_s is None else timeout_s
+        deadline = time.monotonic() + timeout_s
+        with self._cond:
+            generation = self._generation[device]
+            self._requested.add(device)
+            self._cond.notify_all()
+            while self._generation[device] == generation:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    return False
+                if self.heartbeat:
+                    self.heartbeat()
+                self._cond.wait(min(remaining, 1.0))
+            return self._last_ok[device]
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                if not self._requested:
+                    self._cond.wait(0.5)
+                requested = set(self._requested)
+            if self.error_policy is not None:
+                for device in (OB1, MUX):
+                    if self.names[device] and self.error_policy.breaker(device).state == CircuitBreaker.OPEN:
+                        requested.add(device)
+            for device in (OB1, MUX):
+                if device in requested and not self._stop.is_set():
+                    self.reconnect(device)
+
+    # ----- reconnect -----
+
+    def _call(self, fn, *args):
+        try:
+            if fn.__name__.startswith('MUX_DRI'):
+                return fn(*args)
+            return sdk_call(self.sdk_thread, PRIORITY_SAFETY, fn, *args)
+        except Exception as e:
+            if self.verbose:
+                print(f"{fn.__name__} raised {e!r}")
+            return -1
+
+    def _probe(self, device):
+        """True if the device answers on its current ID."""
+        if device == OB1:
+            reg = c_double()
+            return self._call(OB1_Get_Data, self.ids[OB1], c_int32(1), byref(reg), None) == 0
+        valve = c_int32(-1)
+        return self._call(MUX_DRI_Get_Valve, self.ids[MUX].value, byref(valve)) == 0
+
+    def _initialize(self, device, deadline):
+        new_id = c_int32(-1)
+        name = self.names[device].encode('ascii')
+        attempt = 0
+        while not self._stop.is_set():
+            attempt += 1
+            if device == OB1:
+                error = self._call(OB1_Initialization, name, 0, 0, 0, 0, byref(new_id))
+            else:
+                error = self._call(MUX_DRI_Initialization, name, byref(new_id))
+            if error == 0:
+                return new_id.value
+            if self.verbose and attempt == 1:
+                print(f"Waiting for {self.names[device]} to come back (Initialization error {error})...")
+            if time.monotonic() >= deadline:
+                break
+            if self.heartbeat:
+                self.heartbeat()
+            self._stop.wait(self.retry_period_s)
+        return None
+
+    def _restore_ob1(self):
+        """Replay sensors, calibration, setpoints and PID on the new OB1 ID. Returns the number of failed calls."""
+        instr_id = self.ids[OB1]
+        failed = 0
+        for ch, sensor_args in sorted(self.sensors.items()):
+            if self._call(OB1_Add_Sens, instr_id.value, ch, *sensor_args) != 0:
+                failed += 1
+        if self.calibration is not None:
+            if self._call(OB1_Calib_Load, instr_id.value, create_string_buffer(self.calibration)) != 0:
+                failed += 1
+        if self.should_restore is not None and not self.should_restore():
+            if self.verbose:
+                print("Outputs not restored (restore disabled); channels left vented")
+            return failed
+        for ch, pressure in sorted(self.pressure.items()):
+            if self._call(OB1_Set_Press, instr_id, c_int32(ch), c_double(pressure)) != 0:
+                failed += 1
+        for ch, p in sorted(self.pid.items()):
+            if self._call(PID_Add_Remote, instr_id, c_int32(ch), instr_id, c_int32(p['sensor_channel']),
+                          c_double(p['k_p']), c_double(p['k_i']), c_int32(0)) != 0:
+                failed += 1
+                continue
+            if ch in self.flow_target:
+                if self._call(OB1_Set_Sens, instr_id, c_int32(ch), c_double(self.flow_target[ch])) != 0:
+                    failed += 1
+            if p['running']:
+                if self._call(PID_Set_Running_Remote, instr_id, c_int32(ch), c_int32(1)) != 0:
+                    failed += 1
+        return failed
+
+    def _restore_mux(self):
+        """Check the valve position and re-home / move back if it was lost. Returns the number of failed calls."""
+        if self.valve is None:
+            return 0
+        mux_id = self.ids[MUX]
+        valve = c_int32(-1)
+        if self._call(MUX_DRI_Get_Valve, mux_id.value, byref(valve)) == 0 and valve.value == self.valve:
+            if self.verbose:
+                print(f"MUX still on valve {self.valve}, no homing needed")
+            return 0
+        if self.verbose:
+            print(f"MUX position lost (reads {valve.value}), homing and returning to valve {self.valve}")
+        answer = (c_char * 40)()
+        if self._call(MUX_DRI_Send_Command, mux_id.value, 0, answer, 40) != 0:
+            return 1
+        self._stop.wait(MUX_HOME_WAIT_S)
+        if self._call(MUX_DRI_Set_Valve, mux_id.value, self.valve, self.rotation) != 0:
+            return 1
+        self._stop.wait(MUX_SETTLE_S)
+        if self._call(MUX_DRI_Get_Valve, mux_id.value, byref(valve)) != 0 or valve.value != self.valve:
+            return 1
+        return 0
+
+    def reconnect(self, device=OB1):
+        """
+        Re-initialize device and restore its session state.
+
+        Returns:
+            bool: True if the device is back (or never went away)
+        """
+        with self._cond:
+            self._requested.discard(device)
+            if device in self._reconnecting:
+                return False
+            self._reconnecting.add(device)
+        ok = False
+        gap = None
+        try:
+            if self.names[device] is None:
+                return False
+            if self._probe(device):
+                # a transient error, not a dropped device
+                ok = True
+                return True
+
+            started = time.time()
+            old_id = self.ids[device].value
+            if self.verbose:
+                print(f"\n=== RECONNECTING {self.names[device]} ===")
+                print(f"Instrument ID {old_id} lost at {time.strftime('%H:%M:%S')}")
+                print("-" * 30)
+            self._call(OB1_Destructor if device == OB1 else MUX_DRI_Destructor, old_id)
+
+            new_id = self._initialize(device, time.monotonic() + self.reconnect_timeout_s)
+            if new_id is None:
+                if self.verbose:
+                    print(f"✗ {self.names[device]} did not come back within {self.reconnect_timeout_s:.0f}s")
+                gap = {'device': device, 'start': started, 'end': None, 'duration_s': time.time() - started,
+                       'restored': False}
+                return False
+            self.ids[device].value = new_id
+            if self.verbose:
+                print(f"✓ {self.names[device]} re-initialized (ID {old_id} -> {new_id})")
+
+            failed = self._restore_ob1() if device == OB1 else self._restore_mux()
+            if self.error_policy is not None:
+                self.error_policy.breaker(device).record_success()
+            for callback in self.on_reconnect:
+                try:
+                    callback(device, new_id)
+                except Exception as e:
+                    if self.verbose:
+                        print(f"on_reconnect callback raised {e!r}")
+
+            ended = time.time()
+            gap = {'device': device, 'start': started, 'end': ended, 'duration_s': ended - started,
+                   'restored': failed == 0}
+            ok = True
+            if self.verbose:
+                mark = "✓" if failed == 0 else "⚠"
+                print(f"{mark} {self.names[device]} session restored after {ended - started:.1f}s gap"
+                      f"{'' if failed == 0 else f' ({failed} restore calls failed)'}")
+                print("=" * 30)
+            return True
+        finally:
+            if gap is not None:
+                self.gaps.append(gap)
+                if self.event_log is not None:
+                    self.event_log.log(RECONNECT, device=device, gap_s=round(gap['duration_s'], 3),
+                                       restored=gap['restored'])
+            with self._cond:
+                self._reconnecting.discard(device)
+                self._last_ok[device] = ok
+                self._generation[device] += 1
+                self._cond.notify_all()
+
+    def print_summary(self):
+        if not self.gaps:
+            return
+        print("\n=== RECONNECTS ===")
+        for gap in self.gaps:
+            status = "restored" if gap['restored'] else ("partly restored" if gap['end'] else "not recovered")
+            print(f"{self.names[gap['device']]}: {time.strftime('%H:%M:%S', time.localtime(gap['start']))} "
+                  f"gap {gap['duration_s']:.1f}s - {status}")
+        print("=" * 30)
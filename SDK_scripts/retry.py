@@ -0,0 +1,234 @@
+import time
+import random
+import threading
+
+from error_codes import is_transient, error_message, QUEUE_TIMEOUT_ERROR, CIRCUIT_OPEN
+
+
+class RetryPolicy:
+    """
+    Bounded exponential backoff: delay_n = min(base_delay_s * 2**n, max_delay_s) ± jitter.
+
+    Args:
+        max_retries: Retries after the first attempt (default: 3)
+        base_delay_s: First retry delay in seconds (default: 0.05)
+        max_delay_s: Longest delay between attempts in seconds (default: 2.0)
+        jitter: Random ± fraction of the delay (default: 0.2)
+    """
+
+    def __init__(self, max_retries=3, base_delay_s=0.05, max_delay_s=2.0, jitter=0.2):
+        self.max_retries = max_retries
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        delay = min(self.base_delay_s * (2 ** attempt), self.max_delay_s)
+        return delay * (1.0 + random.uniform(-self.jitter, self.jitter))
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a device that keeps failing.
+
+    closed -> open after failure_threshold consecutive transient failures (calls are
+    short-circuited with CIRCUIT_OPEN); open -> half-open after reset_timeout_s (a single probe
+    call goes through, every other caller is short-circuited until it resolves); half-open ->
+    closed on success, back to open on failure. A probe that says nothing about the device
+    (queue timeout, exception) is released with cancel_probe() so the next caller can probe.
+
+    Args:
+        name: Device name for messages
+        failure_threshold: Consecutive failures that open the breaker (default: 5)
+        reset_timeout_s: Time before a trial call is allowed in seconds (default: 10.0)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout_s=10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+                return True
+            return self.state == self.CLOSED
+
+    def cancel_probe(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Returns True if this failure opened the breaker."""
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                return True
+            return False
+
+
+# Safety commands (force=True: watchdog reads, venting) get one short retry, so a check stays
+# bounded by about two call timeouts during a USB hiccup
+SAFETY_RETRY_POLICY = RetryPolicy(max_retries=1, base_delay_s=0.02, max_delay_s=0.02, jitter=0.0)
+
+
+class SDKErrorPolicy:
+    """
+    Central handling of SDK return codes, keyed by ErrorCode (error_codes.py).
+
+    call() runs an SDK function that returns an error code:
+    - 0: success, returned as is
+    - fatal code (configuration errors such as SENSOR_NOT_COMPATIBLE): returned at once, no retry
+    - transient code (NO_COMMUNICATION_WITH_OB1, remote loop not executed, VISA I/O errors):
+      retried with bounded exponential backoff; the final code is returned if all retries fail
+    - an exception from the call (a bug or a hung command thread, not a device answer) is
+      re-raised at once: no retry, and the breaker is left as it was
+
+    Each device has a CircuitBreaker. Once open, calls return CIRCUIT_OPEN immediately instead
+    of hammering an unplugged instrument; force=True (safety commands) always attempts the call,
+    under safety_retry_policy. A call that timed out in the SDK command queue
+    (QUEUE_TIMEOUT_ERROR) is not retried: the queue is busy, not the device.
+    Retries, failures and short-circuits are counted per operation.
+
+    Args:
+        retry_policy: RetryPolicy (default: RetryPolicy())
+        safety_retry_policy: RetryPolicy for force=True calls (default: SAFETY_RETRY_POLICY)
+        failure_threshold: See CircuitBreaker (default: 5)
+        reset_timeout_s: See CircuitBreaker (default: 10.0)
+        verbose: Print retries and breaker changes
+    """
+
+    def __init__(self, retry_policy=None, failure_threshold=5, reset_timeout_s=10.0, verbose=True,
+                 safety_retry_policy=SAFETY_RETRY_POLICY):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.safety_retry_policy = safety_retry_policy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.verbose = verbose
+        self.breakers = {}
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, device):
+        with self._lock:
+            if device not in self.breakers:
+                self.breakers[device] = CircuitBreaker(device, self.failure_threshold, self.reset_timeout_s)
+            return self.breakers[device]
+
+    def _count(self, op, key, n=1):
+        with self._lock:
+            s = self.stats.setdefault(op, {'calls': 0, 'retries': 0, 'recovered': 0, 'failed': 0,
+                                           'fatal': 0, 'short_circuited': 0})
+            s[key] += n
+
+    def call(self, fn, *args, device="OB1", op=None, force=False):
+        """
+        Run fn(*args) under the policy.
+
+        Args:
+            fn: Callable returning an SDK error code (0 = success)
+            device: Breaker key, e.g. "OB1" or "MUX" (default: "OB1")
+            op: Name for the stats (default: fn.__name__)
+            force: Ignore an open breaker and use safety_retry_policy (use for safety commands)
+
+        Returns:
+            int: 0, the last error code, or CIRCUIT_OPEN
+
+        Raises:
+            Exception: Whatever fn raised
+        """
+        op = op or getattr(fn, '__name__', 'sdk_call')
+        breaker = self.breaker(device)
+        self._count(op, 'calls')
+        if not force and not breaker.allow():
+            self._count(op, 'short_circuited')
+            return CIRCUIT_OPEN
+
+        policy = self.safety_retry_policy if force else self.retry_policy
+        attempt = 0
+        while True:
+            try:
+                code = fn(*args)
+            except Exception as e:
+                breaker.cancel_probe()
+                self._count(op, 'fatal')
+                if self.verbose:
+                    print(f"{op} raised {e!r}")
+                raise
+
+            if code == 0:
+                breaker.record_success()
+                if attempt:
+                    self._count(op, 'recovered')
+                return 0
+
+            if code == QUEUE_TIMEOUT_ERROR:
+                breaker.cancel_probe()
+                self._count(op, 'failed')
+                return code
+
+            if not is_transient(code):
+                # the device answered; it is the request that is wrong
+                breaker.record_success()
+                self._count(op, 'fatal')
+                if self.verbose:
+                    print(f"{op}: {error_message(code)} (code {code}, not retried)")
+                return code
+
+            if breaker.record_failure() and self.verbose:
+                print(f"⚠ {device} circuit breaker opened after {breaker.failures} failures "
+                      f"({error_message(code)}); retrying in {self.reset_timeout_s:.0f}s")
+            if attempt >= policy.max_retries or (breaker.state == CircuitBreaker.OPEN and not force):
+                self._count(op, 'failed')
+                return code
+
+            delay = policy.delay(attempt)
+            attempt += 1
+            self._count(op, 'retries')
+            if self.verbose:
+                print(f"{op}: {error_message(code)} (code {code}), retry {attempt}/{policy.max_retries} in {delay * 1000:.0f} ms")
+            time.sleep(delay)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'operations': {op: dict(s) for op, s in self.stats.items()},
+                'breakers': {name: {'state': b.state, 'times_opened': b.times_opened}
+                             for name, b in self.breakers.items()},
+            }
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print("\n=== SDK ERROR POLICY ===")
+        for op, s in stats['operations'].items():
+            if s['retries'] or s['failed'] or s['fatal'] or s['short_circuited']:
+                print(f"{op}: {s['calls']} calls, {s['retries']} retries, {s['recovered']} recovered, "
+                      f"{s['failed']} failed, {s['fatal']} fatal, {s['short_circuited']} short-circuited")
+        for name, b in stats['breakers'].items():
+            print(f"{name} breaker: {b['state']} (opened {b['times_opened']} times)")
+        print("=" * 30)
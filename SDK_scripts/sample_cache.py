@@ -0,0 +1,127 @@
+import sys
+import time
+import threading
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from sdk_worker import sdk_call, PRIORITY_CONTROL, PRIORITY_SAFETY
+from read_mask import READ_REGULATOR, READ_SENSOR, READ_BOTH, data_args
+
+
+class SampleCache:
+    """
+    Latest (pressure, flow) sample per OB1 channel, shared by every consumer.
+
+    read() returns the cached sample if it is younger than the caller's max_age_s and only
+    goes to the SDK when it is stale. Concurrent stale requests for the same channel share
+    one device read (the second caller waits for the first), so N consumers polling the same
+    channel cost about one read per freshness window instead of N.
+
+    Args:
+        instr_id: OB1 instrument ID
+        sdk_thread: Optional SDKCommandThread that owns the OB1
+        error_policy: Optional SDKErrorPolicy; device reads are retried / short-circuited by it
+        read_masks: Optional ReadMasks; channels without a flow sensor are never asked for flow
+        zero_offsets: Optional ZeroOffsets subtracted from every device read before it is cached
+    """
+
+    def __init__(self, instr_id, sdk_thread=None, error_policy=None, read_masks=None, zero_offsets=None):
+        self.instr_id = instr_id
+        self.sdk_thread = sdk_thread
+        self.error_policy = error_policy
+        self.read_masks = read_masks
+        self.zero_offsets = zero_offsets
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}        # channel -> (monotonic time, pressure or None, flow or None)
+        self._channel_locks = {}
+        self._lock = threading.Lock()
+
+    def _channel_lock(self, channel_num):
+        with self._lock:
+            lock = self._channel_locks.get(channel_num)
+            if lock is None:
+                lock = self._channel_locks[channel_num] = threading.Lock()
+            return lock
+
+    def _lookup(self, channel_num, max_age_s, mask):
+        entry = self._entries.get(channel_num)
+        if entry is None:
+            return None
+        stamp, pressure, flow = entry
+        age = time.monotonic() - stamp
+        if age > max_age_s or (mask & READ_REGULATOR and pressure is None) or (mask & READ_SENSOR and flow is None):
+            return None
+        return pressure, flow, age
+
+    def read(self, channel_num, max_age_s=0.1, read_sensor=True, priority=PRIORITY_CONTROL, timeout=None, mask=None):
+        """
+        Sample no older than max_age_s, reading the device only if needed.
+
+        Args:
+            channel_num: OB1 channel number
+            max_age_s: Oldest acceptable sample in seconds (0 forces a read)
+            read_sensor: Flow is needed, not just the regulator pressure
+            priority: SDK command thread priority for the read
+            timeout: See sdk_call (default: None = wait for the command thread)
+            mask: READ_REGULATOR / READ_SENSOR / READ_BOTH, overrides read_sensor (default: None)
+
+        Returns:
+            tuple: (success: bool, pressure_mbar: float or None, flow_ul_min: float or None, error_code: int,
+                    age_s: float); a value that was not read is None
+        """
+        if mask is None:
+            mask = READ_BOTH if read_sensor else READ_REGULATOR
+        if self.read_masks is not None:
+            mask = self.read_masks.restrict(channel_num, mask)
+        cached = self._lookup(channel_num, max_age_s, mask)
+        if cached:
+            self.hits += 1
+            return True, cached[0], cached[1], 0, cached[2]
+
+        with self._channel_lock(channel_num):
+            # another consumer may have refreshed it while we waited
+            cached = self._lookup(channel_num, max_age_s, mask)
+            if cached:
+                self.hits += 1
+                return True, cached[0], cached[1], 0, cached[2]
+
+            self.misses += 1
+            reg = c_double()
+            sen = c_double()
+            args = (self.sdk_thread, priority, OB1_Get_Data, self.instr_id, c_int32(channel_num),
+                    *data_args(mask, reg, sen))
+            if self.error_policy is not None:
+                error = self.error_policy.call(lambda: sdk_call(*args, timeout=timeout), op="OB1_Get_Data",
+                                               force=priority == PRIORITY_SAFETY)
+            else:
+                error = sdk_call(*args, timeout=timeout)
+            if error != 0:
+                return False, 0.0, None, error, 0.0
+            pressure = reg.value if mask & READ_REGULATOR else None
+            flow = sen.value if mask & READ_SENSOR else None
+            if self.zero_offsets is not None:
+                pressure, flow = self.zero_offsets.correct(channel_num, pressure, flow)
+            self._entries[channel_num] = (time.monotonic(), pressure, flow)
+            return True, pressure, flow, 0, 0.0
+
+    def put(self, channel_num, pressure, flow=None):
+        """Store a sample read elsewhere (already zero-corrected) so other consumers can reuse it."""
+        self._entries[channel_num] = (time.monotonic(), pressure, flow)
+
+    def invalidate(self, channel_num=None):
+        """Drop cached samples (e.g. right after a setpoint or valve change)."""
+        if channel_num is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(channel_num, None)
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'device_reads': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
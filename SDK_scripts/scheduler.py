@@ -0,0 +1,218 @@
+import time
+import heapq
+import threading
+
+
+class PeriodicTask:
+    """
+    A periodic callback registered with the DeadlineScheduler.
+
+    Args:
+        name: Unique task name
+        period_s: Period between runs in seconds
+        callback: Function called as callback(now) on every run
+        priority: Lower runs first when two tasks share a deadline (default: 0)
+    """
+
+    def __init__(self, name, period_s, callback, priority=0):
+        if period_s <= 0:
+            raise ValueError("period_s must be positive")
+        self.name = name
+        self.period_s = float(period_s)
+        self.callback = callback
+        self.priority = priority
+        self.next_deadline = 0.0
+        self.active = True
+
+        # statistics
+        self.runs = 0
+        self.overruns = 0
+        self.errors = 0
+        self.last_error = None
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.max_runtime = 0.0
+
+
+class DeadlineScheduler:
+    """
+    Run periodic tasks against absolute deadlines in one background thread.
+
+    Deadlines are computed from the previous deadline (not from the end of the
+    previous run), so loops do not drift the way `time.sleep(sample_dt)` loops do.
+    If a task overruns by one or more periods the missed cycles are skipped and
+    counted instead of being run back to back.
+
+    Args:
+        name: Thread name (default: "deadline-scheduler")
+        verbose: Print task errors as they happen
+    """
+
+    def __init__(self, name="deadline-scheduler", verbose=True):
+        self.name = name
+        self.verbose = verbose
+        self._tasks = {}
+        self._heap = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def add_task(self, name, period_s, callback, priority=0, start_delay=0.0):
+        """
+        Register a periodic task. Safe to call while the scheduler is running.
+
+        Args:
+            name: Unique task name
+            period_s: Period in seconds
+            callback: Function called as callback(now)
+            priority: Tie-break priority, lower runs first (default: 0)
+            start_delay: Delay before the first run in seconds (default: 0.0)
+
+        Returns:
+            PeriodicTask: The registered task
+        """
+        task = PeriodicTask(name, period_s, callback, priority)
+        task.next_deadline = time.perf_counter() + start_delay
+        with self._lock:
+            if name in self._tasks:
+                raise ValueError(f"Task '{name}' is already scheduled")
+            self._tasks[name] = task
+            self._push(task)
+        self._wakeup.set()
+        return task
+
+    def remove_task(self, name):
+        """
+        Remove a task. It will not run again once this returns.
+
+        Returns:
+            bool: True if a task was removed
+        """
+        with self._lock:
+            task = self._tasks.pop(name, None)
+            if task is None:
+                return False
+            task.active = False
+        self._wakeup.set()
+        return True
+
+    def start(self):
+        """Start the scheduler thread."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """
+        Stop the scheduler thread and wait for the current task to return.
+
+        Args:
+            timeout: Maximum time to wait for the thread in seconds
+
+        Returns:
+            bool: True if the thread has exited
+        """
+        self._running = False
+        self._wakeup.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        return not (self._thread and self._thread.is_alive())
+
+    def cancel_all(self):
+        """Remove every task without stopping the scheduler thread."""
+        with self._lock:
+            for task in self._tasks.values():
+                task.active = False
+            self._tasks.clear()
+            self._heap.clear()
+        self._wakeup.set()
+
+    def is_running(self):
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def get_stats(self):
+        """
+        Get per-task timing statistics.
+
+        Returns:
+            dict: task name -> statistics dict
+        """
+        with self._lock:
+            return {
+                name: {
+                    'period_s': task.period_s,
+                    'runs': task.runs,
+                    'overruns': task.overruns,
+                    'errors': task.errors,
+                    'last_error': task.last_error,
+                    'max_lateness_s': task.max_lateness,
+                    'avg_lateness_s': task.total_lateness / task.runs if task.runs else 0.0,
+                    'max_runtime_s': task.max_runtime,
+                }
+                for name, task in self._tasks.items()
+            }
+
+    def _push(self, task):
+        self._seq += 1
+        heapq.heappush(self._heap, (task.next_deadline, task.priority, self._seq, task))
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                # drop removed tasks lazily
+                while self._heap and not self._heap[0][3].active:
+                    heapq.heappop(self._heap)
+                entry = self._heap[0] if self._heap else None
+
+            if entry is None:
+                self._wakeup.wait(timeout=0.5)
+                self._wakeup.clear()
+                continue
+
+            deadline, _, _, task = entry
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                # woken early when tasks are added/removed or on stop()
+                if self._wakeup.wait(timeout=delay):
+                    self._wakeup.clear()
+                    continue
+
+            with self._lock:
+                if not self._heap or self._heap[0][3] is not task:
+                    continue
+                heapq.heappop(self._heap)
+                if not task.active:
+                    continue
+
+            start = time.perf_counter()
+            lateness = start - deadline
+            try:
+                task.callback(start)
+            except Exception as e:
+                task.errors += 1
+                task.last_error = repr(e)
+                if self.verbose:
+                    print(f"Scheduler task '{task.name}' raised: {e}")
+            runtime = time.perf_counter() - start
+
+            task.runs += 1
+            task.total_lateness += lateness
+            task.max_lateness = max(task.max_lateness, lateness)
+            task.max_runtime = max(task.max_runtime, runtime)
+
+            # next absolute deadline; skip cycles we already missed
+            next_deadline = deadline + task.period_s
+            now = time.perf_counter()
+            if next_deadline <= now:
+                missed = int((now - next_deadline) / task.period_s) + 1
+                task.overruns += missed
+                next_deadline += missed * task.period_s
+            task.next_deadline = next_deadline
+
+            with self._lock:
+                if task.active:
+                    self._push(task)
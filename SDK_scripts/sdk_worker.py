@@ -0,0 +1,229 @@
+import time
+import queue
+import itertools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from error_codes import QUEUE_TIMEOUT_ERROR
+
+
+# Lower value runs first
+PRIORITY_SAFETY = 0    # venting, PID off
+PRIORITY_CONTROL = 1   # setpoints and control-loop reads
+PRIORITY_LOGGING = 2   # background logging / monitoring reads
+
+PRIORITY_NAMES = {PRIORITY_SAFETY: 'safety', PRIORITY_CONTROL: 'control', PRIORITY_LOGGING: 'logging'}
+
+_STOP = 99  # sorts after every real priority, so queued work drains before the thread exits
+
+# sdk_call returns QUEUE_TIMEOUT_ERROR (error_codes) when a queued command has not run within
+# its timeout. Not an SDK code and not retried: the queue is busy, not the device
+
+
+class SDKCommandThread:
+    """
+    Single owner thread for one instrument's SDK calls.
+
+    All OB1_* / PID_* calls for an instrument are queued here and executed one at a time on
+    this thread, so the DLL never sees concurrent calls on the same handle and no global lock
+    is needed. Pending commands run by priority (safety > control > logging) and FIFO within
+    a priority; a running call is never interrupted.
+
+    submit() returns a concurrent.futures.Future; call() waits for it. Calls made from the
+    command thread itself, or once the thread has stopped, run inline. Commands still queued
+    when stop() gives up on a hung thread fail with RuntimeError.
+
+    Args:
+        name: Instrument name for the thread and stats (default: 'OB1')
+        verbose: Print start/stop information
+    """
+
+    def __init__(self, name='OB1', verbose=True):
+        self.name = name
+        self.verbose = verbose
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()   # _running and enqueueing change together
+        self._hung = False               # stop() timed out on a call that never returned
+        self._stats_lock = threading.Lock()
+        self.max_depth = 0
+        self._stats = {p: {'calls': 0, 'errors': 0, 'service_total': 0.0, 'service_max': 0.0,
+                           'wait_total': 0.0, 'wait_max': 0.0} for p in PRIORITY_NAMES}
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._hung = False
+        self._thread = threading.Thread(target=self._run, name=f"sdk-{self.name}", daemon=True)
+        self._thread.start()
+        if self.verbose:
+            print(f"✓ SDK command thread for {self.name} started")
+
+    def stop(self, timeout=2.0):
+        """
+        Run what is queued, then stop; later calls run inline on the caller's thread.
+
+        If the thread is still busy after timeout (a hung call), the commands still waiting
+        fail with RuntimeError instead of waiting forever.
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._queue.put((_STOP, next(self._seq), None, None, None, None))
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                # never call around a hung call; fail what waits and what comes until it returns
+                with self._lock:
+                    self._hung = True
+                self._fail_pending(RuntimeError(f"SDK command thread for {self.name} did not stop"))
+
+    def is_running(self):
+        return self._running
+
+    def submit(self, fn, *args, priority=PRIORITY_CONTROL):
+        """
+        Queue fn(*args).
+
+        Returns:
+            Future: Resolves to fn's return value (or its exception)
+        """
+        future = Future()
+        with self._lock:
+            queued = self._running and threading.current_thread() is not self._thread
+            if queued and self._hung:
+                future.set_exception(RuntimeError(f"SDK command thread for {self.name} is hung"))
+                return future
+            if queued:
+                self._queue.put((priority, next(self._seq), fn, args, future, time.perf_counter()))
+        if not queued:
+            self._execute(fn, args, future, priority, time.perf_counter())
+            return future
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return future
+
+    def call(self, fn, *args, priority=PRIORITY_CONTROL, timeout=None, cancel_on_timeout=True):
+        """
+        Queue fn(*args) and wait for its result. Raises TimeoutError if it does not finish in time;
+        with cancel_on_timeout a command that has not started yet is then dropped from the queue.
+        """
+        future = self.submit(fn, *args, priority=priority)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if cancel_on_timeout:
+                future.cancel()
+            raise
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: 'queue_depth', 'max_depth' and per priority name: calls, errors,
+                  mean/max service time and mean/max queue wait in ms
+        """
+        stats = {'queue_depth': self._queue.qsize(), 'max_depth': self.max_depth}
+        with self._stats_lock:
+            for priority, s in self._stats.items():
+                n = s['calls']
+                stats[PRIORITY_NAMES[priority]] = {
+                    'calls': n,
+                    'errors': s['errors'],
+                    'service_mean_ms': s['service_total'] / n * 1000 if n else 0.0,
+                    'service_max_ms': s['service_max'] * 1000,
+                    'wait_mean_ms': s['wait_total'] / n * 1000 if n else 0.0,
+                    'wait_max_ms': s['wait_max'] * 1000,
+                }
+        return stats
+
+    def print_stats(self):
+        stats = self.get_stats()
+        print(f"\n=== SDK COMMAND THREAD ({self.name}) ===")
+        print(f"Queue depth: {stats['queue_depth']} (max {stats['max_depth']})")
+        for name in PRIORITY_NAMES.values():
+            s = stats[name]
+            print(f"{name:8s}: {s['calls']} calls, {s['errors']} errors - "
+                  f"service {s['service_mean_ms']:.2f}/{s['service_max_ms']:.2f} ms (mean/max) - "
+                  f"wait {s['wait_mean_ms']:.2f}/{s['wait_max_ms']:.2f} ms")
+        print("=" * 30)
+
+    def _execute(self, fn, args, future, priority, queued_at):
+        if not future.set_running_or_notify_cancel():
+            return
+        started = time.perf_counter()
+        failed = False
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            failed = True
+            future.set_exception(e)
+        service = time.perf_counter() - started
+        wait = started - queued_at
+        with self._stats_lock:
+            s = self._stats[priority]
+            s['calls'] += 1
+            s['errors'] += failed
+            s['service_total'] += service
+            s['service_max'] = max(s['service_max'], service)
+            s['wait_total'] += wait
+            s['wait_max'] = max(s['wait_max'], wait)
+
+    def _fail_pending(self, exception):
+        stop_marker = None
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == _STOP:
+                stop_marker = item
+            elif item[4].set_running_or_notify_cancel():
+                item[4].set_exception(exception)
+        if stop_marker is not None:
+            # the thread still has to see it once the hung call returns
+            self._queue.put(stop_marker)
+
+    def _run(self):
+        while True:
+            priority, _, fn, args, future, queued_at = self._queue.get()
+            if priority == _STOP:
+                break
+            self._execute(fn, args, future, priority, queued_at)
+        # anything queued after the stop marker still gets run; the queue is only declared
+        # empty under the lock, so nothing can be queued after the last look
+        while True:
+            with self._lock:
+                try:
+                    priority, _, fn, args, future, queued_at = self._queue.get_nowait()
+                except queue.Empty:
+                    self._running = False
+                    self._hung = False
+                    break
+            if priority != _STOP:
+                self._execute(fn, args, future, priority, queued_at)
+        if self.verbose:
+            print(f"SDK command thread for {self.name} stopped")
+
+
+def sdk_call(sdk_thread, priority, fn, *args, timeout=None, cancel_on_timeout=True):
+    """
+    Run an SDK function through sdk_thread if there is one, directly otherwise.
+
+    A call still waiting behind a slow or hung command after timeout returns
+    QUEUE_TIMEOUT_ERROR; it is never sent around the queue, so the DLL keeps a single caller.
+    With cancel_on_timeout (default) the queued command is dropped if it has not started;
+    pass False for commands that must still run once the queue frees up (venting).
+    """
+    if sdk_thread is None:
+        return fn(*args)
+    try:
+        return sdk_thread.call(fn, *args, priority=priority, timeout=timeout, cancel_on_timeout=cancel_on_timeout)
+    except (TimeoutError, FutureTimeoutError):
+        return QUEUE_TIMEOUT_ERROR
@@ -0,0 +1,224 @@
+import time
+from contextlib import contextmanager
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from sdk_worker import sdk_call, PRIORITY_CONTROL
+from read_mask import READ_SENSOR, data_args
+
+
+# OB1_Add_Sens resolution argument: 0..7 => 9..16 bit MFS readings (each extra bit roughly
+# doubles the I2C conversion time)
+MIN_RESOLUTION = 0
+MAX_RESOLUTION = 7
+# Readings thrown away after re-registering a sensor (the first conversion may still be at the old resolution)
+SETTLE_READS = 2
+
+
+class SensorProfile:
+    """
+    MFS resolution and the sampling period a protocol phase runs at with it.
+
+    Args:
+        name: Profile name
+        resolution: OB1_Add_Sens resolution (0..7 => 9..16 bit)
+        sample_dt: Sampling period the phase is meant to run at in seconds
+    """
+
+    def __init__(self, name, resolution, sample_dt):
+        if not MIN_RESOLUTION <= resolution <= MAX_RESOLUTION:
+            raise ValueError(f"MFS resolution must be {MIN_RESOLUTION}..{MAX_RESOLUTION}, got {resolution}")
+        self.name = name
+        self.resolution = resolution
+        self.sample_dt = sample_dt
+
+    @property
+    def bits(self):
+        return 9 + self.resolution
+
+
+# hold: 60 s sampling holds at full precision (what every OB1_Add_Sens call used so far)
+# ramp: pressure ramps, fast enough to follow the flow without losing the steady-state shape
+# transient: valve switches / step responses, as fast as the sensor goes
+PROFILES = {
+    'hold': SensorProfile('hold', resolution=7, sample_dt=1.0),
+    'ramp': SensorProfile('ramp', resolution=4, sample_dt=0.05),
+    'transient': SensorProfile('transient', resolution=1, sample_dt=0.01),
+}
+
+
+class SensorProfiles:
+    """
+    Switch the MFS sensors of an OB1 between resolution profiles.
+
+    Switching re-registers the sensor with OB1_Add_Sens (the only way the SDK changes the
+    resolution), records the new arguments in the reconnect session so a reconnect restores
+    the current profile, drops cached samples and discards the first readings.
+
+        profiles = SensorProfiles(instr_id, {1: (5, 1, 1, 7, 0)}, sdk_thread=sdk_thread)
+        with profiles.use('transient'):
+            ...   # capture the valve switch
+        profiles.characterize(1)   # achieved samples/s and noise per profile
+
+    Args:
+        instr_id: OB1 instrument ID (c_int32, updated in place by a reconnect)
+        sensors: channel -> OB1_Add_Sens arguments after the channel
+                 (sensor type, digital, calibration, resolution, custom voltage)
+        sdk_thread: Optional SDKCommandThread that owns the OB1
+        session: Optional reconnect.InstrumentSession to record the re-registered sensors in
+        sample_cache: Optional SampleCache invalidated after a switch
+        profiles: name -> SensorProfile (default: PROFILES)
+        verbose: Print switches
+    """
+
+    def __init__(self, instr_id, sensors, sdk_thread=None, session=None, sample_cache=None, profiles=None,
+                 verbose=True):
+        self.instr_id = instr_id
+        self.sensors = {int(ch): tuple(args) for ch, args in sensors.items()}
+        self.sdk_thread = sdk_thread
+        self.session = session
+        self.sample_cache = sample_cache
+        self.profiles = dict(PROFILES if profiles is None else profiles)
+        self.verbose = verbose
+        self.current = {ch: None for ch in self.sensors}   # channel -> profile name (None = as configured)
+        self.measured = {}   # profile name -> last measure() result
+
+    def _call(self, fn, *args):
+        return sdk_call(self.sdk_thread, PRIORITY_CONTROL, fn, *args)
+
+    def _read_sensor(self, channel_num):
+        reg = c_double()
+        sen = c_double()
+        error = self._call(OB1_Get_Data, self.instr_id, c_int32(channel_num), *data_args(READ_SENSOR, reg, sen))
+        return error, sen.value
+
+    def apply(self, name, channels=None):
+        """
+        Re-register the sensors on channels (default: all) at the profile's resolution.
+
+        Returns:
+            tuple: (success: bool, error_code: int)
+        """
+        profile = self.profiles[name]
+        for channel_num in (self.sensors if channels is None else channels):
+            args = list(self.sensors[channel_num])
+            if self.current.get(channel_num) == name and args[3] == profile.resolution:
+                continue
+            args[3] = profile.resolution
+            error = self._call(OB1_Add_Sens, self.instr_id.value, channel_num, *args)
+            if error != 0:
+                if self.verbose:
+                    print(f"✗ Could not switch channel {channel_num} to '{name}' ({profile.bits} bit): {error}")
+                return False, error
+            self.sensors[channel_num] = tuple(args)
+            self.current[channel_num] = name
+            if self.session is not None:
+                self.session.record(OB1_Add_Sens, self.instr_id, channel_num, *args)
+            if self.sample_cache is not None:
+                self.sample_cache.invalidate(channel_num)
+            for _ in range(SETTLE_READS):
+                self._read_sensor(channel_num)
+            if self.verbose:
+                print(f"✓ Channel {channel_num} sensor: '{name}' profile ({profile.bits} bit, "
+                      f"{profile.sample_dt}s sampling)")
+        return True, 0
+
+    @contextmanager
+    def use(self, name, channels=None):
+        """Apply a profile for the duration of a with block, then go back to the previous ones."""
+        channels = list(self.sensors if channels is None else channels)
+        previous = {ch: (self.current.get(ch), self.sensors[ch]) for ch in channels}
+        self.apply(name, channels)
+        try:
+            yield self.profiles[name]
+        finally:
+            for channel_num, (prev, args) in previous.items():
+                self._restore(channel_num, prev, args)
+
+    def _restore(self, channel_num, profile, args):
+        """Go back to a profile, or with profile None to the sensor args the channel had before."""
+        if profile is not None:
+            self.apply(profile, [channel_num])
+            return
+        if self.sensors[channel_num] != args:
+            if self._call(OB1_Add_Sens, self.instr_id.value, channel_num, *args) != 0:
+                return
+            self.sensors[channel_num] = args
+            if self.session is not None:
+                self.session.record(OB1_Add_Sens, self.instr_id, channel_num, *args)
+            if self.sample_cache is not None:
+                self.sample_cache.invalidate(channel_num)
+        self.current[channel_num] = None
+
+    def measure(self, channel_num, n=50):
+        """
+        Achieved sensor sample rate and noise on channel_num at its current profile.
+
+        Reads back to back, so the rate is the ceiling the profile allows; the flow should be
+        steady while measuring for the noise figure to mean anything.
+
+        Returns:
+            dict: 'profile', 'bits', 'samples_per_s', 'ms_per_read', 'flow_mean', 'flow_std', 'errors'
+        """
+        values = []
+        errors = 0
+        start = time.perf_counter()
+        for _ in range(n):
+            error, flow = self._read_sensor(channel_num)
+            if error == 0:
+                values.append(flow)
+            else:
+                errors += 1
+        elapsed = time.perf_counter() - start
+        mean = sum(values) / len(values) if values else 0.0
+        std = (sum((x - mean) ** 2 for x in values) / len(values)) ** 0.5 if values else 0.0
+        name = self.current.get(channel_num)
+        result = {
+            'profile': name,
+            'bits': 9 + self.sensors[channel_num][3],
+            'samples_per_s': n / elapsed if elapsed > 0 else float('inf'),
+            'ms_per_read': elapsed / n * 1000,
+            'flow_mean': mean,
+            'flow_std': std,
+            'errors': errors,
+        }
+        if name is not None:
+            self.measured[name] = result
+        return result
+
+    def characterize(self, channel_num, names=None, n=50):
+        """
+        Measure every profile on one channel and go back to the profile it started with.
+
+        Returns:
+            dict: profile name -> measure() result
+        """
+        start_profile = self.current.get(channel_num)
+        start_args = self.sensors[channel_num]
+        results = {}
+        for name in (names or self.profiles):
+            success, _ = self.apply(name, [channel_num])
+            if success:
+                results[name] = self.measure(channel_num, n)
+        self._restore(channel_num, start_profile, start_args)
+        if self.verbose:
+            self.print_summary(results)
+        return results
+
+    def print_summary(self, results=None):
+        results = self.measured if results is None else results
+        print(f"\n=== MFS PROFILES ===")
+        print(f"{'Profile':<11} {'bits':>4} {'target Hz':>10} {'achieved Hz':>12} {'ms/read':>8} {'flow std':>9}")
+        print("-" * 60)
+        for name, r in results.items():
+            target = 1.0 / self.profiles[name].sample_dt
+            mark = "✓" if r['samples_per_s'] >= target else "⚠"
+            print(f"{name:<11} {r['bits']:>4} {target:>10.1f} {r['samples_per_s']:>12.1f} "
+                  f"{r['ms_per_read']:>8.2f} {r['flow_std']:>9.3f} {mark}")
+        print("=" * 60)
+
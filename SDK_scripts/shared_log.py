@@ -0,0 +1,234 @@
+import sys
+import time
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+DEFAULT_BUFFER_NAME = "elveflow_log"
+DEFAULT_CAPACITY = 200000  # samples; about 55 h at 1 Hz, 4.8 MB
+
+# magic, layout version, seqlock counter, committed sample count, capacity, start time, channel
+HEADER_FORMAT = struct.Struct('<4sIQQQdI')
+HEADER_SIZE = 64
+MAGIC = b'ELVL'
+LAYOUT_VERSION = 1
+SEQ_OFFSET = 8
+COUNT_OFFSET = 16
+# Back-off while a write is in progress, so a reader does not burn a core against the writer
+READ_RETRY_S = 0.0001
+
+COLUMNS = ('time_log', 'pressure_log', 'flow_log')
+
+
+def _column_views(buf, capacity):
+    """float64 numpy views of the three columns that follow the header."""
+    views = {}
+    for i, name in enumerate(COLUMNS):
+        offset = HEADER_SIZE + i * capacity * 8
+        views[name] = np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=offset)
+    return views
+
+
+class SharedSampleBuffer:
+    """
+    Logging buffer in multiprocessing.shared_memory, written by the logging worker.
+
+    Layout: a 64-byte header followed by three float64 columns (time, pressure, flow) used as
+    a ring of `capacity` samples. Writes follow a seqlock: the counter is odd while a sample
+    is being written and even otherwise, and the committed count is bumped last. Analysis
+    processes attach with SharedSampleReader and see new samples without copies, pickling
+    or the control loop's GIL.
+
+    There must be exactly one writer.
+
+    Args:
+        name: Shared memory block name (default: DEFAULT_BUFFER_NAME)
+        capacity: Number of samples kept before the ring wraps (default: DEFAULT_CAPACITY)
+        channel_num: Channel being logged, stored in the header for readers
+    """
+
+    def __init__(self, name=DEFAULT_BUFFER_NAME, capacity=DEFAULT_CAPACITY, channel_num=0):
+        self.name = name
+        self.capacity = capacity
+        size = HEADER_SIZE + len(COLUMNS) * capacity * 8
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left over from a crashed run; nobody else writes it, so take it over
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._seq = 0
+        self._count = 0
+        HEADER_FORMAT.pack_into(self._shm.buf, 0, MAGIC, LAYOUT_VERSION, 0, 0, capacity, time.time(), channel_num)
+        self._columns = _column_views(self._shm.buf, capacity)
+
+    def reset(self, start_time, channel_num):
+        """Start a new log in the same block (readers see the count drop back to 0)."""
+        self._begin()
+        self._count = 0
+        HEADER_FORMAT.pack_into(self._shm.buf, 0, MAGIC, LAYOUT_VERSION, self._seq, 0,
+                                self.capacity, start_time, channel_num)
+        self._end()
+
+    def append(self, elapsed_time, pressure, flow):
+        """Write one sample and commit it."""
+        i = self._count % self.capacity
+        self._begin()
+        self._columns['time_log'][i] = elapsed_time
+        self._columns['pressure_log'][i] = pressure
+        self._columns['flow_log'][i] = flow
+        self._count += 1
+        struct.pack_into('<Q', self._shm.buf, COUNT_OFFSET, self._count)
+        self._end()
+
+    def _begin(self):
+        self._seq += 1
+        struct.pack_into('<Q', self._shm.buf, SEQ_OFFSET, self._seq)
+
+    def _end(self):
+        self._seq += 1
+        struct.pack_into('<Q', self._shm.buf, SEQ_OFFSET, self._seq)
+
+    def close(self, unlink=True):
+        """Release the block. The writer unlinks it so it does not outlive the experiment."""
+        self._columns = None
+        self._shm.close()
+        if unlink:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SharedSampleReader:
+    """
+    Read-only view of a SharedSampleBuffer from another process.
+
+    Usage (e.g. in a notebook or analysis script):
+        reader = SharedSampleReader()
+        last = 0
+        while True:
+            data, last, lost = reader.read_since(last)
+            ... numpy / scipy on data['flow_log'] ...
+
+    Args:
+        name: Shared memory block name (default: DEFAULT_BUFFER_NAME)
+        timeout_s: Wait this long for the writer to create the block (default: 10.0)
+    """
+
+    def __init__(self, name=DEFAULT_BUFFER_NAME, timeout_s=10.0):
+        deadline = time.time() + timeout_s
+        while True:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if time.time() > deadline:
+                    raise FileNotFoundError(f"No shared logging buffer named {name!r}")
+                time.sleep(0.2)
+        if sys.platform != 'win32':
+            # on POSIX the resource tracker would unlink the writer's block when this reader exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+
+        magic, layout, _, _, capacity, _, _ = HEADER_FORMAT.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC or layout != LAYOUT_VERSION:
+            raise ValueError(f"{name!r} is not an Elveflow logging buffer (layout {layout})")
+        self.name = name
+        self.capacity = capacity
+        self._columns = _column_views(self._shm.buf, capacity)
+        for view in self._columns.values():
+            view.flags.writeable = False
+
+    def header(self):
+        """
+        Consistent snapshot of the header.
+
+        Returns:
+            dict: 'count', 'start_time', 'channel', 'seq'
+        """
+        while True:
+            seq1 = struct.unpack_from('<Q', self._shm.buf, SEQ_OFFSET)[0]
+            if seq1 & 1:
+                time.sleep(READ_RETRY_S)  # writer in progress
+                continue
+            _, _, _, count, _, start_time, channel_num = HEADER_FORMAT.unpack_from(self._shm.buf, 0)
+            seq2 = struct.unpack_from('<Q', self._shm.buf, SEQ_OFFSET)[0]
+            if seq1 == seq2:
+                return {'count': count, 'start_time': start_time, 'channel': channel_num, 'seq': seq1}
+            time.sleep(READ_RETRY_S)
+
+    def view(self):
+        """
+        Zero-copy, read-only views of all committed samples in time order.
+
+        Valid as long as the ring has not wrapped (count <= capacity); after that the oldest
+        samples are overwritten in place, so this falls back to an ordered copy.
+
+        Returns:
+            tuple: (dict of numpy arrays keyed like the logging results, count)
+        """
+        count = self.header()['count']
+        if count <= self.capacity:
+            return {k: v[:count] for k, v in self._columns.items()}, count
+        head = count % self.capacity
+        return {k: np.concatenate((v[head:], v[:head])) for k, v in self._columns.items()}, count
+
+    def read_since(self, last_count):
+        """
+        Copy out the samples committed after last_count (small, incremental reads).
+
+        Returns:
+            tuple: (dict of numpy arrays, new count, number of samples lost to ring wrap)
+        """
+        while True:
+            hdr = self.header()
+            count = hdr['count']
+            if count < last_count:
+                last_count = 0  # writer started a new log
+            lost = max(0, count - last_count - self.capacity)
+            start = last_count + lost
+            idx = np.arange(start, count) % self.capacity
+            data = {k: v[idx] for k, v in self._columns.items()}
+            # re-check: if the writer wrapped over what we just copied, copy again
+            if self.header()['count'] - self.capacity <= start:
+                return data, count, lost
+
+    def close(self):
+        self._columns = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # arrays from view() are still referenced; the mapping goes away with them
+
+
+def main():
+    """
+    Attach to a running experiment's shared logging buffer and print rolling statistics.
+    """
+    print("=== SHARED LOGGING BUFFER MONITOR ===")
+    reader = SharedSampleReader()
+    print(f"Attached to {reader.name!r} (capacity {reader.capacity} samples)")
+    print("-" * 30)
+    last = 0
+    try:
+        while True:
+            new, last, lost = reader.read_since(last)
+            if len(new['time_log']):
+                data, count = reader.view()
+                flow = data['flow_log'][-60:]
+                print(f"{count} samples - last 60: flow {flow.mean():.1f} ± {flow.std():.1f} µL/min"
+                      + (f" ({lost} lost)" if lost else ""))
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import sys
+import time
+import atexit
+import signal
+import threading
+
+
+class ShutdownStep:
+    """
+    One step of the shutdown sequence.
+
+    Args:
+        name: Step name used in the report
+        fn: Callable with no arguments
+        timeout_s: Longest time to wait for this step in seconds
+        critical: Run even when the overall budget is already spent (venting, releasing handles)
+    """
+
+    def __init__(self, name, fn, timeout_s=2.0, critical=False):
+        self.name = name
+        self.fn = fn
+        self.timeout_s = timeout_s
+        self.critical = critical
+
+
+class ShutdownCoordinator:
+    """
+    Owns SIGINT/SIGTERM handling and runs the shutdown steps once, in registration order,
+    within a total time budget.
+
+    Register steps in the order they must run, typically:
+    cancel scheduler -> drain log writer -> vent channels -> park MUX -> destroy instruments.
+
+    Each step runs on a helper thread and is abandoned (reported as 'timeout') if it does not
+    return within min(step timeout, remaining budget), so one hung SDK call cannot stop the
+    channels from being vented or the USB handles from being released. Critical steps always
+    get their own timeout even when the budget is spent.
+
+    The first signal raises KeyboardInterrupt in the main thread, so the existing
+    `except KeyboardInterrupt` / `finally:` paths unwind normally and then call shutdown().
+    A second signal runs shutdown() immediately from the handler.
+
+    Args:
+        budget_s: Total time budget for the whole sequence in seconds (default: 15.0)
+        verbose: Print progress information
+    """
+
+    def __init__(self, budget_s=15.0, verbose=True):
+        self.budget_s = budget_s
+        self.verbose = verbose
+        self.steps = []
+        self.requested = threading.Event()
+        self.reason = None
+        self.report = []
+        self._done = False
+        self._lock = threading.Lock()
+        self._previous_handlers = {}
+        self._signal_count = 0
+
+    def add_step(self, name, fn, timeout_s=2.0, critical=False):
+        """Append a step to the sequence."""
+        self.steps.append(ShutdownStep(name, fn, timeout_s, critical))
+
+    def install_signal_handlers(self):
+        """Install SIGINT/SIGTERM (and SIGBREAK on Windows) handlers. Must be called from the main thread."""
+        signals = [signal.SIGINT, signal.SIGTERM]
+        if hasattr(signal, 'SIGBREAK'):
+            signals.append(signal.SIGBREAK)
+        for sig in signals:
+            self._previous_handlers[sig] = signal.signal(sig, self._handle_signal)
+        atexit.register(self._atexit)
+
+    def restore_signal_handlers(self):
+        # signal.signal() only works on the main thread
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig, handler in self._previous_handlers.items():
+            signal.signal(sig, handler)
+        self._previous_handlers.clear()
+
+    def request(self, reason="requested"):
+        """Flag that the program should stop (safe from any thread); loops can poll should_stop()."""
+        if not self.requested.is_set():
+            self.reason = reason
+            self.requested.set()
+
+    def should_stop(self):
+        return self.requested.is_set()
+
+    def shutdown(self, reason=None):
+        """
+        Run the shutdown sequence once. Later calls return the first report.
+
+        Returns:
+            list: (step name, status, seconds) tuples; status is 'ok', 'error: ...', 'timeout' or 'skipped'
+        """
+        with self._lock:
+            if self._done:
+                return self.report
+            self._done = True
+        self.request(reason or "shutdown")
+
+        if self.verbose:
+            print(f"\n=== SHUTDOWN ({self.reason}) ===")
+            print(f"Budget: {self.budget_s}s for {len(self.steps)} steps")
+            print("-" * 30)
+
+        start = time.monotonic()
+        for step in self.steps:
+            remaining = self.budget_s - (time.monotonic() - start)
+            if remaining <= 0 and not step.critical:
+                self.report.append((step.name, 'skipped', 0.0))
+                if self.verbose:
+                    print(f"- {step.name}: skipped (budget spent)")
+                continue
+            timeout = step.timeout_s if (step.critical or remaining > step.timeout_s) else remaining
+            status, elapsed = self._run_step(step, timeout)
+            self.report.append((step.name, status, elapsed))
+            if self.verbose:
+                mark = "✓" if status == 'ok' else "✗"
+                print(f"{mark} {step.name}: {status} ({elapsed:.2f}s)")
+
+        total = time.monotonic() - start
+        if self.verbose:
+            print(f"Shutdown finished in {total:.2f}s")
+            print("=" * 30)
+        self.restore_signal_handlers()
+        return self.report
+
+    def _run_step(self, step, timeout):
+        outcome = {}
+
+        def target():
+            try:
+                step.fn()
+                outcome['status'] = 'ok'
+            except BaseException as e:
+                outcome['status'] = f'error: {e!r}'
+
+        t0 = time.monotonic()
+        worker = threading.Thread(target=target, name=f"shutdown-{step.name}", daemon=True)
+        worker.start()
+        worker.join(timeout)
+        elapsed = time.monotonic() - t0
+        if worker.is_alive():
+            return 'timeout', elapsed
+        return outcome.get('status', 'error: no result'), elapsed
+
+    def _handle_signal(self, signum, frame):
+        name = signal.Signals(signum).name
+        if self._done:
+            # the sequence is already running; interrupting it would leave it half done
+            if self.verbose:
+                print(f"\nReceived {name}, shutdown already in progress...")
+            return
+        self._signal_count += 1
+        if self._signal_count == 1:
+            self.request(f"signal {name}")
+            if self.verbose:
+                print(f"\nReceived {name}, stopping (send again to force immediate shutdown)...")
+            raise KeyboardInterrupt
+        # second signal: do not wait for the main thread to unwind
+        self.shutdown(f"forced by second {name}")
+        sys.exit(1)
+
+    def _atexit(self):
+        if not self._done and self.steps:
+            self.shutdown("interpreter exit")
@@ -0,0 +1,193 @@
+import sys
+import time
+import math
+from collections import deque
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+
+def check_stability(time_log, value_log, target, tol, z=2.0, max_std=None, max_drift=None):
+    """
+    Statistical stability test on a window of samples.
+
+    The window is stable when all three hold:
+    - mean:     |mean - target| + z * std / sqrt(n) <= tol  (confidence interval of the mean is inside the band)
+    - slope:    |slope| * window_duration <= max_drift     (no ramp still in progress)
+    - variance: std <= max_std                              (not oscillating around the target)
+
+    Args:
+        time_log: Sample times in seconds
+        value_log: Sample values (same length)
+        target: Target value
+        tol: Allowed deviation of the mean from target
+        z: Confidence multiplier on the standard error (default: 2.0)
+        max_std: Allowed standard deviation (default: tol)
+        max_drift: Allowed change across the window from the fitted slope (default: tol / 2)
+
+    Returns:
+        dict: 'stable', 'mean', 'std', 'slope', 'n' and 'reason' (why it is not stable, '' if stable)
+    """
+    n = len(value_log)
+    if n < 3:
+        return {'stable': False, 'mean': None, 'std': None, 'slope': None, 'n': n, 'reason': 'not enough samples'}
+
+    max_std = tol if max_std is None else max_std
+    max_drift = tol / 2.0 if max_drift is None else max_drift
+
+    mean = sum(value_log) / n
+    var = sum((v - mean) ** 2 for v in value_log) / (n - 1)
+    std = math.sqrt(var)
+
+    # least-squares slope
+    t_mean = sum(time_log) / n
+    stt = sum((t - t_mean) ** 2 for t in time_log)
+    slope = sum((t - t_mean) * (v - mean) for t, v in zip(time_log, value_log)) / stt if stt > 0 else 0.0
+    duration = time_log[-1] - time_log[0]
+
+    reason = ''
+    if abs(mean - target) + z * std / math.sqrt(n) > tol:
+        reason = f'mean {mean:.1f} not confidently within {target} ± {tol}'
+    elif abs(slope) * duration > max_drift:
+        reason = f'drifting {slope:.2f}/s'
+    elif std > max_std:
+        reason = f'std {std:.1f} > {max_std}'
+
+    return {'stable': reason == '', 'mean': mean, 'std': std, 'slope': slope, 'n': n, 'reason': reason}
+
+
+def wait_until_stable(instr_id, channel, target, tol, window=5.0, sample_dt=0.1, timeout_s=300.0,
+                      quantity="flow", z=2.0, max_std=None, max_drift=None, read_fn=None,
+                      print_every=2.0, verbose=True, value_filter=None, abort=None):
+    """
+    Block until a channel's flow (or pressure) is statistically stable at a target.
+
+    Samples are taken every sample_dt into a rolling window of `window` seconds. As soon as a
+    full window passes check_stability() the function returns, so there is no fixed sleep and
+    no single-sample early exit.
+
+    Args:
+        instr_id: OB1 instrument ID
+        channel: Channel to watch
+        target: Target value (µL/min for flow, mbar for pressure)
+        tol: Allowed deviation of the mean from target
+        window: Rolling window length in seconds (default: 5.0)
+        sample_dt: Sampling interval in seconds (default: 0.1)
+        timeout_s: Give up after this many seconds (default: 300)
+        quantity: "flow" or "pressure" (default: "flow")
+        z, max_std, max_drift: See check_stability
+        read_fn: Optional callable (instr_id, channel) -> (success, pressure, flow, error);
+                 defaults to a direct OB1_Get_Data read
+        print_every: Progress print interval in seconds (default: 2.0)
+        verbose: Print progress information
+        value_filter: Optional streaming filter from filters.py (reset at the start); the window,
+                      the checks and value_log then use the filtered value, so single noisy
+                      samples do not break or fake stability
+        abort: Optional callable returning a reason string (or None), checked every sample; a
+               reason ends the wait at once as not stable (e.g. a tripped SafetyWatchdog)
+
+    Returns:
+        dict: 'stable', 'elapsed', 'mean', 'std', 'slope', 'n', 'reason', 'read_errors',
+              plus 'time_log' / 'value_log' of everything sampled
+
+    Raises:
+        KeyboardInterrupt: Ctrl+C during the wait is passed on to the caller
+    """
+    if verbose:
+        print(f"\n=== WAIT UNTIL STABLE ===")
+        print(f"Channel: {channel.value}")
+        print(f"Target: {target} ± {tol} ({quantity}), window {window}s, timeout {timeout_s}s")
+        print("-" * 30)
+
+    if value_filter is not None:
+        value_filter.reset()
+    win_t = deque()
+    win_v = deque()
+    time_log, value_log = [], []
+    read_errors = 0
+    last_print = 0.0
+    result = {'stable': False, 'mean': None, 'std': None, 'slope': None, 'n': 0, 'reason': 'no samples'}
+
+    start = time.time()
+    next_sample = start
+    try:
+        while True:
+            now = time.time()
+            elapsed = now - start
+            if elapsed > timeout_s:
+                result['reason'] = f"timeout after {timeout_s}s ({result['reason']})"
+                break
+            reason = abort() if abort is not None else None
+            if reason:
+                result['stable'] = False
+                result['reason'] = f"aborted: {reason}"
+                break
+
+            if read_fn is not None:
+                success, pressure, flow, error = read_fn(instr_id, channel)
+            else:
+                sen = c_double()
+                reg = c_double()
+                error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+                success, pressure, flow = error == 0, reg.value, sen.value
+
+            if success:
+                value = flow if quantity == "flow" else pressure
+                if value_filter is not None:
+                    value = value_filter.update(value, dt=sample_dt, pressure=pressure if quantity == "flow" else None)
+                win_t.append(elapsed)
+                win_v.append(value)
+                time_log.append(elapsed)
+                value_log.append(value)
+                while win_t and win_t[0] < elapsed - window:
+                    win_t.popleft()
+                    win_v.popleft()
+
+                # only judge full windows
+                if elapsed >= window:
+                    result = check_stability(win_t, win_v, target, tol, z=z, max_std=max_std, max_drift=max_drift)
+                    if result['stable']:
+                        break
+            else:
+                read_errors += 1
+
+            if verbose and elapsed - last_print >= print_every:
+                last_print = elapsed
+                if result['mean'] is not None:
+                    print(f"Stabilization: {elapsed:.1f}s - mean {result['mean']:.1f} ± {result['std']:.1f} - "
+                          f"slope {result['slope']:.2f}/s - {result['reason'] or 'stable'}")
+                else:
+                    print(f"Stabilization: {elapsed:.1f}s - filling window")
+
+            # fixed-rate sampling without drift
+            next_sample += sample_dt
+            delay = next_sample - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.time()
+
+    except KeyboardInterrupt:
+        # the caller is holding pressure: let Ctrl+C reach its cleanup instead of carrying on
+        if verbose:
+            print("\nWait interrupted by user")
+        raise
+
+    result['elapsed'] = time.time() - start
+    result['read_errors'] = read_errors
+    result['time_log'] = time_log
+    result['value_log'] = value_log
+
+    if verbose:
+        if result['stable']:
+            print(f"✓ Stable after {result['elapsed']:.1f}s: mean {result['mean']:.1f}, std {result['std']:.1f}, "
+                  f"slope {result['slope']:.2f}/s over {result['n']} samples")
+        else:
+            print(f"⚠ Not stable: {result['reason']}")
+        print("=" * 30)
+
+    return result
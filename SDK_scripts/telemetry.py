@@ -0,0 +1,216 @@
+import time
+import socket
+import struct
+import threading
+
+
+# Publisher endpoint on localhost; subscribers register by sending SUBSCRIBE to it
+TELEMETRY_ADDRESS = ('127.0.0.1', 47330)
+
+SUBSCRIBE = b'SUB'
+UNSUBSCRIBE = b'UNSUB'
+
+# seq, timestamp (s since epoch), channel, pressure (mbar), flow (µL/min, NaN if not read)
+SAMPLE_FORMAT = struct.Struct('<QdIdd')
+
+# subscribers re-send SUBSCRIBE this often; silent subscribers are dropped after SUBSCRIBER_TTL_S
+RENEW_PERIOD_S = 2.0
+SUBSCRIBER_TTL_S = 6.0
+
+
+class TelemetryPublisher:
+    """
+    Publishes every sample once to any number of local subscribers.
+
+    Samples are packed once into a fixed 36-byte record and sent as UDP datagrams on
+    localhost to each registered subscriber with a non-blocking sendto, so a slow or dead
+    consumer (plotter, recorder, dashboard) can never stall the sampler or the control loop.
+    Whatever a subscriber does not read in time is dropped for that subscriber only; the
+    sequence number lets it count the gap.
+
+    Args:
+        address: (host, port) subscribers register with (default: TELEMETRY_ADDRESS)
+        verbose: Print subscribe/unsubscribe information
+    """
+
+    def __init__(self, address=TELEMETRY_ADDRESS, verbose=True):
+        self.address = address
+        self.verbose = verbose
+        self.seq = 0
+        self.published = 0
+        self.dropped = 0
+
+        self._subscribers = {}  # addr -> last renew time
+        self._lock = threading.Lock()
+        self._sock = None
+        self._send_sock = None
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Bind the endpoint and start accepting subscriptions. Raises OSError if the port is taken."""
+        if self._running:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.address)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._sock.settimeout(0.5)
+        # separate non-blocking socket for sending, so publish() never waits on the receive timeout
+        self._send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._send_sock.setblocking(False)
+        self._running = True
+        self._thread = threading.Thread(target=self._accept_worker, name="telemetry-publisher", daemon=True)
+        self._thread.start()
+        if self.verbose:
+            print(f"✓ Telemetry publishing on udp://{self.address[0]}:{self.address[1]}")
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        for sock in (self._sock, self._send_sock):
+            if sock is not None:
+                sock.close()
+        self._sock = self._send_sock = None
+
+    def publish(self, channel_num, pressure, flow=None, timestamp=None):
+        """
+        Send one sample to every subscriber. Never blocks.
+
+        Args:
+            channel_num: OB1 channel number
+            pressure: Regulator pressure in mbar
+            flow: Flow in µL/min, None if the sensor was not read
+            timestamp: Sample time (default: time.time())
+        """
+        sock = self._send_sock
+        if sock is None:
+            return
+        self.seq += 1
+        record = SAMPLE_FORMAT.pack(self.seq, time.time() if timestamp is None else timestamp,
+                                    channel_num, pressure, float('nan') if flow is None else flow)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for addr in subscribers:
+            try:
+                sock.sendto(record, addr)
+            except (BlockingIOError, OSError):
+                # full socket buffer or subscriber gone: drop, never wait
+                self.dropped += 1
+        self.published += 1
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def _accept_worker(self):
+        while self._running:
+            try:
+                data, addr = self._sock.recvfrom(64)
+            except socket.timeout:
+                data, addr = None, None
+            except OSError:
+                # on Windows an ICMP port-unreachable from a vanished subscriber surfaces here
+                data, addr = None, None
+            now = time.monotonic()
+            with self._lock:
+                if data == SUBSCRIBE:
+                    if addr not in self._subscribers and self.verbose:
+                        print(f"Telemetry subscriber joined: {addr[0]}:{addr[1]}")
+                    self._subscribers[addr] = now
+                elif data == UNSUBSCRIBE:
+                    self._subscribers.pop(addr, None)
+                for stale in [a for a, t in self._subscribers.items() if now - t > SUBSCRIBER_TTL_S]:
+                    del self._subscribers[stale]
+
+
+class TelemetrySubscriber:
+    """
+    Receives samples from a TelemetryPublisher. Adds no SDK reads.
+
+    Usage:
+        with TelemetrySubscriber() as sub:
+            for sample in sub:
+                print(sample['pressure'], sample['flow'])
+
+    Args:
+        address: Publisher address (default: TELEMETRY_ADDRESS)
+        channel_num: Only return samples of this channel, None for all (default: None)
+        timeout_s: recv() timeout in seconds (default: 1.0)
+    """
+
+    def __init__(self, address=TELEMETRY_ADDRESS, channel_num=None, timeout_s=1.0):
+        self.address = address
+        self.channel_num = channel_num
+        self.received = 0
+        self.lost = 0
+        self._last_seq = None
+        self._last_renew = 0.0
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.settimeout(timeout_s)
+        self._renew()
+
+    def _renew(self):
+        self._last_renew = time.monotonic()
+        try:
+            self._sock.sendto(SUBSCRIBE, self.address)
+        except OSError:
+            pass
+
+    def recv(self):
+        """
+        Wait for the next sample.
+
+        Returns:
+            dict: 'seq', 'timestamp', 'channel', 'pressure', 'flow' (None if not read),
+                  or None on timeout
+        """
+        while True:
+            if time.monotonic() - self._last_renew > RENEW_PERIOD_S:
+                self._renew()
+            try:
+                data = self._sock.recv(SAMPLE_FORMAT.size)
+            except socket.timeout:
+                self._renew()
+                return None
+            except OSError:
+                # publisher not up yet (Windows reports port-unreachable on the next recv)
+                time.sleep(0.1)
+                self._renew()
+                return None
+            if len(data) != SAMPLE_FORMAT.size:
+                continue
+            seq, timestamp, channel_num, pressure, flow = SAMPLE_FORMAT.unpack(data)
+            if self._last_seq is not None and seq > self._last_seq + 1:
+                self.lost += seq - self._last_seq - 1
+            self._last_seq = seq
+            if self.channel_num is not None and channel_num != self.channel_num:
+                continue
+            self.received += 1
+            return {'seq': seq, 'timestamp': timestamp, 'channel': channel_num,
+                    'pressure': pressure, 'flow': None if flow != flow else flow}
+
+    def __iter__(self):
+        while True:
+            sample = self.recv()
+            if sample is not None:
+                yield sample
+
+    def close(self):
+        try:
+            self._sock.sendto(UNSUBSCRIBE, self.address)
+        except OSError:
+            pass
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
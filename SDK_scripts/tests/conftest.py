@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import each other as top-level modules, and "from Elveflow64 import *" has to
+# find the simulator instead of the DLL before any of them is imported
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fake_elveflow
+
+SDK = fake_elveflow.install()
+
+
+@pytest.fixture
+def sdk():
+    """The installed FakeElveflow with no instruments opened and every device plugged in."""
+    with SDK._lock:
+        SDK.ob1s.clear()
+        SDK.muxes.clear()
+        SDK.paths.clear()
+        SDK._handles.clear()
+        SDK._unplugged.clear()
+    return SDK
@@ -0,0 +1,36 @@
+import sys
+import importlib.util
+
+import pytest
+
+import device_registry
+
+
+@pytest.fixture
+def no_sdk(monkeypatch, tmp_path):
+    """A bench without bench_config.json, SDK environment overrides or an importable Elveflow64."""
+    monkeypatch.setenv(device_registry.CONFIG_ENV, str(tmp_path / "bench_config.json"))
+    monkeypatch.delenv("ELVEFLOW_SDK_DLL", raising=False)
+    monkeypatch.delenv("ELVEFLOW_SDK_PYTHON", raising=False)
+    monkeypatch.delitem(sys.modules, "Elveflow64")
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None)
+    monkeypatch.setattr(device_registry, "_config", None)
+    return tmp_path
+
+
+def test_defaults_carry_no_bench_paths(no_sdk):
+    config = device_registry.load_config()
+    assert config['sdk'] == {'dll_path': "", 'python_path': ""}
+    assert all(device.get('calibration') is None for device in config['devices'].values())
+
+
+def test_unconfigured_sdk_path_is_a_clear_error(no_sdk):
+    with pytest.raises(RuntimeError, match="bench_config.example.json"):
+        device_registry.add_sdk_path()
+
+
+def test_sdk_path_from_environment(no_sdk, monkeypatch):
+    monkeypatch.setattr(sys, "path", list(sys.path))
+    monkeypatch.setenv("ELVEFLOW_SDK_PYTHON", str(no_sdk))
+    device_registry.add_sdk_path()
+    assert str(no_sdk) in sys.path
@@ -0,0 +1,50 @@
+import pytest
+
+import event_log
+from event_log import EventLog, SETPOINT, SETPOINT_DEADBAND
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(event_log.time, 'time', lambda: now[0])
+    return now
+
+
+def test_ramp_is_one_event_and_steps_on_it_are_dropped(clock):
+    events = EventLog(filename=None)
+    events.setpoint(1, 0.0, ramp_to=600.0, ramp_s=5.0)
+    for step in range(1, 11):
+        clock[0] += 0.5
+        events.setpoint(1, 600.0 * min(step * 0.5 / 5.0, 1.0), deadband=SETPOINT_DEADBAND)
+    # hold at the ramp's end point
+    clock[0] += 10.0
+    events.setpoint(1, 600.0, deadband=SETPOINT_DEADBAND)
+    assert len(events.events_between(0.0, 100.0, SETPOINT)) == 1
+
+
+def test_deviation_from_ramp_is_logged(clock):
+    events = EventLog(filename=None)
+    events.setpoint(1, 0.0, ramp_to=600.0, ramp_s=5.0)
+    clock[0] += 2.0
+    # ramp expects 240 mbar here; the pulse was cut short at 100
+    assert events.setpoint(1, 100.0, deadband=SETPOINT_DEADBAND) is not None
+    clock[0] += 1.0
+    assert events.setpoint(1, 100.0 + SETPOINT_DEADBAND / 2, deadband=SETPOINT_DEADBAND) is None
+
+
+def test_annotate_and_state_at_interpolate_ramps(clock):
+    events = EventLog(filename=None)
+    events.setpoint(1, 0.0, ramp_to=600.0, ramp_s=6.0)
+    clock[0] += 10.0
+    events.setpoint(1, 200.0)
+    assert events.annotate([0.0, 3.0, 6.0, 9.0, 11.0])['setpoint'] == pytest.approx([0.0, 300.0, 600.0, 600.0, 200.0])
+    assert events.state_at(1.5)['setpoint'][1] == ('pressure', pytest.approx(150.0))
+
+
+def test_load_reads_ramps_back(tmp_path, clock):
+    path = tmp_path / "events.jsonl"
+    events = EventLog(str(path))
+    events.setpoint(1, 0.0, ramp_to=400.0, ramp_s=4.0)
+    events.close()
+    assert EventLog.load(str(path)).annotate([2.0])['setpoint'] == [pytest.approx(200.0)]
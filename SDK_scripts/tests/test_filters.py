@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pytest
+
+from filters import (EWMA, MovingMedian, SavitzkyGolay, Kalman1D, ChannelFilters, ewma_batch, median_batch,
+                     savgol_batch, kalman_batch)
+
+
+def _noisy(n=200, seed=1):
+    rng = random.Random(seed)
+    return [100.0 + 20.0 * (i >= n // 2) + rng.gauss(0.0, 2.0) for i in range(n)]
+
+
+@pytest.mark.parametrize("cls, batch, kwargs", [
+    (EWMA, ewma_batch, {'alpha': 0.2}),
+    (MovingMedian, median_batch, {'window': 5}),
+    (SavitzkyGolay, savgol_batch, {'window': 9, 'order': 2}),
+])
+def test_streaming_matches_batch(cls, batch, kwargs):
+    values = _noisy()
+    filt = cls(**kwargs)
+    streamed = [filt.update(v) for v in values]
+    assert np.allclose(streamed, batch(values, **kwargs))
+
+
+def test_kalman_streaming_matches_batch():
+    values = _noisy()
+    pressures = [200.0] * len(values)
+    filt = Kalman1D(model=lambda p: 0.5 * p)
+    streamed = [filt.update(v, dt=0.1, pressure=p) for v, p in zip(values, pressures)]
+    assert np.allclose(streamed, kalman_batch(values, pressures, dt=0.1, model=lambda p: 0.5 * p))
+
+
+def test_moving_median_rejects_single_spike():
+    filt = MovingMedian(window=5)
+    out = [filt.update(v) for v in [10.0, 10.0, 10.0, 500.0, 10.0, 10.0]]
+    assert max(out) == 10.0
+
+
+def test_kalman_converges_on_measurement_with_wrong_model():
+    # the model is 10% off; at a constant pressure the estimate must still settle on the sensor
+    rng = random.Random(2)
+    filt = Kalman1D(model=lambda p: 1.1 * 0.8 * p)
+    for _ in range(600):
+        value = filt.update(400.0 + rng.gauss(0.0, 3.0), dt=0.1, pressure=500.0)
+    assert value == pytest.approx(400.0, abs=3.0)
+
+
+def test_kalman_reset_forgets_model_state():
+    filt = Kalman1D(model=lambda p: p)
+    for _ in range(10):
+        filt.update(100.0, dt=0.1, pressure=100.0)
+    filt.reset()
+    assert filt.update(50.0, dt=0.1, pressure=300.0) == 50.0
+    assert filt.update(50.0, dt=0.1, pressure=300.0) == pytest.approx(50.0)
+
+
+def test_channel_filters_pass_raw_pressure_to_flow_filter():
+    seen = []
+
+    class Recorder:
+        def update(self, value, dt=None, pressure=None):
+            seen.append(pressure)
+            return value
+
+        def reset(self):
+            pass
+    filters = ChannelFilters()
+    filters.attach(1, "pressure", EWMA(alpha=0.5))
+    filters.attach(1, "flow", Recorder())
+    filters.apply(1, 100.0, 5.0)
+    filters.apply(1, 200.0, 5.0)
+    assert seen == [100.0, 200.0]
+    assert filters.apply(2, 1.0, None) == (1.0, None)
+    with pytest.raises(ValueError):
+        filters.attach(1, "temperature", EWMA())
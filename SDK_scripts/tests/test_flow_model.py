@@ -0,0 +1,21 @@
+import copy
+
+import pytest
+
+from flow_model import FlowModel
+
+
+def test_update_tracks_a_linear_path():
+    model = FlowModel()
+    for _ in range(50):
+        for flow in (50.0, 100.0, 200.0):
+            assert model.update(10.0 + 1.5 * flow, flow)
+    assert model.R == pytest.approx(1.5, rel=0.05)
+
+
+def test_rejected_sample_leaves_estimate_and_covariance_unchanged():
+    model = FlowModel(p0=0.0, R=0.01)
+    before = (model.p0, model.R, model.R2, copy.deepcopy(model._P), model.n_samples)
+    # far below the current curve: the step would make R negative
+    assert not model.update(-500.0, 5.0)
+    assert (model.p0, model.R, model.R2, model._P, model.n_samples) == before
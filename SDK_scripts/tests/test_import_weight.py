@@ -0,0 +1,19 @@
+import os
+
+import pytest
+
+import cli
+
+
+def test_every_experiment_script_is_benchmarked():
+    scripts = {os.path.splitext(os.path.basename(path))[0] for path in cli.EXPERIMENTS.values()}
+    assert scripts <= set(cli.BENCH_MODULES)
+
+
+@pytest.mark.parametrize("module", cli.BENCH_MODULES)
+def test_import_does_not_load_heavy_modules(module):
+    # fresh interpreter with the simulated SDK, like "cli.py bench --fake"
+    result = cli._import_profile(module, fake=True)
+    assert result['ok'], result['error']
+    expected = cli.BENCH_EXPECTED_HEAVY.get(module, ())
+    assert [m for m in result['heavy'] if m not in expected] == []
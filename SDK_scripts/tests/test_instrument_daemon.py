@@ -0,0 +1,51 @@
+import socket
+import threading
+import time
+
+from instrument_daemon import InstrumentDaemon, InstrumentClient
+
+AUTHKEY = b"test"
+
+
+def _free_address():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()
+
+
+def _start_daemon():
+    daemon = InstrumentDaemon(ob1_name="OB1", mux_name="", sensors={1: (5, 1, 1, 7, 0)},
+                              address=_free_address(), authkey=AUTHKEY, verbose=False)
+    assert daemon.bring_up()
+    threading.Thread(target=daemon.serve_forever, daemon=True).start()
+    return daemon
+
+
+def _wait_for(condition, timeout_s=2.0):
+    deadline = time.time() + timeout_s
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_pid_commands_are_undone_when_the_client_leaves(sdk):
+    daemon = _start_daemon()
+    try:
+        # one client configures the PID and leaves it in place
+        setup = InstrumentClient(daemon.address, authkey=AUTHKEY)
+        assert setup.pid_add(1, 0.001, 0.001, running=0)[0] == 0
+        setup.close(keep_state=True)
+
+        # another one only starts it and retunes it, then detaches
+        client = InstrumentClient(daemon.address, authkey=AUTHKEY)
+        assert client.pid_run(1, 1)[0] == 0
+        assert client.pid_params(1, 0.002, 0.002)[0] == 0
+        pid = sdk.ob1s["OB1"].pid[1]
+        assert pid['running']
+        client.close()
+
+        assert _wait_for(lambda: not pid['running'])
+        assert _wait_for(lambda: daemon.clients == 0)
+    finally:
+        daemon.stop()
+        daemon.tear_down()
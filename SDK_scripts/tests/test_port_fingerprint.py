@@ -0,0 +1,51 @@
+import math
+
+import pytest
+
+from port_fingerprint import PortFingerprints, _step_timing
+
+
+def _fopdt_step(p_from, p_to, resistance=1.25, dead_s=0.5, tau_s=0.4, step_s=8.0, dt=0.01):
+    """(t, pressure, flow) samples of one pressure step through a first order plus dead time path."""
+    flow_from, flow_to = p_from / resistance, p_to / resistance
+    samples = []
+    for i in range(int(step_s / dt)):
+        t = i * dt
+        progress = 1.0 - math.exp(-(t - dead_s) / tau_s) if t > dead_s else 0.0
+        samples.append((t, p_to, flow_from + (flow_to - flow_from) * progress))
+    return samples
+
+
+def test_step_timing_recovers_dead_time_and_tau():
+    dead, tau = _step_timing(_fopdt_step(100.0, 300.0), 80.0, 240.0)
+    assert dead == pytest.approx(0.5, abs=0.03)
+    assert tau == pytest.approx(0.4, abs=0.03)
+
+
+def test_step_timing_falling_step():
+    dead, tau = _step_timing(_fopdt_step(300.0, 100.0), 240.0, 80.0)
+    assert dead == pytest.approx(0.5, abs=0.03)
+    assert tau == pytest.approx(0.4, abs=0.03)
+
+
+def test_step_timing_none_if_flow_never_gets_there():
+    samples = [(t * 0.1, 100.0, 10.0) for t in range(50)]
+    assert _step_timing(samples, 0.0, 100.0) is None
+
+
+def test_evaluate_fits_resistance_and_timing():
+    pressures = (0.0, 100.0, 200.0, 300.0, 400.0)
+    steps = [_fopdt_step(p_from, p_to) for p_from, p_to in zip((0.0,) + pressures, pressures)]
+    entry, steady_p, steady_f = PortFingerprints._evaluate(steps)
+
+    assert entry is not None
+    assert entry['resistance'] == pytest.approx(1.25, rel=0.02)
+    assert entry['dead_time_s'] == pytest.approx(0.5, abs=0.03)
+    assert entry['tau_s'] == pytest.approx(0.4, abs=0.03)
+    assert entry['points'] == len(steady_f) == len(steady_p)
+
+
+def test_evaluate_rejects_short_steps():
+    steps = [_fopdt_step(0.0, 0.0), _fopdt_step(0.0, 100.0, step_s=0.05)]
+    entry, _, _ = PortFingerprints._evaluate(steps)
+    assert entry is None
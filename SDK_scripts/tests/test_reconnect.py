@@ -0,0 +1,102 @@
+import time
+from ctypes import c_int32, c_double, byref, create_string_buffer
+
+from Elveflow64 import (OB1_Initialization, OB1_Add_Sens, OB1_Calib_Load, OB1_Set_Press, OB1_Set_Sens,
+                        OB1_Get_Data, PID_Add_Remote, PID_Set_Running_Remote)
+
+from fake_elveflow import NO_COMMUNICATION
+from reconnect import InstrumentSession, OB1
+from sdk_worker import SDKCommandThread
+
+
+def _open_ob1():
+    instr_id = c_int32(-1)
+    assert OB1_Initialization(b"OB1", 0, 0, 0, 0, byref(instr_id)) == 0
+    return instr_id
+
+
+def _set_up(session, instr_id):
+    """Sensor, calibration, a pressure setpoint and a running remote PID, recorded like _sdk_call does."""
+    calls = [
+        (OB1_Add_Sens, instr_id, c_int32(1), 5, 1, 1, 7, 0),
+        (OB1_Calib_Load, instr_id, create_string_buffer(b"calibration_20250929.calib")),
+        (OB1_Set_Press, instr_id, c_int32(2), c_double(300.0)),
+        (PID_Add_Remote, instr_id, c_int32(1), instr_id, c_int32(1), c_double(0.5), c_double(0.02), c_int32(0)),
+        (OB1_Set_Sens, instr_id, c_int32(1), c_double(200.0)),
+        (PID_Set_Running_Remote, instr_id, c_int32(1), c_int32(1)),
+    ]
+    for fn, *args in calls:
+        assert fn(*args) == 0, fn.__name__
+        session.record(fn, *args)
+
+
+def _session(instr_id, **kwargs):
+    return InstrumentSession("OB1", instr_id, reconnect_timeout_s=5.0, retry_period_s=0.05, verbose=False,
+                             **kwargs)
+
+
+def test_reconnect_restores_session_under_new_id(sdk):
+    instr_id = _open_ob1()
+    session = _session(instr_id)
+    _set_up(session, instr_id)
+    old_id = instr_id.value
+
+    sdk.simulate_disconnect("OB1", 0.3)
+    reg = c_double()
+    assert OB1_Get_Data(instr_id, c_int32(1), byref(reg), None) == NO_COMMUNICATION
+
+    assert session.reconnect(OB1)
+    assert instr_id.value != old_id
+    assert OB1_Get_Data(c_int32(old_id), c_int32(1), byref(reg), None) == NO_COMMUNICATION
+
+    ob1 = sdk._handles[instr_id.value]
+    assert ob1.sensors[1] == {'type': 5, 'calibration': 1, 'resolution': 7}
+    assert ob1.calibration == "calibration_20250929.calib"
+    assert ob1.setpoint[2] == 300.0
+    assert ob1.pid[1]['sensor_channel'] == 1
+    assert (ob1.pid[1]['k_p'], ob1.pid[1]['k_i']) == (0.5, 0.02)
+    assert ob1.pid[1]['running']
+    assert ob1.flow_target[1] == 200.0
+    assert session.gaps[-1]['restored']
+
+
+def test_reconnect_through_command_thread(sdk):
+    instr_id = _open_ob1()
+    sdk_thread = SDKCommandThread("OB1", verbose=False)
+    sdk_thread.start()
+    reconnected = []
+    try:
+        session = _session(instr_id, sdk_thread=sdk_thread, on_reconnect=[lambda device, new_id: reconnected.append(new_id)])
+        _set_up(session, instr_id)
+        sdk.simulate_disconnect("OB1", 0.2)
+        assert session.recover(OB1)
+    finally:
+        sdk_thread.stop()
+    assert reconnected == [instr_id.value]
+    assert sdk_thread.get_stats()['safety']['calls'] > 0
+    assert sdk._handles[instr_id.value].sensors
+
+
+def test_reconnect_leaves_outputs_vented_when_restore_is_disabled(sdk):
+    instr_id = _open_ob1()
+    session = _session(instr_id, should_restore=lambda: False)
+    _set_up(session, instr_id)
+
+    sdk.simulate_disconnect("OB1", 0.2)
+    assert session.reconnect(OB1)
+
+    ob1 = sdk._handles[instr_id.value]
+    assert 1 in ob1.sensors
+    assert ob1.calibration == "calibration_20250929.calib"
+    assert ob1.setpoint[2] == 0.0
+    assert ob1.pid == {}
+
+
+def test_reconnect_gives_up_when_device_stays_away(sdk):
+    instr_id = _open_ob1()
+    session = InstrumentSession("OB1", instr_id, reconnect_timeout_s=0.2, retry_period_s=0.05, verbose=False)
+    sdk.simulate_disconnect("OB1", 30.0)
+    started = time.monotonic()
+    assert not session.reconnect(OB1)
+    assert time.monotonic() - started < 2.0
+    assert not session.gaps[-1]['restored']
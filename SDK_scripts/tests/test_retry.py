@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+from error_codes import ErrorCode, QUEUE_TIMEOUT_ERROR, CIRCUIT_OPEN, is_transient
+from retry import RetryPolicy, CircuitBreaker, SDKErrorPolicy
+
+TRANSIENT = int(ErrorCode.NO_COMMUNICATION_WITH_OB1)
+FATAL = int(ErrorCode.SENSOR_NOT_COMPATIBLE)
+
+
+def _policy(max_retries=2, failure_threshold=5, reset_timeout_s=10.0):
+    return SDKErrorPolicy(RetryPolicy(max_retries=max_retries, base_delay_s=0.0, jitter=0.0),
+                          failure_threshold=failure_threshold, reset_timeout_s=reset_timeout_s, verbose=False)
+
+
+def _returning(*codes):
+    """SDK stand-in that returns the given codes in turn and counts its calls."""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        return codes[min(len(calls), len(codes)) - 1]
+    return fn, calls
+
+
+def test_delay_doubles_up_to_the_cap():
+    policy = RetryPolicy(base_delay_s=0.05, max_delay_s=0.3, jitter=0.0)
+    assert [policy.delay(n) for n in range(4)] == pytest.approx([0.05, 0.1, 0.2, 0.3])
+    jittered = RetryPolicy(base_delay_s=0.1, jitter=0.2)
+    assert all(0.08 <= jittered.delay(0) <= 0.12 for _ in range(50))
+
+
+def test_local_codes_are_not_transient():
+    assert is_transient(TRANSIENT)
+    assert not is_transient(FATAL)
+    for code in (QUEUE_TIMEOUT_ERROR, CIRCUIT_OPEN):
+        assert not is_transient(code)
+
+
+def test_transient_error_is_retried_until_it_clears():
+    policy = _policy()
+    fn, calls = _returning(TRANSIENT, TRANSIENT, 0)
+    assert policy.call(fn, op="read") == 0
+    assert len(calls) == 3
+    stats = policy.get_stats()['operations']['read']
+    assert stats['retries'] == 2 and stats['recovered'] == 1
+
+
+def test_retries_are_bounded():
+    policy = _policy(max_retries=2)
+    fn, calls = _returning(TRANSIENT)
+    assert policy.call(fn, op="read") == TRANSIENT
+    assert len(calls) == 3
+
+
+def test_fatal_code_and_queue_timeout_are_not_retried():
+    policy = _policy()
+    for code in (FATAL, QUEUE_TIMEOUT_ERROR):
+        fn, calls = _returning(code)
+        assert policy.call(fn) == code
+        assert len(calls) == 1
+    assert policy.breaker("OB1").failures == 0
+
+
+def test_exception_is_raised_without_retry_or_breaker_failure():
+    policy = _policy()
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise TypeError("bad argument")
+
+    with pytest.raises(TypeError):
+        policy.call(broken)
+    assert len(calls) == 1
+    assert policy.breaker("OB1").failures == 0
+
+
+def test_breaker_opens_and_short_circuits():
+    policy = _policy(max_retries=0, failure_threshold=2)
+    fn, calls = _returning(TRANSIENT)
+    policy.call(fn)
+    assert policy.breaker("OB1").state == CircuitBreaker.CLOSED
+    policy.call(fn)
+    assert policy.breaker("OB1").state == CircuitBreaker.OPEN
+
+    assert policy.call(fn) == CIRCUIT_OPEN
+    assert len(calls) == 2
+    # safety commands still go through
+    assert policy.call(fn, force=True) == TRANSIENT
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker("OB1", failure_threshold=1, reset_timeout_s=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # everyone else waits for the probe
+    assert not breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.times_opened == 2
+    assert not breaker.allow()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_probe_without_an_answer_is_released():
+    policy = _policy(max_retries=0, failure_threshold=1, reset_timeout_s=0.05)
+    fn, _ = _returning(TRANSIENT)
+    policy.call(fn)
+    time.sleep(0.06)
+
+    busy, _ = _returning(QUEUE_TIMEOUT_ERROR)
+    assert policy.call(busy) == QUEUE_TIMEOUT_ERROR
+    assert policy.breaker("OB1").state == CircuitBreaker.HALF_OPEN
+    ok, calls = _returning(0)
+    assert policy.call(ok) == 0
+    assert len(calls) == 1
+    assert policy.breaker("OB1").state == CircuitBreaker.CLOSED
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from scheduler import DeadlineScheduler, PeriodicTask
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = DeadlineScheduler(verbose=False)
+    scheduler.start()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_runs_at_period_without_drift(scheduler):
+    times = []
+    scheduler.add_task("tick", 0.02, times.append)
+    time.sleep(0.5)
+    scheduler.stop()
+    assert 20 <= len(times) <= 27
+    # deadlines are absolute: the average spacing stays on the period
+    assert (times[-1] - times[0]) / (len(times) - 1) == pytest.approx(0.02, rel=0.1)
+
+
+def test_overrun_skips_missed_cycles(scheduler):
+    runs = []
+
+    def slow(now):
+        runs.append(now)
+        time.sleep(0.055)
+    task = scheduler.add_task("slow", 0.02, slow)
+    time.sleep(0.3)
+    scheduler.stop()
+    stats = scheduler.get_stats()["slow"]
+    assert stats['runs'] == len(runs) <= 6
+    assert stats['overruns'] >= 2 * (stats['runs'] - 1)
+    assert task.max_runtime >= 0.05
+
+
+def test_errors_are_counted_and_task_keeps_running(scheduler):
+    def fail(now):
+        raise RuntimeError("boom")
+    scheduler.add_task("fail", 0.02, fail)
+    time.sleep(0.15)
+    stats = scheduler.get_stats()["fail"]
+    assert stats['errors'] == stats['runs'] >= 3
+    assert "boom" in stats['last_error']
+
+
+def test_remove_task_stops_it(scheduler):
+    runs = []
+    scheduler.add_task("tick", 0.01, runs.append)
+    time.sleep(0.1)
+    assert scheduler.remove_task("tick")
+    count = len(runs)
+    time.sleep(0.1)
+    assert len(runs) == count
+    assert not scheduler.remove_task("tick")
+
+
+def test_duplicate_and_invalid_tasks_are_rejected(scheduler):
+    scheduler.add_task("tick", 1.0, lambda now: None)
+    with pytest.raises(ValueError):
+        scheduler.add_task("tick", 1.0, lambda now: None)
+    with pytest.raises(ValueError):
+        PeriodicTask("zero", 0.0, lambda now: None)
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from sdk_worker import (SDKCommandThread, sdk_call, PRIORITY_SAFETY, PRIORITY_CONTROL, PRIORITY_LOGGING,
+                        QUEUE_TIMEOUT_ERROR)
+
+
+@pytest.fixture
+def worker():
+    worker = SDKCommandThread("test", verbose=False)
+    worker.start()
+    yield worker
+    worker.stop()
+
+
+def _block(worker):
+    """Occupy the command thread until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def busy():
+        started.set()
+        release.wait(5.0)
+    worker.submit(busy, priority=PRIORITY_LOGGING)
+    assert started.wait(1.0)
+    return release
+
+
+def test_runs_by_priority_then_fifo(worker):
+    release = _block(worker)
+    order = []
+    futures = [worker.submit(order.append, name, priority=priority) for name, priority in
+               [("log", PRIORITY_LOGGING), ("control 1", PRIORITY_CONTROL), ("safety", PRIORITY_SAFETY),
+                ("control 2", PRIORITY_CONTROL)]]
+    release.set()
+    for future in futures:
+        future.result(timeout=1.0)
+    assert order == ["safety", "control 1", "control 2", "log"]
+
+
+def test_calls_never_overlap(worker):
+    active, overlaps = [0], []
+
+    def call():
+        active[0] += 1
+        overlaps.append(active[0] > 1)
+        active[0] -= 1
+    threads = [threading.Thread(target=lambda: [worker.call(call) for _ in range(50)]) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(overlaps) == 200 and not any(overlaps)
+
+
+def test_sdk_call_timeout_returns_error_and_drops_command(worker):
+    release = _block(worker)
+    ran = []
+    assert sdk_call(worker, PRIORITY_CONTROL, ran.append, 1, timeout=0.05) == QUEUE_TIMEOUT_ERROR
+    release.set()
+    worker.call(lambda: None, timeout=1.0)
+    assert ran == []
+
+
+def test_sdk_call_timeout_keeps_command_when_asked(worker):
+    release = _block(worker)
+    vented = []
+    result = sdk_call(worker, PRIORITY_SAFETY, vented.append, 1, timeout=0.05, cancel_on_timeout=False)
+    assert result == QUEUE_TIMEOUT_ERROR
+    release.set()
+    worker.call(lambda: None, timeout=1.0)
+    assert vented == [1]
+
+
+def test_sdk_call_without_thread_runs_inline():
+    assert sdk_call(None, PRIORITY_CONTROL, lambda a, b: a + b, 2, 3) == 5
+
+
+def test_exceptions_reach_the_caller(worker):
+    with pytest.raises(ZeroDivisionError):
+        worker.call(lambda: 1 / 0)
+    assert worker.get_stats()['control']['errors'] == 1
+
+
+def test_stop_drains_queue_then_runs_inline(worker):
+    release = _block(worker)
+    ran = []
+    future = worker.submit(ran.append, "queued")
+    release.set()
+    worker.stop()
+    assert future.result(timeout=0) is None
+    assert not worker.is_running()
+    assert worker.call(ran.append, "inline") is None
+    assert ran == ["queued", "inline"]
+
+
+def test_stop_fails_pending_commands_behind_hung_call():
+    worker = SDKCommandThread("hung", verbose=False)
+    worker.start()
+    release = _block(worker)
+    pending = worker.submit(lambda: None)
+    worker.stop(timeout=0.1)
+    with pytest.raises(RuntimeError):
+        pending.result(timeout=0)
+    with pytest.raises(RuntimeError):
+        worker.call(lambda: None, timeout=0.1)
+    release.set()
+    worker._thread.join(1.0)
+    assert not worker._thread.is_alive()
+    assert worker.call(lambda: "inline") == "inline"
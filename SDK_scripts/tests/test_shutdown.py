@@ -0,0 +1,55 @@
+import time
+import threading
+
+from shutdown import ShutdownCoordinator
+
+
+def test_steps_run_once_in_registration_order():
+    ran = []
+    coordinator = ShutdownCoordinator(budget_s=5.0, verbose=False)
+    for name in ("stop PID", "vent", "destroy"):
+        coordinator.add_step(name, lambda name=name: ran.append(name))
+
+    report = coordinator.shutdown("test")
+    assert ran == ["stop PID", "vent", "destroy"]
+    assert [status for _, status, _ in report] == ['ok', 'ok', 'ok']
+    assert coordinator.reason == "test" and coordinator.should_stop()
+
+    # a second call (e.g. the atexit hook) returns the same report without running anything
+    assert coordinator.shutdown("again") is report
+    assert ran == ["stop PID", "vent", "destroy"]
+
+
+def test_hung_step_times_out_and_the_rest_still_run():
+    release = threading.Event()
+    ran = []
+    coordinator = ShutdownCoordinator(budget_s=5.0, verbose=False)
+    coordinator.add_step("hung SDK call", release.wait, timeout_s=0.1)
+    coordinator.add_step("failing", lambda: 1 / 0)
+    coordinator.add_step("vent", lambda: ran.append("vent"))
+
+    try:
+        report = coordinator.shutdown()
+    finally:
+        release.set()
+    statuses = {name: status for name, status, _ in report}
+    assert statuses["hung SDK call"] == 'timeout'
+    assert statuses["failing"].startswith('error: ZeroDivisionError')
+    assert statuses["vent"] == 'ok'
+    assert ran == ["vent"]
+
+
+def test_spent_budget_skips_only_non_critical_steps():
+    ran = []
+    coordinator = ShutdownCoordinator(budget_s=0.1, verbose=False)
+    coordinator.add_step("slow drain", lambda: time.sleep(0.2), timeout_s=1.0)
+    coordinator.add_step("park MUX", lambda: ran.append("park"))
+    coordinator.add_step("destroy OB1", lambda: ran.append("destroy"), critical=True)
+
+    report = coordinator.shutdown()
+    statuses = {name: status for name, status, _ in report}
+    # the drain is cut at the remaining budget, not its own timeout
+    assert statuses["slow drain"] == 'timeout'
+    assert statuses["park MUX"] == 'skipped'
+    assert statuses["destroy OB1"] == 'ok'
+    assert ran == ["destroy"]
@@ -0,0 +1,47 @@
+from ctypes import c_int32, byref
+
+from Elveflow64 import OB1_Initialization
+
+from watchdog import SafetyWatchdog, ChannelLimits
+from zero_offset import ZeroOffsets
+
+
+def _watchdog(instr_id=0, **kwargs):
+    return SafetyWatchdog(instr_id, {1: ChannelLimits(max_duration_s=10.0)}, heartbeat_timeout_s=None,
+                          verbose=False, **kwargs)
+
+
+def test_low_pressure_hold_counts_as_pressurized():
+    watchdog = _watchdog()
+    # corrected readings: a 40 mbar hold is not a vented channel
+    assert watchdog._check_reading(1, 40.0, 5.0, now=0.0) is None
+    assert watchdog._check_reading(1, 40.0, 5.0, now=11.0) is not None
+
+
+def test_direct_reads_are_zero_offset_corrected(sdk):
+    instr_id = c_int32(-1)
+    assert OB1_Initialization(b"OB1", 0, 0, 0, 0, byref(instr_id)) == 0
+    offsets = ZeroOffsets()
+    offsets.offsets = {1: {'pressure': -40.0, 'flow': 0.0}}
+    watchdog = _watchdog(instr_id.value, zero_offsets=offsets)
+
+    assert watchdog._check(now=0.0) is None
+    pressure, _ = watchdog.last_readings[1]
+    # the vented channel reads about 0 raw, so +40 once the offset is taken out
+    assert 35.0 < pressure < 45.0
+
+
+def test_unreadable_channel_trips_after_max_read_failures(sdk):
+    # no instrument is open, so every read fails
+    watchdog = _watchdog(max_read_failures=3)
+    assert watchdog._check(now=0.0) is None
+    assert watchdog._check(now=0.2) is None
+    assert "unreadable" in watchdog._check(now=0.4)
+
+
+def test_duration_limit_trips_and_resets_when_vented():
+    watchdog = _watchdog()
+    assert watchdog._check_reading(1, 300.0, 50.0, now=0.0) is None
+    assert watchdog._check_reading(1, 300.0, 50.0, now=11.0) is not None
+    assert watchdog._check_reading(1, 0.0, 0.0, now=12.0) is None
+    assert watchdog._check_reading(1, 300.0, 50.0, now=13.0) is None
@@ -0,0 +1,312 @@
+import os
+import json
+import math
+import time
+import threading
+from datetime import datetime
+
+from filters import EWMA
+
+
+DEFAULT_TOTALS_PATH = "flow_totals.json"
+
+# Samples further apart than this are not bridged (logger outage, next run): the volume in the gap is unknown
+MAX_GAP_S = 10.0
+# Time constant of the consumption rate the time-to-empty prediction uses
+RATE_TAU_S = 60.0
+# The logger thread writes the totals to disk this often, so a crashed run still counts
+AUTOSAVE_S = 60.0
+
+
+class Reservoir:
+    """
+    Liquid reservoir drained by the flow of one OB1 channel.
+
+    Args:
+        name: Reservoir name
+        channel: OB1 channel whose flow drains it
+        capacity_ul: Volume when full in µL
+        port: MUX port the flow has to go through to drain it (default: None = any)
+        volume_ul: Volume left in µL (default: full)
+        low_ul: Volume that must stay in it (dip tube submerged, no air pushed into the line)
+    """
+
+    def __init__(self, name, channel, capacity_ul, port=None, volume_ul=None, low_ul=0.0):
+        self.name = name
+        self.channel = channel
+        self.port = port
+        self.capacity_ul = capacity_ul
+        self.volume_ul = capacity_ul if volume_ul is None else volume_ul
+        self.low_ul = low_ul
+        self.refilled = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def drains(self, channel_num, port):
+        return channel_num == self.channel and (self.port is None or self.port == port)
+
+    @property
+    def usable_ul(self):
+        return max(self.volume_ul - self.low_ul, 0.0)
+
+    def to_dict(self):
+        return {'channel': self.channel, 'port': self.port, 'capacity_ul': self.capacity_ul,
+                'volume_ul': self.volume_ul, 'low_ul': self.low_ul, 'refilled': self.refilled}
+
+    @classmethod
+    def from_dict(cls, name, d):
+        reservoir = cls(name, d['channel'], d['capacity_ul'], port=d.get('port'),
+                        volume_ul=d.get('volume_ul'), low_ul=d.get('low_ul', 0.0))
+        reservoir.refilled = d.get('refilled', reservoir.refilled)
+        return reservoir
+
+
+class FlowTotalizer:
+    """
+    Running volume totals per OB1 channel and MUX port, and the reservoirs they drain.
+
+    Every logged flow sample goes through add_sample() (trapezoidal integration, signed, so
+    backflow counts against the total); set_port() tells it where the MUX routes a channel.
+    Totals, reservoir levels and the last consumption rates are saved to a JSON file and
+    carry over to the next run. Thread-safe: the logger thread adds samples while the
+    protocol asks needs_refill() / time_to_empty().
+
+        totalizer = FlowTotalizer()
+        totalizer.load()
+        totalizer.add_reservoir("ch1_source", 1, capacity_ul=15000.0, low_ul=1000.0)
+        totalizer.set_port(1, 3)
+        totalizer.add_sample(1, time.time(), flow)     # from the logger
+        if totalizer.needs_refill("ch1_source", volume_ul=next_visit_ul):
+            ...
+
+    Args:
+        path: JSON file used by save()/load() (default: flow_totals.json)
+        max_gap_s: Longest gap between samples that is integrated across (default: MAX_GAP_S)
+        rate_tau_s: Time constant of the consumption rate estimate (default: RATE_TAU_S)
+        autosave_s: Save from add_sample() at most this often; None = only explicit save()
+    """
+
+    def __init__(self, path=DEFAULT_TOTALS_PATH, max_gap_s=MAX_GAP_S, rate_tau_s=RATE_TAU_S, autosave_s=AUTOSAVE_S):
+        self.path = path
+        self.max_gap_s = max_gap_s
+        self.rate_tau_s = rate_tau_s
+        self.autosave_s = autosave_s
+        self.totals = {}        # channel -> {'total_ul': float, 'ports': {port: float}}
+        self.reservoirs = {}    # name -> Reservoir
+        self._ports = {}        # channel -> port the MUX currently routes it to (None = no MUX)
+        self._last = {}         # channel -> (t, flow) of the previous sample
+        self._rates = {}        # (channel, port or None) -> EWMA of the flow in µL/min
+        self._last_save = time.time()
+        self._lock = threading.RLock()
+
+    def set_port(self, channel_num, port):
+        """Route a channel's flow to a MUX port from now on (None = not through a MUX)."""
+        with self._lock:
+            self._ports[channel_num] = port
+
+    def new_segment(self, channel_num=None):
+        """Forget the previous sample (a channel or all), e.g. when the logging clock restarts."""
+        with self._lock:
+            if channel_num is None:
+                self._last.clear()
+            else:
+                self._last.pop(channel_num, None)
+
+    def _rate_filter(self, channel_num, port):
+        key = (channel_num, port)
+        if key not in self._rates:
+            self._rates[key] = EWMA(tau_s=self.rate_tau_s)
+        return self._rates[key]
+
+    def add_sample(self, channel_num, t, flow_ul_min):
+        """
+        Integrate one flow sample.
+
+        Args:
+            channel_num: OB1 channel
+            t: Sample time in seconds on a clock that does not restart between runs (time.time())
+            flow_ul_min: Flow in µL/min (None / NaN samples are skipped)
+
+        Returns:
+            float: Volume added by this sample in µL
+        """
+        if flow_ul_min is None or math.isnan(flow_ul_min):
+            return 0.0
+        with self._lock:
+            port = self._ports.get(channel_num)
+            previous = self._last.get(channel_num)
+            self._last[channel_num] = (t, flow_ul_min)
+            if previous is None or not 0 < t - previous[0] <= self.max_gap_s:
+                return 0.0
+
+            dt = t - previous[0]
+            volume = 0.5 * (previous[1] + flow_ul_min) * dt / 60.0
+            entry = self.totals.setdefault(channel_num, {'total_ul': 0.0, 'ports': {}})
+            entry['total_ul'] += volume
+            if port is not None:
+                entry['ports'][port] = entry['ports'].get(port, 0.0) + volume
+            for reservoir in self.reservoirs.values():
+                if reservoir.drains(channel_num, port):
+                    reservoir.volume_ul = min(reservoir.volume_ul - volume, reservoir.capacity_ul)
+            self._rate_filter(channel_num, None).update(flow_ul_min, dt=dt)
+            if port is not None:
+                self._rate_filter(channel_num, port).update(flow_ul_min, dt=dt)
+
+            now = time.time()
+            if self.autosave_s is not None and now - self._last_save >= self.autosave_s:
+                self._last_save = now
+                try:
+                    self.save()
+                except OSError:
+                    pass   # the next autosave / the final save() tries again
+            return volume
+
+    def total(self, channel_num, port=None):
+        """Volume in µL delivered by a channel (through one port if given) since the totals were reset."""
+        with self._lock:
+            entry = self.totals.get(channel_num, {'total_ul': 0.0, 'ports': {}})
+            return entry['total_ul'] if port is None else entry['ports'].get(port, 0.0)
+
+    def rate(self, channel_num, port=None):
+        """Recent flow in µL/min (EWMA over rate_tau_s); None before any sample."""
+        with self._lock:
+            filt = self._rates.get((channel_num, port))
+            return filt.value if filt is not None else None
+
+    def reset_totals(self, channel_num=None):
+        with self._lock:
+            if channel_num is None:
+                self.totals.clear()
+            else:
+                self.totals.pop(channel_num, None)
+
+    # ----- reservoirs -----
+
+    def add_reservoir(self, name, channel_num, capacity_ul, port=None, volume_ul=None, low_ul=0.0):
+        """Start tracking a reservoir (full unless volume_ul is given). Returns the Reservoir."""
+        with self._lock:
+            reservoir = Reservoir(name, channel_num, capacity_ul, port=port, volume_ul=volume_ul, low_ul=low_ul)
+            self.reservoirs[name] = reservoir
+            return reservoir
+
+    def refill(self, name, volume_ul=None):
+        """
+        Record a refill.
+
+        Args:
+            name: Reservoir name
+            volume_ul: Volume added in µL (default: None = filled to capacity)
+        """
+        with self._lock:
+            reservoir = self.reservoirs[name]
+            if volume_ul is None:
+                reservoir.volume_ul = reservoir.capacity_ul
+            else:
+                reservoir.volume_ul = min(reservoir.volume_ul + volume_ul, reservoir.capacity_ul)
+            reservoir.refilled = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def time_to_empty(self, name, rate_ul_min=None):
+        """
+        Seconds until the reservoir reaches its low level at the given (default: recent) rate.
+
+        Returns:
+            float: Seconds (0 if already at the low level, inf if it is not being drained),
+                   or None before any sample to base the rate on
+        """
+        with self._lock:
+            reservoir = self.reservoirs[name]
+            if rate_ul_min is None:
+                rate_ul_min = self.rate(reservoir.channel, reservoir.port)
+            if rate_ul_min is None:
+                return None
+            if reservoir.usable_ul <= 0:
+                return 0.0
+            if rate_ul_min <= 0:
+                return float('inf')
+            return reservoir.usable_ul / rate_ul_min * 60.0
+
+    def needs_refill(self, name, volume_ul=0.0, horizon_s=0.0):
+        """
+        True if the reservoir cannot supply volume_ul plus horizon_s at the recent rate
+        without going below its low level.
+        """
+        with self._lock:
+            reservoir = self.reservoirs[name]
+            rate = self.rate(reservoir.channel, reservoir.port) or 0.0
+            needed = volume_ul + max(rate, 0.0) * horizon_s / 60.0
+            return reservoir.usable_ul <= 0 or reservoir.usable_ul < needed
+
+    def print_summary(self):
+        with self._lock:
+            print(f"\n=== FLOW TOTALS ===")
+            print(f"{'Channel':<8} {'Port':<6} {'Total µL':>11} {'Rate µL/min':>12}")
+            print("-" * 40)
+            for channel_num in sorted(self.totals):
+                entry = self.totals[channel_num]
+                rate = self.rate(channel_num)
+                print(f"{channel_num:<8} {'all':<6} {entry['total_ul']:>11.1f} "
+                      f"{rate if rate is not None else float('nan'):>12.1f}")
+                for port in sorted(entry['ports']):
+                    rate = self.rate(channel_num, port)
+                    print(f"{'':<8} {port:<6} {entry['ports'][port]:>11.1f} "
+                          f"{rate if rate is not None else float('nan'):>12.1f}")
+            if self.reservoirs:
+                print(f"\n{'Reservoir':<14} {'Ch':>3} {'Port':>5} {'Left µL':>9} {'Capacity':>9} {'Empty in':>10}")
+                print("-" * 55)
+                for name, reservoir in self.reservoirs.items():
+                    remaining = self.time_to_empty(name)
+                    if remaining is None:
+                        empty_text = "-"
+                    elif math.isinf(remaining):
+                        empty_text = "not used"
+                    else:
+                        empty_text = f"{remaining / 60.0:.1f} min"
+                    mark = "⚠" if reservoir.usable_ul <= 0 else "✓"
+                    port = reservoir.port if reservoir.port is not None else "any"
+                    print(f"{name:<14} {reservoir.channel:>3} {port:>5} {reservoir.volume_ul:>9.1f} "
+                          f"{reservoir.capacity_ul:>9.1f} {empty_text:>10} {mark}")
+            print("=" * 55)
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            data = {
+                'totals': {str(ch): {'total_ul': e['total_ul'], 'ports': {str(p): v for p, v in e['ports'].items()}}
+                           for ch, e in self.totals.items()},
+                'reservoirs': {name: r.to_dict() for name, r in self.reservoirs.items()},
+                'rates': {_rate_key(ch, port): f.value for (ch, port), f in self._rates.items() if f.value is not None},
+                'saved': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, path=None):
+        """
+        Returns:
+            bool: True if a totals file was loaded
+        """
+        path = path or self.path
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            data = json.load(f)
+        with self._lock:
+            self.totals = {int(ch): {'total_ul': e['total_ul'], 'ports': {int(p): v for p, v in e['ports'].items()}}
+                           for ch, e in data.get('totals', {}).items()}
+            self.reservoirs = {name: Reservoir.from_dict(name, d) for name, d in data.get('reservoirs', {}).items()}
+            # last run's rates seed the predictions until this run has its own
+            self._rates = {}
+            for key, value in data.get('rates', {}).items():
+                self._rate_filter(*_parse_rate_key(key)).value = value
+            self._last.clear()
+        return True
+
+
+def _rate_key(channel_num, port):
+    return f"{channel_num}" if port is None else f"{channel_num}:{port}"
+
+
+def _parse_rate_key(key):
+    channel_num, _, port = key.partition(":")
+    return int(channel_num), (int(port) if port else None)
@@ -0,0 +1,290 @@
+import sys
+import time
+import atexit
+import threading
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from sdk_worker import sdk_call, PRIORITY_SAFETY
+from error_codes import WATCHDOG_TRIPPED_ERROR
+
+
+# The regulator reports exactly its upper limit (1000.00 mbar in the logs) when it saturates
+OVER_RANGE_MBAR = 999.5
+# MFS flow sensor full scale (Z_sensor_type 5, 0-1000 µL/min)
+MFS_FULL_SCALE = 1000.0
+# Below this |pressure| a channel counts as vented for the duration limit. Compared with the
+# zero-offset corrected reading; a vented regulator reads up to about -40 mbar uncorrected
+IDLE_PRESSURE_MBAR = 20.0
+# Consecutive failed safety reads of one channel that trip the watchdog: a channel that cannot
+# be read cannot be checked (about 2 s at the default check period, longer with read timeouts)
+MAX_READ_FAILURES = 10
+# Longest wait for a queued safety command; a read that has not run by then is dropped and the
+# check moves on, a vent stays queued (first in line) and is counted as an error
+SAFETY_CALL_TIMEOUT_S = 0.5
+
+
+class ChannelLimits:
+    """
+    Safety limits for one OB1 channel. Use None to disable a limit.
+
+    Args:
+        max_pressure: Highest allowed regulator reading in mbar (default: 950)
+        min_pressure: Lowest allowed regulator reading in mbar (default: -900)
+        max_flow: Highest allowed |flow| in µL/min (default: MFS full scale)
+        max_duration_s: Longest time the channel may stay pressurized in seconds (default: None)
+        check_flow: Read the flow sensor for this channel (default: True; False for channels without MFS)
+    """
+
+    def __init__(self, max_pressure=950.0, min_pressure=-900.0, max_flow=MFS_FULL_SCALE,
+                 max_duration_s=None, check_flow=True):
+        self.max_pressure = max_pressure
+        self.min_pressure = min_pressure
+        self.max_flow = max_flow
+        self.max_duration_s = max_duration_s
+        self.check_flow = check_flow
+
+
+class SafetyWatchdog:
+    """
+    Background thread that vents every OB1 channel when something goes wrong:
+
+    - the control loop stops calling heartbeat() for heartbeat_timeout_s (hung SDK call, dead loop),
+    - a reading breaks a ChannelLimits limit or shows regulator over-range (1000 mbar saturation),
+    - a channel stays pressurized longer than its max_duration_s,
+    - a channel cannot be read max_read_failures times in a row,
+    - another thread reports a fault with report_fault() (e.g. the logging worker),
+    - the interpreter exits (atexit) while the watchdog is armed.
+
+    Venting runs on the watchdog thread, so it does not depend on the main thread. Worst-case
+    latency from a breach to the vent commands is about check_period_s plus one SDK read per
+    monitored channel. Once tripped the watchdog stays latched and re-vents on every check, so
+    a control loop that is still running cannot re-pressurize the chip; callers should also check
+    `tripped` and refuse control writes (WATCHDOG_TRIPPED_ERROR) so the latch is not fought
+    between checks. A killed process
+    (SIGKILL / task manager) cannot run any Python code; that case needs the OB1 itself.
+
+    Args:
+        instr_id: OB1 instrument ID
+        limits: dict channel number -> ChannelLimits for the channels to read
+        n_channels: Number of OB1 channels to vent (default: 4)
+        heartbeat_timeout_s: Trip if no heartbeat for this long; None disables (default: 10.0)
+        check_period_s: Check interval in seconds (default: 0.2)
+        on_trip: Optional callable(reason) run after venting
+        verbose: Print trip information
+        sdk_thread: Optional SDKCommandThread owning the OB1; checks and vents are queued at
+                    safety priority and never sent around it (a vent that times out stays queued)
+        sample_cache: Optional SampleCache; checks reuse samples younger than check_period_s
+                      (already zero-offset corrected)
+        zero_offsets: Optional ZeroOffsets applied to direct reads when there is no sample_cache;
+                      without either the duration limit sees the raw regulator offset
+        max_read_failures: Trip after this many consecutive failed reads of a channel; None
+                           disables (default: MAX_READ_FAILURES)
+    """
+
+    def __init__(self, instr_id, limits, n_channels=4, heartbeat_timeout_s=10.0, check_period_s=0.2,
+                 on_trip=None, verbose=True, sdk_thread=None, sample_cache=None, zero_offsets=None,
+                 max_read_failures=MAX_READ_FAILURES):
+        self.instr_id = instr_id
+        self.limits = dict(limits)
+        self.n_channels = n_channels
+        self.heartbeat_timeout_s = heartbeat_timeout_s
+        self.check_period_s = check_period_s
+        self.on_trip = on_trip
+        self.verbose = verbose
+        self.sdk_thread = sdk_thread
+        self.sample_cache = sample_cache
+        self.zero_offsets = zero_offsets
+        self.max_read_failures = max_read_failures
+
+        self.tripped = False
+        self.trip_reason = None
+        self.trip_time = None
+        self.vent_latency_s = None
+        self.last_readings = {}
+
+        self._last_heartbeat = time.monotonic()
+        self._pressurized_since = {}
+        self._read_failures = {}
+        self._fault = None
+        self._armed = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Arm the watchdog and start its thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._last_heartbeat = time.monotonic()
+        self._armed = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="safety-watchdog", daemon=True)
+        self._thread.start()
+        atexit.register(self._atexit_vent)
+        if self.verbose:
+            print(f"✓ Safety watchdog armed (heartbeat {self.heartbeat_timeout_s}s, check every {self.check_period_s}s)")
+
+    def stop(self, timeout=2.0):
+        """Disarm and stop the watchdog (does not vent)."""
+        self._armed = False
+        self._stop.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        atexit.unregister(self._atexit_vent)
+
+    def heartbeat(self):
+        """Called by the control loop to show it is alive."""
+        self._last_heartbeat = time.monotonic()
+
+    def report_fault(self, reason):
+        """Ask the watchdog to vent from any thread (e.g. an exception in the logging worker)."""
+        with self._lock:
+            if self._fault is None:
+                self._fault = reason
+
+    def report_sample(self, channel_num, pressure, flow):
+        """
+        Check a reading taken elsewhere (e.g. by the logger) against the limits without an extra SDK read.
+        Pass zero-offset corrected values. A breach is acted on at the next watchdog check.
+        """
+        reason = self._check_reading(channel_num, pressure, flow, time.monotonic())
+        if reason:
+            self.report_fault(reason)
+
+    def vent_all(self, reason="manual"):
+        """
+        Stop remote PIDs and set every channel to 0 mbar.
+
+        Returns:
+            int: Number of channels that reported an error
+        """
+        errors = 0
+        for channel_num in range(1, self.n_channels + 1):
+            channel = c_int32(channel_num)
+            try:
+                # a running remote PID would drive the pressure back up
+                sdk_call(self.sdk_thread, PRIORITY_SAFETY, PID_Set_Running_Remote,
+                         self.instr_id, channel, c_int32(0), timeout=SAFETY_CALL_TIMEOUT_S, cancel_on_timeout=False)
+            except Exception:
+                pass
+            try:
+                if sdk_call(self.sdk_thread, PRIORITY_SAFETY, OB1_Set_Press, self.instr_id, channel, c_double(0),
+                            timeout=SAFETY_CALL_TIMEOUT_S, cancel_on_timeout=False) != 0:
+                    errors += 1
+            except Exception:
+                errors += 1
+        return errors
+
+    def get_status(self):
+        return {
+            'armed': self._armed,
+            'tripped': self.tripped,
+            'trip_reason': self.trip_reason,
+            'trip_time': self.trip_time,
+            'vent_latency_s': self.vent_latency_s,
+            'heartbeat_age_s': time.monotonic() - self._last_heartbeat,
+            'last_readings': dict(self.last_readings),
+        }
+
+    def _check_reading(self, channel_num, pressure, flow, now):
+        limits = self.limits.get(channel_num)
+        if limits is None:
+            return None
+        if pressure >= OVER_RANGE_MBAR:
+            return f"channel {channel_num} regulator over-range ({pressure:.2f} mbar)"
+        if limits.max_pressure is not None and pressure > limits.max_pressure:
+            return f"channel {channel_num} pressure {pressure:.1f} > {limits.max_pressure} mbar"
+        if limits.min_pressure is not None and pressure < limits.min_pressure:
+            return f"channel {channel_num} pressure {pressure:.1f} < {limits.min_pressure} mbar"
+        if limits.check_flow and flow is not None and limits.max_flow is not None and abs(flow) > limits.max_flow:
+            return f"channel {channel_num} flow {flow:.1f} exceeds {limits.max_flow} µL/min"
+
+        if limits.max_duration_s is not None:
+            # the logger thread (report_sample) and the watchdog thread both get here
+            with self._lock:
+                if abs(pressure) > IDLE_PRESSURE_MBAR:
+                    since = self._pressurized_since.setdefault(channel_num, now)
+                    if now - since > limits.max_duration_s:
+                        return f"channel {channel_num} pressurized for more than {limits.max_duration_s}s"
+                else:
+                    self._pressurized_since.pop(channel_num, None)
+        return None
+
+    def _check(self, now):
+        with self._lock:
+            fault = self._fault
+        if fault:
+            return fault
+
+        if self.heartbeat_timeout_s is not None and now - self._last_heartbeat > self.heartbeat_timeout_s:
+            return f"no heartbeat for {now - self._last_heartbeat:.1f}s"
+
+        for channel_num, limits in self.limits.items():
+            if self.sample_cache is not None:
+                success, pressure, flow, error, _ = self.sample_cache.read(
+                    channel_num, max_age_s=self.check_period_s, read_sensor=limits.check_flow,
+                    priority=PRIORITY_SAFETY, timeout=SAFETY_CALL_TIMEOUT_S)
+            else:
+                reg = c_double()
+                sen = c_double()
+                error = sdk_call(self.sdk_thread, PRIORITY_SAFETY, OB1_Get_Data,
+                                 self.instr_id, c_int32(channel_num), byref(reg),
+                                 byref(sen) if limits.check_flow else None, timeout=SAFETY_CALL_TIMEOUT_S)
+                pressure = reg.value
+                flow = sen.value if limits.check_flow else None
+                if error == 0 and self.zero_offsets is not None:
+                    pressure, flow = self.zero_offsets.correct(channel_num, pressure, flow)
+            if error != 0:
+                failures = self._read_failures.get(channel_num, 0) + 1
+                self._read_failures[channel_num] = failures
+                if self.max_read_failures is not None and failures >= self.max_read_failures:
+                    return f"channel {channel_num} unreadable ({failures} failed reads, last error {error})"
+                continue
+            self._read_failures.pop(channel_num, None)
+            self.last_readings[channel_num] = (pressure, flow)
+            reason = self._check_reading(channel_num, pressure, flow, now)
+            if reason:
+                return reason
+        return None
+
+    def _trip(self, reason, detected_at):
+        errors = self.vent_all(reason)
+        if not self.tripped:
+            self.tripped = True
+            self.trip_reason = reason
+            self.trip_time = time.time()
+            self.vent_latency_s = time.monotonic() - detected_at
+            if self.verbose:
+                print(f"\n!!! SAFETY WATCHDOG TRIPPED: {reason}")
+                print(f"!!! All channels vented in {self.vent_latency_s * 1000:.0f} ms ({errors} errors)")
+            if self.on_trip:
+                try:
+                    self.on_trip(reason)
+                except Exception as e:
+                    if self.verbose:
+                        print(f"Watchdog on_trip callback raised: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if self.tripped:
+                    # latched: keep the chip vented
+                    self.vent_all(self.trip_reason)
+                else:
+                    reason = self._check(started)
+                    if reason:
+                        self._trip(reason, started)
+            except Exception as e:
+                self._trip(f"watchdog check raised {e!r}", started)
+            self._stop.wait(max(0.0, self.check_period_s - (time.monotonic() - started)))
+
+    def _atexit_vent(self):
+        if self._armed:
+            self.vent_all("interpreter exit")
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+from datetime import datetime
+
+from ctypes import *
+
+from device_registry import add_sdk_path
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
+
+from Elveflow64 import *
+
+from sdk_worker import sdk_call, PRIORITY_CONTROL
+
+
+DEFAULT_OFFSETS_PATH = "zero_offsets.json"
+
+# Known states offsets are measured in
+VENTED = "vented"              # regulator commanded to 0 mbar, outlet open: pressure and flow should read 0
+VALVE_CLOSED = "valve_closed"  # no path for the liquid: flow should read 0 whatever the pressure
+
+# A burst noisier than this has not settled (or something is moving); its mean is not an offset
+MAX_BURST_STD_MBAR = 2.0
+MAX_BURST_STD_UL_MIN = 5.0
+# Larger offsets mean the state was not what we assumed (outlet blocked, reservoir head, wrong valve)
+MAX_PRESSURE_OFFSET_MBAR = 50.0
+MAX_FLOW_OFFSET_UL_MIN = 20.0
+
+
+class ZeroOffsets:
+    """
+    Regulator and flow sensor zero offsets per OB1 channel, measured at known states.
+
+    measure() takes a short averaged burst with the channel vented (pressure and flow offsets)
+    or with its valve closed (flow offset only) and stores the means; correct() subtracts them
+    from a reading. SampleCache applies it to every device read, so the logger, stabilization
+    and control loops all see corrected values. correct_log() does the same to whole logs.
+
+    Args:
+        path: JSON file used by save()/load() (default: zero_offsets.json)
+    """
+
+    def __init__(self, path=DEFAULT_OFFSETS_PATH):
+        self.path = path
+        # channel -> {'pressure', 'flow', 'pressure_std', 'flow_std', 'samples', 'state', 'date'}
+        self.offsets = {}
+
+    def pressure_offset(self, channel_num):
+        return self.offsets.get(channel_num, {}).get('pressure', 0.0)
+
+    def flow_offset(self, channel_num):
+        return self.offsets.get(channel_num, {}).get('flow', 0.0)
+
+    def correct(self, channel_num, pressure, flow=None):
+        """
+        Subtract the stored offsets (values that were not read stay None).
+
+        Returns:
+            tuple: (pressure_mbar, flow_ul_min)
+        """
+        entry = self.offsets.get(channel_num)
+        if entry is None:
+            return pressure, flow
+        if pressure is not None:
+            pressure -= entry.get('pressure', 0.0)
+        if flow is not None:
+            flow -= entry.get('flow', 0.0)
+        return pressure, flow
+
+    def correct_log(self, channel_num, pressure_log, flow_log):
+        """
+        Vectorized correct() for whole logs (offline analysis of CSVs / results dictionaries).
+
+        Returns:
+            tuple: (pressure numpy.ndarray, flow numpy.ndarray)
+        """
+        import numpy as np  # only offline analysis needs it
+
+        return (np.asarray(pressure_log, dtype=float) - self.pressure_offset(channel_num),
+                np.asarray(flow_log, dtype=float) - self.flow_offset(channel_num))
+
+    def measure(self, instr_id, channels, state=VENTED, n=50, sample_dt=0.02, settle_s=3.0,
+                sensor_channels=None, sdk_thread=None, verbose=True):
+        """
+        Measure offsets on channels with a short averaged burst.
+
+        VENTED sets the channels to 0 mbar first and waits settle_s; the caller must make sure
+        the outlet is open to atmosphere. VALVE_CLOSED leaves the pressure alone and only
+        measures the flow offset; the caller closes the path first (e.g. MUX on an unused port).
+        A burst that is too noisy or gives an implausibly large offset is not stored.
+
+        Args:
+            instr_id: OB1 instrument ID
+            channels: Channel numbers
+            state: VENTED or VALVE_CLOSED
+            n: Samples per channel
+            sample_dt: Time between samples in seconds
+            settle_s: Wait after venting in seconds (VENTED only)
+            sensor_channels: Channels with an MFS (default: None = all); the others get no flow offset
+            sdk_thread: Optional SDKCommandThread that owns the OB1
+
+        Returns:
+            dict: channel -> stored entry (channels that failed are missing)
+        """
+        if state not in (VENTED, VALVE_CLOSED):
+            raise ValueError(f"Unknown zeroing state: {state}")
+        if verbose:
+            print(f"\n=== MEASURING ZERO OFFSETS ({state}) ===")
+            print(f"Channels: {list(channels)}, {n} samples every {sample_dt}s")
+            print("-" * 40)
+
+        if state == VENTED:
+            for channel_num in channels:
+                sdk_call(sdk_thread, PRIORITY_CONTROL, OB1_Set_Press, instr_id, c_int32(channel_num), c_double(0.0))
+            time.sleep(settle_s)
+
+        measured = {}
+        for channel_num in channels:
+            pressures, flows = [], []
+            reg = c_double()
+            sen = c_double()
+            for _ in range(n):
+                error = sdk_call(sdk_thread, PRIORITY_CONTROL, OB1_Get_Data, instr_id, c_int32(channel_num),
+                                 byref(reg), byref(sen))
+                if error == 0:
+                    pressures.append(reg.value)
+                    flows.append(sen.value)
+                time.sleep(sample_dt)
+            if len(flows) < n // 2:
+                if verbose:
+                    print(f"✗ Channel {channel_num}: only {len(flows)}/{n} reads succeeded")
+                continue
+
+            entry = dict(self.offsets.get(channel_num, {}))
+            updated = False
+            p_mean, p_std = _mean_std(pressures)
+            f_mean, f_std = _mean_std(flows)
+            problems = []
+            if sensor_channels is not None and channel_num not in sensor_channels:
+                pass
+            elif f_std == 0.0 and f_mean == 0.0:
+                problems.append("flow reads exactly 0 (sensor not added / not connected?)")
+            elif f_std > MAX_BURST_STD_UL_MIN:
+                problems.append(f"flow too noisy ({f_std:.2f} µL/min std)")
+            elif abs(f_mean) > MAX_FLOW_OFFSET_UL_MIN:
+                problems.append(f"flow offset {f_mean:.2f} µL/min too large")
+            else:
+                entry.update(flow=f_mean, flow_std=f_std)
+                updated = True
+            if state == VENTED:
+                if p_std > MAX_BURST_STD_MBAR:
+                    problems.append(f"pressure too noisy ({p_std:.2f} mbar std)")
+                elif abs(p_mean) > MAX_PRESSURE_OFFSET_MBAR:
+                    problems.append(f"pressure offset {p_mean:.2f} mbar too large")
+                else:
+                    entry.update(pressure=p_mean, pressure_std=p_std)
+                    updated = True
+
+            if updated:
+                entry.update(samples=len(flows), state=state, date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                self.offsets[channel_num] = entry
+                measured[channel_num] = entry
+            if verbose:
+                pressure_text = f"{entry['pressure']:+.2f} mbar" if 'pressure' in entry else "-"
+                flow_text = f"{entry['flow']:+.2f} µL/min" if 'flow' in entry else "-"
+                print(f"{'⚠' if problems else '✓'} Channel {channel_num}: pressure offset {pressure_text}, "
+                      f"flow offset {flow_text}")
+                for problem in problems:
+                    print(f"  ⚠ {problem}")
+        if verbose:
+            print("=" * 40)
+        return measured
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, 'w') as f:
+            json.dump({str(ch): entry for ch, entry in self.offsets.items()}, f, indent=2)
+        return path
+
+    def load(self, path=None):
+        """
+        Returns:
+            bool: True if an offsets file was loaded
+        """
+        path = path or self.path
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            data = json.load(f)
+        self.offsets = {int(ch): entry for ch, entry in data.items()}
+        return True
+
+
+def _mean_std(values):
+    mean = sum(values) / len(values)
+    return mean, (sum((x - mean) ** 2 for x in values) / len(values)) ** 0.5
@@ -6,15 +6,20 @@ import queue
 
 from ctypes import *
 from pathlib import Path
-import matplotlib.pyplot as plt
-import numpy as np
 from datetime import datetime
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SDK_scripts'))#shared helpers
+from device_registry import add_sdk_path, device_name, calibration_file, REFILL_OB1, DISTRIBUTION_MUX
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
 
 from Elveflow64 import *
 
+from plotting import plot_in_background
+
+# Mirror the logging buffer into shared memory so analysis processes can read it live
+# (python SDK_scripts/shared_log.py, or SharedSampleReader in a notebook)
+USE_SHARED_LOG_BUFFER = False
+
 
 def create_timestamped_path(original_path, timestamp_format="%Y%m%d"):
     """Efficiently create a timestamped file path from an original path."""
@@ -761,6 +766,8 @@ def plot_channel_data(results, save_plot=True, show_plot=True, filename=None):
         print("No data to plot")
         return ""
     
+    import matplotlib.pyplot as plt  # loaded only when plotting, keeps headless runs fast
+    
     # Set up the plot style
     plt.style.use('default')
     fig, ax = plt.subplots(1, 1, figsize=(12, 6))
@@ -844,6 +851,7 @@ def plot_realtime_monitoring(instr_id, channel, duration_seconds=30.0, sample_dt
     flow_log = []
     
     # Set up interactive plotting
+    import matplotlib.pyplot as plt
     plt.ion()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
     fig.suptitle(f'Real-time Monitoring - Channel {channel.value}', fontsize=16, fontweight='bold')
@@ -971,7 +979,7 @@ _logging_data = {
 }
 _logging_lock = threading.Lock()
 
-def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
+def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True, shared_buffer=None):
     """
     Start continuous logging of pressure and flow rate data.
     
@@ -980,6 +988,8 @@ def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
         channel: Channel to monitor
         sample_dt: Sampling interval in seconds (default: 1.0)
         verbose: Print logging status
+        shared_buffer: Optional SharedSampleBuffer; every sample is also written there for
+                       read-only analysis processes
     
     Returns:
         bool: True if logging started successfully
@@ -1007,12 +1017,16 @@ def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
             'start_time': time.time(),
             'samples': 0
         }
+    if shared_buffer:
+        shared_buffer.reset(_logging_data['start_time'], channel.value)
+        if verbose:
+            print(f"Shared logging buffer: {shared_buffer.name} ({shared_buffer.capacity} samples)")
     
     # Start logging thread
     _logging_active = True
     _logging_thread = threading.Thread(
         target=_continuous_logging_worker,
-        args=(instr_id, channel, sample_dt, verbose),
+        args=(instr_id, channel, sample_dt, verbose, shared_buffer),
         daemon=True
     )
     _logging_thread.start()
@@ -1105,7 +1119,7 @@ def stop_continuous_logging(verbose=True):
                 print("No data was collected during logging")
             return None
 
-def _continuous_logging_worker(instr_id, channel, sample_dt, verbose):
+def _continuous_logging_worker(instr_id, channel, sample_dt, verbose, shared_buffer=None):
     """
     Background worker for continuous logging.
     """
@@ -1133,6 +1147,8 @@ def _continuous_logging_worker(instr_id, channel, sample_dt, verbose):
                     _logging_data['pressure_log'].append(pressure)
                     _logging_data['flow_log'].append(flow_rate)
                     _logging_data['samples'] += 1
+                if shared_buffer:
+                    shared_buffer.append(elapsed_time, pressure, flow_rate)
                 
                 # Print progress every 10 samples
                 if verbose and _logging_data['samples'] % 10 == 0:
@@ -1416,7 +1432,7 @@ def main():
     instr_id = c_int32(-1)
     
     print("=== INITIALIZING OB1 ===")
-    error = OB1_Initialization('OB1'.encode('ascii'), 0, 0, 0, 0, byref(instr_id))
+    error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'), 0, 0, 0, 0, byref(instr_id))
     if error != 0:
         print(f"Error initializing OB1: {error}")
         return
@@ -1425,7 +1441,7 @@ def main():
     # Initialize MUX DRI
     MUX_DRI_Instr_Id = c_int32(-1)
     print("\n=== INITIALIZING MUX DRI ===")
-    error = MUX_DRI_Initialization('12MUX'.encode('ascii'), byref(MUX_DRI_Instr_Id))
+    error = MUX_DRI_Initialization(device_name(DISTRIBUTION_MUX).encode('ascii'), byref(MUX_DRI_Instr_Id))
     if error != 0:
         print(f"Error initializing MUX DRI: {error}")
         return
@@ -1435,10 +1451,15 @@ def main():
     print("\n=== HOMING MUX DRI VALVE ===")
     home_MUX_DRI(MUX_DRI_Instr_Id, verbose=True)
     
+    shared_buffer = None
+    
     try:
         # Load existing calibration
         print("\n=== LOADING EXISTING CALIBRATION ===")
-        calibration_path = r"C:\Users\oykuz\calibration_20250929.calib"
+        calibration_path = calibration_file(REFILL_OB1)  # newest in the archive configured in bench_config.json
+        if not calibration_path:
+            print(f"✗ No calibration found for the {REFILL_OB1}; set its \"calibration\" in bench_config.json")
+            return
         success = existing_calibration(
             instr_id.value, 
             calibration_path, 
@@ -1472,7 +1493,10 @@ def main():
         
         # Start continuous logging on channel 1
         print("\n=== STARTING CONTINUOUS LOGGING ===")
-        start_continuous_logging(instr_id, c_int32(1), sample_dt=1.0, verbose=True)
+        if USE_SHARED_LOG_BUFFER:
+            from shared_log import SharedSampleBuffer  # pulls in numpy, only when enabled
+            shared_buffer = SharedSampleBuffer(channel_num=1)
+        start_continuous_logging(instr_id, c_int32(1), sample_dt=1.0, verbose=True, shared_buffer=shared_buffer)
         
         # Valve switching sequence: 2, 3, 4 with valve 1 in between
         print("\n=== STARTING VALVE SWITCHING LOOP ===")
@@ -1525,6 +1549,8 @@ def main():
         # Stop continuous logging
         print("Stopping continuous logging...")
         results = stop_continuous_logging(verbose=True)
+        if shared_buffer:
+            shared_buffer.close()
         
         if results:
             print(f"✓ Continuous logging collected {results.get('samples', 0)} samples")
@@ -1536,11 +1562,11 @@ def main():
             if filename:
                 print(f"✓ Continuous logging data saved to: {filename}")
             
-            # Create final plot from continuous logging
+            # Create final plot from continuous logging (worker process, so venting below never waits on it)
             print("\n=== CREATING FINAL PLOT ===")
-            plot_filename = plot_channel_data(results, save_plot=True, show_plot=True)
+            plot_filename = plot_in_background(results)
             if plot_filename:
-                print(f"✓ Final plot saved to: {plot_filename}")
+                print(f"✓ Final plot will be saved to: {plot_filename}")
         else:
             print("✗ No continuous logging data available for plotting")
         
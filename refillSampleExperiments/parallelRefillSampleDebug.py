@@ -6,15 +6,95 @@ import queue
 
 from ctypes import *
 from pathlib import Path
-import matplotlib.pyplot as plt
-import numpy as np
 from datetime import datetime
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SDK_scripts'))#shared helpers (scheduler, host PID)
+from device_registry import add_sdk_path, device_name, device_info, calibration_file, REFILL_OB1, DISTRIBUTION_MUX
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
 
 from Elveflow64 import *
 
+from flow_controller import HostPIDController, HostFlowLoop, GainSchedule
+from autotune import load_pid_gains
+from flow_model import FlowModelBank, MAX_FEEDFORWARD_MBAR
+from stability import wait_until_stable
+from watchdog import SafetyWatchdog, ChannelLimits
+from shutdown import ShutdownCoordinator
+from telemetry import TelemetryPublisher
+from sdk_worker import SDKCommandThread, sdk_call, PRIORITY_SAFETY, PRIORITY_CONTROL, PRIORITY_LOGGING
+from sample_cache import SampleCache
+from retry import SDKErrorPolicy
+from error_codes import is_transient, error_message, QUEUE_TIMEOUT_ERROR, WATCHDOG_TRIPPED_ERROR, CIRCUIT_OPEN
+from reconnect import InstrumentSession, OB1, MUX
+from plotting import plot_in_background
+from read_mask import ReadMasks, READ_REGULATOR, READ_SENSOR, READ_BOTH, data_args
+from sensor_profiles import SensorProfiles
+from event_log import EventLog, SETPOINT_DEADBAND
+from zero_offset import ZeroOffsets, VENTED
+from filters import Kalman1D, ChannelFilters
+from totalizer import FlowTotalizer
+from anomaly import AnomalyDetector, CLOG, LEAK, EMPTY
+
+# Use the host-side PID (flow_controller.py) instead of the SDK remote PID for flow control. It
+# runs on the host-unit gains autotune.py saves; the remote PID only uses them with a calibrated
+# REMOTE_GAIN_SCALE
+USE_HOST_PID = False
+
+# SDKCommandThread that owns the OB1 once main() has started it; None = call the SDK directly
+_sdk_thread = None
+# Latest sample per channel shared by the logger, stabilization and maintenance loops; None = no cache
+_sample_cache = None
+# Retry transient SDK errors with backoff and stop calling a device that has dropped off the bus
+_error_policy = SDKErrorPolicy()
+# Records setpoints / PID / calibration / valve and restores them if a device drops off the USB bus; None = no reconnect
+_session = None
+# What the logger reads per channel and protocol phase; channels without an MFS are read regulator-only
+_read_masks = None
+# Regulator / MFS zero offsets subtracted from every reading; None = raw readings
+_zero_offsets = None
+# Streaming filters per channel for what the logger publishes live (telemetry); the CSV log and
+# the watchdog keep the raw samples. None = no filtering
+_channel_filters = None
+# Volume totals per channel / MUX port and reservoir levels, carried over between runs; None = not tracked
+_totalizer = None
+# Clog / bubble / leak / empty-reservoir detection on the logged samples; None = not checked
+_anomalies = None
+# Phases, valve moves, setpoint ramps / changes and PID state on the sample log's time base; None = not logged
+_events = None
+# SafetyWatchdog of the running protocol; once it has tripped, control writes are refused. None = no watchdog
+_watchdog = None
+# Control-priority calls that only read and stay allowed after a trip
+_READ_ONLY_CALLS = (OB1_Get_Data,)
+# Logger read mask per protocol phase (READ_BOTH when not listed). The ramp fit, the flow PID
+# and the hold all use the flow, so nothing is masked on this protocol's sensor channel
+PHASE_READ_MASKS = {}
+
+
+def _sdk_call(priority, fn, *args):
+    """
+    SDK call through the command thread (if any) under the retry / circuit-breaker policy.
+
+    A control call that still fails with a transient error (or finds the OB1's circuit breaker
+    open) waits for the session to reconnect the OB1 and is then tried once more, so the protocol continues after a USB drop. Pass the
+    instr_id c_int32 itself (not .value) so the retry uses the new instrument ID.
+
+    Once the watchdog has tripped, control writes return WATCHDOG_TRIPPED_ERROR without reaching
+    the OB1, so nothing re-pressurizes the vented chip between two watchdog checks.
+    """
+    if (priority == PRIORITY_CONTROL and fn not in _READ_ONLY_CALLS
+            and _watchdog is not None and _watchdog.tripped):
+        return WATCHDOG_TRIPPED_ERROR
+    error = _error_policy.call(sdk_call, _sdk_thread, priority, fn, *args,
+                               op=fn.__name__, force=priority == PRIORITY_SAFETY)
+    if (error != 0 and priority == PRIORITY_CONTROL and _session is not None
+            and (is_transient(error) or error == CIRCUIT_OPEN)):
+        if _session.recover(OB1):
+            error = _error_policy.call(sdk_call, _sdk_thread, priority, fn, *args,
+                                       op=fn.__name__, force=False)
+    if error == 0 and _session is not None:
+        _session.record(fn, *args)
+    return error
+
 
 def create_timestamped_path(original_path, timestamp_format="%Y%m%d"):
     """Efficiently create a timestamped file path from an original path."""
@@ -80,6 +160,8 @@ def calibrate_new(instr_id, base_path, verbose=True):
             if verbose:
                 print(f"Warning: Failed to load saved calibration with error code: {error}")
             return True, timestamped_path, error  # Still return success for saving
+        if _session is not None:
+            _session.record(OB1_Calib_Load, instr_id, path_buf)
         
         if verbose:
             print("Calibration loaded successfully")
@@ -127,6 +209,8 @@ def existing_calibration(instr_id, calib_path, verbose=True):
             if verbose:
                 print(f"Failed to load calibration with error code: {error}")
             return False, error
+        if _session is not None:
+            _session.record(OB1_Calib_Load, instr_id, path_buf)
         
         if verbose:
             print("Calibration loaded successfully")
@@ -140,7 +224,7 @@ def existing_calibration(instr_id, calib_path, verbose=True):
         return False, -1
 
 def ramp_pressure(instr_id, channel, pressure_mbar, ramp_time=0.0, 
-                 sample_dt=0.1, verbose=True):
+                 sample_dt=0.1, verbose=True, heartbeat=None):
     """
     Ramp up pressure on a channel to a target value.
     
@@ -151,6 +235,7 @@ def ramp_pressure(instr_id, channel, pressure_mbar, ramp_time=0.0,
         ramp_time: Time to ramp up pressure in seconds (0 = immediate, default: 0.0)
         sample_dt: Sampling interval in seconds (default: 0.1)
         verbose: Print detailed progress information
+        heartbeat: Optional callable run every ramp step (e.g. SafetyWatchdog.heartbeat)
     
     Returns:
         dict: Pressure ramp results including statistics
@@ -179,8 +264,16 @@ def ramp_pressure(instr_id, channel, pressure_mbar, ramp_time=0.0,
             
             ramp_start = time.time()
             ramp_steps = int(ramp_time / sample_dt)
+            if _events is not None:
+                _events.setpoint(channel.value, 0.0, ramp_to=pressure_mbar, ramp_s=ramp_time)
             
             for step in range(ramp_steps + 1):
+                if heartbeat:
+                    heartbeat()
+                if _watchdog is not None and _watchdog.tripped:
+                    if verbose:
+                        print(f"Ramp aborted: watchdog tripped ({_watchdog.trip_reason})")
+                    return None
                 current_time = time.time()
                 elapsed_ramp = current_time - ramp_start
                 
@@ -189,20 +282,29 @@ def ramp_pressure(instr_id, channel, pressure_mbar, ramp_time=0.0,
                 current_target_pressure = pressure_mbar * ramp_progress
                 
                 # Set current pressure
-                error = OB1_Set_Press(instr_id, channel, c_double(current_target_pressure))
+                error = _sdk_call(PRIORITY_CONTROL, OB1_Set_Press, instr_id, channel, c_double(current_target_pressure))
                 if error != 0:
                     if verbose:
                         print(f"Error setting pressure during ramp: {error}")
+                    if _events is not None:
+                        _events.error("OB1_Set_Press", error, "ramp step failed")
                     return None
+                if _events is not None:
+                    _events.setpoint(channel.value, current_target_pressure, deadband=SETPOINT_DEADBAND)
                 
                 # Read current pressure and flow
                 sen = c_double()
                 reg = c_double()
-                error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+                error = _sdk_call(PRIORITY_CONTROL, OB1_Get_Data, instr_id, channel, byref(reg), byref(sen))
                 
                 if error == 0:
                     current_pressure = reg.value  # mbar
                     current_flow = sen.value  # µL/min
+                    if _zero_offsets is not None:
+                        current_pressure, current_flow = _zero_offsets.correct(channel.value, current_pressure,
+                                                                               current_flow)
+                    if _sample_cache is not None:
+                        _sample_cache.put(channel.value, current_pressure, current_flow)
                     
                     # Log data
                     time_log.append(elapsed_ramp)
@@ -227,11 +329,13 @@ def ramp_pressure(instr_id, channel, pressure_mbar, ramp_time=0.0,
             if verbose:
                 print("Setting pressure immediately...")
             
-            error = OB1_Set_Press(instr_id, channel, c_double(pressure_mbar))
+            error = _sdk_call(PRIORITY_CONTROL, OB1_Set_Press, instr_id, channel, c_double(pressure_mbar))
             if error != 0:
                 if verbose:
                     print(f"Error setting pressure: {error}")
                 return None
+            if _events is not None:
+                _events.setpoint(channel.value, pressure_mbar)
             
             if verbose:
                 print(f"Pressure set to {pressure_mbar} mbar.")
@@ -319,19 +423,19 @@ def set_flowrate(instr_id, channel, flow_rate_ul_min, k_p=0.001, k_i=0.001, verb
         if verbose:
             print("Setting up PID control...")
         
-        error = PID_Add_Remote(instr_id, channel, instr_id, channel, k_p, k_i, 1)
+        error = _sdk_call(PRIORITY_CONTROL, PID_Add_Remote, instr_id, channel, instr_id, channel, k_p, k_i, 1)
         if error != 0:
             if verbose:
                 print(f"Error setting up PID: {error}")
             return None
         
-        error = PID_Set_Running_Remote(instr_id, channel, c_int32(1))
+        error = _sdk_call(PRIORITY_CONTROL, PID_Set_Running_Remote, instr_id, channel, c_int32(1))
         if error != 0:
             if verbose:
                 print(f"Error starting PID: {error}")
             return None
         
-        error = OB1_Set_Sens(instr_id, channel, c_double(flow_rate_ul_min))
+        error = _sdk_call(PRIORITY_CONTROL, OB1_Set_Sens, instr_id, channel, c_double(flow_rate_ul_min))
         if error != 0:
             if verbose:
                 print(f"Error setting flow rate: {error}")
@@ -347,7 +451,7 @@ def set_flowrate(instr_id, channel, flow_rate_ul_min, k_p=0.001, k_i=0.001, verb
             
             sen = c_double()
             reg = c_double()
-            error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+            error = _sdk_call(PRIORITY_CONTROL, OB1_Get_Data, instr_id, channel, byref(reg), byref(sen))
             
             if error == 0:
                 current_flow = sen.value  # µL/min
@@ -404,12 +508,12 @@ def stop_flow(instr_id, channel, verbose=True):
     
     try:
         # Stop PID control if running
-        error = PID_Set_Running_Remote(instr_id, channel, c_int32(0))
+        error = _sdk_call(PRIORITY_SAFETY, PID_Set_Running_Remote, instr_id, channel, c_int32(0))
         if error != 0 and verbose:
             print(f"Warning: Error stopping PID: {error}")
         
         # Set pressure to zero
-        error = OB1_Set_Press(instr_id, channel, c_double(0))
+        error = _sdk_call(PRIORITY_SAFETY, OB1_Set_Press, instr_id, channel, c_double(0))
         if error != 0:
             if verbose:
                 print(f"Error stopping flow: {error}")
@@ -534,12 +638,12 @@ def stop_all_channels(instr_id, verbose=True):
             channel = c_int32(channel_num)
             
             # Stop PID control if running
-            pid_error = PID_Set_Running_Remote(instr_id, channel, c_int32(0))
+            pid_error = _sdk_call(PRIORITY_SAFETY, PID_Set_Running_Remote, instr_id, channel, c_int32(0))
             if pid_error != 0 and verbose:
                 print(f"Warning: Error stopping PID on channel {channel_num}: {pid_error}")
             
             # Set pressure to zero
-            error = OB1_Set_Press(instr_id, channel, c_double(0))
+            error = _sdk_call(PRIORITY_SAFETY, OB1_Set_Press, instr_id, channel, c_double(0))
             if error != 0:
                 if verbose:
                     print(f"Error stopping channel {channel_num}: {error}")
@@ -632,7 +736,12 @@ def set_MUX_DRI_valve(MUX_DRI_Instr_Id, valve_position, rotation=0, verbose=True
             print(f"Setting valve to position {valve_position}...")
         
         # Set the valve position
-        error = MUX_DRI_Set_Valve(MUX_DRI_Instr_Id.value, valve_position, rotation)
+        error = _error_policy.call(MUX_DRI_Set_Valve, MUX_DRI_Instr_Id.value, valve_position, rotation, device=MUX)
+        if (error != 0 and _session is not None and (is_transient(error) or error == CIRCUIT_OPEN)
+                and _session.recover(MUX)):
+            error = _error_policy.call(MUX_DRI_Set_Valve, MUX_DRI_Instr_Id.value, valve_position, rotation, device=MUX)
+        if error == 0 and _session is not None:
+            _session.record(MUX_DRI_Set_Valve, MUX_DRI_Instr_Id, valve_position, rotation)
         time.sleep(3.0)
 
         if error != 0:
@@ -704,7 +813,7 @@ def get_MUX_DRI_valve(MUX_DRI_Instr_Id, verbose=True):
             print(f"Exception during valve reading: {e}")
         return False, -1, -1
 
-def read_channel_data(instr_id, channel, verbose=True):
+def read_channel_data(instr_id, channel, verbose=True, priority=PRIORITY_CONTROL, max_age_s=0.0, mask=READ_BOTH):
     """
     Read pressure and flow rate from a channel with MFS sensor.
     
@@ -712,26 +821,40 @@ def read_channel_data(instr_id, channel, verbose=True):
         instr_id: OB1 instrument ID
         channel: Channel to read from
         verbose: Print the readings
+        priority: SDK command thread priority (PRIORITY_LOGGING for background reads)
+        max_age_s: Accept a cached sample up to this old in seconds (default: 0.0 = always read)
+        mask: READ_REGULATOR / READ_SENSOR / READ_BOTH (default: READ_BOTH); channels without an
+              MFS are read regulator-only whatever is asked
     
     Returns:
-        tuple: (success: bool, pressure_mbar: float, flow_ul_min: float, error_code: int)
+        tuple: (success: bool, pressure_mbar: float, flow_ul_min: float, error_code: int);
+               a value that was not read is None
     """
     try:
-        # Read sensor data
-        sen = c_double()  # Flow rate sensor
-        reg = c_double()  # Pressure regulator
-        error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+        if _read_masks is not None:
+            mask = _read_masks.restrict(channel.value, mask)
+        if _sample_cache is not None:
+            success, pressure, flow_rate, error, _ = _sample_cache.read(channel.value, max_age_s=max_age_s,
+                                                                       priority=priority, mask=mask)
+        else:
+            # Read sensor data (only the outputs in mask)
+            sen = c_double()  # Flow rate sensor
+            reg = c_double()  # Pressure regulator
+            error = _sdk_call(priority, OB1_Get_Data, instr_id, channel, *data_args(mask, reg, sen))
+            pressure = reg.value if mask & READ_REGULATOR else None  # mbar
+            flow_rate = sen.value if mask & READ_SENSOR else None  # µL/min
+            if _zero_offsets is not None:
+                pressure, flow_rate = _zero_offsets.correct(channel.value, pressure, flow_rate)
         
         if error != 0:
             if verbose:
                 print(f"Error reading channel {channel.value} data: {error}")
             return False, 0.0, 0.0, error
         
-        pressure = reg.value  # mbar
-        flow_rate = sen.value  # µL/min
-        
         if verbose:
-            print(f"Channel {channel.value} - Pressure: {pressure:.1f} mbar, Flow: {flow_rate:.1f} µL/min")
+            pressure_text = f"{pressure:.1f} mbar" if pressure is not None else "-"
+            flow_text = f"{flow_rate:.1f} µL/min" if flow_rate is not None else "-"
+            print(f"Channel {channel.value} - Pressure: {pressure_text}, Flow: {flow_text}")
         
         return True, pressure, flow_rate, 0
     
@@ -898,6 +1021,8 @@ def plot_channel_data(results, save_plot=True, show_plot=True, filename=None):
         print("No data to plot")
         return ""
     
+    import matplotlib.pyplot as plt  # loaded only when plotting, keeps headless runs fast
+    
     # Set up the plot style
     plt.style.use('default')
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
@@ -997,6 +1122,7 @@ def plot_realtime_monitoring(instr_id, channel, duration_seconds=30.0, sample_dt
     flow_log = []
     
     # Set up interactive plotting
+    import matplotlib.pyplot as plt
     plt.ion()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
     fig.suptitle(f'Real-time Monitoring - Channel {channel.value}', fontsize=16, fontweight='bold')
@@ -1120,11 +1246,12 @@ _logging_data = {
     'flow_log': [],
     'channel': None,
     'start_time': None,
-    'samples': 0
+    'samples': 0,
+    'gaps': []
 }
 _logging_lock = threading.Lock()
 
-def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
+def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True, watchdog=None, telemetry=None):
     """
     Start continuous logging of pressure and flow rate data.
     
@@ -1133,6 +1260,9 @@ def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
         channel: Channel to monitor
         sample_dt: Sampling interval in seconds (default: 1.0)
         verbose: Print logging status
+        watchdog: Optional SafetyWatchdog; every sample is checked against its limits and a
+                  failing worker reports a fault so the channels get vented
+        telemetry: Optional TelemetryPublisher; every sample is published once for live consumers
     
     Returns:
         bool: True if logging started successfully
@@ -1158,14 +1288,15 @@ def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
             'flow_log': [],
             'channel': channel.value,
             'start_time': time.time(),
-            'samples': 0
+            'samples': 0,
+            'gaps': []
         }
     
     # Start logging thread
     _logging_active = True
     _logging_thread = threading.Thread(
         target=_continuous_logging_worker,
-        args=(instr_id, channel, sample_dt, verbose),
+        args=(instr_id, channel, sample_dt, verbose, watchdog, telemetry),
         daemon=True
     )
     _logging_thread.start()
@@ -1207,23 +1338,25 @@ def stop_continuous_logging(verbose=True):
     # Get final results
     with _logging_lock:
         if _logging_data['samples'] > 0:
-            # Calculate statistics
+            # Calculate statistics over the samples that were read (masked ones are NaN)
             pressure_log = _logging_data['pressure_log']
             flow_log = _logging_data['flow_log']
+            pressure_read = [x for x in pressure_log if x == x] or [0.0]
+            flow_read = [x for x in flow_log if x == x] or [0.0]
             
-            avg_pressure = sum(pressure_log) / len(pressure_log)
-            avg_flow = sum(flow_log) / len(flow_log)
-            min_pressure = min(pressure_log)
-            max_pressure = max(pressure_log)
-            min_flow = min(flow_log)
-            max_flow = max(flow_log)
+            avg_pressure = sum(pressure_read) / len(pressure_read)
+            avg_flow = sum(flow_read) / len(flow_read)
+            min_pressure = min(pressure_read)
+            max_pressure = max(pressure_read)
+            min_flow = min(flow_read)
+            max_flow = max(flow_read)
             
             # Calculate stability
-            pressure_variance = sum((x - avg_pressure) ** 2 for x in pressure_log) / len(pressure_log)
+            pressure_variance = sum((x - avg_pressure) ** 2 for x in pressure_read) / len(pressure_read)
             pressure_std = pressure_variance ** 0.5
             pressure_stability = (pressure_std / avg_pressure) * 100 if avg_pressure > 0 else 0
             
-            flow_variance = sum((x - avg_flow) ** 2 for x in flow_log) / len(flow_log)
+            flow_variance = sum((x - avg_flow) ** 2 for x in flow_read) / len(flow_read)
             flow_std = flow_variance ** 0.5
             flow_stability = (flow_std / avg_flow) * 100 if avg_flow > 0 else 0
             
@@ -1241,13 +1374,16 @@ def stop_continuous_logging(verbose=True):
                 'flow_stability': flow_stability,
                 'time_log': _logging_data['time_log'].copy(),
                 'pressure_log': pressure_log.copy(),
-                'flow_log': flow_log.copy()
+                'flow_log': flow_log.copy(),
+                'gaps': list(_logging_data['gaps'])
             }
             
             if verbose:
                 print(f"✓ Logging stopped")
                 print(f"Samples collected: {results['samples']}")
                 print(f"Duration: {results['duration']:.1f} seconds")
+                for gap_start, gap_end in results['gaps']:
+                    print(f"Gap: {gap_start:.1f}s - {gap_end:.1f}s ({gap_end - gap_start:.1f}s without samples)")
                 print(f"Average Pressure: {results['avg_pressure']:.1f} mbar")
                 print(f"Average Flow: {results['avg_flow']:.1f} µL/min")
                 print("=" * 35)
@@ -1258,7 +1394,7 @@ def stop_continuous_logging(verbose=True):
                 print("No data was collected during logging")
             return None
 
-def _continuous_logging_worker(instr_id, channel, sample_dt, verbose):
+def _continuous_logging_worker(instr_id, channel, sample_dt, verbose, watchdog=None, telemetry=None):
     """
     Background worker for continuous logging.
     """
@@ -1269,37 +1405,82 @@ def _continuous_logging_worker(instr_id, channel, sample_dt, verbose):
     
     consecutive_errors = 0
     max_consecutive_errors = 5
+    # transient errors (USB hiccup, open circuit breaker) are ridden through for this long
+    max_outage_s = 120.0
+    outage_start = None
     
     while _logging_active:
         try:
-            # Read current data
-            success, pressure, flow_rate, error = read_channel_data(instr_id, channel, verbose=False)
+            # Read current data; a sample the control side took within the last half interval is good enough.
+            # Only what the current phase needs is read (no sensor read at all on a channel without an MFS)
+            mask = _read_masks.get(channel.value) if _read_masks is not None else READ_BOTH
+            success, pressure, flow_rate, error = read_channel_data(instr_id, channel, verbose=False,
+                                                                    priority=PRIORITY_LOGGING,
+                                                                    max_age_s=sample_dt / 2.0,
+                                                                    mask=mask)
             
             if success:
+                if outage_start is not None:
+                    if verbose:
+                        print(f"✓ Logging resumed after {time.time() - outage_start:.1f}s outage")
+                    # (start, end) of the outage on the time_log clock
+                    with _logging_lock:
+                        _logging_data['gaps'].append((outage_start - _logging_data['start_time'],
+                                                      time.time() - _logging_data['start_time']))
+                outage_start = None
                 consecutive_errors = 0  # Reset error counter on success
                 current_time = time.time()
                 elapsed_time = current_time - _logging_data['start_time']
                 
-                # Add data to logs
+                # Add data to logs (NaN for a value the mask skipped)
                 with _logging_lock:
                     _logging_data['time_log'].append(elapsed_time)
-                    _logging_data['pressure_log'].append(pressure)
-                    _logging_data['flow_log'].append(flow_rate)
+                    _logging_data['pressure_log'].append(pressure if pressure is not None else float('nan'))
+                    _logging_data['flow_log'].append(flow_rate if flow_rate is not None else float('nan'))
                     _logging_data['samples'] += 1
+                if _totalizer is not None:
+                    _totalizer.add_sample(channel.value, current_time, flow_rate)
+                if _anomalies is not None:
+                    _anomalies.add_sample(channel.value, elapsed_time, pressure, flow_rate)
+                
+                if pressure is not None:
+                    if watchdog:
+                        watchdog.report_sample(channel.value, pressure, flow_rate)
+                    if telemetry:
+                        live_pressure, live_flow = pressure, flow_rate
+                        if _channel_filters is not None:
+                            live_pressure, live_flow = _channel_filters.apply(channel.value, pressure, flow_rate,
+                                                                              dt=sample_dt)
+                        telemetry.publish(channel.value, live_pressure, live_flow, timestamp=current_time)
                 
                 # Print progress every 10 samples
                 if verbose and _logging_data['samples'] % 10 == 0:
                     print(f"Logged {_logging_data['samples']} samples - "
-                          f"P: {pressure:.1f} mbar, F: {flow_rate:.1f} µL/min")
+                          f"P: {_logging_data['pressure_log'][-1]:.1f} mbar, F: {_logging_data['flow_log'][-1]:.1f} µL/min")
+            elif is_transient(error) or error in (QUEUE_TIMEOUT_ERROR, CIRCUIT_OPEN):
+                # retries already happened in the error policy (or the device is being reconnected,
+                # or the queue is busy); keep going until the outage is too long
+                if outage_start is None:
+                    outage_start = time.time()
+                    if verbose:
+                        print(f"Read error, riding through: {error_message(error)} (code {error})")
+                if time.time() - outage_start > max_outage_s:
+                    if verbose:
+                        print(f"Stopping logging after {max_outage_s:.0f}s without a successful read")
+                    if watchdog:
+                        watchdog.report_fault(f"logging worker stopped after {max_outage_s:.0f}s outage")
+                    break
             else:
                 consecutive_errors += 1
                 if verbose:
-                    print(f"Error reading data (attempt {consecutive_errors}): {error}")
+                    print(f"Error reading data (attempt {consecutive_errors}): {error_message(error)} (code {error})")
                 
                 # Stop logging if too many consecutive errors
                 if consecutive_errors >= max_consecutive_errors:
                     if verbose:
                         print(f"Stopping logging due to {max_consecutive_errors} consecutive errors")
+                    if watchdog:
+                        watchdog.report_fault(f"logging worker stopped after {max_consecutive_errors} read errors")
                     break
             
             time.sleep(sample_dt)
@@ -1312,6 +1493,8 @@ def _continuous_logging_worker(instr_id, channel, sample_dt, verbose):
             if consecutive_errors >= max_consecutive_errors:
                 if verbose:
                     print(f"Stopping logging due to {max_consecutive_errors} consecutive exceptions")
+                if watchdog:
+                    watchdog.report_fault(f"logging worker stopped after exception: {e}")
                 break
             
             time.sleep(sample_dt)  # Wait before retrying
@@ -1396,36 +1579,197 @@ def main():
     6. Maintain flow rate for 5 minutes with logging
     7. Save plot and cleanup
     """
+    global _sdk_thread, _sample_cache, _session, _read_masks, _zero_offsets, _channel_filters, _totalizer, \
+        _anomalies, _events, _watchdog
     
     # Initialize OB1
     channel = c_int32(1)
     instr_id = c_int32(-1)
     MUX_DRI_Instr_Id = c_int32(-1)
+    host_loop = None
     
     print("=== INITIALIZING OB1 ===")
-    error = OB1_Initialization('OB1'.encode('ascii'), 0, 0, 0, 0, byref(instr_id))
+    error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'), 0, 0, 0, 0, byref(instr_id))
     if error != 0:
         print(f"Error initializing OB1: {error}")
         return
     print("✓ OB1 initialized successfully")
     
-    # Initialize MUX DRI
-    print("\n=== INITIALIZING MUX DRI ===")
-    error = MUX_DRI_Initialization("12MUX".encode('ascii'), byref(MUX_DRI_Instr_Id))
-    if error != 0:
-        print(f"Error initializing Distribution Valve: {error}")
-        return
-    print("✓ MUX DRI initialized successfully")
+    # Shutdown sequence: from here on every exit, the early returns included, unwinds into the
+    # finally below, which runs these steps in order within a 15 s budget so the USB handles are
+    # released promptly. Steps for parts that were never set up do nothing
+    logging_results = {}
+    mux_open = False
+    watchdog = None
+    telemetry = None
     
-    # Add sensor
-    print("\n=== ADDING SENSOR ===")
-    error = OB1_Add_Sens(instr_id.value, channel.value, 5, 1, 1, 7, 0)
-    if error != 0:
-        print(f"Error adding sensor: {error}")
-        return
-    print("✓ Sensor added successfully")
+    def stop_supervisor():
+        if _session is not None:
+            _session.stop()
+    
+    def stop_controllers():
+        if host_loop is not None:
+            host_loop.stop(vent=False)
+        _sdk_call(PRIORITY_SAFETY, PID_Set_Running_Remote, instr_id, channel, c_int32(0))
+    
+    def drain_logging():
+        results = stop_continuous_logging(verbose=True)
+        logging_results['results'] = results
+        if results:
+            print(f"✓ Continuous logging collected {results.get('samples', 0)} samples")
+            print(f"✓ Duration: {results.get('duration', 0):.1f} seconds")
+            filename = save_continuous_logging_data()
+            if filename:
+                print(f"✓ Continuous logging data saved to: {filename}")
+        if _anomalies is not None:
+            _anomalies.print_summary()
+        if _totalizer is not None:
+            _totalizer.print_summary()
+            print(f"✓ Flow totals saved to: {_totalizer.save()}")
+    
+    def stop_telemetry():
+        if telemetry is not None:
+            telemetry.stop()
+    
+    def park_mux():
+        if mux_open:
+            set_MUX_DRI_valve(MUX_DRI_Instr_Id, 1, rotation=0, verbose=False)
+    
+    def disarm_watchdog():
+        if watchdog is not None:
+            watchdog.stop()
+    
+    def stop_sdk_thread():
+        if _sdk_thread is None:
+            return
+        if _session is not None:
+            _session.print_summary()
+        _sdk_thread.stop()
+        _sdk_thread.print_stats()
+        if _sample_cache is not None:
+            stats = _sample_cache.get_stats()
+            print(f"Sample cache: {stats['hits']} hits, {stats['device_reads']} device reads "
+                  f"({stats['hit_rate'] * 100:.0f}% served from cache)")
+        _error_policy.print_stats()
+    
+    def destroy_mux():
+        if mux_open and not cleanup_MUX_DRI(MUX_DRI_Instr_Id, verbose=False):
+            raise RuntimeError("MUX_DRI_Destructor failed")
+    
+    def destroy_ob1():
+        error = OB1_Destructor(instr_id.value)
+        if error != 0:
+            raise RuntimeError(f"OB1_Destructor error {error}")
+    
+    shutdown = ShutdownCoordinator(budget_s=15.0)
+    shutdown.add_step("stop reconnect supervisor", stop_supervisor, timeout_s=1.0)
+    shutdown.add_step("cancel scheduler / stop PID", stop_controllers, timeout_s=2.0)
+    shutdown.add_step("drain log writer", drain_logging, timeout_s=6.0)
+    shutdown.add_step("stop telemetry", stop_telemetry, timeout_s=1.0)
+    shutdown.add_step("vent channels", lambda: stop_all_channels(instr_id, verbose=False), timeout_s=3.0, critical=True)
+    shutdown.add_step("park MUX", park_mux, timeout_s=5.0)
+    shutdown.add_step("disarm watchdog", disarm_watchdog, timeout_s=1.0, critical=True)
+    shutdown.add_step("stop SDK command thread", stop_sdk_thread, timeout_s=3.0, critical=True)
+    shutdown.add_step("destroy MUX DRI", destroy_mux, timeout_s=3.0, critical=True)
+    shutdown.add_step("destroy OB1", destroy_ob1, timeout_s=3.0, critical=True)
+    shutdown.install_signal_handlers()
     
     try:
+        # Initialize MUX DRI
+        print("\n=== INITIALIZING MUX DRI ===")
+        error = MUX_DRI_Initialization(device_name(DISTRIBUTION_MUX).encode('ascii'), byref(MUX_DRI_Instr_Id))
+        if error != 0:
+            print(f"Error initializing Distribution Valve: {error}")
+            return
+        mux_open = True
+        print("✓ MUX DRI initialized successfully")
+        
+        # Add sensor: flow control needs the MFS configured for this channel in bench_config.json
+        print("\n=== ADDING SENSOR ===")
+        sensor_args = device_info(REFILL_OB1).get('sensors', {}).get(str(channel.value))
+        if not sensor_args:
+            print(f"Error: no MFS configured on channel {channel.value} of the {REFILL_OB1}")
+            return
+        error = OB1_Add_Sens(instr_id.value, channel.value, *sensor_args)
+        if error != 0:
+            print(f"Error adding sensor: {error}")
+            return
+        print("✓ Sensor added successfully")
+        
+        # From here on one thread owns the OB1: safety > control > logging, no concurrent DLL calls
+        _sdk_thread = SDKCommandThread("OB1")
+        _sdk_thread.start()
+        # only the channel the sensor was added to is ever asked for flow
+        _read_masks = ReadMasks(sensor_channels=[channel.value])
+        for phase, mask in PHASE_READ_MASKS.items():
+            _read_masks.set(mask, phase=phase)
+        _zero_offsets = ZeroOffsets()
+        if _zero_offsets.load():
+            print(f"✓ Zero offsets loaded from {_zero_offsets.path} (re-measured before logging)")
+        _channel_filters = ChannelFilters()
+        _totalizer = FlowTotalizer()
+        if _totalizer.load():
+            print(f"✓ Flow totals loaded from {_totalizer.path}")
+        _sample_cache = SampleCache(instr_id.value, sdk_thread=_sdk_thread, error_policy=_error_policy,
+                                    read_masks=_read_masks, zero_offsets=_zero_offsets)
+        
+        # Vent all channels if the control loop hangs, a limit is hit or the regulator saturates. The
+        # watchdog vents; stopping the host loop keeps it from writing pressures until the protocol aborts
+        def on_trip(reason):
+            if host_loop is not None:
+                host_loop.stop(vent=False)
+        
+        watchdog = SafetyWatchdog(
+            instr_id.value,
+            {channel.value: ChannelLimits(max_pressure=950.0, max_flow=1000.0, max_duration_s=3600.0)},
+            heartbeat_timeout_s=30.0,
+            check_period_s=0.2,
+            on_trip=on_trip,
+            sdk_thread=_sdk_thread,
+            sample_cache=_sample_cache
+        )
+        _watchdog = watchdog
+        watchdog.start()
+        
+        # A leak puts liquid where it should not be: vent now. Clogs / an empty reservoir end the hold (step 4)
+        def on_anomaly(event):
+            if event.kind == LEAK:
+                watchdog.report_fault(f"leak on channel {event.channel}: {event.message}")
+        
+        _anomalies = AnomalyDetector(totalizer=_totalizer, on_event=on_anomaly)
+        
+        # Re-initialize and restore the OB1 / MUX if either drops off the USB bus mid-run
+        def on_reconnect(device, new_id):
+            if device == OB1:
+                watchdog.instr_id = new_id
+                _sample_cache.instr_id = new_id
+                _sample_cache.invalidate()
+        
+        _session = InstrumentSession(
+            device_name(REFILL_OB1), instr_id,
+            mux_name=device_name(DISTRIBUTION_MUX), mux_id=MUX_DRI_Instr_Id,
+            sdk_thread=_sdk_thread,
+            error_policy=_error_policy,
+            heartbeat=watchdog.heartbeat,
+            should_restore=lambda: not watchdog.tripped and not shutdown.should_stop(),
+            on_reconnect=[on_reconnect]
+        )
+        _session.record(OB1_Add_Sens, instr_id, channel, *sensor_args)
+        
+        # MFS resolution per phase: 13 bit while ramping / converging, 16 bit for the hold
+        sensor_profiles = SensorProfiles(instr_id, {channel.value: tuple(sensor_args)}, sdk_thread=_sdk_thread,
+                                         session=_session, sample_cache=_sample_cache)
+        
+        # Live samples for other local processes (python SDK_scripts/cli.py monitor to watch); the run
+        # does not depend on it, so a taken port only turns it off (publish() is then a no-op)
+        telemetry = TelemetryPublisher()
+        try:
+            telemetry.start()
+        except OSError as e:
+            print(f"⚠ Telemetry off: could not bind udp://{telemetry.address[0]}:{telemetry.address[1]} ({e})")
+        
+        _session.start()
+        
         # # Perform calibration and save it
         # print("\n=== PERFORMING CALIBRATION ===")
         # base_path = r"C:\Users\oykuz\calibration.calib"
@@ -1441,9 +1785,17 @@ def main():
         
         # print(f"✓ Calibration completed and saved to: {saved_path}")
         
-        # Load existing calibration first
+        # Load existing calibration first: the newest one in the dated archive, unless its drift
+        # trend says OB1_Calib is due (run calibrate_new above with the outlets capped then)
         print("\n=== LOADING EXISTING CALIBRATION ===")
-        calibration_path = r"C:\Users\oykuz\calibration_20250929.calib"
+        from calib_drift import recalibration_needed  # numpy, only needed for this check
+        calibration_path = calibration_file(REFILL_OB1)
+        if not calibration_path:
+            print(f"✗ No calibration found for the {REFILL_OB1}; set its \"calibration\" in bench_config.json")
+            return
+        recalibrate, _, _ = recalibration_needed(device_info(REFILL_OB1)['calibration'])
+        if recalibrate:
+            print("⚠ Loading it anyway; recalibrate before relying on absolute pressures")
         success = existing_calibration(
             instr_id.value, 
             calibration_path, 
@@ -1475,6 +1827,8 @@ def main():
             return
         
         print(f"✓ MUX valve set to position 1")
+        _totalizer.set_port(channel.value, 1)
+        _anomalies.set_port(channel.value, 1)
         
         # Add buffer time for valve to settle
         time.sleep(3.0)  # 3 second buffer
@@ -1488,22 +1842,43 @@ def main():
             print(f"Warning: Could not read valve position (error: {error_code})")
 
         print("Setting pressure to zero...")
-        error = OB1_Set_Press(instr_id.value, channel, c_double(0))
+        error = _sdk_call(PRIORITY_CONTROL, OB1_Set_Press, instr_id, channel, c_double(0))
+        
+        # Vented and at rest: measure the regulator / MFS zero so every reading from here on is corrected
+        watchdog.heartbeat()
+        if _zero_offsets.measure(instr_id, [channel.value], state=VENTED, n=50, sample_dt=0.02,
+                                 sensor_channels=[channel.value], sdk_thread=_sdk_thread):
+            _zero_offsets.save()
+            _sample_cache.invalidate()
         
         # Start continuous logging
         print("\n=== STARTING CONTINUOUS LOGGING ===")
-        start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True)
+        start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True, watchdog=watchdog,
+                                 telemetry=telemetry)
+        
+        # Structured event log on the same time base as the sample log (Time_s); ramps are one
+        # event each, steps only when they leave the ramp by more than SETPOINT_DEADBAND
+        _events = EventLog(f"events_{channel.value}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                           start_time=_logging_data['start_time'])
+        _session.event_log = _events
+        _anomalies.event_log = _events
+        _events.valve_confirmed(1)
+        _events.setpoint(channel.value, 0.0)
         
         # Step 1: Pressure ramp to 600 mbar over 100 seconds
         print("\n=== PRESSURE RAMP EXPERIMENT ===")
+        _read_masks.set_phase("ramp")
+        sensor_profiles.apply('ramp')
         print("Ramping pressure to 600 mbar over 100 seconds...")
+        _events.phase_begin("ramp", target=600.0)
         success = ramp_pressure(
             instr_id, 
             channel, 
             pressure_mbar=600.0, 
             ramp_time=100.0,  # Ramp over 100 seconds
             sample_dt=1.0, 
-            verbose=True
+            verbose=True,
+            heartbeat=watchdog.heartbeat
         )
         
         if not success:
@@ -1511,141 +1886,196 @@ def main():
             return
         else:
             print("✓ Pressure ramp completed successfully")
+        _events.phase_end("ramp")
+        
+        # Learn the pressure->flow curve of this path (channel 1 through MUX valve 1) from the ramp
+        flow_models = FlowModelBank()
+        flow_models.load()
+        if flow_models.fit_from_ramp(channel.value, 1, success, verbose=True):
+            flow_models.save()
+        # Kalman filters take flow changes from the regulator pressure through this model (random walk without one)
+        path_model = flow_models.get(channel.value, 1)
+        flow_prediction = path_model.flow_for_pressure if path_model is not None else None
+        _channel_filters.attach(channel.value, "flow", Kalman1D(model=flow_prediction))
+        _anomalies.flow_models = flow_models
+        _anomalies.reset(channel.value)   # predictions start now; the PID handover gets the settle window
         
         # Step 2: Activate PID control to stabilize at 400 µL/min
+        # (set_flowrate re-enables the remote PID, so never after a trip)
+        if watchdog.tripped:
+            print(f"✗ Not starting PID control: watchdog tripped ({watchdog.trip_reason})")
+            return
         print("\n=== ACTIVATING PID CONTROL ===")
+        _read_masks.set_phase("pid")
         print("Setting PID control to stabilize flow rate at 400 µL/min...")
-        flow_result = set_flowrate(
-            instr_id,
-            channel,
-            flow_rate_ul_min=400.0,
-            k_p=0.001,
-            k_i=0.001,
-            verbose=True
-        )
+        # gains autotune.py saved for this channel and the fluid the MFS is calibrated for
+        tuned = load_pid_gains(channel.value, sensor_args[2])
+        if USE_HOST_PID:
+            # start from the pressure left by the ramp so the handover is bumpless
+            _, ramp_pressure_now, _, _ = read_channel_data(instr_id, channel, verbose=False)
+            feedforward = flow_models.feedforward(channel.value, 1)
+            # saved gains are in host units (mbar per µL/min), which is what this loop uses
+            if tuned:
+                controller = HostPIDController(k_p=tuned['k_p'], k_i=tuned['k_i'], k_d=0.0, feedforward=feedforward)
+                print(f"Using autotuned host gains from {tuned['date']}: Kp={tuned['k_p']}, Ki={tuned['k_i']}")
+            else:
+                controller = HostPIDController(gain_schedule=GainSchedule(), feedforward=feedforward)
+            host_loop = HostFlowLoop(instr_id, channel, controller,
+                                     period_s=0.05, verbose=True, sdk_thread=_sdk_thread,
+                                     zero_offsets=_zero_offsets, flow_filter=Kalman1D(model=flow_prediction))
+            host_loop.start(400.0, initial_pressure=None if feedforward else ramp_pressure_now)
+            _events.pid(channel.value, True)
+            flow_result = {'target_flow_rate': 400.0, 'success': True}
+        else:
+            # use the autotuned gains only if they were saved with a calibrated remote scale
+            # (entries without one are host-unit gains, far too high here; see USE_HOST_PID)
+            k_p, k_i = 0.001, 0.001
+            if tuned and tuned.get('remote_gain_scale') is not None and tuned.get('remote_k_p') is not None:
+                k_p, k_i = tuned['remote_k_p'], tuned['remote_k_i']
+                print(f"Using autotuned gains from {tuned['date']}: Kp={k_p}, Ki={k_i}")
+            # start the remote PID near the right pressure instead of from wherever the ramp ended
+            ff_pressure = flow_models.pressure_for_flow(channel.value, 1, 400.0)
+            if ff_pressure is not None:
+                print(f"Feedforward: setting {ff_pressure:.1f} mbar before enabling PID")
+                _sdk_call(PRIORITY_CONTROL, OB1_Set_Press, instr_id, channel, c_double(ff_pressure))
+                _events.setpoint(channel.value, ff_pressure)
+            elif flow_models.get(channel.value, 1) is not None:
+                print(f"⚠ Feedforward skipped: the path model needs more than {MAX_FEEDFORWARD_MBAR:.0f} mbar for 400 µL/min")
+            # the OB1's own PID compares the raw sensor value, so the target carries the sensor offset
+            flow_result = set_flowrate(
+                instr_id,
+                channel,
+                flow_rate_ul_min=400.0 + _zero_offsets.flow_offset(channel.value),
+                k_p=k_p,
+                k_i=k_i,
+                verbose=True
+            )
+            if flow_result:
+                _events.pid(channel.value, True, k_p=k_p, k_i=k_i)
         
         if not flow_result:
             print("✗ PID control activation failed")
             return
         else:
             print("✓ PID control activated successfully")
+        _events.setpoint(channel.value, 400.0, kind="flow")
         
         # Step 3: Wait for flow rate stabilization at 400 ± 10 µL/min
         print("\n=== WAITING FOR FLOW RATE STABILIZATION ===")
         print("Waiting for flow rate to reach 400 ± 10 µL/min...")
         target_flow = 400.0
         tolerance = 10.0
-        min_flow = target_flow - tolerance  # 390 µL/min
-        max_flow = target_flow + tolerance  # 410 µL/min
-        
-        stabilization_start = time.time()
         max_wait_time = 300.0  # Maximum 5 minutes wait time
         
-        while (time.time() - stabilization_start) < max_wait_time:
-            elapsed_wait = time.time() - stabilization_start
-            
-            # Read current values
-            sen = c_double()
-            reg = c_double()
-            error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
-            
-            if error == 0:
-                current_pressure = reg.value  # mbar
-                current_flow = sen.value  # µL/min
-                
-                print(f"Stabilization: {elapsed_wait:.1f}s - "
-                      f"Pressure: {current_pressure:.1f} mbar - "
-                      f"Flow: {current_flow:.1f} µL/min - "
-                      f"Target: {target_flow} ± {tolerance} µL/min")
-                
-                # Check if flow rate is within target range
-                if min_flow <= current_flow <= max_flow:
-                    print(f"✓ Flow rate stabilized at {current_flow:.1f} µL/min")
-                    break
-            else:
-                print(f"Error reading sensor data: {error}")
-            
-            time.sleep(2.0)  # Check every 2 seconds
+        def read_with_heartbeat(instr, ch):
+            watchdog.heartbeat()
+            return read_channel_data(instr, ch, verbose=False, max_age_s=0.05)
+        
+        def stop_reason():
+            if watchdog.tripped:
+                return f"watchdog tripped ({watchdog.trip_reason})"
+            return shutdown.reason if shutdown.should_stop() else None
+        
+        # rolling-window mean/slope/variance check instead of the first sample inside the band
+        _events.phase_begin("settle", target=target_flow)
+        stability = wait_until_stable(
+            instr_id,
+            channel,
+            target=target_flow,
+            tol=tolerance,
+            window=5.0,
+            sample_dt=0.1,
+            timeout_s=max_wait_time,
+            read_fn=read_with_heartbeat,
+            verbose=True,
+            value_filter=Kalman1D(model=flow_prediction),
+            abort=stop_reason
+        )
+        
+        _events.phase_end("settle", stable=stability['stable'])
+        if stop_reason():
+            print(f"✗ Stopping before the hold: {stop_reason()}")
+            return
+        
+        if stability['stable']:
+            print(f"✓ Flow rate stabilized at {stability['mean']:.1f} µL/min after {stability['elapsed']:.1f}s")
         else:
-            print(f"⚠ Warning: Flow rate did not stabilize within {max_wait_time/60:.1f} minutes")
+            print(f"⚠ Warning: Flow rate did not stabilize within {max_wait_time/60:.1f} minutes ({stability['reason']})")
             print("Continuing with current flow rate...")
         
         # Step 4: Maintain flow rate for 5 minutes with logging
         print("\n=== MAINTAINING FLOW RATE FOR 5 MINUTES ===")
+        _read_masks.set_phase("hold")
+        sensor_profiles.apply('hold')
         print("Maintaining 400 µL/min flow rate for 5 minutes...")
         maintenance_start_time = time.time()
         maintenance_duration = 300.0  # 5 minutes = 300 seconds
+        _events.phase_begin("hold", target=400.0)
         
         while (time.time() - maintenance_start_time) < maintenance_duration:
+            watchdog.heartbeat()
+            if shutdown.should_stop():
+                print(f"✗ Aborting maintenance: {shutdown.reason}")
+                break
+            if watchdog.tripped:
+                print(f"✗ Aborting maintenance: watchdog tripped ({watchdog.trip_reason})")
+                break
             elapsed = time.time() - maintenance_start_time
             remaining = maintenance_duration - elapsed
+            # end the hold before a tracked reservoir feeding this path runs dry (two update intervals of margin)
+            empty = [name for name, reservoir in _totalizer.reservoirs.items()
+                     if reservoir.drains(channel.value, 1) and _totalizer.needs_refill(name, horizon_s=10.0)]
+            if empty:
+                print(f"⚠ Ending maintenance early: reservoir {', '.join(empty)} needs a refill "
+                      f"(record it with 'python cli.py totals --refill NAME')")
+                break
+            problems = _anomalies.active(channel.value) & {CLOG, EMPTY}
+            if problems:
+                print(f"⚠ Ending maintenance early: {', '.join(sorted(problems))} detected on channel {channel.value}")
+                break
             
-            # Read current values
-            sen = c_double()
-            reg = c_double()
-            error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+            # Read current values (the logger's sample is fresh enough)
+            success, current_pressure, current_flow, error = read_channel_data(instr_id, channel, verbose=False,
+                                                                               max_age_s=1.0)
             
-            if error == 0:
-                current_pressure = reg.value  # mbar
-                current_flow = sen.value  # µL/min
-                
+            if success:
                 print(f"Maintenance: {elapsed:.1f}s/{maintenance_duration:.1f}s - "
                       f"Pressure: {current_pressure:.1f} mbar - "
                       f"Flow: {current_flow:.1f} µL/min - "
                       f"Remaining: {remaining:.1f}s")
+                
+                # keep the path model current with steady-state points
+                flow_models.update(channel.value, 1, current_pressure, current_flow)
             else:
                 print(f"Error reading sensor data: {error}")
             
             time.sleep(5.0)  # Update every 5 seconds
         
+        _events.phase_end("hold")
+        flow_models.save()
         print("✓ 5-minute maintenance period completed")
     
+    except KeyboardInterrupt:
+        print("\n\n=== PROGRAM STOPPED BY USER ===")
+    
     finally:
-        # Cleanup
-        print("\n=== CLEANUP ===")
-        
-        # Stop PID control first
-        print("Stopping PID control...")
-        error = PID_Set_Running_Remote(instr_id, channel, c_int32(0))
-        if error != 0:
-            print(f"Warning: Error stopping PID control: {error}")
-        else:
-            print("✓ PID control stopped")
-        
-        # Stop continuous logging
-        print("Stopping continuous logging...")
-        results = stop_continuous_logging(verbose=True)
+        # Ordered, time-bounded cleanup (see the steps registered above)
+        shutdown.shutdown("protocol finished" if not shutdown.should_stop() else shutdown.reason)
         
+        # Plot only after the channels are vented and the instruments released; the
+        # render runs in a worker process so the program exits without waiting on it
+        results = logging_results.get('results')
         if results:
-            print(f"✓ Continuous logging collected {results.get('samples', 0)} samples")
-            print(f"✓ Duration: {results.get('duration', 0):.1f} seconds")
-            print(f"✓ Time range: {min(results.get('time_log', [0])):.1f}s to {max(results.get('time_log', [0])):.1f}s")
-            
-            # Save the continuous logging data
-            filename = save_continuous_logging_data()
-            if filename:
-                print(f"✓ Continuous logging data saved to: {filename}")
-            
-            # Create final plot from continuous logging
             print("\n=== CREATING FINAL PLOT ===")
-            plot_filename = plot_channel_data(results, save_plot=True, show_plot=True)
+            plot_filename = plot_in_background(results)
             if plot_filename:
-                print(f"✓ Final plot saved to: {plot_filename}")
+                print(f"✓ Final plot will be saved to: {plot_filename}")
         else:
             print("✗ No continuous logging data available for plotting")
         
-        # Set pressure to zero and destruct OB1
-        print("Setting pressure to zero...")
-        error = OB1_Set_Press(instr_id.value, channel, c_double(0))
-        
-        # Cleanup MUX DRI
-        print("Cleaning up MUX DRI...")
-        mux_success = cleanup_MUX_DRI(MUX_DRI_Instr_Id, verbose=True)
-        if not mux_success:
-            print("Warning: MUX DRI cleanup had issues")
-        
-        print("Destructing OB1...")
-        error = OB1_Destructor(instr_id.value)
+        if _events is not None:
+            _events.close()
+            print(f"✓ Event log saved to: {_events.filename}")
         
         print("✓ Cleanup completed")
         print("Program finished successfully")
@@ -6,15 +6,22 @@ import queue
 
 from ctypes import *
 from pathlib import Path
-import matplotlib.pyplot as plt
-import numpy as np
 from datetime import datetime
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SDK_scripts'))#shared helpers
+from device_registry import add_sdk_path, device_name, device_info, calibration_file, REFILL_OB1, DISTRIBUTION_MUX
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
 
 from Elveflow64 import *
 
+from event_log import EventLog, SETPOINT_DEADBAND
+from plotting import plot_in_background
+from totalizer import FlowTotalizer
+from flow_model import FlowModelBank
+from anomaly import AnomalyDetector, CLOG, LEAK, EMPTY
+from port_fingerprint import PortFingerprints
+from zero_offset import ZeroOffsets, VENTED
+
 
 def create_timestamped_path(original_path, timestamp_format="%Y%m%d"):
     """Efficiently create a timestamped file path from an original path."""
@@ -761,6 +768,8 @@ def plot_channel_data(results, save_plot=True, show_plot=True, filename=None):
         print("No data to plot")
         return ""
     
+    import matplotlib.pyplot as plt  # loaded only when plotting, keeps headless runs fast
+    
     # Set up the plot style
     plt.style.use('default')
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
@@ -860,6 +869,7 @@ def plot_realtime_monitoring(instr_id, channel, duration_seconds=30.0, sample_dt
     flow_log = []
     
     # Set up interactive plotting
+    import matplotlib.pyplot as plt
     plt.ion()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
     fig.suptitle(f'Real-time Monitoring - Channel {channel.value}', fontsize=16, fontweight='bold')
@@ -986,6 +996,26 @@ _logging_data = {
     'samples': 0
 }
 _logging_lock = threading.Lock()
+# Volume totals per channel / MUX port and the source reservoir level, carried over between runs; None = not tracked
+_totalizer = None
+# Clog / bubble / leak / empty-reservoir detection on the logged samples; None = not checked
+_anomalies = None
+
+# Source reservoir pushed by channel 1 (15 mL tube). A valve visit only starts if the reservoir
+# can supply what that port took on its previous visit without going below RESERVOIR_LOW_UL
+RESERVOIR_NAME = "ch1_source"
+RESERVOIR_CAPACITY_UL = 15000.0
+RESERVOIR_LOW_UL = 1000.0   # keeps the dip tube submerged
+
+# Flow each pulse should give. Every MUX port has its own tube path, so the pulse pressure is
+# computed per port from its fingerprint (port_fingerprints.json); ports without one use the
+# fixed pressures. Ports that have none are fingerprinted once before the first cycle
+VALVES = [3, 4]
+PRIME_FLOW_UL_MIN = 400.0
+SAMPLE_FLOW_UL_MIN = 200.0
+PRIME_PRESSURE_MBAR = 600.0    # fallback without a fingerprint
+SAMPLE_PRESSURE_MBAR = 300.0   # fallback without a fingerprint
+FINGERPRINT_MISSING_PORTS = True
 
 def start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True):
     """
@@ -1149,6 +1179,10 @@ def _continuous_logging_worker(instr_id, channel, sample_dt, verbose):
                     _logging_data['pressure_log'].append(pressure)
                     _logging_data['flow_log'].append(flow_rate)
                     _logging_data['samples'] += 1
+                if _totalizer is not None:
+                    _totalizer.add_sample(channel.value, current_time, flow_rate)
+                if _anomalies is not None:
+                    _anomalies.add_sample(channel.value, elapsed_time, pressure, flow_rate)
                 
                 # Print progress every 10 samples
                 if verbose and _logging_data['samples'] % 10 == 0:
@@ -1257,6 +1291,7 @@ def main():
     4. Set pressure to 500 mbar over 180 seconds
     5. Save plot and cleanup
     """
+    global _totalizer, _anomalies
     
     # Initialize OB1
     channel = c_int32(1)
@@ -1264,7 +1299,7 @@ def main():
     MUX_DRI_Instr_Id = c_int32(-1)
     
     print("=== INITIALIZING OB1 ===")
-    error = OB1_Initialization('OB1'.encode('ascii'), 0, 0, 0, 0, byref(instr_id))
+    error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'), 0, 0, 0, 0, byref(instr_id))
     if error != 0:
         print(f"Error initializing OB1: {error}")
         return
@@ -1272,12 +1307,26 @@ def main():
     
     # Initialize MUX DRI
     print("\n=== INITIALIZING MUX DRI ===")
-    error = MUX_DRI_Initialization("12MUX".encode('ascii'), byref(MUX_DRI_Instr_Id))
+    error = MUX_DRI_Initialization(device_name(DISTRIBUTION_MUX).encode('ascii'), byref(MUX_DRI_Instr_Id))
     if error != 0:
         print(f"Error initializing Distribution Valve: {error}")
         return
     print("✓ MUX DRI initialized successfully")
     
+    # The flow totals and the anomaly checks need the MFS; register it as configured in bench_config.json
+    sensor_args = device_info(REFILL_OB1).get('sensors', {}).get(str(channel.value))
+    if sensor_args:
+        print("\n=== ADDING SENSOR ===")
+        error = OB1_Add_Sens(instr_id.value, channel.value, *sensor_args)
+        if error != 0:
+            print(f"Error adding sensor: {error}")
+            return
+        print("✓ Sensor added successfully")
+    else:
+        print(f"No MFS configured on channel {channel.value}: flow totals and anomaly checks are off")
+    
+    events = None
+    
     try:
         # # Perform calibration and save it
         # print("\n=== PERFORMING CALIBRATION ===")
@@ -1296,7 +1345,10 @@ def main():
         
         # Load existing calibration first
         print("\n=== LOADING EXISTING CALIBRATION ===")
-        calibration_path = r"C:\Users\oykuz\calibration_20250929.calib"
+        calibration_path = calibration_file(REFILL_OB1)  # newest in the archive configured in bench_config.json
+        if not calibration_path:
+            print(f"✗ No calibration found for the {REFILL_OB1}; set its \"calibration\" in bench_config.json")
+            return
         success = existing_calibration(
             instr_id.value, 
             calibration_path, 
@@ -1319,6 +1371,45 @@ def main():
         
         print(f"✓ MUX DRI homed successfully")
         
+        # Volume totals and reservoir level from the previous runs; a new reservoir starts full.
+        # Set up before the fingerprint sweep, whose volume comes out of the same reservoir
+        _totalizer = FlowTotalizer()
+        if _totalizer.load():
+            print(f"✓ Flow totals loaded from {_totalizer.path}")
+        if RESERVOIR_NAME not in _totalizer.reservoirs:
+            _totalizer.add_reservoir(RESERVOIR_NAME, channel.value, RESERVOIR_CAPACITY_UL, low_ul=RESERVOIR_LOW_UL)
+        
+        # Path models per port: fingerprint the ports that have none (needs the MFS), then work out
+        # each port's prime and sampling pressure
+        fingerprints = PortFingerprints()
+        if fingerprints.load():
+            print(f"✓ Port fingerprints loaded from {fingerprints.path}")
+        flow_models = FlowModelBank()
+        flow_models.load()
+        missing = [v for v in VALVES if fingerprints.get(channel.value, v) is None]
+        if missing and sensor_args and FINGERPRINT_MISSING_PORTS:
+            # vented and at rest: correct the sweep like the zero-corrected fits it shares the bank with
+            zero_offsets = ZeroOffsets()
+            zero_offsets.load()
+            if zero_offsets.measure(instr_id, [channel.value], state=VENTED, sensor_channels=[channel.value]):
+                zero_offsets.save()
+            if fingerprints.measure(instr_id.value, channel.value, missing, mux_id=MUX_DRI_Instr_Id,
+                                    flow_models=flow_models, totalizer=_totalizer, zero_offsets=zero_offsets):
+                fingerprints.save()
+                flow_models.save()
+        elif missing:
+            print(f"⚠ No fingerprint for valves {missing}: using {PRIME_PRESSURE_MBAR:.0f} / {SAMPLE_PRESSURE_MBAR:.0f} mbar")
+        prime_pressure = {}
+        sample_pressure = {}
+        sample_delay = {}   # valve -> dead time of the port's path, added to the sampling hold
+        for v in VALVES:
+            prime_pressure[v] = fingerprints.pressure_for_flow(channel.value, v, PRIME_FLOW_UL_MIN, default=PRIME_PRESSURE_MBAR)
+            sample_pressure[v] = fingerprints.pressure_for_flow(channel.value, v, SAMPLE_FLOW_UL_MIN, default=SAMPLE_PRESSURE_MBAR)
+            entry = fingerprints.get(channel.value, v)
+            sample_delay[v] = (entry or {}).get('dead_time_s') or 0.0
+            print(f"Valve {v}: prime {prime_pressure[v]:.0f} mbar, sampling {sample_pressure[v]:.0f} mbar"
+                  f"{' (fingerprint)' if entry else ' (default)'}")
+        
         # Set MUX valve to position 1
         print("\n=== SETTING MUX VALVE TO POSITION 3 ===")
         success, error_code = set_MUX_DRI_valve(MUX_DRI_Instr_Id, 3, rotation=0, verbose=True)
@@ -1343,34 +1434,86 @@ def main():
         print("Setting pressure to zero...")
         error = OB1_Set_Press(instr_id.value, channel, c_double(0))
         
+        _totalizer.set_port(channel.value, 3)
+        print(f"Reservoir '{RESERVOIR_NAME}': {_totalizer.reservoirs[RESERVOIR_NAME].volume_ul:.0f} µL left")
+        
         # Start continuous logging after calibration is loaded
         print("\n=== STARTING CONTINUOUS LOGGING ===")
         start_continuous_logging(instr_id, channel, sample_dt=1.0, verbose=True)
         
+        # Structured event log on the same time base as the sample log (Time_s)
+        events = EventLog(f"events_{channel.value}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                          start_time=_logging_data['start_time'])
+        events.valve_confirmed(3)
+        events.setpoint(channel.value, 0.0)
+        
+        # Flow predicted from each port's path model; a clogged or leaking port is dropped from the
+        # rest of the run, an empty reservoir stops it
+        failed_ports = {}       # valve -> AnomalyEvent that took it out of the run
+        reservoir_empty = []    # EMPTY events
+        
+        def on_anomaly(event):
+            if event.kind in (CLOG, LEAK):
+                failed_ports.setdefault(event.port, event)
+            elif event.kind == EMPTY:
+                reservoir_empty.append(event)
+        
+        if sensor_args:
+            _anomalies = AnomalyDetector(flow_models, tau_s=fingerprints.response_times(channel.value),
+                                         totalizer=_totalizer, on_event=on_anomaly, event_log=events)
+            _anomalies.set_port(channel.value, 3)
+        
         # Loop through valves 1-4, with pressure ramp and flow rate control for each valve
         print("\n=== STARTING VALVE CYCLE EXPERIMENT ===")
         print("Will cycle through valves 1-4, maintaining 200 µL/min flow rate for 1 minute at each valve")
         print("Pausing for 1 minute between valve switches")
         print("This entire 4-valve cycle will be repeated 10 times")
         
+        visit_volume_ul = {}  # valve -> µL the last prime + sampling pulse took through that port
+        refill_needed = False
         for cycle_num in range(1, 11):  # Repeat the entire cycle 10 times
             print(f"\n{'='*60}")
             print(f"STARTING CYCLE {cycle_num}/10")
             print(f"{'='*60}")
+            events.phase_begin("cycle", cycle=cycle_num)
             
-            for valve_num in [3, 4]:  # Toggle between valves 3 and 4
+            for valve_num in VALVES:  # Toggle between valves 3 and 4
                 print(f"\n=== CYCLE {cycle_num}/10 - VALVE {valve_num} ===")
                 
+                if valve_num in failed_ports:
+                    print(f"⚠ Skipping valve {valve_num}: {failed_ports[valve_num].kind} detected "
+                          f"({failed_ports[valve_num].message})")
+                    continue
+                
+                # Stop when the reservoir cannot supply another visit, not on a fixed refill schedule
+                needed_ul = visit_volume_ul.get(valve_num, 0.0)
+                if reservoir_empty or _totalizer.needs_refill(RESERVOIR_NAME, volume_ul=needed_ul):
+                    left_ul = _totalizer.reservoirs[RESERVOIR_NAME].volume_ul
+                    events.log("refill_needed", reservoir=RESERVOIR_NAME, volume_ul=left_ul, needed_ul=needed_ul)
+                    print(f"⚠ Reservoir '{RESERVOIR_NAME}' needs a refill: {left_ul:.0f} µL left, "
+                          f"valve {valve_num} takes ~{needed_ul:.0f} µL (low level {RESERVOIR_LOW_UL:.0f} µL)")
+                    print(f"Stopping before cycle {cycle_num} valve {valve_num}; refill and record it with "
+                          f"'python cli.py totals --refill {RESERVOIR_NAME}'")
+                    refill_needed = True
+                    break
+                
                 # Switch to current valve
+                events.valve_commanded(valve_num)
                 success, error_code = set_MUX_DRI_valve(MUX_DRI_Instr_Id, valve_num, rotation=0, verbose=True)
                 
                 if not success:
+                    events.error("MUX_DRI_Set_Valve", error_code, f"switch to valve {valve_num} failed")
                     print(f"✗ MUX valve switching to {valve_num} failed with error: {error_code}")
                     continue  # Skip this valve and continue with next
+                _totalizer.set_port(channel.value, valve_num)
+                if _anomalies is not None:
+                    _anomalies.set_port(channel.value, valve_num)
+                port_total_before = _totalizer.total(channel.value, valve_num)
                 
                 # Verify valve position
                 success_verify, current_position, error_verify = get_MUX_DRI_valve(MUX_DRI_Instr_Id, verbose=False)
                 if success_verify:
+                    events.valve_confirmed(current_position)
                     print(f"✓ MUX valve switched to position {valve_num} (verified: {current_position})")
                 else:
                     print(f"✓ MUX valve switched to position {valve_num} (verification failed: {error_verify})")
@@ -1396,17 +1539,19 @@ def main():
                 # else:
                 #     print(f"✓ Pressure ramp completed successfully for valve {valve_num}")
                 
-                # Send pressure pulse to prime the line: 600 mbar with 5s ramp up, 3s hold, 5s ramp down
+                # Send pressure pulse to prime the line: the port's prime pressure with 5s ramp up, 3s hold, 5s ramp down
+                target_pressure = prime_pressure[valve_num]
                 print(f"\n=== PRIME THE LINE FOR VALVE {valve_num} ===")
-                print("Sending 600 mbar pressure pulse to prime the line...")
+                print(f"Sending {target_pressure:.0f} mbar pressure pulse to prime the line...")
                 print("Ramp up: 5s, Hold: 3s, Ramp down: 5s")
+                events.phase_begin("prime", valve=valve_num, target=target_pressure)
                 
                 pulse_start = time.time()
                 ramp_up_time = 5.0     # 5 seconds ramp up
                 hold_time = 3.0        # 3 seconds hold
                 ramp_down_time = 5.0   # 5 seconds ramp down
+                last_phase = None
                 pulse_duration = ramp_up_time + hold_time + ramp_down_time  # 13 seconds total
-                target_pressure = 600.0
                 
                 while (time.time() - pulse_start) < pulse_duration:
                     elapsed_pulse = time.time() - pulse_start
@@ -1430,6 +1575,19 @@ def main():
                     
                     # Set pressure
                     error = OB1_Set_Press(instr_id, channel, c_double(current_target))
+                    if phase != last_phase:
+                        if last_phase:
+                            events.phase_end(last_phase)
+                        events.phase_begin(phase)
+                        last_phase = phase
+                        # one event per ramp (start, end and duration); the hold is the ramp's end point
+                        if phase == "Ramp Up":
+                            events.setpoint(channel.value, current_target, ramp_to=target_pressure,
+                                            ramp_s=ramp_up_time - elapsed_pulse)
+                        elif phase == "Ramp Down":
+                            events.setpoint(channel.value, current_target, ramp_to=0.0,
+                                            ramp_s=pulse_duration - elapsed_pulse)
+                    events.setpoint(channel.value, current_target, deadband=SETPOINT_DEADBAND)
                     
                     # Read current pressure values
                     reg = c_double()
@@ -1442,13 +1600,24 @@ def main():
                               f"Target: {current_target:.1f} mbar - "
                               f"Actual: {actual_pressure:.1f} mbar")
                     
+                    if _anomalies is not None and _anomalies.active(channel.value) & {CLOG, LEAK, EMPTY}:
+                        print(f"⚠ Ending pulse early: {', '.join(sorted(_anomalies.active(channel.value)))} "
+                              f"on valve {valve_num}")
+                        target_pressure = current_target  # the ramp down starts where the pulse stopped
+                        break
+                    
                     time.sleep(0.5)  # Update every 0.5 seconds
                 
+                if last_phase:
+                    events.phase_end(last_phase)
+                
                 # Ramp down pressure to 0 over 5 seconds after priming pulse
                 print("Ramping down pressure to 0 over 5 seconds...")
                 ramp_down_start = time.time()
                 ramp_down_duration = 5.0
                 initial_pressure = target_pressure
+                events.phase_begin("Ramp Down")
+                events.setpoint(channel.value, initial_pressure, ramp_to=0.0, ramp_s=ramp_down_duration)
                 
                 while (time.time() - ramp_down_start) < ramp_down_duration:
                     elapsed_ramp = time.time() - ramp_down_start
@@ -1457,6 +1626,7 @@ def main():
                     
                     # Set pressure
                     error = OB1_Set_Press(instr_id, channel, c_double(current_target))
+                    events.setpoint(channel.value, current_target, deadband=SETPOINT_DEADBAND)
                     
                     # Read current pressure values
                     reg = c_double()
@@ -1472,23 +1642,29 @@ def main():
                 
                 # Ensure pressure is set to 0
                 OB1_Set_Press(instr_id, channel, c_double(0))
+                events.setpoint(channel.value, 0.0, deadband=SETPOINT_DEADBAND)
+                events.phase_end("Ramp Down")
+                events.phase_end("prime")
                 print(f"✓ Line priming completed for valve {valve_num}")
                 
                 # Wait 5 seconds between pulses
                 print("Waiting 5 seconds before next pulse...")
                 time.sleep(5.0)
                 
-                # Send sampling pulse: 300 mbar with 5s ramp up, 60s hold, 5s ramp down
+                # Send sampling pulse: the port's sampling pressure with 5s ramp up, 60s hold (plus the
+                # port's dead time, so the outlet gets the full 60s), 5s ramp down
+                target_pressure = sample_pressure[valve_num]
                 print(f"\n=== SAMPLING PULSE FOR VALVE {valve_num} ===")
-                print("Sending 300 mbar sampling pulse...")
-                print("Ramp up: 5s, Hold: 60s, Ramp down: 5s")
+                print(f"Sending {target_pressure:.0f} mbar sampling pulse...")
+                print(f"Ramp up: 5s, Hold: {60.0 + sample_delay[valve_num]:.1f}s, Ramp down: 5s")
+                events.phase_begin("sample", valve=valve_num, target=target_pressure)
                 
                 pulse_start = time.time()
                 ramp_up_time = 5.0     # 5 seconds ramp up
-                hold_time = 60.0       # 60 seconds hold
+                hold_time = 60.0 + sample_delay[valve_num]  # 60 seconds hold at the outlet
                 ramp_down_time = 5.0   # 5 seconds ramp down
-                pulse_duration = ramp_up_time + hold_time + ramp_down_time  # 70 seconds total
-                target_pressure = 300.0
+                last_phase = None
+                pulse_duration = ramp_up_time + hold_time + ramp_down_time  # ~70 seconds total
                 
                 while (time.time() - pulse_start) < pulse_duration:
                     elapsed_pulse = time.time() - pulse_start
@@ -1512,6 +1688,19 @@ def main():
                     
                     # Set pressure
                     error = OB1_Set_Press(instr_id, channel, c_double(current_target))
+                    if phase != last_phase:
+                        if last_phase:
+                            events.phase_end(last_phase)
+                        events.phase_begin(phase)
+                        last_phase = phase
+                        # one event per ramp (start, end and duration); the hold is the ramp's end point
+                        if phase == "Ramp Up":
+                            events.setpoint(channel.value, current_target, ramp_to=target_pressure,
+                                            ramp_s=ramp_up_time - elapsed_pulse)
+                        elif phase == "Ramp Down":
+                            events.setpoint(channel.value, current_target, ramp_to=0.0,
+                                            ramp_s=pulse_duration - elapsed_pulse)
+                    events.setpoint(channel.value, current_target, deadband=SETPOINT_DEADBAND)
                     
                     # Read current pressure values
                     reg = c_double()
@@ -1524,13 +1713,24 @@ def main():
                               f"Target: {current_target:.1f} mbar - "
                               f"Actual: {actual_pressure:.1f} mbar")
                     
+                    if _anomalies is not None and _anomalies.active(channel.value) & {CLOG, LEAK, EMPTY}:
+                        print(f"⚠ Ending pulse early: {', '.join(sorted(_anomalies.active(channel.value)))} "
+                              f"on valve {valve_num}")
+                        target_pressure = current_target  # the ramp down starts where the pulse stopped
+                        break
+                    
                     time.sleep(0.5)  # Update every 0.5 seconds
                 
+                if last_phase:
+                    events.phase_end(last_phase)
+                
                 # Ramp down pressure to 0 over 5 seconds after sampling pulse
                 print("Ramping down pressure to 0 over 5 seconds...")
                 ramp_down_start = time.time()
                 ramp_down_duration = 5.0
                 initial_pressure = target_pressure
+                events.phase_begin("Ramp Down")
+                events.setpoint(channel.value, initial_pressure, ramp_to=0.0, ramp_s=ramp_down_duration)
                 
                 while (time.time() - ramp_down_start) < ramp_down_duration:
                     elapsed_ramp = time.time() - ramp_down_start
@@ -1539,6 +1739,7 @@ def main():
                     
                     # Set pressure
                     error = OB1_Set_Press(instr_id, channel, c_double(current_target))
+                    events.setpoint(channel.value, current_target, deadband=SETPOINT_DEADBAND)
                     
                     # Read current pressure values
                     reg = c_double()
@@ -1554,9 +1755,15 @@ def main():
                 
                 # Ensure pressure is set to 0
                 OB1_Set_Press(instr_id, channel, c_double(0))
+                events.setpoint(channel.value, 0.0, deadband=SETPOINT_DEADBAND)
+                events.phase_end("Ramp Down")
+                events.phase_end("sample")
                 print(f"✓ Sampling pulse completed for valve {valve_num}")
                 
                 print(f"✓ Line priming and sampling completed for valve {valve_num}")
+                visit_volume_ul[valve_num] = _totalizer.total(channel.value, valve_num) - port_total_before
+                print(f"Valve {valve_num} took {visit_volume_ul[valve_num]:.1f} µL, reservoir "
+                      f"'{RESERVOIR_NAME}' has {_totalizer.reservoirs[RESERVOIR_NAME].volume_ul:.0f} µL left")
                 
                 # Pause for 20 seconds between valve switches (except for the last valve)
                 if valve_num == 3:  # Don't pause after valve 4 (the last valve)
@@ -1564,6 +1771,7 @@ def main():
                     print(f"Pausing for 20 seconds before switching to valve {valve_num + 1}...")
                     pause_start_time = time.time()
                     pause_duration = 20.0  # 20 seconds pause
+                    events.phase_begin("pause")
                     
                     while (time.time() - pause_start_time) < pause_duration:
                         elapsed_pause = time.time() - pause_start_time
@@ -1574,14 +1782,21 @@ def main():
                         
                         time.sleep(5.0)  # Update every 5 seconds during pause
                     
+                    events.phase_end("pause")
                     print(f"✓ Pause completed, ready for valve {valve_num + 1}")
             
+            events.phase_end("cycle")
+            if refill_needed:
+                break
             print(f"\n{'='*60}")
             print(f"CYCLE {cycle_num}/10 COMPLETED")
             print(f"{'='*60}")
         
-        print("\n=== VALVE CYCLE EXPERIMENT COMPLETED ===")
-        print("All 10 cycles of valves (1-4) have been tested with 200 µL/min flow rate")
+        if refill_needed:
+            print("\n=== VALVE CYCLE EXPERIMENT STOPPED: RESERVOIR NEEDS REFILL ===")
+        else:
+            print("\n=== VALVE CYCLE EXPERIMENT COMPLETED ===")
+            print("All 10 cycles of valves (1-4) have been tested with 200 µL/min flow rate")
     
     finally:
         # Cleanup
@@ -1601,14 +1816,20 @@ def main():
             if filename:
                 print(f"✓ Continuous logging data saved to: {filename}")
             
-            # Create final plot from continuous logging
+            # Create final plot from continuous logging (worker process, so venting below never waits on it)
             print("\n=== CREATING FINAL PLOT ===")
-            plot_filename = plot_channel_data(results, save_plot=True, show_plot=True)
+            plot_filename = plot_in_background(results)
             if plot_filename:
-                print(f"✓ Final plot saved to: {plot_filename}")
+                print(f"✓ Final plot will be saved to: {plot_filename}")
         else:
             print("✗ No continuous logging data available for plotting")
         
+        if _anomalies is not None:
+            _anomalies.print_summary()
+        if _totalizer is not None:
+            _totalizer.print_summary()
+            print(f"✓ Flow totals saved to: {_totalizer.save()}")
+        
         # Set pressure to zero and destruct OB1
         print("Setting pressure to zero...")
         error = OB1_Set_Press(instr_id.value, channel, c_double(0))
@@ -1622,6 +1843,10 @@ def main():
         print("Destructing OB1...")
         error = OB1_Destructor(instr_id.value)
         
+        if events:
+            events.close()
+            print(f"✓ Event log saved to: {events.filename}")
+        
         print("✓ Cleanup completed")
         print("Program finished successfully")
 
@@ -6,15 +6,16 @@ import queue
 
 from ctypes import *
 from pathlib import Path
-import matplotlib.pyplot as plt
-import numpy as np
 from datetime import datetime
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SDK_scripts'))#shared helpers
+from device_registry import add_sdk_path, device_name, calibration_file, REFILL_OB1
+add_sdk_path()#Elveflow64.lib / Elveflow64.py locations come from bench_config.json
 
 from Elveflow64 import *
 
+from plotting import plot_in_background
+
 
 def create_timestamped_path(original_path, timestamp_format="%Y%m%d"):
     """Efficiently create a timestamped file path from an original path."""
@@ -580,6 +581,8 @@ def plot_channel_data(results, save_plot=True, show_plot=True, filename=None):
         print("No data to plot")
         return ""
     
+    import matplotlib.pyplot as plt  # loaded only when plotting, keeps headless runs fast
+    
     # Set up the plot style
     plt.style.use('default')
     fig, ax = plt.subplots(1, 1, figsize=(12, 6))
@@ -663,6 +666,7 @@ def plot_realtime_monitoring(instr_id, channel, duration_seconds=30.0, sample_dt
     flow_log = []
     
     # Set up interactive plotting
+    import matplotlib.pyplot as plt
     plt.ion()
     fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 8))
     fig.suptitle(f'Real-time Monitoring - Channel {channel.value}', fontsize=16, fontweight='bold')
@@ -1237,7 +1241,7 @@ def main():
     instr_id = c_int32(-1)
     
     print("=== INITIALIZING OB1 ===")
-    error = OB1_Initialization('OB1'.encode('ascii'), 0, 0, 0, 0, byref(instr_id))
+    error = OB1_Initialization(device_name(REFILL_OB1).encode('ascii'), 0, 0, 0, 0, byref(instr_id))
     if error != 0:
         print(f"Error initializing OB1: {error}")
         return
@@ -1247,7 +1251,10 @@ def main():
     try:
         # Load existing calibration
         print("\n=== LOADING EXISTING CALIBRATION ===")
-        calibration_path = r"C:\Users\oykuz\calibration_20250929.calib"
+        calibration_path = calibration_file(REFILL_OB1)  # newest in the archive configured in bench_config.json
+        if not calibration_path:
+            print(f"✗ No calibration found for the {REFILL_OB1}; set its \"calibration\" in bench_config.json")
+            return
         success = existing_calibration(
             instr_id.value, 
             calibration_path, 
@@ -1339,11 +1346,11 @@ def main():
             if filename:
                 print(f"✓ Continuous logging data saved to: {filename}")
             
-            # Create final plot from continuous logging
+            # Create final plot from continuous logging (worker process, so venting below never waits on it)
             print("\n=== CREATING FINAL PLOT ===")
-            plot_filename = plot_channel_data(results, save_plot=True, show_plot=True)
+            plot_filename = plot_in_background(results)
             if plot_filename:
-                print(f"✓ Final plot saved to: {plot_filename}")
+                print(f"✓ Final plot will be saved to: {plot_filename}")
         else:
             print("✗ No continuous logging data available for plotting")
         
@@ -2,13 +2,11 @@ import sys
 import time
 import os
 
-from ctypes import *
 from pathlib import Path
 
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/DLL64')#add the path to Elveflow64.lib here
-sys.path.append('C:/Users/oykuz/ESI_V3_10_02/SDK_V3_10_01/SDK_V3_10_01/DLL/Python/Python_64')#add the path of the Elveflow64.py
-
-from Elveflow64 import *
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'SDK_scripts'))#shared helpers
+from instrument_daemon import InstrumentClient
+from device_registry import device_info, REFILL_OB1
 
 def create_timestamped_path(original_path, timestamp_format="%Y%m%d"):
     """Efficiently create a timestamped file path from an original path."""
@@ -16,12 +14,12 @@ def create_timestamped_path(original_path, timestamp_format="%Y%m%d"):
     timestamp = time.strftime(timestamp_format)
     return str(path_obj.parent / f"{path_obj.stem}_{timestamp}{path_obj.suffix}")
 
-def inject_volume(instr_id, channel, target_volume_ul, flow_rate_ul_min=50.0, sample_dt=0.1, timeout_s=300):
+def inject_volume(ob1, channel, target_volume_ul, flow_rate_ul_min=50.0, sample_dt=0.1, timeout_s=300):
     """
     Inject a specific volume using PID control.
     
     Args:
-        instr_id: OB1 instrument ID
+        ob1: InstrumentClient attached to the instrument daemon
         channel: Channel to control (channel_refill or channel_sample)
         target_volume_ul: Target volume to inject in microliters
         flow_rate_ul_min: Target flow rate in µL/min (default: 50)
@@ -34,7 +32,7 @@ def inject_volume(instr_id, channel, target_volume_ul, flow_rate_ul_min=50.0, sa
     print(f"Starting volume injection: {target_volume_ul} µL at {flow_rate_ul_min} µL/min")
     
     # Set target flow rate
-    error = OB1_Set_Sens(instr_id, channel, c_double(flow_rate_ul_min))
+    error, _ = ob1.set_flow(channel, flow_rate_ul_min)
     if error != 0:
         print(f"Error setting flow rate: {error}")
         return False, 0.0, 0.0
@@ -60,16 +58,12 @@ def inject_volume(instr_id, channel, target_volume_ul, flow_rate_ul_min=50.0, sa
                 break
             
             # Read current flow rate
-            sen = c_double()
-            reg = c_double()
-            error = OB1_Get_Data(instr_id, channel, byref(reg), byref(sen))
+            error, (_, current_flow) = ob1.get_data(channel)  # µL/min
             
             if error != 0:
                 print(f"Error reading sensor data: {error}")
                 break
             
-            current_flow = sen.value  # µL/min
-            
             # Calculate volume injected since last reading
             dt = current_time - last_time
             volume_increment = current_flow * (dt / 60.0)  # Convert min to sec
@@ -97,7 +91,7 @@ def inject_volume(instr_id, channel, target_volume_ul, flow_rate_ul_min=50.0, sa
     
     finally:
         # Stop flow by setting pressure to 0
-        error = OB1_Set_Press(instr_id, channel, c_double(0))
+        error, _ = ob1.set_pressure(channel, 0)
         if error != 0:
             print(f"Error stopping flow: {error}")
     
@@ -110,64 +104,68 @@ def inject_volume(instr_id, channel, target_volume_ul, flow_rate_ul_min=50.0, sa
     return success, injected_volume, injection_time
 
 #MFS used to measure flow rate of the refill and sample lines
-channel_refill = c_int32(1)
-channel_sample = c_int32(2)
-
-Instr_ID=c_int32(-1) # handle for the SDK communication, increments with each new instrument initialized
-error = OB1_Initialization('113433'.encode('ascii'),0,0,0,0,byref(Instr_ID)) 
-error = OB1_Add_Sens(Instr_ID.value, channel_refill.value, 5, 1, 1, 7, 0) 
-error = OB1_Add_Sens(Instr_ID.value, channel_sample.value, 5, 1, 1, 7, 0) 
-
-
-# ----- CALIBRATION -----
-Calib_path = r"C:\Users\oykuz\calibration.calib"
-# Efficient timestamping using helper function
-new_path = create_timestamped_path(Calib_path)
-path_buf = create_string_buffer(new_path.encode('ascii'))
-
-start = time.time() # Start timer
-error = OB1_Calib (Instr_ID.value)
-elapsed = time.time() - start
-print ("ran calibration in %d seconds with exit code %d" %(elapsed, error))
-error = OB1_Calib_Save(Instr_ID.value, path_buf)
-print("Saved calibration to %s with error code %d" % (new_path, error))
-
-#reset pressures on both channels to start
-error = OB1_Set_Press(Instr_ID.value, channel_refill, c_double(0)) 
-error = OB1_Set_Press(Instr_ID.value, channel_sample, c_double(0)) 
-
-# --- PID CONTROL SETUP ---
-#add PI controllers to both refill and sample channels and start them
-k_p = 0.001
-k_i = 0.001
-error = PID_Add_Remote(Instr_ID.value, channel_refill, Instr_ID.value, channel_refill, k_p, k_i, 1)
-error = PID_Add_Remote(Instr_ID.value, channel_sample, Instr_ID.value, channel_sample, k_p, k_i, 1)
-error = PID_Set_Running_Remote(Instr_ID.value, channel_refill, c_int32(1)) 
-error = PID_Set_Running_Remote(Instr_ID.value, channel_sample, c_int32(1)) 
-
-#adjust parameters if needed
-# error = PID_Set_Params_Remote(Instr_ID.value, channel_refill, 1, k_p, k_i)
-# error = PID_Set_Params_Remote(Instr_ID.value, channel_sample, 1, k_p, k_i)
-
-# --- REFILL CONTROL START ---
-error = OB1_Set_Sens(Instr_ID.value, channel_refill, c_double(0))
-
-# Example usage of inject_volume function:
-# Inject 100 µL through the refill channel at 50 µL/min
-success, actual_volume, injection_time = inject_volume(
-    Instr_ID.value, 
-    channel_refill, 
-    target_volume_ul=100.0, 
-    flow_rate_ul_min=50.0
-)
-
-# Inject 50 µL through the sample channel at 25 µL/min
-success, actual_volume, injection_time = inject_volume(
-    Instr_ID.value, 
-    channel_sample, 
-    target_volume_ul=50.0, 
-    flow_rate_ul_min=25.0
-)
+channel_refill = 1
+channel_sample = 2
+
+# the instrument daemon (python SDK_scripts/instrument_daemon.py) owns the OB1: attach to it
+# instead of initializing the instrument here
+ob1 = InstrumentClient()
+error, _ = ob1.add_sensor(channel_refill, (5, 1, 1, 7, 0))
+error, _ = ob1.add_sensor(channel_sample, (5, 1, 1, 7, 0))
+
+try:
+    # ----- CALIBRATION -----
+    Calib_path = device_info(REFILL_OB1)['calibration']  # archive base path from bench_config.json
+    if not Calib_path:
+        raise SystemExit(f"No calibration path configured for the {REFILL_OB1} in bench_config.json")
+    # Efficient timestamping using helper function
+    new_path = create_timestamped_path(Calib_path)
+
+    start = time.time() # Start timer
+    error, _ = ob1.calibrate(new_path)
+    elapsed = time.time() - start
+    print ("ran calibration in %d seconds and saved it to %s with exit code %d" %(elapsed, new_path, error))
+
+    #reset pressures on both channels to start
+    error, _ = ob1.set_pressure(channel_refill, 0)
+    error, _ = ob1.set_pressure(channel_sample, 0)
+
+    # --- PID CONTROL SETUP ---
+    #add PI controllers to both refill and sample channels and start them
+    k_p = 0.001
+    k_i = 0.001
+    error, _ = ob1.pid_add(channel_refill, k_p, k_i, 1)
+    error, _ = ob1.pid_add(channel_sample, k_p, k_i, 1)
+    error, _ = ob1.pid_run(channel_refill, 1)
+    error, _ = ob1.pid_run(channel_sample, 1)
+
+    #adjust parameters if needed
+    # error, _ = ob1.pid_params(channel_refill, k_p, k_i)
+    # error, _ = ob1.pid_params(channel_sample, k_p, k_i)
+
+    # --- REFILL CONTROL START ---
+    error, _ = ob1.set_flow(channel_refill, 0)
+
+    # Example usage of inject_volume function:
+    # Inject 100 µL through the refill channel at 50 µL/min
+    success, actual_volume, injection_time = inject_volume(
+        ob1, 
+        channel_refill, 
+        target_volume_ul=100.0, 
+        flow_rate_ul_min=50.0
+    )
+
+    # Inject 50 µL through the sample channel at 25 µL/min
+    success, actual_volume, injection_time = inject_volume(
+        ob1, 
+        channel_sample, 
+        target_volume_ul=50.0, 
+        flow_rate_ul_min=25.0
+    )
+
+finally:
+    # detaching vents the channels this script set; the daemon keeps the OB1 open
+    ob1.close()
 
 
 # --- LOOP TO CONTINIOUSLY SAMPLE AND REFILL WITH TIMESTAMPS ---